@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Assets module
+Builds the bundles of the lineage page
+
+The MetaViz scripts and styles are concatenated in the order the page needs them, minified
+and written next to their sources under a name carrying the hash of their content, so a
+new build always gets a new URL. The build also writes the resource.config of the fanstatic
+library, whose `metaviz` group is the only resource the lineage page includes:
+
+    {% resource 'datalineage/metaviz' %}
+
+Fanstatic serves the library under versioned URLs with far-future cache headers.
+
+Dojo is not bundled, its loader finds the modules it loads from the location of dojo.js.
+The compressed dojo.js is used, a custom build limited to the modules MetaViz requires can
+be made with the dojo build tool from metaviz.profile.js, next to this module, and copied
+over js/dojo/dojo.js.
+"""
+
+from collections import OrderedDict
+import glob
+import hashlib
+import logging
+import os
+
+import rcssmin
+import rjsmin
+
+logger = logging.getLogger(__name__)
+
+FANSTATIC_PATH = os.path.join(os.path.dirname(__file__), 'fanstatic')
+
+# bundles are written in the directory of their sources so relative urls keep working
+BUNDLES = OrderedDict([
+    ('css/metaviz.bundle.css', [
+        'css/pure-min.css',
+        'css/base-min.css',
+        'css/general_styles.css',
+        'css/heatmap_styles.css',
+        'css/card_styles.css',
+        'css/nav_styles.css',
+    ]),
+    ('js/metaviz.bundle.js', [
+        'js/metaviz.js',
+        'js/MetaViz/required_dojo_scripts.js',
+        'js/MetaViz/initialize_scripts.js',
+        'js/MetaViz/local_tools_creation.js',
+        'js/MetaViz/local_tools_logic.js',
+        'js/MetaViz/card_creation.js',
+        'js/MetaViz/card_position.js',
+        'js/MetaViz/card_logic.js',
+        'js/MetaViz/line_position.js',
+        'js/MetaViz/lineage_filling.js',
+        'js/MetaViz/navi_hide_show_logic.js',
+        'js/guiFunctions.js',
+        'js/Exhibit3/exhibitOutputFunctions.js',
+        'js/preloader.js',
+        'js/lineage_paging.js',
+        # starts with a "use strict" directive, which must not apply to the other files
+        'js/load_metaviz.js',
+    ]),
+])
+
+# resources of the page loaded as they are
+DOJO_THEME = 'js/dojo/themes/tundra/tundra.css'
+DOJO = 'js/dojo/dojo.js'
+
+RESOURCE_CONFIG = '''# Written by `paster datalineage build-assets`, do not edit
+
+[main]
+
+order = %(dojo)s
+dont_bundle = %(dojo)s
+
+[depends]
+
+%(script)s = datalineage/%(dojo)s
+
+[groups]
+
+metaviz =
+    %(theme)s
+    %(style)s
+    %(dojo)s
+    %(script)s
+'''
+
+
+def _hashed_name(bundle, digest):
+    base, extension = os.path.splitext(bundle)
+    return '%s.%s%s' % (base, digest, extension)
+
+
+def _min_name(path):
+    base, extension = os.path.splitext(path)
+    return '%s.min%s' % (base, extension)
+
+
+def build_bundle(bundle, sources, path=FANSTATIC_PATH):
+    """
+    Concatenates and minifies the sources of a bundle
+
+    Returns the path of the bundle relative to the library, the minified version sits next
+    to it with a .min suffix, as fanstatic expects
+
+    @param bundle: Path of the bundle relative to the library, without the hash
+    @param sources: Paths of the sources relative to the library, in load order
+    """
+    contents = []
+    for source in sources:
+        with open(os.path.join(path, source), 'rb') as f:
+            contents.append(f.read().rstrip())
+    separator = '\n' if bundle.endswith('.css') else ';\n'
+    content = separator.join(contents) + '\n'
+    minify = rcssmin.cssmin if bundle.endswith('.css') else rjsmin.jsmin
+
+    digest = hashlib.sha1(content).hexdigest()[:12]
+    hashed = _hashed_name(bundle, digest)
+    # drop the bundles of the previous builds
+    base, extension = os.path.splitext(bundle)
+    for old in glob.glob(os.path.join(path, '%s.*%s' % (base, extension))):
+        if os.path.basename(old) not in (os.path.basename(hashed),
+                                         os.path.basename(_min_name(hashed))):
+            os.remove(old)
+    with open(os.path.join(path, hashed), 'wb') as f:
+        f.write(content)
+    with open(os.path.join(path, _min_name(hashed)), 'wb') as f:
+        f.write(minify(content))
+    logger.info('Built %s from %s files' % (hashed, len(sources)))
+    return hashed
+
+
+def build(path=FANSTATIC_PATH):
+    """
+    Builds all the bundles and the resource.config of the library
+
+    Returns the list of the built bundles
+    """
+    built = [build_bundle(bundle, sources, path) for bundle, sources in BUNDLES.items()]
+    style, script = built
+    with open(os.path.join(path, 'resource.config'), 'w') as f:
+        f.write(RESOURCE_CONFIG % {'theme': DOJO_THEME, 'style': style,
+                                   'dojo': DOJO, 'script': script})
+    return built
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk module
+Writes batches of lineage edges straight to the lineage extras of the packages
+
+Every edge is recorded in the lineage field of the package declaring it, as package_update
+would do, but without validating and reindexing the packages one by one:
+
+    parent:   the dataset (target) gets the model (source) as parent
+    producer: the model (target) gets the dataset (source) added to its producers
+    consumer: the dataset (source) gets the model (target) added to its consumers
+
+The extras are written with plain SQL, so the packages are not reindexed one by one on
+commit, see the reindex module.
+"""
+
+from collections import OrderedDict
+import logging
+
+from ckan.common import config
+
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import sync
+from ckanext.datalineage.model import split_codes
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_EDGES = 20000
+
+# relation -> (end of the edge declaring it, field it is declared in)
+DECLARED_BY = {
+    lineage_model.RELATION_PARENT: ('target', 'parent'),
+    lineage_model.RELATION_PRODUCER: ('target', 'producers'),
+    lineage_model.RELATION_CONSUMER: ('source', 'consumers'),
+}
+
+
+def max_edges():
+    return int(config.get('ckanext.datalineage.bulk_upsert.max_edges', DEFAULT_MAX_EDGES))
+
+
+def plan_changes(edges):
+    """
+    Groups edges by the package code declaring them
+
+    Returns an OrderedDict mapping each declaring code to a dict of lineage field -> list
+    of codes, and a dict of the codes given more than one parent
+
+    @param edges: List of (source, target, relation) tuples
+    """
+    changes = OrderedDict()
+    conflicts = {}
+    for source, target, relation in edges:
+        end, field = DECLARED_BY[relation]
+        code, value = (target, source) if end == 'target' else (source, target)
+        values = changes.setdefault(code, {}).setdefault(field, [])
+        if value not in values:
+            values.append(value)
+        if field == 'parent' and len(values) > 1:
+            conflicts[code] = values
+    return changes, conflicts
+
+
+def _merge(current, values, replace):
+    if replace:
+        return values
+    merged = split_codes(current)
+    merged.extend(value for value in values if value not in merged)
+    return merged
+
+
+def write_lineage(package_id, extras, fields):
+    """
+    Writes the lineage fields of a package and syncs its edges, in the current session
+
+    Returns True if a field changed
+
+    @param package_id: Id of the package
+    @param extras: Current lineage extras rows of the package, see get_lineage_extras
+    @param fields: Dict of the new values of some lineage fields
+    """
+    values = dict((key, extra.value) for key, extra in extras.items()
+                  if extra.state == u'active')
+    updated = dict(values)
+    updated.update(fields)
+    if updated == values:
+        return False
+    lineage_model.write_lineage_extras(package_id, extras, fields)
+    sync.sync_lineage(package_id, updated)
+    return True
+
+
+def apply_changes(changes, package_ids, replace=False):
+    """
+    Writes the planned changes to the lineage extras and edges of the packages, in the
+    current session
+
+    Returns the ids of the packages whose lineage fields changed
+
+    @param changes: Planned changes, see plan_changes
+    @param package_ids: Dict mapping the declaring codes to their package ids
+    @param replace: Replace the values of the fields named in the changes instead of adding
+                    to them
+    """
+    extras = lineage_model.get_lineage_extras(package_ids.values())
+    changed = []
+    for code, fields in changes.items():
+        package_id = package_ids[code]
+        package_extras = extras[package_id]
+        new_values = {}
+        for field, codes in fields.items():
+            current = package_extras.get(field)
+            current = current.value if current is not None and current.state == u'active' else None
+            new_values[field] = u','.join(_merge(current, codes, replace))
+        if write_lineage(package_id, package_extras, new_values):
+            changed.append(package_id)
+    # the lineage pages and the HTTP validators rely on the modification date
+    lineage_model.touch_packages(changed)
+    return changed
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Cache module
+Shared cache for code -> package lookups of the data lineage extension
+
+The cache is configured with the following settings:
+
+    ckanext.datalineage.cache.backend = memory  (memory, redis or none)
+    ckanext.datalineage.cache.size = 1000       (maximum number of entries of the memory backend)
+    ckanext.datalineage.cache.ttl = 300         (seconds an entry is kept)
+    ckanext.datalineage.cache.missing_ttl = 60  (seconds a code without a package is remembered)
+    ckanext.datalineage.cache.redis_url = redis://localhost:6379/0 (defaults to ckan.redis.url)
+"""
+
+from collections import OrderedDict
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZE = 1000
+DEFAULT_TTL = 300
+DEFAULT_MISSING_TTL = 60
+KEY_PREFIX = 'ckanext-datalineage:'
+
+
+class MemoryBackend(object):
+    """
+    In-process LRU cache with a bounded size and a time to live for every entry
+
+    Sets are kept apart from the entries, they are not evicted by the LRU so the keys
+    recorded in them can always be dropped
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, ttl=DEFAULT_TTL):
+        self.size = size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._sets = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                return None
+            # re-insert the entry so it becomes the most recently used one
+            self._data[key] = entry
+            return value
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+            while len(self._data) > self.size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def add_to_set(self, key, member):
+        """
+        Adds a member to a set, the set expires ttl seconds after its last change
+        """
+        with self._lock:
+            now = time.time()
+            if len(self._sets) > self.size and key not in self._sets:
+                # the sets of the entries gone since are dropped with them
+                for expired in [name for name, (expires, _) in self._sets.items() if expires < now]:
+                    del self._sets[expired]
+            expires, members = self._sets.get(key, (None, set()))
+            members.add(member)
+            self._sets[key] = (now + self.ttl, members)
+
+    def pop_set(self, key):
+        """
+        Removes a set and returns its members
+        """
+        with self._lock:
+            expires, members = self._sets.pop(key, (None, set()))
+            return members if expires is not None and expires >= time.time() else set()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sets.clear()
+
+
+class RedisBackend(object):
+    """
+    Cache shared by all the workers, stored in redis
+
+    @param client: Any object implementing the get, setex, delete, sadd, expire and pipeline
+                   methods of a redis client
+    """
+
+    def __init__(self, client, ttl=DEFAULT_TTL, prefix=KEY_PREFIX):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        self.client.setex(self.prefix + key, self.ttl if ttl is None else ttl, json.dumps(value))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def add_to_set(self, key, member):
+        pipeline = self.client.pipeline()
+        pipeline.sadd(self.prefix + key, member)
+        pipeline.expire(self.prefix + key, self.ttl)
+        pipeline.execute()
+
+    def pop_set(self, key):
+        # read and removed in one transaction, so no member added meanwhile is lost
+        pipeline = self.client.pipeline()
+        pipeline.smembers(self.prefix + key)
+        pipeline.delete(self.prefix + key)
+        members, _ = pipeline.execute()
+        return set(member.decode('utf-8') if isinstance(member, bytes) else member
+                   for member in members)
+
+    def clear(self):
+        keys = list(self.client.scan_iter(self.prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class CodeCache(object):
+    """
+    Caches packages by lineage field (code, parent) and keeps track of the keys each
+    package is stored under in a set of the backend, so they can all be dropped when the
+    package changes, whichever worker stored them
+
+    Codes without a package are remembered for missing_ttl seconds, so the views do not
+    search for them on every request
+    """
+
+    def __init__(self, backend, missing_ttl=DEFAULT_MISSING_TTL):
+        self.backend = backend
+        self.missing_ttl = missing_ttl
+
+    def get_many(self, field, codes):
+        """
+        Returns a dict with the cached packages for the given codes
+
+        @param field: Lineage field the codes refer to (code, parent)
+        @param codes: Iterable of codes
+        """
+        result = {}
+        for code in codes:
+            package = self.backend.get('%s:%s' % (field, code))
+            if package is not None:
+                result[code] = package
+        return result
+
+    def set_many(self, field, packages):
+        """
+        Stores packages in the cache, private packages are never cached since their
+        visibility depends on the user
+
+        @param field: Lineage field the packages are keyed by (code, parent)
+        @param packages: Dict mapping codes to packages
+        """
+        for code, package in packages.items():
+            if package.get('private'):
+                continue
+            key = '%s:%s' % (field, code)
+            self.backend.set(key, package)
+            self.backend.add_to_set('package:%s' % package['id'], key)
+
+    def get_missing(self, codes):
+        """
+        Returns the codes among the given ones remembered to have no package
+        """
+        return set(code for code in codes if self.backend.get('missing:%s' % code))
+
+    def set_missing(self, codes):
+        """
+        Remembers codes without a package, a package created with one of them drops it,
+        see invalidate
+        """
+        if not self.missing_ttl:
+            return
+        for code in codes:
+            self.backend.set('missing:%s' % code, True, self.missing_ttl)
+
+    def invalidate(self, package_id, codes=()):
+        """
+        Drops all the entries of a package
+
+        @param package_id: Id of the changed package
+        @param codes: Additional keys to drop, e.g. the new code of the package and its
+                      missing entry
+        """
+        for key in self.backend.pop_set('package:%s' % package_id) | set(codes):
+            self.backend.delete(key)
+
+    def get_layout(self, digest):
+        """
+        Returns the layout of a graph, see the layout module
+
+        @param digest: Digest of the graph
+        """
+        return self.backend.get('layout:%s' % digest)
+
+    def set_layout(self, digest, layout):
+        """
+        Stores the layout of a graph, layouts are keyed by the content of their graph so
+        they never need to be dropped
+
+        @param digest: Digest of the graph
+        @param layout: JSON serializable layout
+        """
+        self.backend.set('layout:%s' % digest, layout)
+
+    def clear(self):
+        self.backend.clear()
+
+
+_code_cache = None
+
+
+def create_backend(config):
+    """
+    Creates the cache backend from the CKAN config, returns None if caching is disabled
+
+    @param config: CKAN config
+    """
+    name = config.get('ckanext.datalineage.cache.backend', 'memory')
+    ttl = int(config.get('ckanext.datalineage.cache.ttl', DEFAULT_TTL))
+    if name == 'none':
+        return None
+    if name == 'redis':
+        import redis
+        url = config.get('ckanext.datalineage.cache.redis_url',
+                         config.get('ckan.redis.url', 'redis://localhost:6379/0'))
+        return RedisBackend(redis.StrictRedis.from_url(url), ttl=ttl)
+    if name != 'memory':
+        logger.warning('Unknown datalineage cache backend [%s], using memory' % name)
+    size = int(config.get('ckanext.datalineage.cache.size', DEFAULT_SIZE))
+    return MemoryBackend(size=size, ttl=ttl)
+
+
+def configure(config):
+    """
+    Sets up the shared code cache from the CKAN config
+
+    @param config: CKAN config
+    """
+    global _code_cache
+    backend = create_backend(config)
+    missing_ttl = int(config.get('ckanext.datalineage.cache.missing_ttl', DEFAULT_MISSING_TTL))
+    _code_cache = CodeCache(backend, missing_ttl) if backend is not None else None
+
+
+def get_code_cache():
+    """
+    Returns the shared code cache, or None if caching is disabled
+    """
+    return _code_cache
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+Closure module
+Reachability index of the lineage graph, answering impact queries with one indexed lookup
+
+The datalineage_closure table holds a row for every (ancestor, descendant) pair of codes
+linked by a path of edges. It is updated in the transaction changing the edges:
+
+    added edge (a, b):   every code reaching a, and a, now reaches b and every code b reaches
+    removed edge (a, b): only the pairs from the codes reaching a to the codes b reached can
+                         be lost, the descendants of the codes reaching a are recomputed from
+                         their edges, restricted to the codes b reached
+
+Cycles in the declared lineage are supported, the codes of a cycle reach each other.
+`paster datalineage closure` rebuilds the whole table from the edges.
+"""
+
+import logging
+
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage.traversal import BOTH, DOWNSTREAM, UPSTREAM
+
+logger = logging.getLogger(__name__)
+
+
+def _successors(codes):
+    codes = list(codes)
+    successors = {}
+    for start in xrange(0, len(codes), lineage_model.QUERY_BATCH_SIZE):
+        batch = codes[start:start + lineage_model.QUERY_BATCH_SIZE]
+        for source, target, _ in lineage_model.get_downstream_edges(batch):
+            successors.setdefault(source, set()).add(target)
+    return successors
+
+
+def _remove_pairs(removed):
+    """
+    Drops the pairs of the closure which were only reachable through removed edges, the
+    edge table must already be updated while the closure is not
+    """
+    sources = set(source for source, _ in removed)
+    targets = set(target for _, target in removed)
+    affected = set(sources)
+    for ancestors in lineage_model.get_ancestors(sources).values():
+        affected.update(ancestors)
+    reached = set(targets)
+    for descendants in lineage_model.get_descendants(targets).values():
+        reached.update(descendants)
+
+    old = lineage_model.get_descendants(affected)
+    successors = _successors(affected)
+    # codes not reaching a removed edge keep their descendants
+    outside = set()
+    for codes in successors.values():
+        outside.update(codes)
+    outside_descendants = lineage_model.get_descendants(outside - affected)
+
+    # least fixed point of the reachability restricted to the reached codes, the codes
+    # reaching fewer codes come first so a lineage without cycles converges in one pass
+    order = sorted(affected, key=lambda code: len(old.get(code, ())))
+    new = dict((code, set()) for code in affected)
+    changed = True
+    while changed:
+        changed = False
+        for code in order:
+            reachable = set()
+            for successor in successors.get(code, ()):
+                reachable.add(successor)
+                reachable.update(new[successor] if successor in new
+                                 else outside_descendants.get(successor, ()))
+            reachable &= reached
+            reachable.discard(code)
+            if len(reachable) > len(new[code]):
+                new[code] = reachable
+                changed = True
+
+    lost = [(code, descendant) for code in affected
+            for descendant in (old.get(code, set()) & reached) - new[code]]
+    lineage_model.delete_closure_pairs(lost)
+    return len(lost)
+
+
+def update_closure(added, removed):
+    """
+    Updates the closure after edges were added and removed, in the current session
+
+    @param added: (source, target) pairs no edge linked before
+    @param removed: (source, target) pairs no edge links any more
+    """
+    if removed:
+        _remove_pairs(removed)
+    for source, target in sorted(added):
+        if source != target:
+            lineage_model.add_closure_edge(source, target)
+
+
+def rebuild_closure():
+    """
+    Rebuilds the closure from all the edges, in the current session
+
+    Returns the number of edges walked
+    """
+    lineage_model.clear_closure()
+    # the pairs are read first, the streaming query can not stay open during the inserts
+    pairs = list(lineage_model.iter_edge_pairs())
+    for index, (source, target) in enumerate(pairs):
+        if source != target:
+            lineage_model.add_closure_edge(source, target)
+        if (index + 1) % 10000 == 0:
+            logger.info('Added %s of %s edges to the lineage closure' % (index + 1, len(pairs)))
+    return len(pairs)
+
+
+def impact(code, direction=BOTH):
+    """
+    Returns a dict with the sorted lists of the codes reachable from a code (downstream)
+    and of the codes reaching it (upstream)
+
+    @param code: Code of the package
+    @param direction: upstream, downstream or both
+    """
+    result = {}
+    if direction in (DOWNSTREAM, BOTH):
+        result['downstream'] = sorted(lineage_model.get_descendants([code]).get(code, ()))
+    if direction in (UPSTREAM, BOTH):
+        result['upstream'] = sorted(lineage_model.get_ancestors([code]).get(code, ()))
+    return result
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Paster commands of the data lineage extension
+"""
+
+import sys
+
+from ckan.lib.cli import CkanCommand
+
+
+class DatalineageCommand(CkanCommand):
+    '''Manage the data lineage extension
+
+    Usage:
+
+        paster datalineage initdb
+            - Create the lineage tables
+
+        paster datalineage backfill
+            - Rebuild the lineage edges, their closure and their history from the extras
+              and the activity stream of all the packages
+
+        paster datalineage closure
+            - Rebuild the closure of the lineage edges, used by the impact analysis
+
+        paster datalineage history
+            - Rebuild the periods of the lineage edges from the activity stream of the
+              packages, used by the lineage views at a past date
+
+        paster datalineage dangling [rebuild]
+            - List the lineage references to codes without a package, after
+              detecting them again from all the edges with rebuild
+
+        paster datalineage memgraph
+            - Load the in-memory lineage graph and report its size and load time
+
+        paster datalineage export FORMAT PATH
+            - Export the lineage graph of the whole catalogue to PATH as jsonl, graphml
+              or prov, an interrupted export carries on when run again
+
+        paster datalineage build-assets
+            - Rebuild the minified script and style bundles of the lineage page
+
+        paster datalineage flush-reindex
+            - Reindex the packages waiting in the deferred reindex queue
+
+        paster datalineage snapshots [all]
+            - Rebuild the dirty lineage snapshots, or the snapshots of all the packages
+              with a lineage code
+    '''
+    summary = __doc__.split('\n')[0]
+    usage = __doc__
+    min_args = 1
+    max_args = 3
+
+    # number of packages synced before committing
+    BATCH_SIZE = 500
+
+    def command(self):
+        self._load_config()
+        cmd = self.args[0]
+        if cmd == 'initdb':
+            self.initdb()
+        elif cmd == 'backfill':
+            self.backfill()
+        elif cmd == 'closure':
+            self.closure()
+        elif cmd == 'history':
+            self.history()
+        elif cmd == 'memgraph':
+            self.memgraph()
+        elif cmd == 'dangling':
+            self.dangling(len(self.args) > 1 and self.args[1] == 'rebuild')
+        elif cmd == 'export' and len(self.args) == 3:
+            self.export(self.args[1], self.args[2])
+        elif cmd == 'build-assets':
+            self.build_assets()
+        elif cmd == 'flush-reindex':
+            self.flush_reindex()
+        elif cmd == 'snapshots':
+            self.snapshots(len(self.args) > 1 and self.args[1] == 'all')
+        else:
+            print(self.usage)
+            sys.exit(1)
+
+    def initdb(self):
+        from ckanext.datalineage import model as lineage_model
+        lineage_model.setup()
+        print('Lineage tables are set up')
+
+    def backfill(self):
+        import ckan.model as model
+        from ckanext.datalineage import model as lineage_model
+        lineage_model.setup()
+        count = 0
+        # collect the packages first, the extras query can not stay open across commits
+        packages = list(lineage_model.iter_package_lineage())
+        for package, fields in packages:
+            edges = lineage_model.package_edges(fields.get('code'), fields.get('parent'),
+                                                fields.get('producers'), fields.get('consumers'))
+            lineage_model.sync_package_edges(package['id'], edges)
+            count += 1
+            if count % self.BATCH_SIZE == 0:
+                model.Session.commit()
+                print('Synced the edges of %s packages' % count)
+        model.Session.commit()
+        print('Synced the edges of %s packages' % count)
+        # the closure and the dangling references are rebuilt once the edges are all there
+        self.closure()
+        from ckanext.datalineage import dangling
+        count = dangling.rebuild()
+        model.Session.commit()
+        print('Found %s dangling references' % count)
+        self.history()
+
+    def dangling(self, rebuild=False):
+        import ckan.model as model
+        from ckanext.datalineage import dangling
+        from ckanext.datalineage import model as lineage_model
+        if rebuild:
+            dangling.rebuild()
+            model.Session.commit()
+        rows, count = lineage_model.get_dangling()
+        for package_id, package_name, code, field, detected in rows:
+            print('%s\t%s\t%s\t%s' % (code, package_name or package_id, field,
+                                       detected.strftime('%Y-%m-%d %H:%M')))
+        print('%s dangling references' % count)
+
+    def memgraph(self):
+        from ckanext.datalineage import memgraph
+        stats = memgraph.Engine().load().stats()
+        print('Loaded %(codes)s codes and %(edges)s edges of %(packages)s packages' % stats)
+        print('Memory: %.1f MB, load time: %.2f s' % (stats['memory_bytes'] / 1048576.0,
+                                                      stats['load_seconds']))
+
+    def closure(self):
+        import ckan.model as model
+        from ckanext.datalineage import closure
+        count = closure.rebuild_closure()
+        model.Session.commit()
+        print('Rebuilt the closure of %s edges' % count)
+
+    def history(self):
+        import ckan.model as model
+        from ckanext.datalineage import history
+        count = history.rebuild_history()
+        model.Session.commit()
+        print('Rebuilt %s periods of the lineage edges' % count)
+
+    def snapshots(self, rebuild_all=False):
+        from ckanext.datalineage import model as lineage_model
+        from ckanext.datalineage import snapshot
+        if rebuild_all:
+            package_ids = [package['id'] for package, fields
+                           in lineage_model.iter_package_lineage() if fields.get('code')]
+        else:
+            package_ids = lineage_model.get_dirty_snapshots()
+        snapshot.rebuild_snapshots(package_ids)
+        print('Rebuilt the snapshots of %s packages' % len(package_ids))
+
+    def build_assets(self):
+        from ckanext.datalineage import assets
+        for bundle in assets.build():
+            print('Built %s' % bundle)
+
+    def flush_reindex(self):
+        from ckanext.datalineage import reindex
+        print('Reindexed %s packages' % reindex.flush())
+
+    def export(self, export_format, path):
+        from ckanext.datalineage import export
+        if export_format not in export.WRITERS:
+            print('Unknown format %s, use one of %s' % (export_format, ', '.join(sorted(export.WRITERS))))
+            sys.exit(1)
+        count = export.export_to_file(export_format, path)
+        print('Exported %s packages to %s' % (count, path))
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrency module
+Runs the independent lookups of a lineage graph level in parallel
+
+Lookups run in a thread pool shared by the requests of the worker, each one with its own
+copy of the action context, so they are authorized as the requesting user. All the lookups
+of a request share one time budget, the lookups still waiting for a thread when it runs out
+are skipped, so the work of the requests that timed out does not hold up the others.
+
+    ckanext.datalineage.concurrency.enabled = false
+    ckanext.datalineage.concurrency.pool_size = 4
+    ckanext.datalineage.concurrency.timeout = 10  (seconds available to the lookups of a request)
+"""
+
+import logging
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+import threading
+import time
+
+import ckan.model as model
+from ckan.common import config
+from paste.deploy.converters import asbool
+
+from ckanext.datalineage import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_TIMEOUT = 10
+DEADLINE_KEY = 'datalineage_deadline'
+# set on the context of the lookups running in the pool, they must not wait on the pool themselves
+IN_POOL_KEY = 'datalineage_in_pool'
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class LookupTimeout(Exception):
+    """
+    Raised when the lookups of a request take longer than their time budget
+    """
+    pass
+
+
+def concurrency_enabled():
+    return asbool(config.get('ckanext.datalineage.concurrency.enabled', False))
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            size = int(config.get('ckanext.datalineage.concurrency.pool_size', DEFAULT_POOL_SIZE))
+            _pool = ThreadPool(size)
+        return _pool
+
+
+def _call(call):
+    func, context, arg, stats = call
+    if time.time() >= context[DEADLINE_KEY]:
+        # the request already gave up waiting for the result
+        metrics.inc('datalineage_skipped_lookups_total')
+        raise LookupTimeout('Lineage lookup not started in time')
+    context[IN_POOL_KEY] = True
+    try:
+        # the queries of the lookup count for the request that started it
+        with metrics.bound(stats):
+            return func(context, arg)
+    finally:
+        # every pool thread has its own scoped session, give its connection back
+        model.Session.remove()
+
+
+def run_concurrently(context, calls):
+    """
+    Runs independent lookups and returns their results in order
+
+    The lookups run one after the other unless concurrency is enabled, and always when
+    called from a lookup already running in the pool
+
+    @param context: Action context, a copy of it is passed to every lookup
+    @param calls: List of (function, argument) tuples, each function is called as
+                  function(context, argument)
+    """
+    if not concurrency_enabled() or len(calls) < 2 or context.get(IN_POOL_KEY):
+        return [func(context, arg) for func, arg in calls]
+    if DEADLINE_KEY not in context:
+        timeout = float(config.get('ckanext.datalineage.concurrency.timeout', DEFAULT_TIMEOUT))
+        context[DEADLINE_KEY] = time.time() + timeout
+    stats = metrics.current_stats()
+    pending = _get_pool().map_async(_call, [(func, dict(context), arg, stats)
+                                            for func, arg in calls])
+    try:
+        return pending.get(max(context[DEADLINE_KEY] - time.time(), 0))
+    except TimeoutError:
+        raise LookupTimeout('Lineage lookups did not finish in time')
@@ -6,7 +6,10 @@ from ckan.common import OrderedDict, _, json, request, c, response, config
 import ckan.model as model
 import ckan.lib.base as base
 import ckan.logic as logic
-from paste.deploy.converters import asbool
+
+from ckanext.datalineage import metrics
+from ckanext.datalineage.model import split_codes
+from ckanext.datalineage.resolver import resolve_codes
 
 import logging
 
@@ -18,27 +21,58 @@ NotFound = logic.NotFound
 NotAuthorized = logic.NotAuthorized
 get_action = logic.get_action
 
+def _view_context():
+    """
+    Returns the action context used to resolve codes for the views
+    """
+    return {'model': model, 'session': model.Session,
+            'user': c.user, 'for_view': True,
+            'auth_user_obj': c.userobj}
+
+
+def _request_cache():
+    """
+    Returns the code -> package cache of the current request, the cache lives on the
+    template context so it is dropped once the request is served
+    """
+    cache = getattr(c, 'datalineage_code_cache', None)
+    if not isinstance(cache, dict):
+        cache = {}
+        c.datalineage_code_cache = cache
+    return cache
+
+
+@metrics.timed('view_resolve')
+def resolve_codes_for_view(*values):
+    """
+    Resolves all the given codes with a single lookup and keeps them in the request cache,
+    templates should call it once before rendering a list of codes
+
+    @param values: Comma separated lists of codes
+    """
+    cache = _request_cache()
+    codes = set()
+    for value in values:
+        codes.update(split_codes(value))
+    missing = codes.difference(cache)
+    if missing:
+        found = resolve_codes(_view_context(), missing)
+        for code in missing:
+            cache[code] = found.get(code)
+    return ''
+
+
 def get_title_for_code(code):
     """
     Retrieves a package title from a given code
 
     @param code: Code of the package to retrieve
     """
-    context = {'model': model, 'session': model.Session,
-                   'user': c.user, 'for_view': True,
-                   'auth_user_obj': c.userobj}
-
-    q = 'extras_code:%s' % (code.replace(':', '\:'))
-    search_extras = {}
-    data_dict = {
-        'q': q,
-        'fq': q,
-        'extras': search_extras,
-        'include_private': asbool(config.get(
-            'ckan.search.default_include_private', True)),
-    }
-    query = get_action('package_search')(context, data_dict)
-    results = query['results'][0] if query['results'] else {}
+    code = code.strip()
+    cache = _request_cache()
+    if code not in cache:
+        resolve_codes_for_view(code)
+    results = cache[code] or {}
     if not results:
         logger.error('No dataset found with code {}'.format(code))
     return results.get('name', code)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Dangling module
+Records the lineage references to codes that no package has
+
+The references of a package are checked when its edges are synced, the references to a
+code are recorded when its package is deleted or changes its code, and dropped when a
+package gets the code.
+The references are listed by the datalineage_dangling action and by
+`paster datalineage dangling`, which also rebuilds them from all the edges.
+"""
+
+import logging
+
+from ckanext.datalineage import model as lineage_model
+
+logger = logging.getLogger(__name__)
+
+
+def record_package(package_id, code, edges, old_code=None):
+    """
+    Records the dangling references of a changed package, in the current session
+
+    @param package_id: Id of the package
+    @param code: Code of the package, the references to it are dropped
+    @param edges: List of the (source, target, relation) edges the package declares
+    @param old_code: Code the package had before the change, the references to it are
+                     recorded unless another package has it
+    """
+    references = lineage_model.edge_references(edges)
+    existing = lineage_model.get_code_packages(code for code, _ in references)
+    dangling = [(reference, field) for reference, field in references if reference not in existing]
+    if dangling:
+        logger.info('Package [%s] references codes without a package: %s' % (
+            package_id, ', '.join(reference for reference, _ in dangling)))
+    lineage_model.sync_package_dangling(package_id, dangling)
+    if code:
+        lineage_model.delete_dangling_code(code)
+    if old_code and old_code != code and not lineage_model.get_code_packages([old_code]):
+        lineage_model.add_dangling_code(old_code)
+
+
+def record_deleted_package(package_id, code):
+    """
+    Records the references to the code of a deleted package, unless another package has
+    the code, in the current session
+
+    @param package_id: Id of the deleted package
+    @param code: Code of the deleted package
+    """
+    lineage_model.sync_package_dangling(package_id, [])
+    if code and not lineage_model.get_code_packages([code]):
+        lineage_model.add_dangling_code(code)
+
+
+def rebuild():
+    """
+    Rebuilds the dangling references from all the edges, in the current session
+
+    Returns the number of dangling references
+    """
+    references = {}
+    for package_id, source, target, relation in lineage_model.iter_edges():
+        for reference in lineage_model.edge_references([(source, target, relation)]):
+            references.setdefault(package_id, []).append(reference)
+    existing = lineage_model.get_code_packages(
+        code for package_references in references.values() for code, _ in package_references)
+    lineage_model.clear_dangling()
+    count = 0
+    for package_id, package_references in references.items():
+        dangling = [(code, field) for code, field in package_references if code not in existing]
+        if dangling:
+            lineage_model.sync_package_dangling(package_id, sorted(set(dangling)))
+            count += len(set(dangling))
+    return count
@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+"""
+Export module
+Streams the lineage graph of the whole catalogue as JSON Lines, GraphML or W3C PROV-JSON
+
+Packages are read in id order through a server side cursor and written as they come, so
+memory use stays flat whatever the size of the catalogue. An export to a file keeps a
+checkpoint next to it and carries on from the last checkpointed package when restarted.
+"""
+
+import json
+import logging
+import os
+import urllib
+from xml.sax.saxutils import escape, quoteattr
+
+from ckan.common import config
+
+from ckanext.datalineage import model as lineage_model
+
+logger = logging.getLogger(__name__)
+
+# number of packages written between two checkpoints
+CHECKPOINT_INTERVAL = 1000
+
+
+def _write(out, text):
+    out.write(text.encode('utf-8') if isinstance(text, unicode) else text)
+
+
+def package_type(fields):
+    """
+    Returns 'activity' for the packages describing a model and 'entity' for the datasets
+    """
+    if fields.get('producers') and not fields.get('parent'):
+        return 'activity'
+    return 'entity'
+
+
+class Writer(object):
+    """
+    Base class of the export writers
+
+    @param out: File-like object the export is written to
+    @param parts: Dict mapping the names in `sections` to open part files, for the formats
+                  that can not be written in a single pass
+    """
+    sections = ()
+
+    def __init__(self, out, parts=None):
+        self.out = out
+        self.parts = parts or {}
+
+    def start(self):
+        pass
+
+    def node(self, package, fields):
+        raise NotImplementedError
+
+    def edge(self, source, target, relation):
+        raise NotImplementedError
+
+    def finish_chunks(self):
+        """
+        Yields the end of the document
+        """
+        return []
+
+    def finish(self):
+        for chunk in self.finish_chunks():
+            _write(self.out, chunk)
+
+
+class JSONLinesWriter(Writer):
+    """
+    Writes one JSON object per node and per edge
+    """
+
+    def node(self, package, fields):
+        _write(self.out, json.dumps({
+            'kind': 'node', 'id': package['id'], 'name': package['name'],
+            'title': package['title'], 'code': fields.get('code'), 'type': package_type(fields),
+        }) + '\n')
+
+    def edge(self, source, target, relation):
+        _write(self.out, json.dumps({
+            'kind': 'edge', 'source': source, 'target': target, 'relation': relation,
+        }) + '\n')
+
+
+
+class GraphMLWriter(Writer):
+    """
+    Writes a GraphML document whose nodes are identified by their lineage code, the codes
+    no package has get a placeholder node marked as missing so every edge has its ends
+    """
+
+    def start(self):
+        _write(self.out,
+               u'<?xml version="1.0" encoding="UTF-8"?>\n'
+               u'<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+               u'<key id="package_id" for="node" attr.name="package_id" attr.type="string"/>\n'
+               u'<key id="name" for="node" attr.name="name" attr.type="string"/>\n'
+               u'<key id="title" for="node" attr.name="title" attr.type="string"/>\n'
+               u'<key id="type" for="node" attr.name="type" attr.type="string"/>\n'
+               u'<key id="missing" for="node" attr.name="missing" attr.type="boolean">'
+               u'<default>false</default></key>\n'
+               u'<key id="relation" for="edge" attr.name="relation" attr.type="string"/>\n'
+               u'<graph id="lineage" edgedefault="directed">\n')
+
+    def node(self, package, fields):
+        _write(self.out,
+               u'<node id=%s><data key="package_id">%s</data><data key="name">%s</data>'
+               u'<data key="title">%s</data><data key="type">%s</data></node>\n' % (
+                   quoteattr(fields['code']), escape(package['id']), escape(package['name'] or u''),
+                   escape(package['title'] or u''), package_type(fields)))
+
+    def edge(self, source, target, relation):
+        _write(self.out,
+               u'<edge source=%s target=%s><data key="relation">%s</data></edge>\n' % (
+                   quoteattr(source), quoteattr(target), escape(relation)))
+
+    def finish_chunks(self):
+        # GraphML does not care about the order of the nodes and edges
+        for code in lineage_model.iter_codes_without_package():
+            yield u'<node id=%s><data key="missing">true</data></node>\n' % quoteattr(code)
+        yield u'</graph>\n</graphml>\n'
+
+
+class PROVWriter(Writer):
+    """
+    Writes a W3C PROV-JSON document, models are activities and datasets are entities
+
+    PROV-JSON groups the records by kind, so each kind is written to its own part file as
+    the packages come and the parts are put together when the export finishes
+    """
+    sections = ('entity', 'activity', 'wasGeneratedBy', 'used')
+
+    def _qname(self, code):
+        return 'lineage:%s' % urllib.quote(code.encode('utf-8'), safe='')
+
+    def _record(self, section, key, value):
+        part = self.parts[section]
+        # the part files are opened for appending, an empty one gets its first record
+        separator = ',\n' if os.fstat(part.fileno()).st_size or part.tell() else ''
+        _write(part, separator + json.dumps(key) + ': ' + json.dumps(value))
+
+    def node(self, package, fields):
+        kind = package_type(fields)
+        self._record(kind, self._qname(fields['code']), {
+            'ckan:package_id': package['id'],
+            'ckan:name': package['name'],
+            'prov:label': package['title'],
+        })
+
+    def edge(self, source, target, relation):
+        if relation == lineage_model.RELATION_PARENT:
+            self._record('wasGeneratedBy', '_:gen-%s-%s' % (self._qname(target), self._qname(source)),
+                         {'prov:entity': self._qname(target), 'prov:activity': self._qname(source)})
+        else:
+            # both the dataset and the model can declare the usage, keep one record for each
+            self._record('used', '_:%s-%s-%s' % (relation, self._qname(target), self._qname(source)),
+                         {'prov:activity': self._qname(target), 'prov:entity': self._qname(source)})
+
+    def finish_chunks(self):
+        site_url = config.get('ckan.site_url', '').rstrip('/')
+        yield '{"prefix": %s' % json.dumps({
+            'lineage': site_url + '/lineage/code/',
+            'ckan': site_url + '/ns/ckan#',
+        })
+        for section in self.sections:
+            part = self.parts[section]
+            part.flush()
+            yield ',\n%s: {\n' % json.dumps(section)
+            with open(part.name, 'rb') as data:
+                for chunk in iter(lambda: data.read(65536), ''):
+                    yield chunk
+            yield '\n}'
+        yield '}\n'
+
+
+WRITERS = {
+    'jsonl': JSONLinesWriter,
+    'graphml': GraphMLWriter,
+    'prov': PROVWriter,
+}
+
+
+def write_package(writer, package, fields):
+    """
+    Writes a package and the edges it declares
+
+    Returns False if the package has no code and was skipped
+    """
+    if not fields.get('code'):
+        return False
+    writer.node(package, fields)
+    for source, target, relation in lineage_model.package_edges(
+            fields.get('code'), fields.get('parent'), fields.get('producers'), fields.get('consumers')):
+        writer.edge(source, target, relation)
+    return True
+
+
+def stream_export(export_format, parts):
+    """
+    Yields the chunks of an export, one per package, for streaming HTTP responses
+
+    @param export_format: One of the WRITERS keys
+    @param parts: Dict of open temporary files for the sections of the writer
+    """
+    buf = _Buffer()
+    writer = WRITERS[export_format](buf, parts)
+    writer.start()
+    yield buf.pop()
+    for package, fields in lineage_model.iter_package_lineage():
+        if write_package(writer, package, fields):
+            yield buf.pop()
+    for chunk in writer.finish_chunks():
+        yield chunk.encode('utf-8') if isinstance(chunk, unicode) else chunk
+
+
+class _Buffer(object):
+    """
+    Collects written data until it is popped
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def pop(self):
+        data, self.chunks = ''.join(self.chunks), []
+        return data
+
+
+def export_to_file(export_format, path, checkpoint_interval=CHECKPOINT_INTERVAL):
+    """
+    Exports the lineage graph to a file, resuming from `path`.checkpoint if an earlier
+    export of the same file was interrupted
+
+    Returns the number of packages written by this run, the packages without a code are
+    skipped
+
+    @param export_format: One of the WRITERS keys
+    @param path: Path of the export file
+    """
+    writer_class = WRITERS[export_format]
+    checkpoint_path = path + '.checkpoint'
+    part_paths = dict((section, '%s.%s.part' % (path, section)) for section in writer_class.sections)
+    checkpoint = None
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('format') != export_format:
+            raise ValueError('%s belongs to a %s export' % (checkpoint_path, checkpoint.get('format')))
+        # drop whatever was written after the last checkpoint
+        for file_path, size in checkpoint['sizes'].items():
+            with open(file_path, 'r+b') as f:
+                f.truncate(size)
+        logger.info('Resuming the export after package %s' % checkpoint['last_id'])
+
+    out = open(path, 'ab' if checkpoint else 'wb')
+    parts = dict((section, open(part_path, 'ab' if checkpoint else 'wb+'))
+                 for section, part_path in part_paths.items())
+    files = [out] + parts.values()
+
+    def save_checkpoint(last_id):
+        for f in files:
+            f.flush()
+            os.fsync(f.fileno())
+        state = {'format': export_format, 'last_id': last_id,
+                 'sizes': dict((f.name, os.path.getsize(f.name)) for f in files)}
+        with open(checkpoint_path + '.tmp', 'w') as f:
+            json.dump(state, f)
+        os.rename(checkpoint_path + '.tmp', checkpoint_path)
+
+    writer = writer_class(out, parts)
+    if not checkpoint:
+        writer.start()
+    count = read = 0
+    last_id = checkpoint['last_id'] if checkpoint else None
+    for package, fields in lineage_model.iter_package_lineage(after_id=last_id):
+        if write_package(writer, package, fields):
+            count += 1
+        last_id = package['id']
+        read += 1
+        if read % checkpoint_interval == 0:
+            save_checkpoint(last_id)
+            logger.info('Exported %s packages' % count)
+    writer.finish()
+    for f in files:
+        f.close()
+    for part_path in part_paths.values():
+        os.remove(part_path)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return count
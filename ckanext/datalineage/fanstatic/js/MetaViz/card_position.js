@@ -25,8 +25,32 @@
    
   var quarter_detail_card = 5;
   //var counter = 0;
-  
+
+  //card tops computed by the server (ckanext/datalineage/layout.py), null if the payload has none
+  var layoutTops = null;
+
+//reads the layout section of the payload - called from initialize_scripts.js / initMetaViz()
+function loadLayout() {
+  layoutTops = null;
+  var layout;
+  mStore.fetchItemByIdentity({ identity: "layout", onItem: function(item, request) { layout = item; }});
+  if (layout == null) return;
+  layoutTops = {};
+  var ids = mStore.getAttributes(layout);
+  for (var i = 0; i < ids.length; i++) {
+    if (ids[i] != "paramName") layoutTops[ids[i]] = mStore.getValue(layout, ids[i]);
+  }
+}
+
+//places all the cards at the tops computed by the server, replaces positionDatasets() and setModels()
+function applyLayout() {
+  for (var id in layoutTops) {
+    if (dojo.byId(id) != null) dojo.byId(id).style.top = layoutTops[id] + 'px';
+  }
+}
+
 function positionModel(id) { 
+  if (layoutTops != null) return; //placed by applyLayout()
 	var count = 0;
 	if(num_us_ds>num_lin_ds)count=num_us_ds; //get highest amount of datasets to set the top value of lineage model - proper visualization depends on it
 	else count = num_lin_ds;
@@ -107,6 +131,7 @@ function positionModel(id) {
 }
   
 function positionDetail(id) { //correcting detail position          
+  if (layoutTops != null) return; //placed by applyLayout()
   var mod_pos_string;
   if (dojo.byId('lineage_model_0') != null) 
 	  mod_pos_string = dojo.byId('lineage_model_0').style.top; 
@@ -22,6 +22,7 @@
 
   function initMetaViz(storeData) {    
     mStore = new dojo.data.ItemFileReadStore({ data:storeData });
+    loadLayout();
 
     initData();
     initStylesAndTools();
@@ -165,10 +166,11 @@
   
   function initStylesAndTools() {
     setWhiteSize();
-    positionDatasets();      
+    if (layoutTops != null) applyLayout(); //precomputed layout, nothing to measure
+    else positionDatasets();      
     initializeLocalTools();   
     toggleLineage();     
-    if(num_us_mod>2)setModels(); //to add n-models in card-position
+    if(layoutTops == null && num_us_mod>2)setModels(); //to add n-models in card-position
     //drawLink(); 
     setLines();
   }
\ No newline at end of file
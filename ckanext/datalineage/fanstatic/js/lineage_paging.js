@@ -0,0 +1,74 @@
+// Loads the models using the dataset and the producers left out of the lineage page,
+// one page at a time, through the datalineage_neighbours action
+ckan.module('datalineage_paging', function ($) {
+  return {
+    initialize: function () {
+      var paging = (this.options.data || {}).paging || {};
+      this.list = $('<div class="datalineage-paging"></div>').appendTo(this.el);
+      this.addSection(paging.usage_models, 'Models using the dataset');
+      this.addSection(paging.producers, 'Producers');
+    },
+
+    addSection: function (page, title) {
+      if (!page || !page.next_cursor) {
+        return;
+      }
+      var section = $('<div class="datalineage-paging-section"></div>').appendTo(this.list);
+      $('<h4></h4>').text(title).appendTo(section);
+      var links = $('<ul></ul>').appendTo(section);
+      var button = $('<button class="btn btn-default btn-sm"></button>').appendTo(section);
+      var state = {code: page.code, direction: page.direction, total: page.total,
+                   cursor: page.next_cursor, shown: page.limit, asOf: page.as_of,
+                   excludeGenerated: page.exclude_generated};
+      this.updateButton(button, state);
+      button.on('click', $.proxy(function () {
+        this.loadPage(state, links, button);
+      }, this));
+    },
+
+    updateButton: function (button, state) {
+      if (!state.cursor) {
+        button.remove();
+        return;
+      }
+      button.text('Show more (' + state.shown + ' of ' + state.total + ')');
+    },
+
+    loadPage: function (state, links, button) {
+      button.prop('disabled', true);
+      var params = {code: state.code, direction: state.direction, cursor: state.cursor};
+      // the pages of a past lineage are read at the same date
+      if (state.asOf) {
+        params.as_of = state.asOf;
+      }
+      // the models using the dataset leave out the datasets declaring it as producer
+      if (state.excludeGenerated) {
+        params.exclude_generated = true;
+      }
+      var client = this.sandbox.client;
+      $.getJSON(client.url('/api/3/action/datalineage_neighbours'), params)
+      .done(function (response) {
+        var result = response.result;
+        $.each(result.neighbours, function (index, node) {
+          var item = $('<li></li>').appendTo(links);
+          if (node.missing) {
+            item.text(node.code);
+          } else {
+            // the client url keeps the root path the site is mounted under
+            var href = client.url('/dataset/lineage/' + encodeURIComponent(node.name));
+            if (state.asOf) {
+              href += '?as_of=' + encodeURIComponent(state.asOf);
+            }
+            $('<a></a>').attr('href', href)
+              .text(node.title || node.name).appendTo(item);
+          }
+        });
+        state.shown += result.neighbours.length;
+        state.cursor = result.next_cursor;
+      }).always($.proxy(function () {
+        button.prop('disabled', false);
+        this.updateButton(button, state);
+      }, this));
+    }
+  };
+});
@@ -0,0 +1,278 @@
+var metaViz={};var num_lin_ds=0,num_us_ds=0;var num_lin_mod=0,num_us_mod=0;metaViz.dataBaseRequest=function(mode,id,callback){$.ajax({"url":'MetavizController',"type":'GET',"data":{"mode":mode,"id":id,},"success":function(data,status){return callback(data);}});};metaViz.hideMetaViz=function(){if(heatmap)
+metaVizMode=false;if(dojo.byId("map_info_text")!=null)
+dojo.byId("map_info_text").innerHTML="Click on a boundingbox to get further information.";num_lin_ds=0,num_us_ds=0;num_lin_mod=0,num_us_mod=0;dojo.byId("page").style.display="none";lineage_model_cards=0;usage_model_cards=0;lineage_model_mini_cards=0;usage_model_mini_cards=0;lineage_dataset_cards=0;usage_dataset_cards=0;lineage_dataset_mini_cards=0;usage_dataset_mini_cards=0;al=dojo.byId("actual_lines");while(al.hasChildNodes()){al.removeChild(al.lastChild);}
+ldmcc=dojo.byId("lineage_dataset_mini_cards_container");while(ldmcc.hasChildNodes()){ldmcc.removeChild(ldmcc.lastChild);}
+lmmcc=dojo.byId("lineage_model_mini_cards_container");while(lmmcc.hasChildNodes()){lmmcc.removeChild(lmmcc.lastChild);};udmcc=dojo.byId("usage_dataset_mini_cards_container");while(udmcc.hasChildNodes()){udmcc.removeChild(udmcc.lastChild);};ummcc=dojo.byId("usage_model_mini_cards_container");while(ummcc.hasChildNodes()){ummcc.removeChild(ummcc.lastChild);};ldcc=dojo.byId("lineage_dataset_cards_container");while(ldcc.hasChildNodes()){ldcc.removeChild(ldcc.lastChild);};lmcc=dojo.byId("lineage_model_cards_container");while(lmcc.hasChildNodes()){lmcc.removeChild(lmcc.lastChild);};umcc=dojo.byId("usage_model_cards_container");while(umcc.hasChildNodes()){umcc.removeChild(umcc.lastChild);};udcc=dojo.byId("usage_dataset_cards_container");while(udcc.hasChildNodes()){udcc.removeChild(udcc.lastChild);};udic=dojo.byId("input_container");while(udcc.hasChildNodes()){udic.removeChild(udcc.lastChild);};};metaViz.showMetaViz=function(id){guiFunctions.showPreloaderCallback().then(function(){lineage_hidden=true;mode="hsql";metaViz.hideMetaViz();if(dojo.byId("map_info_text")!=null)
+dojo.byId("map_info_text").innerHTML="Click on an item in the list to reset the lineage view to map.";metaViz.dataBaseRequest(mode,id,function(data){metaViz.displayMetaViz(data);hidePreloader();if(heatmap)
+metaVizMode=true;});});};metaViz.displayMetaViz=function(data){console.log(data);if(dojo.byId("time4mapsMap")!=null)dojo.byId("time4mapsMap").style.display="none";if(dojo.byId("mapII")!=null)dojo.byId("mapII").style.display="none";if(dojo.byId("map")!=null){var map=dojo.byId("map");if(map){while(map.hasChildNodes()){map.removeChild(map.lastChild);}}}
+try{var jsonObject=$.parseJSON(data);}catch(e){console.log("Error with jsonString from database");return;}
+if(jsonObject==null)
+jsonObject=data;var storeData={identifier:'paramName',items:[jsonObject]};require(["dojo/dom","dojo/dom-style"],function(dom,domStyle){if(dom.byId("btnCursor"))
+domStyle.set("btnCursor","display","none");if(dom.byId("btnFilter"))
+domStyle.set("btnFilter","display","none");if(dom.byId("btnRectangle"))
+domStyle.set("btnRectangle","display","none");});initMetaViz(storeData);dojo.byId("page").style.display="block";if(dijit.byId("map_contentPane"))
+dijit.byId("map_contentPane").resize();register_callbacks();};function handle_dblclick(event){var url=window.location.href.split('/')
+url.pop()
+url.pop()
+ev_id=event.target.id;id=ev_id.split('_',3).join('_');var mappings;mStore.fetchItemByIdentity({identity:"mapping_ids_uuids",onItem:function(item,request){mappings=item;}});var mapped_id=mStore.getValues(mappings,id);var ds;mStore.fetchItemByIdentity({identity:mapped_id[0],onItem:function(item,request){ds=item;}});if(ds!=null){url.push(ds['name']);location.replace(url.join('/'));}
+if(event.target.dataset.name!=null){url.push(event.target.dataset.name);location.replace(url.join('/'));}}
+function register_callbacks(){var elm1=document.getElementsByClassName("description_card");var elm2=document.getElementsByClassName("description_card_petrol");var elm3=document.getElementsByClassName("input_card");var index;for(index=0;index<elm1.length;index++){elm1[index].ondblclick=handle_dblclick;}
+for(index=0;index<elm2.length;index++){elm2[index].ondblclick=handle_dblclick;}
+for(index=0;index<elm3.length;index++){elm3[index].ondblclick=handle_dblclick;}};dojo.require("dojo.data.ItemFileReadStore");dojo.require("dojox.fx");dojo.require("dojox.gfx._base");dojo.require("dojox.gfx3d.object");dojo.require("dojox.gfx.shape");dojo.require("dijit.Tooltip");dojo.require("dojox.grid.EnhancedGrid");dojo.require("dojo.data.ItemFileWriteStore");dojo.require("dojox.grid.DataGrid");;var det_desc_tip;var usage_inputs=[];var linked_ds=[];var savedDS;var maxInput;function initMetaViz(storeData){mStore=new dojo.data.ItemFileReadStore({data:storeData});loadLayout();initData();initStylesAndTools();fillLineage();buildTooltips();det_desc_tip=new dijit.Tooltip({connectId:["detail_title"],label:'<div class="tooltip"></div>'});}
+function initData(){var ds_data;mStore.fetchItemByIdentity({identity:"datasets",onItem:function(item,request){ds_data=item;}});var ds_ids=mStore.getAttributes(ds_data);preprocessData(ds_ids);var mod_data;mStore.fetchItemByIdentity({identity:"models",onItem:function(item,request){mod_data=item;}});var mod_ids=mStore.getAttributes(mod_data);preprocessModel(mod_ids);var mappings;mStore.fetchItemByIdentity({identity:"mapping_ids_uuids",onItem:function(item,request){mappings=item;}});maxInput=0;for(var i=0;i<num_lin_mod;i++){console.log("num_lin_mo:"+i);var model;var mappedID=mStore.getValues(mappings,"lineage_model_"+i);mStore.fetchItemByIdentity({identity:mappedID,onItem:function(item,request){model=item;}});if(model!=null)buildCardSet("Model",model.title,model.organisation,"","",model.type+"_model",false,false,false,false,false);}
+for(var i=0;i<num_us_mod;i++){console.log("num_us_mod:"+i);var model;var mappedID=mStore.getValues(mappings,"usage_model_"+i);mStore.fetchItemByIdentity({identity:mappedID,onItem:function(item,request){model=item;}});if(model!=null){buildCardSet("Model",model.title,model.organisation,"","",model.type+"_model",false,false,false,false,false);var inputs=[];for(var k=0;k<model.input_datasets.length;k++){inputs.push(model.input_datasets[k]);}
+usage_inputs["usage_model_"+i]=inputs;if(maxInput<inputs.length)maxInput=inputs.length;}}
+for(var i=0;i<num_lin_ds;i++){console.log("num_lin_ds:"+i);var mappedID=mStore.getValues(mappings,"lineage_dataset_"+i);var ds;mStore.fetchItemByIdentity({identity:mappedID,onItem:function(item,request){ds=item;}});if(ds!=null){var ds_time="";var is_time=false;var has_view=false;var has_save=false;var has_info=false;if(ds.time!=null&&ds.time[0]!=""){ds_time=", <br />"+ds.time;is_time=true;}
+if((ds.view!=null&&ds.view[0]!="")&&((ds.view[0].indexOf("catalog"))<0)&&(ds.view[0].indexOf("null")>0)){has_view=true;}
+if(ds.save!=null&&ds.save[0]!=""){has_save=true;}
+if(ds.info!=null&&ds.info[0]!=""){has_info=true;}
+buildCardSet("Dataset",ds.title,ds.organisation,ds.extent+ds_time,"","lineage_dataset",ds.vector,is_time,has_info,has_view,has_save);}}
+for(var i=0;i<num_us_ds;i++){console.log("num_us_ds:"+i);var mappedID=mStore.getValues(mappings,"usage_dataset_"+i);var ds;mStore.fetchItemByIdentity({identity:mappedID,onItem:function(item,request){ds=item;}});if(ds!=null){if(ds.linked_2_modelInput==1)linked_ds.push("usage_dataset_"+i);var ds_time="";var is_time=false;var has_view=false;var has_save=false;var has_info=false;if(ds.time!=null&&ds.time[0]!=""){ds_time=", <br />"+ds.time;is_time=true;}
+if((ds.view!=null&&ds.view[0]!="")&&((ds.view[0].indexOf("catalog"))<0)&&(ds.view[0].indexOf("null")>0)){has_view=true;}
+if(ds.save!=null&&ds.save[0]!=""){has_save=true;}
+if(ds.info!=null&&ds.info[0]!=""){has_info=true;}
+buildCardSet("Dataset",ds.title,ds.organisation,ds.extent+ds_time,"",ds.type+"_dataset",ds.vector,is_time,has_info,has_view,has_save);}}
+var detailId;mStore.fetchItemByIdentity({identity:"mapping_ids_uuids",onItem:function(item,request){detailId=item;}});var detail;mStore.fetchItemByIdentity({identity:detailId.detail_0[0],onItem:function(item,request){detail=item;}});savedDS=detailId.detail_0[0];var ds_time="";var is_time=false;var has_view=false;var has_save=false;var has_info=false;if(detail.time!=""){ds_time=",<br />"+detail.time;is_time=true;}
+if((detail.view!=null&&detail.view[0]!="")&&((detail.view[0].indexOf("catalog"))<0)&&(detail.view[0].indexOf("null")>0)){has_view=true;}
+if(detail.save!=""){has_save=true;}
+if(detail.info!=""){has_info=true;}
+buildCardSet("Dataset",detail.title,detail.organisation,detail.extent+ds_time,detail.description,"detail",detail.vector,is_time,has_info,has_view,has_save);}
+function preprocessData(ds_ids){for(var i=0;i<ds_ids.length;i++){var ds;if(ds_ids[i]!="paramName"){mStore.fetchItemByIdentity({identity:ds_ids[i],onItem:function(item,request){ds=item;}});if(ds!=null&&ds.paramName!=null){if(ds.type=="lineage"||ds.linked_2_modelInput==1)num_lin_ds++;if(ds.type=="usage")num_us_ds++;}}}}
+function preprocessModel(mod_ids){for(var i=0;i<mod_ids.length;i++){var mod;if(mod_ids[i]!="paramName"){mStore.fetchItemByIdentity({identity:mod_ids[i],onItem:function(item,request){mod=item;}});if(mod.type=="lineage")num_lin_mod++;else if(mod.type=="usage")num_us_mod++;}}}
+function initStylesAndTools(){setWhiteSize();if(layoutTops!=null)applyLayout();else positionDatasets();initializeLocalTools();toggleLineage();if(layoutTops==null&&num_us_mod>2)setModels();setLines();};function initializeLocalTools(){dojo.byId("content").innerHTML+=buildFull();dojo.byId("content").innerHTML+=buildInfo();dojo.byId("content").innerHTML+=buildView();dojo.byId("content").innerHTML+=buildSave();dojo.byId("content").innerHTML+=buildViewInfo();dojo.byId("content").innerHTML+=buildSaveInfo();dojo.byId("content").innerHTML+=buildSaveView();}
+function buildFull(){var html_tools="<div id=\"tools_full\" class=\"local_tools\" style=\"visibility:hidden;height:30px;width:85px;left:0px;top:0px;z-index:10000;\">";if(dojo.byId("map")!=null){html_tools+="<div id=\"view_0\" class=\"icon_view\" style=\"top:7px;left:10px;\" onmousedown=\'show_view_menu()\'></div>";html_tools+="<div id=\"save_0\" class=\"icon_save\" style=\"top:-9px;left:33px;\" onmousedown=\'show_save_menu()\'></div>";html_tools+="<div id=\"info_0\" class=\"icon_info\" style=\"top:-25px;left:57px;\" onmousedown=\'show_info_menu()\'></div>";html_tools+="</div> ";}else{html_tools=buildSaveInfo();html_tools=html_tools.replace(/tools_save_info/g,"tools_full");}
+return html_tools;}
+function buildInfo(){var html_tools="<div id=\"tools_info\" class=\"local_tools\" style=\"visibility:hidden;height:30px;width:35px;left:0px;top:0px;z-index:10000;\">";html_tools+="<div id=\"info_1\" class=\"icon_info\" style=\"top:7px;left:10px;\" onmousedown=\'show_info_menu()\'></div>";html_tools+="</div> ";return html_tools;}
+function buildView(){var html_tools="<div id=\"tools_view\" class=\"local_tools\" style=\"visibility:hidden;height:30px;width:35px;left:0px;top:0px;z-index:10000;\">";if(dojo.byId("map")!=null)
+html_tools+="<div id=\"view_1\" class=\"icon_view\" style=\"top:7px;left:10px;\" onmousedown=\'show_view_menu()\'></div>";else
+html_tools="<div id=\"tools_view\" class=\"local_tools\" style=\"visibility:hidden;height:0px;width:0px;left:0px;top:0px;z-index:10000;\">";html_tools+="</div> ";return html_tools;}
+function buildSave(){var html_tools="<div id=\"tools_save\" class=\"local_tools\" style=\"visibility:hidden;height:30px;width:35px;left:0px;top:0px;z-index:10000;\">";html_tools+="<div id=\"save_1\" class=\"icon_save\" style=\"top:7px;left:10px;\" onmousedown=\'show_save_menu()\'></div>";html_tools+="</div> ";return html_tools;}
+function buildViewInfo(){var html_tools="<div id=\"tools_view_info\" class=\"local_tools\" style=\"visibility:hidden;height:30px;width:60px;left:0px;top:0px;z-index:10000;\">";if(dojo.byId("map")!=null){html_tools+="<div id=\"view_2\" class=\"icon_view\" style=\"top:7px;left:10px;\" onmousedown=\'show_view_menu()\'></div>";html_tools+="<div id=\"info_2\" class=\"icon_info\" style=\"top:-9px;left:35px;\" onmousedown=\'show_info_menu()\'></div>";html_tools+="</div> ";}else{html_tools=buildInfo();html_tools=html_tools.replace(/tools_info/g,"tools_view_info");}
+return html_tools;}
+function buildSaveInfo(){var html_tools="<div id=\"tools_save_info\" class=\"local_tools\" style=\"visibility:hidden;height:30px;width:60px;left:0px;top:0px;z-index:10000;\">";html_tools+="<div id=\"save_2\" class=\"icon_save\" style=\"top:7px;left:10px;\" onmousedown=\'show_save_menu()\'></div>";html_tools+="<div id=\"info_3\" class=\"icon_info\" style=\"top:-9px;left:35px;\" onmousedown=\'show_info_menu()\'></div>";html_tools+="</div> ";return html_tools;}
+function buildSaveView(){var html_tools="<div id=\"tools_save_view\" class=\"local_tools\" style=\"visibility:hidden;height:30px;width:60px;left:0px;top:0px;z-index:10000;\">";if(dojo.byId("map")!=null){html_tools+="<div id=\"save_3\" class=\"icon_save\" style=\"top:7px;left:10px;\" onmousedown=\'show_save_menu()\'></div>";html_tools+="<div id=\"view_3\" class=\"icon_view\" style=\"top:-9px;left:35px;\" onmousedown=\'show_view_menu()\'></div>";html_tools+="</div> ";}else{html_tools=buildSave();html_tools=html_tools.replace(/tools_save/g,"tools_save_view");}
+return html_tools;}
+function buildTooltips(){new dijit.Tooltip({connectId:["ial2"],label:'<div class="tooltip">Minimize lineage information.</div>'});new dijit.Tooltip({connectId:["ial"],label:'<div class="tooltip">Maximize lineage information.</div>'});for(var i=0;i<=num_raster;i++){new dijit.Tooltip({connectId:["raster_"+i],label:'<div class="tooltip">This dataset contains raster.</div>'});}
+for(var i=0;i<=num_time;i++){new dijit.Tooltip({connectId:["time_"+i],label:'<div class="tooltip">This dataset is time variate.</div>'});}
+for(var i=0;i<=num_vector;i++){new dijit.Tooltip({connectId:["vector_"+i],label:'<div class="tooltip">This dataset contains vectors.</div>'});}
+for(var i=0;i<=num_lin_ds;i++){new dijit.Tooltip({connectId:["lineage_dataset_"+i],label:'<div class="tooltip">Click to get further information for this lineage dataset.</div>'});new dijit.Tooltip({connectId:["lineage_dataset_mini_"+i],label:'<div class="tooltip">Click to get further information for this lineage dataset.</div>'});}
+for(var i=0;i<=num_us_ds;i++){new dijit.Tooltip({connectId:["usage_dataset_"+i],label:'<div class="tooltip">Click to get further information for this usage dataset.</div>'});new dijit.Tooltip({connectId:["usage_dataset_mini_"+i],label:'<div class="tooltip">Click to get further information for this usage dataset.</div>'});}
+for(var i=0;i<=num_us_mod;i++){new dijit.Tooltip({connectId:["lineage_dataset_"+i],label:'<div class="tooltip">Click to get further information for this lineage dataset.</div>'});new dijit.Tooltip({connectId:["lineage_dataset_mini_"+i],label:'<div class="tooltip">Click to get further information for this lineage dataset.</div>'});}
+for(var i=0;i<=3;i++){new dijit.Tooltip({connectId:["info_"+i],label:'<div class="tooltip">Click to get further information on another website.</div>'});new dijit.Tooltip({connectId:["save_"+i],label:'<div class="tooltip">Click to download the dataset.</div>'});new dijit.Tooltip({connectId:["view_"+i],label:'<div class="tooltip">Click to view the data in a map client. </div>'});}};var actual_id;function show_tools(id,has_info,has_viewing,has_store){actual_id=id;var tool_id;var move_Pos0=36;var move_Pos1=155;var move_Pos1b=151;var move_Pos2=421;var move_Pos2b=371;var move_Pos3=791;var move_Pos4=641;var move_Pos5=721;var move_Pos6=1041;var move_Pos7=896;var move_Pos8=1011;var move_Pos9=935;var move_Pos10=1271;var move_right=0;hide_tools();if(has_viewing=="true"&&has_store=="true"&&has_info=="true"){tool_id="tools_full";dojo.byId(tool_id).style.visibility="visible";}else if(has_viewing=="true"&&has_store=="false"&&has_info=="true"){tool_id="tools_view_info";move_right=25;dojo.byId(tool_id).style.visibility="visible";}else if(has_viewing=="false"&&has_store=="true"&&has_info=="true"){tool_id="tools_save_info";move_right=25;dojo.byId(tool_id).style.visibility="visible";}else if(has_info=="true"&&has_store=="false"&&has_viewing=="false"){tool_id="tools_info";move_right=50;dojo.byId(tool_id).style.visibility="visible";}else if(has_info=="false"&&has_store=="true"&&has_viewing=="false"){tool_id="tools_save";move_right=50;dojo.byId(tool_id).style.visibility="visible";}else if(has_info=="false"&&has_store=="false"&&has_viewing=="true"){tool_id="tools_view";move_right=50;dojo.byId(tool_id).style.visibility="visible";}else if(has_info=="false"&&has_store=="true"&&has_viewing=="true"){tool_id="tools_save_view";move_right=25;dojo.byId(tool_id).style.visibility="visible";}
+if(tool_id!=null){if(id.indexOf('dataset')!=-1&&id.indexOf('lineage')!=-1){if(id.indexOf('mini')==-1)dojo.byId(tool_id).style.left=move_Pos1+move_right+"px";else dojo.byId(tool_id).style.left=move_Pos0+"px";}
+if(id.indexOf('model')!=-1&&id.indexOf('lineage')!=-1){if(id.indexOf('mini')==-1)dojo.byId(tool_id).style.left=move_Pos2+move_right+"px";else dojo.byId(tool_id).style.left=move_Pos1b+"px";}
+if(dojo.byId('lineage_model_0')==null&&dojo.byId('usage_model_0')==null)dojo.byId(tool_id).style.left="651px";else if(id.indexOf('detail')!=-1&&!lineage_hidden)dojo.byId(tool_id).style.left=move_Pos5+move_right+"px";else if(id.indexOf('detail')!=-1&&lineage_hidden)dojo.byId(tool_id).style.left=move_Pos2b+move_right+"px";if(id.indexOf('dataset')!=-1&&id.indexOf('usage')!=-1&&!lineage_hidden){if(id.indexOf('mini')==-1)dojo.byId(tool_id).style.left=move_Pos10+move_right+"px";else dojo.byId(tool_id).style.left=move_Pos8+"px";}
+if(id.indexOf('dataset')!=-1&&id.indexOf('usage')!=-1&&lineage_hidden)
+dojo.byId(tool_id).style.left=move_Pos9+move_right+"px";if(id.indexOf('model')!=-1&&id.indexOf('usage')!=-1&&!lineage_hidden){if(id.indexOf('mini')==-1)dojo.byId(tool_id).style.left=move_Pos7+move_right+"px";else dojo.byId(tool_id).style.left=move_Pos6+"px";}
+if(id.indexOf('model')!=-1&&id.indexOf('usage')!=-1&&lineage_hidden){if(id.indexOf('mini')==-1)dojo.byId(tool_id).style.left=move_Pos4+"px";else dojo.byId(tool_id).style.left=move_Pos4+"px";}
+if(id.indexOf('mini')==-1)dojo.byId(tool_id).style.top=dojo.byId(id).offsetTop+30+"px";else dojo.byId(tool_id).style.top=dojo.byId(id).offsetTop+40+"px";}}
+function hide_tools(){dojo.byId("tools_full").style.visibility="hidden";dojo.byId("tools_view_info").style.visibility="hidden";dojo.byId("tools_save_info").style.visibility="hidden";dojo.byId("tools_save_view").style.visibility="hidden";dojo.byId("tools_info").style.visibility="hidden";dojo.byId("tools_view").style.visibility="hidden";dojo.byId("tools_save").style.visibility="hidden";}
+function show_view_menu(){var data;mStore.fetchItemByIdentity({identity:"mapping_ids_uuids",onItem:function(item,request){data=item;}});if(actual_id.indexOf('mini')!=-1)actual_id=actual_id.replace('_mini','');var mapped_id=mStore.getValues(data,actual_id);guiFunctions.setItemDetailsWithoutHiding(mapped_id);guiFunctions.scrollToSpecificPoint(mapped_id);time4Maps.showTime4MapsId(mapped_id);}
+function show_info_menu(){var data;mStore.fetchItemByIdentity({identity:"mapping_ids_uuids",onItem:function(item,request){data=item;}});if(actual_id.indexOf('mini')!=-1)actual_id=actual_id.replace('_mini','');var mapped_id=mStore.getValues(data,actual_id);var map;mStore.fetchItemByIdentity({identity:mapped_id,onItem:function(item,request){map=item;}});window.open(map.info);}
+function show_save_menu(){var data;mStore.fetchItemByIdentity({identity:"mapping_ids_uuids",onItem:function(item,request){data=item;}});if(actual_id.indexOf('mini')!=-1)actual_id=actual_id.replace('_mini','');var mapped_id=mStore.getValues(data,actual_id);var map;mStore.fetchItemByIdentity({identity:mapped_id,onItem:function(item,request){map=item;}});window.open(map.save);}
+function focus_element(id){var mappings;mStore.fetchItemByIdentity({identity:"mapping_ids_uuids",onItem:function(item,request){mappings=item;}});var mapped_id=mStore.getValues(mappings,id);var entry=httpGet(findInternId+"/"+mapped_id);mapped_id=entry.id;metaVizOn=true;guiFunctions.setItemDetailsWithoutHiding(mapped_id);guiFunctions.scrollToSpecificPoint(mapped_id);metaVizOn=false;}
+function showChildren(){dojo.byId("children_div").style.visibility="visible";}
+function hideChildren(){dojo.byId("children_div").style.visibility="hidden";};var lineage_model_cards=0;var usage_model_cards=0;var lineage_model_mini_cards=0;var usage_model_mini_cards=0;var lineage_dataset_cards=0;var usage_dataset_cards=0;var lineage_dataset_mini_cards=0;var usage_dataset_mini_cards=0;function buildCardSet(type,title,organisation,extent_time,description,view_type,is_vector,is_time_aware,has_info,has_viewing,has_store){console.log("TITLE: "+title+" VIEW_TYPE: "+view_type);if(view_type=="detail"){dojo.byId("detail_container").innerHTML=generateCard(type,title,organisation,extent_time,description,view_type,is_vector,is_time_aware,has_info,has_viewing,has_store);positionDetail("detail_0");}else{var mini_card_html=generate_mini_card(type,view_type,is_vector,is_time_aware,has_info,has_viewing,has_store);var card_html=generateCard(type,title,organisation,extent_time,description,view_type,is_vector,is_time_aware,has_info,has_viewing,has_store);if(view_type.indexOf('model')!=-1){if(view_type.indexOf('lineage')!=-1){dojo.byId("lineage_model_cards_container").innerHTML+=card_html;dojo.byId("lineage_model_mini_cards_container").innerHTML+=mini_card_html;positionModel("lineage_model_"+(lineage_model_cards-1));positionModel("lineage_model_mini_"+(lineage_model_mini_cards-1));}else{dojo.byId("usage_model_cards_container").innerHTML+=card_html;dojo.byId("usage_model_mini_cards_container").innerHTML+=mini_card_html;positionModel("usage_model_"+(usage_model_cards-1));}}else{if(view_type.indexOf('lineage')!=-1){dojo.byId("lineage_dataset_cards_container").innerHTML+=card_html;dojo.byId("lineage_dataset_mini_cards_container").innerHTML+=mini_card_html;}else{dojo.byId("usage_dataset_cards_container").innerHTML+=card_html;dojo.byId("usage_dataset_mini_cards_container").innerHTML+=mini_card_html;}}}}
+function generateCard(type,title,organisation,extent_time,description,view_type,is_vector,is_time_aware,has_info,has_viewing,has_store){var html_card="";if(view_type=="lineage_dataset")html_card+="<div id=\""+"lineage_dataset_"+lineage_dataset_cards+"\" style=\"top:"+(lineage_dataset_cards-1)*card_size_with_buffer+"px;\" class=\"description_card\" \">";else if(view_type=="usage_dataset")html_card+="<div id=\""+"usage_dataset_"+usage_dataset_cards+"\" style=\"top:"+(usage_dataset_cards-1)*card_size_with_buffer+"px;\"  class=\"description_card\" \">";else if(view_type=="lineage_model")html_card+="<div id=\""+"lineage_model_"+lineage_model_cards+"\" class=\"description_card_petrol\" >";else if(view_type=="usage_model")html_card+="<div id=\""+"usage_model_"+usage_model_cards+"\" class=\"description_card_petrol\"  onmousedown=\"showInputs(\'"+"usage_model_"+usage_model_cards+"\')\">";else if(view_type=="detail")html_card+="<div id=\""+"detail_0"+"\" class=\"description_card_colored_petrol\" \">";if(view_type.indexOf('model')==-1)html_card+=generateIconset(false,is_vector,is_time_aware,true);else html_card+=generateIconset(true,is_vector,is_time_aware,true);html_card+=generateDescriptionset(type,title,organisation,extent_time,description,view_type);html_card+="</div>";return html_card;}
+var num_raster=0;var num_vector=0;var num_time=0;function generateIconset(is_model,is_vector,is_time_aware,normal_size){var html_icons="<div class=\"icons\">";if(!is_model){if(is_vector==="true"){html_icons+="<div class=\"icon_vector\" id=\"vector_"+num_vector+"\"></div>";num_vector++;}
+else{html_icons+="<div class=\"icon_raster\" id=\"raster_"+num_raster+"\"></div>";num_raster++;}}
+if(normal_size&&is_time_aware){html_icons+="<div class=\"icon_time\" id=\"time_"+num_time+"\"></div>";num_time++;}
+else if(!normal_size&&is_time_aware){html_icons+="<div class=\"icon_time\" id=\"time_"+num_time+"\" style=\"top:10px;left:35px;\"></div>";num_time++;}
+html_icons+="</div>";return html_icons;}
+function generateDescriptionset(type,title,organisation,extent_time,description,view_type){var html_description="";var id;if(view_type=="lineage_dataset"){id=lineage_dataset_cards;lineage_dataset_cards++;}
+else if(view_type=="usage_dataset"){id=usage_dataset_cards;usage_dataset_cards++;}
+else if(view_type=="lineage_model"){id=lineage_model_cards;lineage_model_cards++;}
+else if(view_type=="usage_model"){id=usage_model_cards;usage_model_cards++;}
+else if(view_type=="detail")id=0;if(view_type=="lineage_model"||view_type=="usage_model")html_description+="<p id=\""+view_type+"_"+id+"_type\" class=\"object_type\" style=\"left:10px;\">"+type+"</p>";else html_description+="<p id=\""+view_type+"_"+id+"_type\" class=\"object_type\">"+type+"</p>";if(title[0].length>23){var tit;if(title[0].length>50)tit=title[0].substring(0,50)+"...";else tit=title[0];if(view_type=="lineage_model"||view_type=="usage_model")html_description+="<p id=\""+view_type+"_"+id+"_title\" class=\"object_title\" style=\"font-size:12px;left:10px;\">"+tit+"</p>";else html_description+="<p id=\""+view_type+"_"+id+"_title\" class=\"object_title\" style=\"font-size:12px;\" \">"+tit+"</p>";}else{if(view_type=="lineage_model"||view_type=="usage_model")html_description+="<p id=\""+view_type+"_"+id+"_title\" class=\"object_title\" style=\"left:10px;\">"+title+"</p>";else html_description+="<p id=\""+view_type+"_"+id+"_title\" class=\"object_title\"\">"+title+"</p>";}
+if(organisation!=null&&organisation[0].length>36){if(organisation[0].length>55)organisation[0]=organisation[0].substring(0,50)+"...";if(view_type=="lineage_model"||view_type=="usage_model")html_description+="<p id=\""+view_type+"_"+id+"_organisation\" class=\"object_organisation\" style=\"left:10px;\">"+organisation+"</p>";else html_description+="<p id=\""+view_type+"_"+id+"_organisation\" class=\"object_organisation\">"+organisation+"</p>";}else{if(organisation==null||organisation==""){if(view_type=="lineage_model"||view_type=="usage_model")html_description+="<p id=\""+view_type+"_"+id+"_organisation\" class=\"object_organisation\" style=\"left:10px;\">"+"processor not defined"+"</p>";else html_description+="<p id=\""+view_type+"_"+id+"_organisation\" class=\"object_organisation\">"+"processor not defined"+"</p>";}else{if(view_type=="lineage_model"||view_type=="usage_model")html_description+="<p id=\""+view_type+"_"+id+"_organisation\" class=\"object_organisation\" style=\"left:10px;\">"+organisation+"</p>";else html_description+="<p id=\""+view_type+"_"+id+"_organisation\" class=\"object_organisation\">"+organisation+"</p>";}}
+return html_description;}
+function generate_mini_card(type,view_type,is_vector,is_time_aware,has_info,has_viewing,has_store){var html_card="";var id;if(view_type=="lineage_dataset"){id=lineage_dataset_mini_cards;lineage_dataset_mini_cards++;}
+else if(view_type=="usage_dataset"){id=usage_dataset_mini_cards;usage_dataset_mini_cards++;}
+else if(view_type=="lineage_model"){id=lineage_model_mini_cards;lineage_model_mini_cards++;}
+else if(view_type=="usage_model"){id=usage_model_mini_cards;usage_model_mini_cards++;}
+else if(view_type=="detail")id=0;if(view_type=="lineage_dataset")html_card+="<div id=\""+"lineage_dataset_mini_"+(lineage_dataset_mini_cards-1)+"\" class=\"description_card\" style=\"width:65px;height:50px;top:"+((lineage_dataset_mini_cards-1)*70+10)+"px;\" \">";else if(view_type=="usage_dataset")html_card+="<div id=\""+"usage_dataset_mini_"+(usage_dataset_mini_cards-1)+"\" class=\"description_card\" style=\"width:65px;height:50px;top:"+((usage_dataset_mini_cards-1)*70+10)+"px;\" \">";else if(view_type=="lineage_model")html_card+="<div id=\""+"lineage_model_mini_"+(lineage_model_mini_cards-1)+"\" class=\"description_card_petrol\" style=\"width:65px;height:50px;\" \">";else if(view_type=="usage_model")html_card+="<div id=\""+"usage_model_mini_"+(usage_model_mini_cards-1)+"\" class=\"description_card_petrol\" style=\"width:65px;height:50px;\" \">";else if(view_type=="detail")html_card+="<div id=\""+"detail_0_mini"+"\" class=\"description_card_colored_petrol\" style=\"width:65px;height:50px;\" \">";if(view_type.indexOf('model')!=-1)html_card+=generateIconset(true,is_vector,is_time_aware,false);else html_card+=generateIconset(false,is_vector,is_time_aware,false);html_card+="<p id=\""+view_type+"_mini_"+id+"_type\" class=\"object_type_mini\" style=\"left:0px;\">"+type+"</p>";html_card+="</div>";return html_card;};var card_size_with_buffer=100;var half_card_size=45;var mini_card_with_buffer=60;var half_mini_card_size=25;var quarter_detail_card=5;var layoutTops=null;function loadLayout(){layoutTops=null;var layout;mStore.fetchItemByIdentity({identity:"layout",onItem:function(item,request){layout=item;}});if(layout==null)return;layoutTops={};var ids=mStore.getAttributes(layout);for(var i=0;i<ids.length;i++){if(ids[i]!="paramName")layoutTops[ids[i]]=mStore.getValue(layout,ids[i]);}}
+function applyLayout(){for(var id in layoutTops){if(dojo.byId(id)!=null)dojo.byId(id).style.top=layoutTops[id]+'px';}}
+function positionModel(id){if(layoutTops!=null)return;var count=0;if(num_us_ds>num_lin_ds)count=num_us_ds;else count=num_lin_ds;var top=(count)/2*card_size_with_buffer;if(id==="lineage_model_0"||id==="lineage_model_mini_0"){dojo.byId(id).style.top=top+'px';}else if(id==="usage_model_0"){dojo.byId(usage_model_0).style.top=top+'px';dojo.byId(usage_model_mini_0).style.top=top+'px';}else
+if(id==="usage_model_1"||id==="usage_model_mini_1"){if(num_lin_ds==0){dojo.byId("usage_model_0").style.top=(20)+'px';dojo.byId("usage_model_1").style.top=(130)+'px';dojo.byId("usage_model_mini_0").style.top=(130)+'px';dojo.byId("usage_model_mini_1").style.top=(-30)+'px';}else{dojo.byId("usage_model_0").style.top=(top-60)+'px';dojo.byId("usage_model_1").style.top=(top+50)+'px';dojo.byId("usage_model_mini_0").style.top=(top-60)+'px';dojo.byId("usage_model_mini_1").style.top=(top)+'px';}}}
+function positionDetail(id){if(layoutTops!=null)return;var mod_pos_string;if(dojo.byId('lineage_model_0')!=null)
+mod_pos_string=dojo.byId('lineage_model_0').style.top;else if(dojo.byId('usage_model_0')!=null)
+mod_pos_string=dojo.byId('usage_model_0').style.top;else mod_pos_string="70px";if(dojo.byId('lineage_model_0')==null&&dojo.byId('usage_model_1')!=null){mod_pos_string='75px';}
+var mod_position=parseInt(mod_pos_string.slice(0,mod_pos_string.length-2));var top=mod_position-quarter_detail_card;dojo.byId(id).style.top=top+'px';}
+function positionDatasets(){var mod_pos_string;if(dojo.byId('lineage_model_0')!=null)mod_pos_string=dojo.byId('lineage_model_0').style.top;else if(dojo.byId('usage_model_0')!=null)mod_pos_string=dojo.byId('usage_model_0').style.top;else mod_pos_string="20px";if(dojo.byId('usage_model_0')!=null&&dojo.byId('usage_model_1')!=null&&num_lin_ds==0){var modtop=dojo.byId('usage_model_0').style.top;mod_pos_string=parseInt(modtop.slice(0,modtop.length-2))-50+"px";}
+var mod_position=parseInt(mod_pos_string.slice(0,mod_pos_string.length-2));var mod_middle;var h_ds;var o_ds=10;var num_ds;var id_string;for(var j=0;j<3;j++){if(j==0)h_ds=50;else h_ds=90;if(j==0||j==1)num_ds=num_lin_ds;else num_ds=num_us_ds;if(j==0)id_string="lineage_dataset_mini_";else if(j==1)id_string="lineage_dataset_";else if(j==2)id_string="usage_dataset_";mod_middle=mod_position+(h_ds/2);if(num_ds%2==0){for(var i=0;i<num_ds;i++){var faktor=getPosition(i,num_ds,0);var y_pos_relative=Math.abs(faktor)*h_ds+(Math.abs(faktor)+1/2)*o_ds;var y_pos_absolute;if(faktor<0){y_pos_absolute=mod_middle-y_pos_relative;if(dojo.byId(id_string+i)!=null)dojo.byId(id_string+i).style.top=y_pos_absolute+'px';}else{y_pos_absolute=mod_middle+y_pos_relative;if(dojo.byId(id_string+i)!=null)dojo.byId(id_string+i).style.top=y_pos_absolute+'px';}}}else{for(var i=0;i<num_ds;i++){var faktor=getPosition(i,num_ds,1);var y_pos_relative=Math.abs(faktor)*o_ds+(Math.abs(faktor)+1/2)*h_ds;if(faktor<=0){y_pos_absolute=mod_middle-y_pos_relative;if(dojo.byId(id_string+i)!=null)dojo.byId(id_string+i).style.top=y_pos_absolute+'px';}else{y_pos_absolute=mod_middle+y_pos_relative-h_ds;if(dojo.byId(id_string+i)!=null)dojo.byId(id_string+i).style.top=y_pos_absolute+'px';}}}}
+var models;mStore.fetchItemByIdentity({identity:"usage_models",onItem:function(item,request){models=item;}});var model_array=models.usage_model_ids;id_string="usage_dataset_mini_";h_ds=50;o_ds=10;for(var k=0;k<models.usage_model_ids.length&&models.usage_model_ids.length>0;k++){var mapping_JSON;mStore.fetchItemByIdentity({identity:"mod_ds_relations",onItem:function(item,request){mapping_JSON=item;}});var ds_array=mStore.getValues(mapping_JSON,"usage_model_"+k);var num_ds=ds_array.length;console.log("MODEL K:"+model_array[k]);var mo_id="usage_dataset_"+k;var mod_pos_string=dojo.byId(mo_id).style.top;var mod_position=parseInt(mod_pos_string.slice(0,mod_pos_string.length-2));var mod_middle=mod_position+(h_ds/2);if(num_ds%2==0){for(var i=0;i<num_ds;i++){var faktor=getPosition(i,num_ds,0);var y_pos_relative=Math.abs(faktor)*h_ds+(Math.abs(faktor)+1/2)*o_ds;var y_pos_absolute;var no=getIdNumber(ds_array[i]);if(faktor<0){y_pos_absolute=mod_middle-y_pos_relative;if(dojo.byId(id_string+no)!=null){dojo.byId(id_string+no).style.top=y_pos_absolute+'px';}}else{y_pos_absolute=mod_middle+y_pos_relative;if(dojo.byId(id_string+no)!=null){dojo.byId(id_string+no).style.top=y_pos_absolute+'px';}}}}else{for(var i=0;i<num_ds;i++){var faktor=getPosition(i,num_ds,1);var y_pos_relative=Math.abs(faktor)*o_ds+(Math.abs(faktor)+1/2)*h_ds;var no=getIdNumber(ds_array[i]);if(faktor<=0){y_pos_absolute=mod_middle-y_pos_relative;if(dojo.byId(id_string+no)!=null){dojo.byId(id_string+no).style.top=y_pos_absolute+'px';}}else{y_pos_absolute=mod_middle+y_pos_relative-h_ds;if(dojo.byId(id_string+no)!=null){dojo.byId(id_string+no).style.top=y_pos_absolute+'px';}}}}}}
+function getIdNumber(id_string){var l_id=id_string.lastIndexOf("_")+1;var length=id_string.length;var no=id_string.slice(l_id,length);return parseInt(no);}
+function getPosition(pos,max_vals,odd){if(odd==0){var a=max_vals/2;return(-a+pos);}else{var a=(max_vals-1)/2;return(-a+pos);}}
+function setWhiteSize(){var factor;if(num_lin_ds>num_us_ds)factor=num_lin_ds;else factor=num_us_ds;if(dojo.byId('lineage_model_0')==null&&dojo.byId('usage_model_0')==null)factor=1.5;if(factor<2)factor=2.0;dojo.byId('hide_and_show').style.top=(factor*card_size_with_buffer+170)+"px";if(dojo.byId('footer')!=null)dojo.byId('footer').style.top=(factor*card_size_with_buffer+980)+"px";dojo.byId('lineage_mini_cards').style.height=(factor*card_size_with_buffer)+"px";dojo.byId('usage_mini_cards').style.height=(factor*card_size_with_buffer)+"px";}
+function setModels(){for(var i=0;i<num_us_mod;i++){dojo.byId("usage_model_"+i).style.height=85+'px';dojo.byId("usage_model_mini_"+i).style.height=45+'px';dojo.byId("usage_model_"+i).style.top=dojo.byId("usage_dataset_"+i).style.top;if(i==1){var topString=dojo.byId("usage_dataset_mini_"+i).style.top;var top=parseInt(topString.slice(0,topString.length-2));top=top-50;dojo.byId("usage_model_mini_"+i).style.top=top;}else{dojo.byId("usage_model_mini_"+i).style.top=dojo.byId("usage_model_"+i).style.top;}
+console.log(dojo.byId("usage_model_mini_"+i).style.top);console.log(dojo.byId("usage_dataset_mini_"+i).style.top);console.log("---------------------");}}
+var lastID="";function showInputs(id){dojo.byId("input_container").innerHTML="";setLines();if(lastID==id){lastID="";return;}else lastID=id;toggleGroup.clear();var inputLength=usage_inputs[id].length;var top_dataset=getTopPosition("detail_0");var left_dataset=210;var top_usage_model=getTopPosition(id);var left_usage_model=510;var width=255;var offset=0;var distance=0;if(top_usage_model<top_dataset){distance=50;offset=-50;}else{offset=120;distance=-50;}
+var cards=0;for(var i=0;i<inputLength;i++){if(usage_inputs[id][i]!=savedDS){mStore.fetchItemByIdentity({identity:usage_inputs[id][i],onItem:function(item,request){ds=item;}});if(ds!=null){var is_time=false;if(ds.time!=null&&ds.time[0]!=""){ds_time=", <br />"+ds.time;is_time=true;}
+var html_card="";html_card+="<div data-name=\""+ds.name+"\" id=\""+"input_dataset_"+i+"\" class=\"input_card\" style=\"top:"+(top_dataset-(cards*distance)+offset)+"px; \">";html_card+="<p  data-name=\""+ds.name+"\" style=\"font-size:10px;\">"+"DATASET INPUT"+"</p>";var title=ds.title;if(title[0].length>25)title=title[0].substring(0,25)+"...";html_card+="<p  data-name=\""+ds.name+"\" class=\"object_title\" style=\"top:-20px;\">"+title+"</p>";html_card+="</div>";dojo.byId("input_container").innerHTML+=html_card;drawArrow({start:{x:left_dataset+width+3,y:offset+top_dataset-(cards*distance)+20},end:{x:left_usage_model,y:top_usage_model+55}});cards++;}}else{drawArrow({start:{x:left_dataset+width+3,y:top_dataset+55},end:{x:left_usage_model,y:top_usage_model+55}});}}
+register_callbacks();};function checkTitleLength(){for(var i=0;i<lineage_dataset_cards;i++){var id_title="lineage_dataset_"+i+"_title";var id_type="lineage_dataset_"+i+"_type";var id_orga="lineage_dataset_"+i+"_organisation";if(dojo.byId(id_title).innerHTML.length>=35){dojo.byId(id_title).style.fontSize="12px";dojo.byId(id_type).style.fontSize="10px";dojo.byId(id_title).style.paddingTop="5px";dojo.byId(id_orga).style.paddingTop="5px";}}
+for(var i=0;i<usage_dataset_cards;i++){var id_title="usage_dataset_"+i+"_title";var id_type="usage_dataset_"+i+"_type";var id_orga="usage_dataset_"+i+"_organisation";if(dojo.byId(id_title).innerHTML.length>=35){dojo.byId(id_title).style.fontSize="12px";dojo.byId(id_type).style.fontSize="10px";dojo.byId(id_title).style.paddingTop="5px";dojo.byId(id_orga).style.paddingTop="5px";}}
+for(var i=0;i<lineage_model_cards;i++){var id_title="lineage_model_"+i+"_title";var id_type="lineage_model_"+i+"_type";var id_orga="lineage_model_"+i+"_organisation";if(dojo.byId(id_title).innerHTML.length>=35){dojo.byId(id_title).style.fontSize="12px";dojo.byId(id_type).style.fontSize="10px";dojo.byId(id_title).style.paddingTop="5px";dojo.byId(id_orga).style.paddingTop="5px";}}
+for(var i=0;i<usage_model_cards;i++){var id_title="usage_model_"+i+"_title";var id_type="usage_model_"+i+"_type";var id_orga="usage_model_"+i+"_organisation";if(dojo.byId(id_title).innerHTML.length>=35){dojo.byId(id_title).style.fontSize="12px";dojo.byId(id_type).style.fontSize="10px";dojo.byId(id_title).style.paddingTop="5px";dojo.byId(id_orga).style.paddingTop="5px";}}
+var id_title="detail_0_title";var id_type="detail_0_type";var id_orga="detail_0_organisation";if(dojo.byId(id_title).innerHTML.length>=35){dojo.byId(id_title).style.fontSize="12px";dojo.byId(id_type).style.fontSize="10px";dojo.byId(id_title).style.paddingTop="5px";dojo.byId(id_orga).style.paddingTop="5px";}};var first=true;var surface;var surface_height;var toggleGroup;var tempGroup;function setLines(){var num_ds;var lineage_ds_left,lineage_model_left,lineage_model_width,usage_ds_left,usage_model_left,usage_model_width,usage_dataset_width,usage_dataset_height,lineage_model_corner;var detail_left;var detail_width=250;var id_string,mod_id_string;var offset=half_card_size;if(lineage_hidden==false){lineage_ds_left=255;lineage_model_left=290;lineage_model_width=235;detail_left=590;usage_model_left=930;usage_ds_left=965;usage_model_width=75;usage_dataset_width=65;usage_dataset_height=45;lineage_model_corner=100;}else{lineage_ds_left=60;lineage_model_left=100;detail_left=240;usage_model_left=740;usage_ds_left=780;lineage_model_width=75;usage_model_width=230;usage_dataset_width=250;usage_dataset_height=85;lineage_model_corner=70;}
+if(first==false&&dojo.byId("actual_lines").hasChildNodes())dojo.byId('actual_lines').removeChild(dojo.byId('actual_lines').firstChild);else{first=false;}
+if(maxInput>num_lin_ds&&maxInput>num_us_ds)
+surface_height=maxInput*card_size_with_buffer;else if(num_lin_ds>num_us_ds)
+surface_height=num_lin_ds*card_size_with_buffer;else if(num_lin_ds==0&&num_us_ds==0)
+surface_height=card_size_with_buffer;else surface_height=num_us_ds*card_size_with_buffer;if(num_us_ds>0)
+surface=dojox.gfx.createSurface(dojo.byId('actual_lines'),1100,surface_height);else{surface=dojox.gfx.createSurface(dojo.byId('actual_lines'),700,surface_height);dojo.byId("usage_mini_cards").style.left="-200px";}
+num_ds=num_lin_ds;if(lineage_hidden==false){id_string="lineage_dataset_";mod_id_string="lineage_model_0";}else{id_string="lineage_dataset_mini_";mod_id_string="lineage_model_mini_0";}
+var mod_top_pos=getTopPosition(mod_id_string);for(var i=0;i<num_ds;i++){var ds_top_pos=getTopPosition(id_string+i);drawArrow({start:{x:lineage_ds_left,y:ds_top_pos+offset},end:{x:lineage_model_left,y:mod_top_pos+offset}});}
+if(dojo.byId('lineage_model_0')!=null)
+drawArrow({start:{x:lineage_model_left+lineage_model_width,y:mod_top_pos+offset},end:{x:detail_left-30,y:mod_top_pos+offset}});if(lineage_hidden==false){id_string="usage_dataset_mini_";}else{id_string="usage_dataset_";}
+toggleGroup=surface.createGroup();for(var k=0;k<num_us_mod;k++){var us_mod_top_pos=getTopPosition(id_string+k);var ds_top_pos=getTopPosition(id_string+k);var detail_top_pos=getTopPosition("detail_0");toggleGroup.add(drawArrow({color:"black",arrowHeight:10,arrowWidth:2,start:{x:detail_left+detail_width-20,y:detail_top_pos+offset},end:{x:usage_model_left-usage_model_width,y:us_mod_top_pos+offset-5}}));drawArrow({start:{x:usage_model_left,y:us_mod_top_pos+offset},end:{x:usage_ds_left,y:ds_top_pos+offset}});var _defaultStroke={color:"black",style:"dot",width:1};for(var m=0;m<linked_ds.length;m++){if(linked_ds[m]=="usage_dataset_"+k){var deepest=getTopPosition(id_string+(num_us_mod-1));var group=surface.createGroup();group.createPath().moveTo(usage_ds_left+usage_dataset_width,ds_top_pos+offset).lineTo(usage_ds_left+usage_dataset_width+50,ds_top_pos+offset).lineTo(usage_ds_left+usage_dataset_width+50,deepest+(usage_dataset_height*2)).lineTo(lineage_model_left-20,deepest+(usage_dataset_height*2)).lineTo(lineage_model_left-20,mod_top_pos+offset).setStroke(_defaultStroke);drawArrow({start:{x:lineage_model_left-20,y:mod_top_pos+offset},end:{x:lineage_model_left,y:mod_top_pos+offset}});}}}}
+function getTopPosition(id){if(id==="model_0")id="usage_model_0";if(dojo.byId(id)==null&&id==="model_1"){id="usage_model_1";}
+if(dojo.byId(id)!=null){var pos_string=dojo.byId(id).style.top;var pos_top=parseInt(pos_string.slice(0,pos_string.length-2));return pos_top;}else{return 0;}}
+function drawArrow(p){var group=surface.createGroup();var x1=p.start.x,y1=p.start.y,x2=p.end.x,y2=p.end.y;x2=x1+((x2-x1)*0.8);y2=y1+((y2-y1)*0.8);var _arrowHeight=p.arrowHeight||10;var _arrowWidth=p.arrowWidth||2;var len=Math.sqrt(Math.pow(x2-x1,2)+Math.pow(y2-y1,2));var _defaultStroke={color:p.color||"black",style:p.style||"dot",width:1};var _arrowEnd={color:p.color||"black",style:p.style||"solid",width:1};group.createLine({x1:0,y1:0,x2:0+len,y2:0}).setStroke(p.stroke||_defaultStroke);group.createPath().moveTo(len-_arrowHeight,0).lineTo(len-_arrowHeight,-_arrowWidth).lineTo(len,0).lineTo(len-_arrowHeight,_arrowWidth).lineTo(len-_arrowHeight,0).setStroke(p.stroke||_arrowEnd).setFill(p.stroke?p.stroke.color:_arrowEnd.color);var _rot=Math.asin((y2-y1)/len)*180/Math.PI;if(x2<=x1){_rot=180-_rot;}
+group.setTransform([dojox.gfx.matrix.translate(x1,y1),dojox.gfx.matrix.rotategAt(_rot,0,0)]);return group;};function fillLineage(){var statement;mStore.fetchItemByIdentity({identity:"statement",onItem:function(item,request){statement=item;}});if(statement!=null&&statement.description!=""){dojo.byId('ps_statement').innerHTML=statement.description;dojo.byId('lin_process').parentNode.removeChild(dojo.byId('lin_process'));if(dojo.byId('table_processing'))dojo.byId('table_processing').parentNode.removeChild(dojo.byId('table_processing'));}else{if(dojo.byId('lin_statement'))dojo.byId('lin_statement').parentNode.removeChild(dojo.byId('lin_statement'));var pStep_data;mStore.fetchItemByIdentity({identity:"process_step_0",onItem:function(item,request){pStep_data=item;}});if(pStep_data!=null){dojo.byId('ps_rationale').innerHTML=pStep_data.rationale;dojo.byId('ps_description').innerHTML=pStep_data.description;dojo.byId('p_time').innerHTML=pStep_data.dateTime;dojo.byId('p_processor').innerHTML=pStep_data.processor;dojo.byId('pubs').innerHTML="";if(pStep_data.processing_list!=null){var pubs=pStep_data.processing_list[0].processing_0[0].docs[0];if(pubs!=null){var pubs_html="<table class=\"lin_info_table\" style=\"clear:left;\">";for(var i=0;i<pubs.size[0];i++){var cit;mStore.fetchItemByIdentity({identity:"doc_"+i,onItem:function(item,request){cit=item;}});if(i!=0)pubs_html+="<tr><td class=\"table_left\" id=\"table_title\" style=\"height:30px;padding-top:20px;\">"+(i+1)+". PUBLICATION</td><td></td></tr>";else pubs_html+="<tr><td class=\"table_left\" id=\"table_title\" style=\"height:30px;\">"+(i+1)+". PUBLICATION</td><td></td></tr>";pubs_html+="<tr><td class=\"table_left\" valign=\"top\">TITLE OF PUBLICATION</td><td>"+cit.title+"</td></tr>";if(cit.date!=null&&cit.date!="")pubs_html+="<tr><td class=\"table_left\" valign=\"top\">PUBLISHING DATE</td><td>"+cit.date+"</td></tr>";if(cit.others!=null&&cit.others!=""&&cit.others.toString().substring(0,4)=="http")pubs_html+="<tr><td class=\"table_left\" valign=\"top\">CITATION</td><td><a onclick=\"window.open(\'"+cit.others+"\')\">"+cit.others+"</a></td></tr>";else
+if(cit.others!=null&&cit.others!=""&&cit.others.toString().substring(0,4)=="doi:"){var helper=cit.others.toString().substring(4,cit.others.toString().lenth);helper="http://dx.doi.org/"+helper;pubs_html+="<tr><td class=\"table_left\" valign=\"top\">CITATION</td><td><a onclick=\"window.open(\'"+helper+"\')\">"+helper+"</a></td></tr>";}else if(cit.others!=null&&cit.others!="")pubs_html+="<tr><td class=\"table_left\" valign=\"top\">CITATION</td><td>"+cit.others+"</td></tr>";}
+pubs_html+="</table>";dojo.byId('pubs').innerHTML=pubs_html;}}}}};var lineage_hidden=true;function toggleLineage(){var slideTarget=dojo.byId("lineage_mini_cards");var neg_slideTarget=dojo.byId("lineage_con");var slideTarget2=dojo.byId("usage_mini_cards");var neg_slideTarget2=dojo.byId("usage_con");var slideTarget3=dojo.byId("detail_container");var lines=dojo.byId('actual_lines');var detail_left;if(dojo.byId('lineage_model_0')==null&&dojo.byId('usage_model_0')==null)detail_left="470";else if(lineage_hidden)detail_left="590";else detail_left="240";if(lineage_hidden){dojo.byId("usage_mini_cards").style.visibility="visible";dojo.byId("icon_arrow_right").style.visibility="visible";dojo.byId("icon_arrow_left").style.visibility="hidden";dojo.byId("usage_model_cards_container").style.left="0px";dojo.byId("usage_dataset_cards_container").style.left="0px";lineage_hidden=false;dojo.fadeOut({node:lines,duration:200}).play();dojo.fx.combine([dojo.fadeOut({node:slideTarget,duration:200}),dojo.fadeOut({node:neg_slideTarget2,duration:200}),]).play();dojo.fx.combine([dojo.fx.slideTo({node:slideTarget,duration:100,left:"-600",top:"30"}),dojo.fx.slideTo({node:neg_slideTarget,duration:100,left:"0",top:"50"}),dojo.fx.slideTo({node:slideTarget2,duration:100,left:"860",top:"30"}),dojo.fx.slideTo({node:neg_slideTarget2,duration:100,left:"0",top:"50"}),]).play();dojo.byId("lineage_dataset_cards_container").style.visibility="visible";dojo.byId("lineage_model_cards_container").style.visibility="visible";dojo.fx.combine([dojo.fadeIn({node:neg_slideTarget,duration:1400}),dojo.fadeIn({node:slideTarget2,duration:1400}),dojo.fx.slideTo({node:slideTarget3,duration:400,left:detail_left,top:"50"}),]).play();setLines();dojo.byId('actual_lines').style.opacity=0;dojo.fadeIn({node:lines,duration:1400}).play();dojo.byId("lineage_mini_cards").style.visibility="hidden";dojo.byId("usage_dataset_cards_container").style.visibility="hidden";dojo.byId("usage_model_cards_container").style.visibility="hidden";if(num_us_ds<1){dojo.byId("usage_mini_cards").style.left="0px";dojo.byId("usage_mini_cards").style.width="0px";dojo.byId("usage_dataset_mini_cards_container").style.left="0px";dojo.byId("usage_dataset_mini_cards_container").style.width="0px";dojo.byId("usage_model_mini_cards_container").style.left="0px";dojo.byId("usage_model_mini_cards_container").style.width="0px";}else{dojo.byId("usage_dataset_mini_cards_container").style.left="110px";dojo.byId("usage_model_mini_cards_container").style.left="5px";}
+hide_tools();}else{dojo.byId("lineage_mini_cards").style.visibility="visible";dojo.byId("icon_arrow_right").style.visibility="hidden";dojo.byId("icon_arrow_left").style.visibility="visible";dojo.byId("usage_model_cards_container").style.left="510px";dojo.byId("usage_dataset_cards_container").style.left="780px";lineage_hidden=true;dojo.fadeOut({node:lines,duration:200}).play();dojo.fx.combine([dojo.fadeOut({node:neg_slideTarget,duration:200}),dojo.fadeOut({node:slideTarget2,duration:200})]).play();dojo.fx.combine([dojo.fx.slideTo({node:slideTarget,duration:100,left:"-30",top:"30"}),dojo.fx.slideTo({node:neg_slideTarget,duration:100,left:"-600",top:"50"}),dojo.fx.slideTo({node:neg_slideTarget2,duration:100,left:"30",top:"50"}),dojo.fx.slideTo({node:slideTarget2,duration:100,left:"0",top:"30"}),]).play();dojo.byId("usage_dataset_cards_container").style.visibility="visible";dojo.byId("usage_model_cards_container").style.visibility="visible";dojo.fx.combine([dojo.fadeIn({node:slideTarget,duration:1400}),dojo.fadeIn({node:neg_slideTarget2,duration:1400}),dojo.fx.slideTo({node:slideTarget3,duration:400,left:detail_left,top:"50"}),]).play();setLines();dojo.byId('actual_lines').style.opacity=0;dojo.fadeIn({node:lines,duration:1400}).play();dojo.byId("usage_mini_cards").style.visibility="hidden";dojo.byId("lineage_dataset_cards_container").style.visibility="hidden";dojo.byId("lineage_model_cards_container").style.visibility="hidden";hide_tools();}};var lastposition=0;var guiFunctions={};var _id=null;var hierarchyStandalone=false;var metaVizOn=false;guiFunctions.setItemDetails=function(id){if(dojo.byId("map")!=null){time4Maps.hideTime4Maps();metaViz.hideMetaViz();dojo.byId("mapII").style.display="block";guiFunctions.setGeneralMetaData(id);guiFunctions.setTabularView(id);if((dijit.byId('tabContainer').selectedChildWidget==dijit.byId('tabTree'))&&_id!=id){guiFunctions.setTree(id);}}else{guiFunctions.setGeneralMetaData(id);}
+_id=id;};guiFunctions.setItemDetailsWithoutHiding=function(id){if(id==""){alert("Selected Object not found.");return;}
+var entry=httpGet(findOne+"/"+id);if(entry==""){console.log("guiFunctions: Entry is not defined ");return;}
+showFeature(id);if(dojo.byId('tabContainer')!=null){if((dijit.byId('tabContainer').selectedChildWidget==dijit.byId('tabTree'))&&_id!=id){_id=id;guiFunctions.setTree(_id);}
+_id=id;guiFunctions.setTabularView(id);guiFunctions.setGeneralMetaData(id);}else if(dojo.byId("tabMetaData")!=null){guiFunctions.setGeneralMetaData(id);}};guiFunctions.scrollToSpecificPoint=function(href){window.location.href="#"+href;};guiFunctions.setTabularView=function(id){_id=id;var table2=document.getElementsByClassName("exhibit-tabularView-body");if(lastposition>table2[0].rows.length){lastposition=0;return;}
+table2[0].rows[lastposition+1].style.background='#fff';for(var i=0;i<currentTabularViewItems.length;i++){if(currentTabularViewItems[i].id==id&&table2[0].rows[i]!=undefined){lastposition=i;table2[0].rows[i+1].style.background='rgba(249, 178, 0, 0.4)';break;}}};guiFunctions.showInfoText=function(){dojo.byId("infotext").style.display="block";};guiFunctions.removeTableAndTree=function(){(dojo.byId("infotext")).style.display="none";var tab=dojo.byId("metaDataTable");if(tab){while(tab.hasChildNodes()){tab.removeChild(tab.lastChild);}
+dojo.destroy(tab);}
+var tab=document.getElementById("table");if(tab)
+tab.parentNode.removeChild(tab);dijit.byId("myTree").reload([],[]);_id=null;};guiFunctions.removeTable=function(){if(dojo.byId("infotext")!=null)
+(dojo.byId("infotext")).style.display="none";var tab=dojo.byId("metaDataTable");if(tab){while(tab.hasChildNodes()){tab.removeChild(tab.lastChild);}
+dojo.destroy(tab);}
+var tab=document.getElementById("table");if(tab)
+tab.parentNode.removeChild(tab);};guiFunctions.setGeneralMetaData=function(id){if(dojo.byId("tabTree")!=null)
+dijit.byId("tabTree").set("disabled",false);guiFunctions.removeTable();function createTableRow(contentCell1,contentCell2){var row=document.createElement("tr");var cell=document.createElement("td");var cellText=document.createTextNode(contentCell1);cell.appendChild(cellText);var cell2=document.createElement("td");var cellText2=document.createTextNode(contentCell2);cell2.appendChild(cellText2);if(contentCell1.indexOf("Title")>=0){cell2.style.cssText="font-weight:bold";}else{cell2.style.cssText="color:#666666";}
+row.appendChild(cell);row.appendChild(cell2);return row;}
+var table=document.createElement("table");table.setAttribute("id","metaDataTable");var entry=httpGet(findOne+"/"+id);if(entry.id=="null")return;_id=entry.id;table.appendChild(createTableRow("Title: ",entry.label));table.appendChild(createTableRow("Description: ",entry.description));table.appendChild(createTableRow("Organisation: ",entry.organization));table.appendChild(createTableRow("Datatype: ",entry.datatype));if(entry.keywords!=null&&entry.keywords!="")
+table.appendChild(createTableRow("Keywords: ",entry.keywords));if(entry.temporalextentbeginposition)
+table.appendChild(createTableRow("From: ",entry.temporalextentbeginposition));if(entry.temporalextentendposition)
+table.appendChild(createTableRow("To: ",entry.temporalextentendposition));if(entry.topiccategory){var topics="";for(var i=0;i<entry.topiccategory.length;i++){if(i<entry.topiccategory.length-1)
+topics+=entry.topiccategory[i]+", ";else
+topics+=entry.topiccategory[i];}
+table.appendChild(createTableRow("Topic: ",topics));}
+if(entry.scenario)
+table.appendChild(createTableRow("Scenario: ",entry.scenario));if(entry.hierarchylevelname)
+table.appendChild(createTableRow("Related project: ",entry.hierarchylevelname));var a=document.createElement("a");newAttribute=document.createAttribute("onclick");newAttribute2=document.createAttribute("onclick");if(entry.url){var row=document.createElement("tr");var cell=document.createElement("td");var cellText=document.createTextNode("Links: ");cell.appendChild(cellText);row.appendChild(cell);var cell2=document.createElement("td");var metaData="<a onclick=\"window.open(\'"+entry.url+"\');\">Show detailed metadata in catalog</a>";cell2.innerHTML=metaData;row.appendChild(cell2);table.appendChild(row);}
+if(entry.hierarchylevelname=="GLUES"&&entry.datatype=="dataset"&&hierarchyStandalone==false){newAttribute.nodeValue="metaViz.showMetaViz(\""+entry.uuid+"\")";a.setAttributeNode(newAttribute);a.innerHTML="Show lineage information";var row=document.createElement("tr");var cell=document.createElement("td");cellText=document.createTextNode("Lineage: ");cell.appendChild(cellText);var cell2=document.createElement("td");cell2.appendChild(a);row.appendChild(cell);row.appendChild(cell2);table.appendChild(row);}else if(entry.datatype=="dataset"&&hierarchyStandalone==true){a.href="metaviz_detail.html?mode=hsql&id="+entry.uuid;a.innerHTML="Show lineage information";var row=document.createElement("tr");var cell=document.createElement("td");cellText=document.createTextNode("Lineage: ");cell.appendChild(cellText);var cell2=document.createElement("td");cell2.appendChild(a);row.appendChild(cell);row.appendChild(cell2);table.appendChild(row);}
+if(entry["datatype"]=="dataset"){var publication=httpGet("findPublicationByDsId/"+entry["id"]);if(publication[0]!=null){for(var i=0;i<publication.length;i++){var pubId=publication[i].id;var cell=document.createElement("td");cellText=document.createTextNode("Publication: ");cell.appendChild(cellText);var row=document.createElement("tr");var cell2=document.createElement("td");var a=document.createElement("a");var newAttribute=document.createAttribute("onclick");newAttribute.nodeValue="guiFunctions.setItemDetails(\""+pubId+"\")";a.setAttributeNode(newAttribute);a.innerHTML=publication[i].label;cell2.appendChild(a);row.appendChild(cell);row.appendChild(cell2);table.appendChild(row);}}}
+if(entry["related service"]&&entry["related service"]!="null"&&dojo.byId("map")!=null&&entry["related service"].indexOf("csw")<0){var a=document.createElement("a");newAttribute=document.createAttribute("onclick");newAttribute.nodeValue="time4Maps.showTime4MapsId(\""+id+"\")";a.setAttributeNode(newAttribute);a.innerHTML="Visualize on the map";var row=document.createElement("tr");var cell=document.createElement("td");var cellText="";if(entry["datatype"]=="dataset"||entry["datatype"]=="publication")
+cellText=document.createTextNode("Related service: ");else if(entry["datatype"]=="service")
+cellText=document.createTextNode("Service: ");if(cellText!="")
+cell.appendChild(cellText);var cell2=document.createElement("td");cell2.appendChild(a);if(entry["related service id"]){var a2=document.createElement("a");newAttribute2=document.createAttribute("onclick");newAttribute2.nodeValue="guiFunctions.setItemDetails(\""+entry["related service id"]+"\")";a2.setAttributeNode(newAttribute2);a2.innerHTML=" Show details of related service";a2.style.cssText="padding-left: 10px;";cell2.appendChild(a2);}
+row.appendChild(cell);row.appendChild(cell2);table.appendChild(row);}
+if(entry.save!=null&&entry.save!=""){var a=document.createElement("a");newAttribute=document.createAttribute("onclick");newAttribute.nodeValue="self.location.href=\""+entry["save"]+"\"";newAttribute.nodeValue="window.open('"+entry["save"]+"')";a.setAttributeNode(newAttribute);a.innerHTML="Open download page";var row=document.createElement("tr");var cell=document.createElement("td");var cellText=document.createTextNode("Download: ");cell.appendChild(cellText);var cell2=document.createElement("td");cell2.appendChild(a);row.appendChild(cell);row.appendChild(cell2);table.appendChild(row);}
+if(entry.info!=null&&entry.info!=""){var a=document.createElement("a");newAttribute=document.createAttribute("onclick");newAttribute.nodeValue="self.location.href=\""+entry["info"]+"\"";newAttribute.nodeValue="window.open('"+entry["info"]+"')";a.setAttributeNode(newAttribute);a.innerHTML="Open info page";var row=document.createElement("tr");var cell=document.createElement("td");var cellText=document.createTextNode("Information: ");cell.appendChild(cellText);var cell2=document.createElement("td");cell2.appendChild(a);row.appendChild(cell);row.appendChild(cell2);table.appendChild(row);}
+if(entry["related datasets"]){var innerTable=document.createElement("table");innerTable.setAttribute("id","relatedDSTable");for(var i=0;i<entry["related datasets"].length;i++){var datasetTuple=entry["related datasets"][i];datasetTuple=datasetTuple.substr(1,datasetTuple.length-1);var datasetTupleId=datasetTuple.substr(0,datasetTuple.lastIndexOf("+"));var pos=datasetTuple.lastIndexOf("+")+1;var datasetTupleName=datasetTuple.substr(pos,(datasetTuple.length-pos-1));var a=document.createElement("a");newAttribute=document.createAttribute("onclick");newAttribute.nodeValue="guiFunctions.setItemDetails(\""+datasetTupleId+"\")";a.setAttributeNode(newAttribute);a.innerHTML="Show details";var row=document.createElement("tr");var cell=document.createElement("td");var cellText=document.createTextNode(datasetTupleName);cell.appendChild(cellText);var cell2=document.createElement("td");cell2.appendChild(a);row.appendChild(cell);row.appendChild(cell2);innerTable.appendChild(row);}
+var innerRow=document.createElement("tr");var innerCell=document.createElement("td");innerCellText=document.createTextNode("Related datasets: ");innerCell.appendChild(innerCellText);var innerCell2=document.createElement("td");innerCell2.appendChild(innerTable);innerRow.appendChild(innerCell);innerRow.appendChild(innerCell2);table.appendChild(innerRow);}
+if(entry["related service"]&&entry["related service"].indexOf("csw")>=0){var a=document.createElement("a");newAttribute=document.createAttribute("onclick");newAttribute.nodeValue="self.location.href=\""+entry["related service"]+"\"";newAttribute.nodeValue="window.open('"+entry["related service"]+"')";a.setAttributeNode(newAttribute);a.innerHTML="Show CSW details (opens a new window)";var row=document.createElement("tr");var cell=document.createElement("td");var cellText=document.createTextNode("URL: ");cell.appendChild(cellText);var cell2=document.createElement("td");cell2.appendChild(a);row.appendChild(cell);row.appendChild(cell2);table.appendChild(row);}
+if(!(entry["datatype"]=="dataset")){if(dojo.byId("tabTree")!=null)
+dijit.byId("tabTree").set("disabled",true);}
+if(dojo.byId("tabContainer"))
+dijit.byId("tabContainer").selectChild(dijit.byId("tabMetaData"));table.style.display="block";document.getElementById("tabMetaData").appendChild(table);$('#tabMetaData').scrollTop(0);};guiFunctions.setTreeI=function(){if(_id!=null)
+guiFunctions.setTree(_id);};guiFunctions.setTree=function(id){var myTree=dijit.byId("myTree");var entry=httpGet(findOne+"/"+id);if(entry.datatype!="dataset"){myTree.reload([],[]);dojo.byId("tabTree").innerHTML="There is no structure for this item. The information is only available for datasets.";return;}
+data=[];var grandparent=httpGet("findGrandParent"+"/"+id);if(grandparent==""){console.log("guiFunctions: no root node of dataset found");myTree.reload([],[]);return;}else if(grandparent.children.length==0){myTree.reload([],[]);dojo.byId("tabTree").innerHTML="There is no structure for this item. This dataset has no parent or children.";return;}
+var rooti=myTree.getRootId();if(grandparent.id==rooti&&rooti!=undefined){myTree.resetPath(grandparent["pathToChild"]);}else{var dataContent=httpGet("findTree"+"/"+grandparent.id);data.push(dataContent);require(["dojo/Deferred"],function(Deferred){var d=new Deferred();reloadTree=function(){myTree.reload(data);setTimeout(function(){d.resolve();},10);return d.promise;};});reloadTree().then(function(){myTree.resetPath(grandparent["pathToChild"]);myTree.scroll(grandparent["pathToChild"]);});}
+function getGrandParent(object){var grandparent=httpGet("findGrandParent"+"/"+object["id"]);return grandparent;}
+function setChildren(object){var children=httpGet(findOne+"/"+object["id"]).children;var label=httpGet(findOne+"/"+object["id"]).label;if(children!=null&&children.length>0){object["children"]=[];for(var i=0;i<children.length;i++){var child={};child["id"]=children[i];var labelChild=httpGet(findOne+"/"+children[i]).label;if(labelChild.substring(0,label.length)==label){labelChild=labelChild.substring(label.length,labelChild.length);}
+child["label"]=labelChild;setChildren(child);object["children"].push(child);}}
+return object;}};guiFunctions.showMap=function(){dojo.byId("mapII").style.display="block";if(map2){map2.updateSize();}};guiFunctions.resizeAll=function(){if(dijit.byId("map_contentPane"))
+dijit.byId("map_contentPane").resize();if(dijit.byId("time4mapsMap"))
+dijit.byId("time4mapsMap").resize();if(dijit.byId("time4mapsMap_Left"))
+dijit.byId("time4mapsMap_Left").resize();if(dijit.byId("time4mapsMap_Time"))
+dijit.byId("time4mapsMap_Time").resize();if(dijit.byId("border-left-top"))
+dijit.byId("border-left-top").resize();if(dijit.byId("bc_t4m_right"))
+dijit.byId("bc_t4m_right").resize();if(dijit.byId("listPanel"))
+dijit.byId("listPanel").resize();if(dijit.byId("centerPanel"))
+dijit.byId("centerPanel").resize();if(dijit.byId("tabMetaData"))
+dijit.byId("tabMetaData").resize();if(dijit.byId("tabTree"))
+dijit.byId("tabTree").resize();};guiFunctions.setStandalone=function(){hierarchyStandalone=true;};;var currentTabularViewItems;var projectLoaded=false;var scenarioLoaded=false;function getItemsOfTabularView(items){if(!selectOneBox)
+currentTabularViewItems=items;}
+function httpGet(requestDetail){var requestUrl=dbHost+requestDetail;var response="";$.ajax({type:"GET",async:false,url:'HSQLController',dataType:"json",data:{data:requestDetail},success:function(msg){response=msg;if(requestDetail==findAllIds){allItemsCount=response.length;}
+if(requestUrl.indexOf("Box")<0)
+filteredItemsCount=response.length;},error:function(err){if(err.status==200){}else{console.log('Error:'+err.responseText+'  Status: '+err.status);}
+response=err.responseText;}});return response;}
+function httpGetJSON(fileUrl){var response="";$.ajax({type:"GET",async:false,url:fileUrl,dataType:"json",success:function(msg){response=msg;},error:function(err){}});return response;}
+function getAllItemsCount(){return allItemsCount;}
+function clearAllFilter(){exhibit._registry._registry.facet.f0.clearAllRestrictions();exhibit._registry._registry.facet.f1.clearAllRestrictions();exhibit._registry._registry.facet.f2.clearAllRestrictions();exhibit._registry._registry.facet.f3.clearAllRestrictions();exhibit._registry._registry.facet.f4.clearAllRestrictions();exhibit._registry._registry.facet.f5.clearAllRestrictions();}
+function clearBoundingBoxFilter(){exhibit._registry._registry.facet.f5.clearAllRestrictions();}
+function getTopicSelection(){var selectedTopics="";if(typeof fixedTopic!="undefined"&&fixedTopic!=""){selectedTopics=fixedTopic;list=selectedTopics.split("..");require(["dojo/html","dojo/dom","dojo/domReady!"],function(html,dom,on){text="<div><span class='exhibit-facet-header-title'>selected Thematic categorization</span></div><table>";for(var i=0;0<list.length;i++){if(list[i]==undefined)break;text+="<tr><td>"+list[i]+"</td></tr>";}
+text+="</table>";html.set(dom.byId("f3"),text);});return selectedTopics;}
+if(exhibit._registry._registry.facet.f3!=null&&exhibit._registry._registry.facet.f3._valueSet._count>0){var valueObj=exhibit._registry._registry.facet.f3._valueSet._hash;for(property in valueObj){selectedTopics+=property+";";}
+selectedTopics=selectedTopics.substring(0,selectedTopics.length-1);}
+if(selectedTopics=="")selectedTopics="-";return selectedTopics;}
+function setTopicSelection(topicArray){var selection=new Object();if(exhibit._registry._registry.facet.f3!=null){for(var i=0;i<topicArray.length;i++){selection[topicArray[i]]=true;exhibit._registry._registry.facet.f3.setSelection(topicArray[i],true);}
+if(exhibit._registry._registry.facet.f3._valueSet._hash!=null){exhibit._registry._registry.facet.f3._notifyCollection();}}}
+function getDatatypeSelection(){var selectedDatatypes="";if(typeof fixedDataType!="undefined"&&fixedDataType!=""){selectedDatatypes=fixedDataType;selectedDatatypes=replaceAll("&#45;","-",selectedDatatypes);list=selectedDatatypes.split("..");require(["dojo/html","dojo/dom","dojo/domReady!"],function(html,dom,on){text="<div><span class='exhibit-facet-header-title'>selected Resources</span></div><table>";for(var i=0;0<list.length;i++){if(list[i]==undefined)break;text+="<tr><td>"+list[i]+"</td></tr>";}
+text+="</table>";html.set(dom.byId("f2"),text);});selectedDatatypes=replaceAll("\\.\\.",";",selectedDatatypes);console.log(selectedDatatypes);return selectedDatatypes;}
+if(exhibit._registry._registry.facet.f2!=null&&exhibit._registry._registry.facet.f2._valueSet._count>0){var valueObj=exhibit._registry._registry.facet.f2._valueSet._hash;for(property in valueObj){selectedDatatypes+=property+";";}
+selectedDatatypes=selectedDatatypes.substring(0,selectedDatatypes.length-1);}
+if(selectedDatatypes=="")selectedDatatypes="-";return selectedDatatypes;}
+function setDatatypeSelection(datatypeArray){var selection=new Object();if(exhibit._registry._registry.facet.f2!=null){for(var i=0;i<datatypeArray.length;i++){selection[datatypeArray[i]]=true;exhibit._registry._registry.facet.f2.setSelection(datatypeArray[i],true);}
+if(exhibit._registry._registry.facet.f2._valueSet._hash!=null){exhibit._registry._registry.facet.f2._notifyCollection();}}}
+function getBoundingboxSelection(){var selectedBoundingboxes="";if(exhibit._registry._registry.facet.f5!=null&&exhibit._registry._registry.facet.f5._valueSet._count>0){var valueObj=exhibit._registry._registry.facet.f5._valueSet._hash;for(property in valueObj){selectedBoundingboxes+=property+"<";}
+selectedBoundingboxes=selectedBoundingboxes.substring(0,selectedBoundingboxes.length-1);}
+if(selectedBoundingboxes=="")selectedBoundingboxes="-";return selectedBoundingboxes;}
+var blockBoxUpdate=false;function setBoundingboxSelection(boundingboxArray){exhibit._registry._registry.facet.f5._valueSet._count=0;exhibit._registry._registry.facet.f5._valueSet._hash={};var selection=new Object();if(exhibit._registry._registry.facet.f5!=null){blockBoxUpdate=true;for(var i=0;i<boundingboxArray.length;i++){selection[boundingboxArray[i]]=true;exhibit._registry._registry.facet.f5.setSelection(boundingboxArray[i],true);}
+blockBoxUpdate=false;if(exhibit._registry._registry.facet.f5._valueSet._hash!=null){exhibit._registry._registry.facet.f5._notifyCollection();}}}
+function getOrganizationSelection(){var selectedOrganizations="";if(typeof fixedOrganization!="undefined"&&fixedOrganization!=""){selectedOrganizations=fixedOrganization;list=selectedOrganizations.split("..");require(["dojo/html","dojo/dom","dojo/domReady!"],function(html,dom,on){text="<div><span class='exhibit-facet-header-title'>selected Organization</span></div><table>";for(var i=0;0<list.length;i++){if(list[i]==undefined)break;text+="<tr><td>"+list[i]+"</td></tr>";}
+text+="</table>";html.set(dom.byId("f4"),text);});return selectedOrganizations;}
+if(exhibit._registry._registry.facet.f4!=null&&exhibit._registry._registry.facet.f4._valueSet._count>0){var valueObj=exhibit._registry._registry.facet.f4._valueSet._hash;for(property in valueObj){selectedOrganizations+=property+";";}
+selectedOrganizations=selectedOrganizations.substring(0,selectedOrganizations.length-1);}
+if(selectedOrganizations=="")selectedOrganizations="-";return selectedOrganizations;}
+function setOrganizationSelection(organizationArray){var selection=new Object();if(exhibit._registry._registry.facet.f4!=null){for(var i=0;i<organizationArray.length;i++){selection[organizationArray[i]]=true;exhibit._registry._registry.facet.f4.setSelection(organizationArray[i],true);}}}
+var selectedScenarios="";function getScenarioSelection(){if(typeof fixedScenario!="undefined"&&fixedScenario!=""){selectedScenarios=fixedScenario;list=selectedScenarios.split("..");require(["dojo/html","dojo/dom","dojo/domReady!"],function(html,dom,on){text="<div><span class='exhibit-facet-header-title'>selected Scenarios or storylines</span></div><table>";for(var i=0;0<list.length;i++){if(list[i]==undefined)break;text+="<tr><td>"+list[i]+"</td></tr>";}
+text+="</table>";html.set(dom.byId("f1"),text);});selectedScenarios=replaceAll("\\.\\.",";",selectedScenarios);return selectedScenarios;}
+if(scenarioUpdateFlag){selectedScenarios="";if(exhibit._registry._registry.facet.f1!=null&&exhibit._registry._registry.facet.f1._selections.length>0){var valueObj=exhibit._registry._registry.facet.f1._selections;for(var i=0;i<valueObj.length;i++){childrenNames="";selectedScenarios+=getDeepestChildren(valueObj[i].value,getScenarioTree());}
+if(selectedScenarios.charAt(selectedScenarios.length-1)==";")
+selectedScenarios=selectedScenarios.substring(0,selectedScenarios.length-1);}
+if(selectedScenarios=="")selectedScenarios="-";scenarioUpdateFlag=false;}
+return selectedScenarios;}
+function setScenarioSelection(scenarioArray){var selection=[];if(exhibit._registry._registry.facet.f1!=null){for(var i=0;i<scenarioArray.length;i++){var selected=new Object();selected["value"]=scenarioArray[i];selection.push(selected);}
+exhibit._registry._registry.facet.f1._selections=selection;}}
+function setScenarioCounts(scenCounts){scenarioCounts=scenCounts;}
+function getScenarioCounts(scen){for(var i=0;i<scenarioCounts.length;i++){if(scen==scenarioCounts[i].scen)
+return scenarioCounts[i].count;}
+return 0;}
+var _scenarioNames="";function getScenarioTreeNames(){var tree=getScenarioTree();if(_scenarioNames==""){_scenarioNames=traverseChildrenNames(tree);if(_scenarioNames.charAt(_scenarioNames.length-1)==";")
+_scenarioNames=_scenarioNames.substring(0,_scenarioNames.length-1);}
+return _scenarioNames;}
+var selectedHierarchylevelnames="";function getHierarchylevelnameSelection(){if(typeof fixedHierarchylvl!="undefined"&&fixedHierarchylvl!=""){selectedHierarchylevelnames=fixedHierarchylvl;list=selectedHierarchylevelnames.split("..");require(["dojo/html","dojo/dom","dojo/domReady!"],function(html,dom,on){text="<div><span class='exhibit-facet-header-title'>selected Sustainable Land Management</span></div><table>";for(var i=0;0<list.length;i++){if(list[i]==undefined)break;text+="<tr><td>"+list[i]+"</td></tr>";}
+text+="</table>";html.set(dom.byId("f0"),text);});selectedHierarchylevelnames=replaceAll("\\.\\.",";",selectedHierarchylevelnames);return selectedHierarchylevelnames;}
+if(projectUpdateFlag){selectedHierarchylevelnames="";if(exhibit._registry._registry.facet.f0!=null&&exhibit._registry._registry.facet.f0._selections.length>0){var valueObj=exhibit._registry._registry.facet.f0._selections;for(var i=0;i<valueObj.length;i++){childrenNames="";selectedHierarchylevelnames+=getDeepestChildren(valueObj[i].value,getProjectTree());}
+if(selectedHierarchylevelnames.charAt(selectedHierarchylevelnames.length-1)==";"){selectedHierarchylevelnames=selectedHierarchylevelnames.substring(0,selectedHierarchylevelnames.length-1);}}
+if(selectedHierarchylevelnames=="")selectedHierarchylevelnames="-";projectUpdateFlag=false;}
+return selectedHierarchylevelnames;}
+function setHierarchylevelnameSelection(hierarchylevelnameArray){var selection=[];if(exhibit._registry._registry.facet.f0!=null){for(var i=0;i<hierarchylevelnameArray.length;i++){var selected=new Object();selected["value"]=hierarchylevelnameArray[i];selection.push(selected);}
+exhibit._registry._registry.facet.f0._selections=selection;}}
+function setHierarchylevelnameCounts(hvlCounts){hierarchylevelnameCounts=hvlCounts;}
+function getHierarchylevelnameCounts(hvl){for(var i=0;i<hierarchylevelnameCounts.length;i++){if(hvl==hierarchylevelnameCounts[i].hvl)
+return hierarchylevelnameCounts[i].count;}
+return 0;}
+var _projectNames="";function getProjectTreeNames(){var tree=getProjectTree();if(_projectNames==""){_projectNames=traverseChildrenNames(tree);if(_projectNames.charAt(_projectNames.length-1)==";")
+_projectNames=_projectNames.substring(0,_projectNames.length-1);}
+return _projectNames;}
+function traverseChildrenNames(tree){var names=tree.name+";";for(var i=0;(tree.children!=null&&i<tree.children.length);i++)
+names+=traverseChildrenNames(tree.children[i]);return names;}
+function getProjectTree(){projectTree=httpGetJSON(projectRegistryUrl);if(projectTree instanceof Object){console.log("Project tree loaded as object.");}else{console.log("Project tree loaded as string.");projectTree=$.parseJSON(projectTree);}
+return projectTree[0];}
+function getScenarioTree(){scenarioTree=httpGetJSON(scenarioRegistryUrl);if(scenarioTree instanceof Object){console.log("Scenario tree loaded as object.");}else{console.log("Scenario tree loaded as string.");scenarioTree=$.parseJSON(scenarioTree);}
+return scenarioTree[0];}
+var childrenNames="";function getDeepestChildren(selected,tree){var children=tree.children;if(children!=null&&children.length>0){for(var i=0;i<children.length;i++){if(selected==tree.name){if(childrenNames.indexOf(children[i].name+";")<0)
+childrenNames+=children[i].name+";";getDeepestChildren(children[i].name,children[i]);}else{getDeepestChildren(selected,children[i]);}}}else if(selected==tree.name&&childrenNames.indexOf(selected)<0){if(childrenNames.indexOf(selected+";")<0)
+childrenNames+=selected+";";}
+return childrenNames;}
+function getChildNames(children){var names="";for(var i=0;i<children.length;i++)
+names+=children[i].name+";";names=names.substring(0,names.length-1);return names;}
+var hierarchyInits;var scenarioInits;var datatypeInits;var organizationInits;var topicInits;function setInitValues(facet,obj){if(hierarchylevelnameFacet==facet){hierarchyInits=obj;}
+else if(scenarioFacet==facet)scenarioInits=obj;else if(datatypeFacet==facet)datatypeInits=obj;else if(organizationFacet==facet)organizationInits=obj;else if(topicFacet==facet)topicInits=obj;}
+function getInitValues(facet){if(hierarchylevelnameFacet==facet){return hierarchyInits;}
+else if(scenarioFacet==facet)return scenarioInits;else if(datatypeFacet==facet)return datatypeInits;else if(organizationFacet==facet)return organizationInits;else if(topicFacet==facet)return topicInits;}
+var dbHost="http://141.30.100.165:3000/metadata/";var scenarioRegistryUrl="././registries/glues_registry_scenarios.json";var projectRegistryUrl="././registries/glues_registry_projects.json";var projectTree;var hierarchylevelnameCounts;var scenarioTree;var scenarioCounts;var findAllIds="findAllIds";var findOne="findOne";var findAllBBox="findAllBBox";var findMixedBox="findMixedBox";var topicFacet="topiccategory";var findAllTopics="findAllTopiccategories";var findAllTopicsById="findAllTopiccategoriesById";var countAllTopiccategories="countAllTopiccategories";var themeFacet="Thematic categorization";var datatypeFacet="datatype";var findAllDatatypes="findAllDatatypes";var findAllDatatypesById="findAllDatatypesById";var countAllDatatypes="countAllDatatypes";var dtFacet="Resources";var organizationFacet="organization";var findAllOrganizations="findAllOrganizations";var findAllOrganizationsById="findAllOrganizationsById";var countAllOrganizations="countAllOrganizations";var orgaFacet="Organizations";var hierarchylevelnameFacet="Sustainable Land Management";var findHierarchylevelnames="findHierarchylevelnames";var findAllHierarchylevelnamesById="findAllHierarchylevelnamesById";var countAllHierarchylevelnames="countAllHierarchylevelnames";var scenarioFacet="Scenarios and storylines";var findScenarios="findScenarios";var findAllScenariosById="findAllScenariosById";var countAllScenarios="countAllScenarios";var boundingboxFacet="geographicboundingbox";var findAllBoundingboxes="findAllBoundingboxes";var countAllBoundingboxes="countAllBoundingboxes";var findByMixed="findByMixed";var findPublicationByDsId="findPublicationByDsId";var findSimilarLimited="findSimilarLimited";var findSimilarScenarioValues="findSimilarScenarioValues";var findSimilarHierarchylevelnameValues="findSimilarHierarchylevelnameValues";var findSimilarTopiccategoryValues="findSimilarTopiccategoryValues";var findSimilarDatatypeValues="findSimilarDatatypeValues";var findSimilarOrganizationValues="findSimilarOrganizationValues";var findInternId="findInternId";var allItemsCount=0;var filteredItemsCount=0;var PARENT="parent";var CHILDREN="children";var TOPIC="topic";var DESCRIPTION="Description";var ORGANISATION="Organization";var FROM="from";var TO="to";var RELATED_LAYER="related layer";var RELATED_DATASETS="related datasets";var RELATED_SERVICE="related service";var SCENARIO="scenario";var LABEL="label";var DATATYPE="Datatype";var HVL="hvl";var ID="id";var URL="url";var LATLONG="latlng";;var hidePreloader=function(){if(dojo.byId("preloader")!=null){var hide=function(){dojo.fadeOut({node:"preloader",duration:200,onEnd:function(){dojo.style("preloader","display","none");}}).play();};setTimeout(hide,100);}};function showPreloader(){if(dojo.byId("preloader")!=null){var ps=dojo.position('preloaderContent');var ws=dojo.window.getBox();dojo.style("preloaderContent","top",(ws.h/2-ps.h/2)+"px");dojo.style("preloaderContent","left",(ws.w/2-ps.w/2)+"px");dojo.style("preloaderContent","visibility","visible");dojo.style("preloader","opacity","1");dojo.style("preloader","display","block");}};ckan.module('datalineage_paging',function($){return{initialize:function(){var paging=(this.options.data||{}).paging||{};this.list=$('<div class="datalineage-paging"></div>').appendTo(this.el);this.addSection(paging.usage_models,'Models using the dataset');this.addSection(paging.producers,'Producers');},addSection:function(page,title){if(!page||!page.next_cursor){return;}
+var section=$('<div class="datalineage-paging-section"></div>').appendTo(this.list);$('<h4></h4>').text(title).appendTo(section);var links=$('<ul></ul>').appendTo(section);var button=$('<button class="btn btn-default btn-sm"></button>').appendTo(section);var state={code:page.code,direction:page.direction,total:page.total,cursor:page.next_cursor,shown:page.limit,asOf:page.as_of,excludeGenerated:page.exclude_generated};this.updateButton(button,state);button.on('click',$.proxy(function(){this.loadPage(state,links,button);},this));},updateButton:function(button,state){if(!state.cursor){button.remove();return;}
+button.text('Show more ('+state.shown+' of '+state.total+')');},loadPage:function(state,links,button){button.prop('disabled',true);var params={code:state.code,direction:state.direction,cursor:state.cursor};if(state.asOf){params.as_of=state.asOf;}
+if(state.excludeGenerated){params.exclude_generated=true;}
+var client=this.sandbox.client;$.getJSON(client.url('/api/3/action/datalineage_neighbours'),params).done(function(response){var result=response.result;$.each(result.neighbours,function(index,node){var item=$('<li></li>').appendTo(links);if(node.missing){item.text(node.code);}else{var href=client.url('/dataset/lineage/'+encodeURIComponent(node.name));if(state.asOf){href+='?as_of='+encodeURIComponent(state.asOf);}
+$('<a></a>').attr('href',href).text(node.title||node.name).appendTo(item);}});state.shown+=result.neighbours.length;state.cursor=result.next_cursor;}).always($.proxy(function(){button.prop('disabled',false);this.updateButton(button,state);},this));}};});;"use strict";ckan.module('datalineage_js_module',function($){return{initialize:function(){console.log("I've been initialized for element: ",this.el);var data=this.options.data;metaViz.displayMetaViz(data);}};});
\ No newline at end of file
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+History module
+Lineage graph as it was at a past date
+
+Every edge is kept in the datalineage_edge_history table with the period it was declared
+in, from valid_from until valid_to, which is null while the edge is still declared. The
+periods are opened and closed when the edges of a package are synced, see
+sync_package_edges, and `paster datalineage history` rebuilds them from the activity
+stream of the packages.
+
+The graph at a date is walked like the current one, the edges being read from the history
+with the traversal.HistoryEdgeSource, so the historical views make the same searches as
+the current ones. The lineage fields of the packages are replaced by their values at the
+date, the other package fields are the current ones and the packages deleted since are
+missing nodes, which only have their code, as the codes no package has.
+"""
+
+import datetime
+import logging
+
+from ckanext.datalineage import model as lineage_model
+
+logger = logging.getLogger(__name__)
+
+AS_OF_FORMATS = ('%Y-%m-%dT%H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d')
+
+PACKAGE_ACTIVITIES = (u'new package', u'changed package', u'deleted package')
+
+
+def parse_as_of(value):
+    """
+    Returns the UTC datetime of an ISO 8601 date or date and time, a trailing Z is allowed,
+    raises ValueError if the value is not a date
+
+    @param value: Date string, e.g. 2020-06-30 or 2020-06-30T12:00:00Z
+    """
+    text = unicode(value).strip()
+    if text.endswith('Z'):
+        text = text[:-1]
+    for date_format in AS_OF_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, date_format)
+        except ValueError:
+            continue
+    raise ValueError('Invalid date %s' % value)
+
+
+def format_as_of(as_of):
+    return as_of.isoformat() if as_of is not None else ''
+
+
+def with_fields_as_of(nodes, as_of):
+    """
+    Returns copies of lineage nodes or package dicts whose parent, producers and consumers
+    are the values they had at a date
+
+    @param nodes: List of dicts with a code
+    @param as_of: Datetime
+    """
+    fields = lineage_model.get_lineage_fields_as_of(
+        [node.get('code') for node in nodes if node], as_of)
+    result = []
+    for node in nodes:
+        if node:
+            node = dict(node)
+            node.update(fields.get(node.get('code'), {'parent': None, 'producers': None,
+                                                      'consumers': None}))
+        result.append(node)
+    return result
+
+
+def _package_fields(package):
+    """
+    Returns the lineage fields of a package dict of the activity stream, which are top level
+    keys or still in the extras
+    """
+    fields = {}
+    for extra in package.get('extras') or []:
+        if extra.get('key') in lineage_model.LINEAGE_FIELDS and extra.get('state', u'active') == u'active':
+            fields[extra['key']] = extra.get('value')
+    for field in lineage_model.LINEAGE_FIELDS:
+        if package.get(field):
+            fields[field] = package[field]
+    return fields
+
+
+def _replay(package_id, activities, current_edges, modified, periods):
+    """
+    Adds the periods of the edges of a package to `periods`, from its activities and its
+    current edges
+
+    @param activities: List of (timestamp, activity_type, data) of the package, oldest first
+    @param current_edges: Edges the package declares now
+    @param modified: Date of the last change of the package, the current edges are dated
+                     then if the activities end with other edges, e.g. after a bulk write
+    """
+    opened = {}
+    for timestamp, activity_type, data in activities:
+        if activity_type == u'deleted package':
+            edges = set()
+        else:
+            fields = _package_fields((data or {}).get('package') or {})
+            edges = set(lineage_model.package_edges(fields.get('code'), fields.get('parent'),
+                                                    fields.get('producers'), fields.get('consumers')))
+        for edge in set(opened) - edges:
+            periods.append((package_id,) + edge + (opened.pop(edge), timestamp))
+        for edge in edges - set(opened):
+            opened[edge] = timestamp
+    current_edges = set(current_edges)
+    if set(opened) != current_edges:
+        for edge in set(opened) - current_edges:
+            periods.append((package_id,) + edge + (opened.pop(edge), modified))
+        for edge in current_edges - set(opened):
+            opened[edge] = modified
+    for edge, valid_from in opened.items():
+        periods.append((package_id,) + edge + (valid_from, None))
+
+
+def rebuild_history():
+    """
+    Rebuilds the periods of the edges from the activity stream of the packages, in the
+    current session
+
+    Returns the number of periods
+    """
+    current = {}
+    for package_id, source, target, relation in lineage_model.iter_edges():
+        current.setdefault(package_id, []).append((source, target, relation))
+    dates = lineage_model.get_package_dates(current.keys())
+
+    # the activities are read first, the streaming query can not stay open during the inserts
+    periods = []
+    replayed = set()
+    package_id, activities = None, []
+    for row in lineage_model.iter_package_activities(PACKAGE_ACTIVITIES):
+        if row[0] != package_id:
+            if package_id is not None:
+                _replay(package_id, activities, current.get(package_id, []),
+                        dates.get(package_id, (None, datetime.datetime.utcnow()))[1], periods)
+                replayed.add(package_id)
+            package_id, activities = row[0], []
+        activities.append(row[1:])
+    if package_id is not None:
+        _replay(package_id, activities, current.get(package_id, []),
+                dates.get(package_id, (None, datetime.datetime.utcnow()))[1], periods)
+        replayed.add(package_id)
+
+    # packages without activities declared their edges since they were created
+    for package_id, edges in current.items():
+        if package_id not in replayed:
+            created = dates.get(package_id, (datetime.datetime.utcnow(), None))[0]
+            periods.extend((package_id,) + edge + (created, None) for edge in set(edges))
+
+    lineage_model.replace_edge_history(periods)
+    logger.info('Rebuilt %s periods of the lineage edges' % len(periods))
+    return len(periods)
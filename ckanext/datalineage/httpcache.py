@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+HTTP cache module
+Conditional requests and cache headers for the lineage pages and API
+
+The output of a lineage page only depends on the packages of its graph, so the ETag is
+computed from their ids and modification dates, which only costs a couple of SQL queries.
+
+    ckanext.datalineage.http_cache.max_age = 300  (max-age sent to shared caches, 0 disables it)
+"""
+
+import calendar
+import datetime
+from email.utils import formatdate, parsedate_tz, mktime_tz
+import hashlib
+
+from ckan.common import config, request, response
+
+from ckanext.datalineage import model as lineage_model
+
+DEFAULT_MAX_AGE = 300
+
+
+def page_versions(pkg_dict):
+    """
+    Returns the (id, metadata_modified) of the packages a lineage page can show, i.e. the
+    packages at most two edges away from a dataset, or three edges away from a model since
+    its page is the one of the dataset it generates
+    """
+    hops = 2 if pkg_dict.get('parent') else 3
+    codes = [pkg_dict.get('code')]
+    for _ in range(hops):
+        codes = lineage_model.get_neighbour_codes(codes)
+    return lineage_model.get_package_versions(codes)
+
+
+def compute_validators(pkg_dict, versions, *extra):
+    """
+    Returns the (etag, last_modified) of a response built from some packages
+
+    @param pkg_dict: Requested package
+    @param versions: List of (id, metadata_modified) of the packages in the response
+    @param extra: Any other value the response depends on, e.g. the user or the parameters
+    """
+    digest = hashlib.sha1()
+    digest.update((u'%s|%s' % (pkg_dict['id'], pkg_dict.get('metadata_modified'))).encode('utf-8'))
+    last_modified = None
+    for package_id, modified in versions:
+        digest.update((u'|%s|%s' % (package_id, modified.isoformat() if modified else '')).encode('utf-8'))
+        if modified and (last_modified is None or modified > last_modified):
+            last_modified = modified
+    for value in extra:
+        digest.update((u'|%s' % (value,)).encode('utf-8'))
+    return '"%s"' % digest.hexdigest(), last_modified
+
+
+def is_not_modified(etag, last_modified):
+    """
+    Checks the conditional headers of the request against the validators of the response
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        return etag in [value.strip() for value in if_none_match.split(',')] or \
+            if_none_match.strip() == '*'
+    if_modified_since = request.headers.get('If-Modified-Since')
+    if if_modified_since and last_modified:
+        parsed = parsedate_tz(if_modified_since)
+        if parsed:
+            since = datetime.datetime.utcfromtimestamp(mktime_tz(parsed))
+            return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def set_cache_headers(etag, last_modified, user):
+    """
+    Sets the validators and the Cache-Control header, pages of logged in users are never
+    stored by shared caches
+    """
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = formatdate(
+            calendar.timegm(last_modified.utctimetuple()), usegmt=True)
+    max_age = int(config.get('ckanext.datalineage.http_cache.max_age', DEFAULT_MAX_AGE))
+    if user or not max_age:
+        response.headers['Cache-Control'] = 'private, max-age=0, must-revalidate'
+    else:
+        response.headers['Cache-Control'] = 'public, max-age=%s' % max_age
+    response.headers['Vary'] = 'Cookie'
+    # CKAN sets Pragma: no-cache on dynamic pages, which would defeat the validators
+    if 'Pragma' in response.headers:
+        del response.headers['Pragma']
+
+
+def not_modified():
+    """
+    Turns the response into a 304 Not Modified
+    """
+    response.status_int = 304
+    for header in ('Content-Type', 'Content-Length'):
+        if header in response.headers:
+            del response.headers[header]
+    return ''
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Layout module
+Layered (Sugiyama style) layout of the lineage graphs, computed once on the server so the
+lineage page only has to draw the cards
+
+The layout runs the usual steps of a layered drawing:
+
+    1. the edges closing a cycle are reversed and every node gets a layer, the longest path
+       from a source unless the layers are given
+    2. edges spanning several layers are split by dummy nodes
+    3. the nodes of every layer are ordered by the barycenter of their neighbours in the
+       previous, then the next layer, keeping the order with the fewest crossings
+    4. the nodes are placed along their layer at the barycenter of their neighbours, without
+       overlapping each other
+
+The layouts are cached under a digest of the graph, so they are computed once per graph
+change whatever the number of views.
+"""
+
+import bisect
+import hashlib
+import json
+import logging
+
+from ckanext.datalineage import cache
+from ckanext.datalineage import metrics
+
+logger = logging.getLogger(__name__)
+
+# number of down and up sweeps ordering the layers
+SWEEPS = 4
+
+
+def _break_cycles(nodes, edges):
+    """
+    Returns the edges with the ones closing a cycle reversed, found by a depth first search
+    """
+    successors = dict((node, []) for node in nodes)
+    for source, target in edges:
+        successors[source].append(target)
+    state = {}
+    reversed_edges = set()
+    for root in nodes:
+        if root in state:
+            continue
+        state[root] = 'open'
+        stack = [(root, iter(successors[root]))]
+        while stack:
+            node, children = stack[-1]
+            for child in children:
+                if state.get(child) == 'open':
+                    reversed_edges.add((node, child))
+                elif child not in state:
+                    state[child] = 'open'
+                    stack.append((child, iter(successors[child])))
+                    break
+            else:
+                state[node] = 'closed'
+                stack.pop()
+    return [(target, source) if (source, target) in reversed_edges else (source, target)
+            for source, target in edges if source != target]
+
+
+def assign_layers(nodes, edges):
+    """
+    Returns a dict mapping every node to its layer, the length of the longest path reaching
+    it from a source
+
+    @param nodes: List of nodes
+    @param edges: List of (source, target) tuples, without cycles
+    """
+    predecessors = dict((node, []) for node in nodes)
+    successors = dict((node, []) for node in nodes)
+    for source, target in edges:
+        predecessors[target].append(source)
+        successors[source].append(target)
+    remaining = dict((node, len(predecessors[node])) for node in nodes)
+    ready = [node for node in nodes if not remaining[node]]
+    layers = {}
+    while ready:
+        node = ready.pop()
+        layers[node] = max([layers[source] + 1 for source in predecessors[node]] or [0])
+        for target in successors[node]:
+            remaining[target] -= 1
+            if not remaining[target]:
+                ready.append(target)
+    return layers
+
+
+def _split_long_edges(nodes, layers, edges):
+    """
+    Returns the nodes of every layer, in the order they are given, and the edges between
+    consecutive layers, the edges spanning several layers going through dummy nodes
+    """
+    ranks = [[] for _ in xrange(max(layers[node] for node in nodes) + 1)]
+    for node in nodes:
+        ranks[layers[node]].append(node)
+    short_edges = []
+    for source, target in edges:
+        start, end = layers[source], layers[target]
+        if start > end:
+            source, target, start, end = target, source, end, start
+        previous = source
+        for layer in xrange(start + 1, end):
+            dummy = ('dummy', source, target, layer)
+            ranks[layer].append(dummy)
+            short_edges.append((previous, dummy))
+            previous = dummy
+        if start != end:
+            short_edges.append((previous, target))
+    return ranks, short_edges
+
+
+def _barycenter_order(rank, neighbours, positions):
+    def key(item):
+        index, node = item
+        linked = [positions[neighbour] for neighbour in neighbours.get(node, ())
+                  if neighbour in positions]
+        # nodes without neighbours keep their place
+        return (float(sum(linked)) / len(linked) if linked else index, index)
+    return [node for _, node in sorted(enumerate(rank), key=key)]
+
+
+def _crossings(upper, lower, successors):
+    """
+    Counts the crossings of the edges between two layers, the inversions of their targets
+    """
+    positions = dict((node, index) for index, node in enumerate(lower))
+    crossings = 0
+    seen = []
+    for node in upper:
+        targets = sorted(positions[target] for target in successors.get(node, ()))
+        for target in targets:
+            crossings += len(seen) - bisect.bisect_right(seen, target)
+        for target in targets:
+            bisect.insort(seen, target)
+    return crossings
+
+
+def order_ranks(ranks, edges, sweeps=SWEEPS):
+    """
+    Orders the nodes of every layer to reduce the crossings of the edges, with alternate
+    down and up barycenter sweeps
+
+    Returns the ordered layers
+
+    @param ranks: List of the lists of nodes of every layer, in their initial order
+    @param edges: List of (source, target) tuples between consecutive layers
+    """
+    successors = {}
+    predecessors = {}
+    for source, target in edges:
+        successors.setdefault(source, []).append(target)
+        predecessors.setdefault(target, []).append(source)
+
+    def count(ranks):
+        return sum(_crossings(ranks[index], ranks[index + 1], successors)
+                   for index in xrange(len(ranks) - 1))
+
+    best = [list(rank) for rank in ranks]
+    best_crossings = count(best)
+    current = [list(rank) for rank in ranks]
+    for sweep in xrange(sweeps):
+        if not best_crossings:
+            break
+        if sweep % 2 == 0:
+            for index in xrange(1, len(current)):
+                positions = dict((node, i) for i, node in enumerate(current[index - 1]))
+                current[index] = _barycenter_order(current[index], predecessors, positions)
+        else:
+            for index in xrange(len(current) - 2, -1, -1):
+                positions = dict((node, i) for i, node in enumerate(current[index + 1]))
+                current[index] = _barycenter_order(current[index], successors, positions)
+        crossings = count(current)
+        if crossings < best_crossings:
+            best = [list(rank) for rank in current]
+            best_crossings = crossings
+    return best
+
+
+def _place_rank(rank, wanted, sizes, gap):
+    """
+    Places the nodes of a layer as close as possible to their wanted position, in order and
+    without overlaps, returns the start of every node
+    """
+    starts = []
+    end = None
+    for node in rank:
+        start = wanted[node] - sizes[node] / 2.0
+        if end is not None:
+            start = max(start, end + gap)
+        starts.append(start)
+        end = start + sizes[node]
+    # the nodes pushed forward are shifted back so the layer is centered on its wishes
+    if rank:
+        shift = (sum(starts[index] + sizes[node] / 2.0 - wanted[node]
+                     for index, node in enumerate(rank)) / len(rank))
+        starts = [start - shift for start in starts]
+    return dict(zip(rank, starts))
+
+
+def assign_coordinates(ranks, edges, sizes, gap):
+    """
+    Returns a dict mapping every node to the start of its card along its layer
+
+    The layers are first stacked, then every layer is moved towards the barycenter of its
+    neighbours in the previous layer and the previous layers towards their next one
+
+    @param ranks: Ordered layers, see order_ranks
+    @param edges: List of (source, target) tuples between consecutive layers
+    @param sizes: Dict mapping every node to the size of its card along the layer
+    @param gap: Space between two cards of a layer
+    """
+    successors = {}
+    predecessors = {}
+    for source, target in edges:
+        successors.setdefault(source, []).append(target)
+        predecessors.setdefault(target, []).append(source)
+
+    starts = {}
+    for rank in ranks:
+        end = 0
+        for node in rank:
+            starts[node] = end
+            end += sizes[node] + gap
+
+    def centers(rank, neighbours):
+        wanted = {}
+        for node in rank:
+            linked = [starts[other] + sizes[other] / 2.0 for other in neighbours.get(node, ())]
+            wanted[node] = (sum(linked) / len(linked) if linked
+                            else starts[node] + sizes[node] / 2.0)
+        return wanted
+
+    for rank in ranks[1:]:
+        starts.update(_place_rank(rank, centers(rank, predecessors), sizes, gap))
+    for rank in reversed(ranks[:-1]):
+        starts.update(_place_rank(rank, centers(rank, successors), sizes, gap))
+    return starts
+
+
+def layered_layout(nodes, edges, layers=None, sizes=None, gap=10, default_size=90):
+    """
+    Computes a layered layout of a graph
+
+    Returns a dict mapping every node to its (layer, start) position, starts begin at 0
+
+    @param nodes: List of nodes
+    @param edges: List of (source, target) tuples
+    @param layers: Optional dict giving the layer of every node, computed from the edges
+                   otherwise. The nodes keep their given order within a layer unless
+                   reordering removes crossings
+    @param sizes: Optional dict with the size of the card of every node along its layer
+    @param gap: Space between two cards of a layer
+    @param default_size: Size of the cards missing from sizes
+    """
+    if not nodes:
+        return {}
+    node_set = set(nodes)
+    edges = [edge for edge in edges if edge[0] in node_set and edge[1] in node_set]
+    if layers is None:
+        edges = _break_cycles(nodes, edges)
+        layers = assign_layers(nodes, edges)
+    ranks, short_edges = _split_long_edges(nodes, layers, edges)
+    ranks = order_ranks(ranks, short_edges)
+    all_sizes = dict((node, default_size) for rank in ranks for node in rank)
+    all_sizes.update(sizes or {})
+    # dummy nodes only take the room of the gap
+    for rank in ranks:
+        for node in rank:
+            if node not in node_set:
+                all_sizes[node] = 0
+    starts = assign_coordinates(ranks, short_edges, all_sizes, gap)
+    offset = min(starts[node] for node in nodes)
+    return dict((node, (layers[node], int(round(starts[node] - offset)))) for node in nodes)
+
+
+def graph_digest(*parts):
+    """
+    Returns a digest identifying a graph and the parameters of its layout
+    """
+    return hashlib.sha1(json.dumps(parts, sort_keys=True)).hexdigest()
+
+
+def cached_layout(digest, compute):
+    """
+    Returns the layout stored under a digest in the shared cache, computed and stored if
+    missing
+
+    @param digest: Digest of the graph, see graph_digest
+    @param compute: Function without arguments computing the layout, its result must be
+                    JSON serializable
+    """
+    code_cache = cache.get_code_cache()
+    if code_cache is not None:
+        layout = code_cache.get_layout(digest)
+        hit = int(layout is not None)
+        metrics.count_cache('layout', hit, 1 - hit)
+        if layout is not None:
+            return layout
+    layout = compute()
+    if code_cache is not None:
+        code_cache.set_layout(digest, layout)
+    return layout
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+"""
+Actions of the data lineage extension
+"""
+
+import logging
+
+import ckan.authz as authz
+import ckan.logic as logic
+import ckan.plugins.toolkit as tk
+from ckan.common import _
+
+from ckanext.datalineage import bulk, closure, history, metrics, reindex, traversal
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage.resolver import resolve_codes
+
+logger = logging.getLogger(__name__)
+
+ValidationError = logic.ValidationError
+
+# node fields a client can ask for
+NODE_FIELDS = ('id', 'name', 'title', 'code', 'parent', 'notes', 'url', 'type', 'private',
+               'organization', 'metadata_created', 'metadata_modified')
+DEFAULT_NODE_FIELDS = ('id', 'name', 'title')
+
+
+def _node_fields(data_dict):
+    fields = data_dict.get('fields') or DEFAULT_NODE_FIELDS
+    if isinstance(fields, basestring):
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = set(fields).difference(NODE_FIELDS)
+    if unknown:
+        raise ValidationError({'fields': [_('Unknown fields: %s') % ', '.join(sorted(unknown))]})
+    return fields
+
+
+def _node(code, depth, package, fields):
+    node = {'code': code, 'depth': depth}
+    if package is None:
+        # the code is referenced by an edge but its package does not exist or is not visible
+        node['missing'] = True
+        return node
+    for field in fields:
+        value = package.get(field)
+        if field == 'organization':
+            value = (value or {}).get('name')
+        node[field] = value
+    return node
+
+
+def _int_param(data_dict, key):
+    value = data_dict.get(key)
+    if value in (None, ''):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValidationError({key: [_('Must be an integer')]})
+    if value < 0:
+        raise ValidationError({key: [_('Must be a positive integer')]})
+    return value
+
+
+def _as_of_param(data_dict):
+    value = data_dict.get('as_of')
+    if value in (None, ''):
+        return None
+    try:
+        return history.parse_as_of(value)
+    except ValueError:
+        raise ValidationError({'as_of': [_('Must be an ISO 8601 date, e.g. 2020-06-30T12:00:00')]})
+
+
+def parse_graph_params(data_dict):
+    """
+    Validates the parameters of a graph request
+
+    Returns a dict with the direction, max_depth, max_nodes, max_neighbours, fields and
+    as_of date of the request
+    """
+    direction = data_dict.get('direction') or traversal.BOTH
+    if direction not in traversal.DIRECTIONS:
+        raise ValidationError({'direction': [_('Must be one of %s') % ', '.join(traversal.DIRECTIONS)]})
+    return {
+        'direction': direction,
+        'max_depth': _int_param(data_dict, 'max_depth'),
+        'max_nodes': _int_param(data_dict, 'max_nodes'),
+        'max_neighbours': _int_param(data_dict, 'max_neighbours'),
+        'fields': _node_fields(data_dict),
+        'as_of': _as_of_param(data_dict),
+    }
+
+
+def get_start_code(context, data_dict):
+    """
+    Returns the code a graph request starts from, given by the id of a package or by a code
+    """
+    if data_dict.get('id'):
+        pkg_dict = tk.get_action('package_show')(dict(context), {'id': data_dict['id']})
+        code = pkg_dict.get('code')
+        if not code:
+            raise ValidationError({'id': [_('Package has no lineage code')]})
+        return code
+    if data_dict.get('code'):
+        return data_dict['code']
+    raise ValidationError({'id': [_('Missing value')]})
+
+
+def hidden_codes(context, codes):
+    """
+    Returns the codes among the given ones whose package the user can not read: the
+    private packages of the organizations the user is not a member of
+
+    @param context: Action context with the user
+    @param codes: Iterable of codes
+    """
+    private = lineage_model.get_private_code_owners(codes)
+    if not private or authz.is_sysadmin(context.get('user')):
+        return set()
+    organizations = tk.get_action('organization_list_for_user')(
+        {'user': context.get('user'), 'ignore_auth': True}, {'permission': 'read'})
+    readable = set(organization['id'] for organization in organizations)
+    return set(code for code, owner_org in private.items() if owner_org not in readable)
+
+
+def graph_payload(context, graph, fields):
+    """
+    Converts a traversed graph to the nodes and edges returned by datalineage_graph, the
+    packages the user can not read are left out with their edges
+    """
+    hidden = hidden_codes(context, graph['nodes'].keys())
+    codes = [code for code in graph['nodes'] if code not in hidden]
+    packages = resolve_codes(dict(context), codes)
+    return {
+        'nodes': [_node(node_code, graph['nodes'][node_code], packages.get(node_code), fields)
+                  for node_code in codes],
+        'edges': [{'source': source, 'target': target, 'relation': relation}
+                  for source, target, relation in graph['edges']
+                  if source not in hidden and target not in hidden],
+        'truncated': graph['truncated'],
+        'capped': [entry for entry in graph.get('capped', []) if entry['code'] not in hidden],
+    }
+
+
+@tk.side_effect_free
+@metrics.scoped('datalineage_graph')
+def datalineage_graph(context, data_dict):
+    """
+    Returns the lineage graph around a package, every package of the graph appears once
+
+    :param id: id or name of the package to start from
+    :type id: string
+    :param code: code of the package to start from, used when no id is given
+    :type code: string
+    :param direction: ``upstream``, ``downstream`` or ``both`` (optional, default: ``both``)
+    :type direction: string
+    :param max_depth: maximum number of hops from the package (optional)
+    :type max_depth: int
+    :param max_nodes: maximum number of nodes in the graph (optional)
+    :type max_nodes: int
+    :param max_neighbours: maximum number of neighbours walked from every node in each
+        direction, the others can be listed with datalineage_neighbours (optional)
+    :type max_neighbours: int
+    :param fields: package fields included in the nodes, e.g. ``name,title,metadata_modified``
+        (optional, default: ``id,name,title``)
+    :type fields: list of strings or comma separated string
+    :param as_of: ISO 8601 date or date and time (UTC), the graph is walked over the edges
+        declared at that date, the packages deleted since are missing nodes with their
+        code (optional)
+    :type as_of: string
+
+    :returns: ``nodes`` with the ``code`` and ``depth`` of each package plus the requested
+        fields, ``edges`` with their ``source``, ``target`` and ``relation`` codes,
+        ``truncated``, true if the graph was cut by ``max_nodes``, and ``capped``, the nodes
+        whose neighbours were cut by ``max_neighbours`` with the ``direction``, the
+        ``total`` number of neighbours and the ``next_cursor`` to page through the others.
+        The packages the user can not read are left out with their edges
+    :rtype: dictionary
+    """
+    tk.check_access('datalineage_graph', context, data_dict)
+    params = parse_graph_params(data_dict)
+    code = get_start_code(context, data_dict)
+    graph = traversal.traverse([code], params['direction'], params['max_depth'], params['max_nodes'],
+                               edge_source=traversal.get_edge_source(params['as_of']),
+                               max_neighbours=params['max_neighbours'])
+    return graph_payload(context, graph, params['fields'])
+
+
+@tk.side_effect_free
+@metrics.scoped('datalineage_neighbours')
+def datalineage_neighbours(context, data_dict):
+    """
+    Returns one page of the neighbours of a package, ordered by code, so nodes with
+    thousands of neighbours can be expanded a page at a time
+
+    :param id: id or name of the package
+    :type id: string
+    :param code: code of the package, used when no id is given
+    :type code: string
+    :param direction: ``upstream`` or ``downstream`` (optional, default: ``downstream``)
+    :type direction: string
+    :param limit: number of neighbours in the page (optional)
+    :type limit: int
+    :param cursor: ``next_cursor`` returned with the previous page (optional)
+    :type cursor: string
+    :param fields: package fields included in the nodes, as for datalineage_graph
+        (optional, default: ``id,name,title``)
+    :type fields: list of strings or comma separated string
+    :param as_of: ISO 8601 date, the neighbours at that date are listed, as for
+        datalineage_graph (optional)
+    :type as_of: string
+    :param exclude_generated: leave out the neighbours generated by a model, i.e. the
+        datasets, so only the models using a dataset are listed downstream of it
+        (optional, default: false)
+    :type exclude_generated: bool
+
+    :returns: ``code`` of the package, ``neighbours`` with the nodes of the page, ``total``
+        number of neighbours and ``next_cursor``, null on the last page. The neighbours
+        the user can not read are left out of the page but counted in ``total``
+    :rtype: dictionary
+    """
+    tk.check_access('datalineage_neighbours', context, data_dict)
+    direction = data_dict.get('direction') or traversal.DOWNSTREAM
+    if direction not in (traversal.UPSTREAM, traversal.DOWNSTREAM):
+        raise ValidationError({'direction': [_('Must be one of %s') % ', '.join(
+            (traversal.UPSTREAM, traversal.DOWNSTREAM))]})
+    limit = _int_param(data_dict, 'limit')
+    if limit == 0:
+        raise ValidationError({'limit': [_('Must be a positive integer')]})
+    fields = _node_fields(data_dict)
+    as_of = _as_of_param(data_dict)
+    code = get_start_code(context, data_dict)
+    try:
+        page = traversal.neighbour_page(
+            code, direction, cursor=data_dict.get('cursor'), limit=limit, as_of=as_of,
+            exclude_generated=tk.asbool(data_dict.get('exclude_generated', False)))
+    except ValueError:
+        raise ValidationError({'cursor': [_('Invalid cursor')]})
+    depth = 1 if direction == traversal.DOWNSTREAM else -1
+    hidden = hidden_codes(context, page['codes'])
+    codes = [neighbour for neighbour in page['codes'] if neighbour not in hidden]
+    packages = resolve_codes(dict(context), codes)
+    return {
+        'code': code,
+        'neighbours': [_node(neighbour, depth, packages.get(neighbour), fields)
+                       for neighbour in codes],
+        'total': page['total'],
+        'next_cursor': page['next_cursor'],
+    }
+
+
+@tk.side_effect_free
+@metrics.scoped('datalineage_impact')
+def datalineage_impact(context, data_dict):
+    """
+    Returns every code derived from a package, directly or not, and every code it is
+    derived from, read from the precomputed closure of the lineage graph
+
+    :param id: id or name of the package
+    :type id: string
+    :param code: code of the package, used when no id is given
+    :type code: string
+    :param direction: ``upstream``, ``downstream`` or ``both`` (optional, default: ``both``)
+    :type direction: string
+
+    :returns: ``code`` of the package, the sorted ``downstream`` and ``upstream`` codes
+        and their counts, ``downstream_count`` and ``upstream_count``, for the requested
+        directions. The codes of the packages the user can not read are left out
+    :rtype: dictionary
+    """
+    tk.check_access('datalineage_impact', context, data_dict)
+    direction = data_dict.get('direction') or traversal.BOTH
+    if direction not in traversal.DIRECTIONS:
+        raise ValidationError({'direction': [_('Must be one of %s') % ', '.join(traversal.DIRECTIONS)]})
+    code = get_start_code(context, data_dict)
+    result = {'code': code}
+    impact = closure.impact(code, direction)
+    hidden = hidden_codes(context, set(impacted for codes in impact.values() for impacted in codes))
+    for key, codes in impact.items():
+        result[key] = [impacted for impacted in codes if impacted not in hidden]
+        result['%s_count' % key] = len(result[key])
+    return result
+
+
+@tk.side_effect_free
+def datalineage_dangling(context, data_dict):
+    """
+    Lists the lineage references to codes that no package has, recorded when the packages
+    are written
+
+    :param code: only list the references to this code (optional)
+    :type code: string
+    :param limit: maximum number of references returned (optional, default: 100)
+    :type limit: int
+    :param offset: number of references skipped (optional, default: 0)
+    :type offset: int
+
+    :returns: ``count`` of the references and ``results``, the references ordered by code,
+        with the ``package_id`` and ``package_name`` of the referencing package, the
+        referenced ``code``, the lineage ``field`` referencing it and the ``detected`` date
+    :rtype: dictionary
+    """
+    tk.check_access('datalineage_dangling', context, data_dict)
+    limit = _int_param(data_dict, 'limit')
+    rows, count = lineage_model.get_dangling(data_dict.get('code'),
+                                             100 if limit is None else limit,
+                                             _int_param(data_dict, 'offset') or 0)
+    return {
+        'count': count,
+        'results': [{'package_id': package_id, 'package_name': package_name, 'code': code,
+                     'field': field, 'detected': detected.isoformat()}
+                    for package_id, package_name, code, field, detected in rows],
+    }
+
+
+def parse_edges(data_dict):
+    """
+    Validates the edges of a bulk request
+
+    Returns the list of (source, target, relation) tuples
+    """
+    edges = data_dict.get('edges')
+    if not isinstance(edges, list) or not edges:
+        raise ValidationError({'edges': [_('Must be a non empty list')]})
+    if len(edges) > bulk.max_edges():
+        raise ValidationError({'edges': [_('At most %s edges can be sent at once') % bulk.max_edges()]})
+    relations = (lineage_model.RELATION_PARENT,) + lineage_model.USAGE_RELATIONS
+    result = []
+    errors = {}
+    for index, edge in enumerate(edges):
+        if not isinstance(edge, dict):
+            errors[index] = [_('Must be an object with source, target and relation')]
+            continue
+        source = edge.get('source')
+        target = edge.get('target')
+        relation = edge.get('relation')
+        if not isinstance(source, basestring) or not source.strip() or ',' in source:
+            errors[index] = [_('source must be a code')]
+        elif not isinstance(target, basestring) or not target.strip() or ',' in target:
+            errors[index] = [_('target must be a code')]
+        elif relation not in relations:
+            errors[index] = [_('relation must be one of %s') % ', '.join(relations)]
+        else:
+            result.append((source.strip(), target.strip(), relation))
+    if errors:
+        raise ValidationError({'edges': [errors]})
+    return result
+
+
+def datalineage_bulk_upsert(context, data_dict):
+    """
+    Records a batch of lineage edges in one transaction
+
+    Each edge is added to the lineage field of the package declaring it (the dataset for
+    ``parent`` and ``consumer``, the model for ``producer``) without going through
+    package_update, the changed packages are reindexed afterwards in batches
+
+    :param edges: edges to record, e.g.
+        ``[{"source": "glues:lmu:metadata:model:promet",
+        "target": "glues:lmu:metadata:dataset:promet", "relation": "parent"}]``
+    :type edges: list of dictionaries
+    :param replace: replace the producers, consumers and parent of the declaring packages
+        with the ones of the batch instead of adding to them (optional, default: false)
+    :type replace: bool
+
+    :returns: ``edges``, the number of edges received, ``packages``, the number of packages
+        whose lineage changed
+    :rtype: dictionary
+    """
+    tk.check_access('datalineage_bulk_upsert', context, data_dict)
+    model = context['model']
+    edges = parse_edges(data_dict)
+    replace = tk.asbool(data_dict.get('replace', False))
+    changes, conflicts = bulk.plan_changes(edges)
+    if conflicts:
+        raise ValidationError({'edges': [_('Packages with more than one parent: %s')
+                                         % ', '.join(sorted(conflicts))]})
+    package_ids = lineage_model.get_code_packages(changes.keys())
+    unknown = set(changes).difference(package_ids)
+    if unknown:
+        raise ValidationError({'edges': [_('No package with the codes: %s')
+                                         % ', '.join(sorted(unknown))]})
+
+    try:
+        changed = bulk.apply_changes(changes, package_ids, replace)
+        _commit_and_reindex(model, changed)
+    except Exception:
+        model.Session.rollback()
+        raise
+    return {'edges': len(edges), 'packages': len(changed)}
+
+
+def _commit_and_reindex(model, package_ids):
+    """
+    Commits the lineage changes of some packages and reindexes them, right away or through
+    the deferred reindex queue
+    """
+    if reindex.deferred_reindex_enabled():
+        reindex.defer_reindex(package_ids)
+        model.repo.commit()
+    else:
+        model.repo.commit()
+        reindex.reindex_packages(package_ids)
+
+
+def datalineage_update(context, data_dict):
+    """
+    Changes the lineage fields of a package without a full package_update
+
+    Only the given lineage fields are written and the package is not validated again, it
+    is reindexed after the commit or, with deferred reindexing enabled, queued so that a
+    burst of edits ends in a single reindex
+
+    :param id: id or name of the package
+    :type id: string
+    :param code: code of the package (optional)
+    :type code: string
+    :param parent: code of the model that generated the package (optional)
+    :type parent: string
+    :param producers: comma separated codes of the datasets used by the package (optional)
+    :type producers: string
+    :param consumers: comma separated codes of the models using the package (optional)
+    :type consumers: string
+
+    :returns: ``id`` of the package and ``changed``, false if the fields already had the
+        given values
+    :rtype: dictionary
+    """
+    model = context['model']
+    package = model.Package.get(data_dict.get('id') or '')
+    if package is None or package.state != u'active':
+        raise logic.NotFound(_('Dataset not found'))
+    data_dict['id'] = package.id
+    tk.check_access('datalineage_update', context, data_dict)
+
+    fields = {}
+    for field in lineage_model.LINEAGE_FIELDS:
+        if field not in data_dict:
+            continue
+        value = data_dict[field] or u''
+        if not isinstance(value, basestring):
+            raise ValidationError({field: [_('Must be a string')]})
+        fields[field] = u','.join(lineage_model.split_codes(value)) \
+            if field in ('producers', 'consumers') else value.strip()
+    if not fields:
+        raise ValidationError({'id': [_('No lineage field given')]})
+
+    extras = lineage_model.get_lineage_extras([package.id])[package.id]
+    try:
+        changed = bulk.write_lineage(package.id, extras, fields)
+        if changed:
+            lineage_model.touch_packages([package.id])
+            _commit_and_reindex(model, [package.id])
+    except Exception:
+        model.Session.rollback()
+        raise
+    return {'id': package.id, 'changed': changed}
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Auth functions of the data lineage extension
+"""
+
+import ckan.plugins.toolkit as tk
+from ckan.common import _
+
+from ckanext.datalineage import metrics
+from ckanext.datalineage import model as lineage_model
+
+
+@tk.auth_allow_anonymous_access
+def datalineage_graph(context, data_dict):
+    """
+    Anyone who can read the requested package can read its lineage graph, the packages of
+    the graph the user can not read are left out by the actions
+
+    A package requested by code must be readable too, codes without a package are not
+    secret
+    """
+    package_id = data_dict.get('id')
+    if not package_id and data_dict.get('code'):
+        package_id = lineage_model.get_code_packages([data_dict['code']]).get(data_dict['code'])
+    if package_id:
+        try:
+            tk.check_access('package_show', context, {'id': package_id})
+        except tk.NotAuthorized:
+            return {'success': False,
+                    'msg': _('User not authorized to read package %s') % (
+                        data_dict.get('id') or data_dict['code'])}
+    return {'success': True}
+
+
+@tk.auth_allow_anonymous_access
+def datalineage_neighbours(context, data_dict):
+    """
+    Same rules as datalineage_graph
+    """
+    return datalineage_graph(context, data_dict)
+
+
+@tk.auth_allow_anonymous_access
+def datalineage_impact(context, data_dict):
+    """
+    Same rules as datalineage_graph
+    """
+    return datalineage_graph(context, data_dict)
+
+
+def datalineage_export(context, data_dict):
+    """
+    Only sysadmins can export the lineage graph of the whole catalogue
+    """
+    return {'success': False, 'msg': _('Only sysadmins can export the lineage graph')}
+
+
+@tk.auth_allow_anonymous_access
+def datalineage_metrics(context, data_dict):
+    """
+    Only sysadmins can read the lineage metrics unless they are made public
+    """
+    if metrics.metrics_public():
+        return {'success': True}
+    return {'success': False, 'msg': _('Only sysadmins can read the lineage metrics')}
+
+
+def datalineage_dangling(context, data_dict):
+    """
+    Only sysadmins can list the dangling references, they name packages of any visibility
+    """
+    return {'success': False, 'msg': _('Only sysadmins can list the dangling lineage references')}
+
+
+def datalineage_bulk_upsert(context, data_dict):
+    """
+    Only sysadmins can write lineage edges in bulk, the edges can touch any package
+    """
+    return {'success': False, 'msg': _('Only sysadmins can write lineage edges in bulk')}
+
+
+def datalineage_update(context, data_dict):
+    """
+    Anyone who can update a package can change its lineage fields
+    """
+    try:
+        tk.check_access('package_update', context, {'id': data_dict.get('id')})
+    except tk.NotAuthorized:
+        return {'success': False,
+                'msg': _('User %s not authorized to edit package %s') % (context.get('user'), data_dict.get('id'))}
+    return {'success': True}
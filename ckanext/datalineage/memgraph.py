@@ -0,0 +1,492 @@
+# -*- coding: utf-8 -*-
+"""
+Memgraph module
+In-memory copy of the lineage graph, answering the edge lookups of the worker without a query
+
+The edges are loaded once per worker into compressed sparse rows: the codes are interned as
+integers, in code order, and the edges of each direction are stored in flat arrays where the
+neighbours of a code are one slice, already ordered by code. The graph is loaded in a
+background thread and the lookups read the datalineage_edge table until it is ready, so the
+workers start as fast as without it.
+
+Every change of the edges is logged in the datalineage_graph_change table. The workers read
+the log at most every refresh interval, and right after their own commits, and apply the
+changed packages as an overlay on top of the loaded edges. The graph is loaded again once
+the overlay holds too many packages.
+
+    ckanext.datalineage.memgraph.enabled = false
+    ckanext.datalineage.memgraph.refresh_interval = 5       (seconds between two reads of the log)
+    ckanext.datalineage.memgraph.max_overlay = 10000        (changed packages before a reload)
+    ckanext.datalineage.memgraph.change_retention = 86400   (seconds the changes are logged)
+"""
+
+from array import array
+import bisect
+import datetime
+import heapq
+from itertools import islice
+import logging
+import sys
+import threading
+import time
+
+import ckan.model as model
+from paste.deploy.converters import asbool
+from sqlalchemy import event
+
+from ckanext.datalineage import metrics
+from ckanext.datalineage import model as lineage_model
+
+logger = logging.getLogger(__name__)
+
+RELATIONS = (lineage_model.RELATION_PARENT, lineage_model.RELATION_PRODUCER,
+             lineage_model.RELATION_CONSUMER)
+
+DEFAULT_REFRESH_INTERVAL = 5
+DEFAULT_MAX_OVERLAY = 10000
+DEFAULT_CHANGE_RETENTION = 86400
+# transactions do not commit in the order of their change ids, the changes logged this long
+# before the last read are read again
+CHANGE_LAG = datetime.timedelta(seconds=60)
+
+PENDING_KEY = 'datalineage_memgraph_changed'
+
+
+def _counting_sort(size, keys, order):
+    """
+    Groups the edges by key, keeping their given order within a key
+
+    Returns the offsets of the groups and the indexes of the edges grouped by key
+    """
+    offsets = array('i', [0]) * (size + 1)
+    for key in keys:
+        offsets[key + 1] += 1
+    for index in xrange(size):
+        offsets[index + 1] += offsets[index]
+    positions = offsets[:-1]
+    grouped = array('i', [0]) * len(keys)
+    for edge in order:
+        key = keys[edge]
+        grouped[positions[key]] = edge
+        positions[key] += 1
+    return offsets, grouped
+
+
+class Adjacency(object):
+    """
+    Edges of one direction, the edges of the code n are the indexes offsets[n] to
+    offsets[n + 1] of the neighbours, relations and packages arrays
+    """
+    __slots__ = ('offsets', 'neighbours', 'relations', 'packages')
+
+    def __init__(self, offsets, neighbours, relations, packages):
+        self.offsets = offsets
+        self.neighbours = neighbours
+        self.relations = relations
+        self.packages = packages
+
+    def nbytes(self):
+        return sum(values.itemsize * len(values)
+                   for values in (self.offsets, self.neighbours, self.relations, self.packages))
+
+
+def _adjacency(size, keys, others, relations, packages, order):
+    """
+    Returns the Adjacency of the edges grouped by key, and the order of the grouped edges
+    """
+    offsets, grouped = _counting_sort(size, keys, order)
+    return Adjacency(offsets, array('i', (others[edge] for edge in grouped)),
+                     array('b', (relations[edge] for edge in grouped)),
+                     array('i', (packages[edge] for edge in grouped))), grouped
+
+
+class Overlay(object):
+    """
+    Edges of the packages changed since the graph was loaded, which replace the loaded edges
+    of these packages. An overlay is never modified, every change builds a new one so the
+    lookups running meanwhile read a consistent graph
+    """
+    __slots__ = ('packages', 'shadowed', 'downstream', 'upstream')
+
+    def __init__(self, packages=None, shadowed=frozenset()):
+        self.packages = packages or {}
+        self.shadowed = shadowed
+        self.downstream = {}
+        self.upstream = {}
+        for edges in self.packages.values():
+            for source, target, relation in edges:
+                self.downstream.setdefault(source, []).append((target, relation))
+                self.upstream.setdefault(target, []).append((source, relation))
+
+    def edge_count(self):
+        return sum(len(edges) for edges in self.packages.values())
+
+
+class CompactGraph(object):
+    """
+    The lineage edges in compressed sparse rows, with the upstream(codes) and
+    downstream(codes) methods of the edge sources of the traversal module
+    """
+    __slots__ = ('codes', 'ids', 'package_ids', 'package_index', 'downstream_edges',
+                 'upstream_edges', 'overlay', 'load_seconds')
+
+    def __init__(self, rows):
+        """
+        @param rows: Iterable of (package_id, source, target, relation) tuples
+        """
+        relation_index = dict((relation, index) for index, relation in enumerate(RELATIONS))
+        ids = {}
+        codes = []
+        self.package_index = {}
+        self.package_ids = []
+        sources, targets = array('i'), array('i')
+        relations, packages = array('b'), array('i')
+        for package_id, source, target, relation in rows:
+            if relation not in relation_index:
+                continue
+            for code, column in ((source, sources), (target, targets)):
+                code_id = ids.get(code)
+                if code_id is None:
+                    code_id = ids[code] = len(codes)
+                    codes.append(code)
+                column.append(code_id)
+            package = self.package_index.get(package_id)
+            if package is None:
+                package = self.package_index[package_id] = len(self.package_ids)
+                self.package_ids.append(package_id)
+            relations.append(relation_index[relation])
+            packages.append(package)
+        del ids
+
+        # the ids follow the order of the codes, so the neighbours of a code are ordered
+        # by code and a page starts with a binary search
+        order = sorted(xrange(len(codes)), key=codes.__getitem__)
+        remap = array('i', [0]) * len(codes)
+        for new_id, old_id in enumerate(order):
+            remap[old_id] = new_id
+        self.codes = [codes[old_id] for old_id in order]
+        self.ids = dict((code, code_id) for code_id, code in enumerate(self.codes))
+        del codes, order
+        sources = array('i', (remap[code_id] for code_id in sources))
+        targets = array('i', (remap[code_id] for code_id in targets))
+
+        size = len(self.codes)
+        _, by_target = _counting_sort(size, targets, xrange(len(targets)))
+        # grouped by source after being ordered by target, then grouped by target in the
+        # order of the sources
+        self.downstream_edges, by_source = _adjacency(size, sources, targets, relations,
+                                                      packages, by_target)
+        self.upstream_edges, _ = _adjacency(size, targets, sources, relations, packages,
+                                            by_source)
+        self.overlay = Overlay()
+        self.load_seconds = None
+
+    def apply_changes(self, package_edges):
+        """
+        Replaces the edges of some packages
+
+        @param package_edges: Dict mapping package ids to their (source, target, relation)
+                              edges, see get_package_edges
+        """
+        overlay = self.overlay
+        packages = dict(overlay.packages)
+        packages.update(package_edges)
+        shadowed = set(overlay.shadowed)
+        shadowed.update(self.package_index[package_id] for package_id in package_edges
+                        if package_id in self.package_index)
+        self.overlay = Overlay(packages, frozenset(shadowed))
+
+    def _relation_ids(self, relations):
+        if not relations:
+            return None
+        return set(RELATIONS.index(relation) for relation in relations if relation in RELATIONS)
+
+    def _loaded_neighbours(self, overlay, code, downstream, relations, after=None):
+        """
+        Yields the (neighbour, relation) of the loaded edges of a code still valid, ordered
+        by neighbour
+        """
+        code_id = self.ids.get(code)
+        if code_id is None:
+            return
+        adjacency = self.downstream_edges if downstream else self.upstream_edges
+        start, end = adjacency.offsets[code_id], adjacency.offsets[code_id + 1]
+        if after is not None:
+            start = bisect.bisect_left(adjacency.neighbours, bisect.bisect_right(self.codes, after),
+                                       start, end)
+        wanted = self._relation_ids(relations)
+        shadowed = overlay.shadowed
+        for index in xrange(start, end):
+            relation = adjacency.relations[index]
+            if wanted is not None and relation not in wanted:
+                continue
+            if shadowed and adjacency.packages[index] in shadowed:
+                continue
+            yield self.codes[adjacency.neighbours[index]], RELATIONS[relation]
+
+    def _overlay_neighbours(self, overlay, code, downstream, relations, after=None):
+        edges = (overlay.downstream if downstream else overlay.upstream).get(code, ())
+        return sorted(set((neighbour, relation) for neighbour, relation in edges
+                          if (not relations or relation in relations)
+                          and (after is None or neighbour > after)))
+
+    def _is_generated(self, overlay, code):
+        """
+        Returns whether a code has a parent, i.e. is a dataset
+        """
+        parent = (lineage_model.RELATION_PARENT,)
+        for _ in self._loaded_neighbours(overlay, code, False, parent):
+            return True
+        return bool(self._overlay_neighbours(overlay, code, False, parent))
+
+    def _ordered_neighbours(self, code, downstream, relations, after=None,
+                            exclude_generated=False):
+        """
+        Yields the distinct codes linked to a code, in code order
+        """
+        overlay = self.overlay
+        previous = None
+        for neighbour, _ in heapq.merge(
+                self._loaded_neighbours(overlay, code, downstream, relations, after),
+                self._overlay_neighbours(overlay, code, downstream, relations, after)):
+            if neighbour != previous:
+                previous = neighbour
+                if not exclude_generated or not self._is_generated(overlay, neighbour):
+                    yield neighbour
+
+    def _edges(self, codes, downstream, relations):
+        overlay = self.overlay
+        edges = set()
+        for code in set(code for code in codes if code):
+            for neighbour, relation in self._loaded_neighbours(overlay, code, downstream, relations):
+                edges.add((code, neighbour, relation) if downstream else (neighbour, code, relation))
+            for neighbour, relation in self._overlay_neighbours(overlay, code, downstream, relations):
+                edges.add((code, neighbour, relation) if downstream else (neighbour, code, relation))
+        return sorted(edges)
+
+    def downstream(self, codes, relations=None):
+        """
+        Returns the (source, target, relation) edges going out of the given codes, see
+        get_downstream_edges
+        """
+        return self._edges(codes, True, relations)
+
+    def upstream(self, codes, relations=None):
+        """
+        Returns the (source, target, relation) edges coming into the given codes, see
+        get_upstream_edges
+        """
+        return self._edges(codes, False, relations)
+
+    def neighbour_page(self, code, downstream=True, relations=None, after=None, limit=50,
+                       exclude_generated=False):
+        """
+        Returns a page of the codes linked to a code and whether more follow, see
+        get_neighbour_page
+        """
+        codes = list(islice(self._ordered_neighbours(code, downstream, relations, after,
+                                                     exclude_generated), limit + 1))
+        return codes[:limit], len(codes) > limit
+
+    def count_neighbours(self, code, downstream=True, relations=None, exclude_generated=False):
+        """
+        Returns the number of codes linked to a code, see count_neighbours
+        """
+        return sum(1 for _ in self._ordered_neighbours(code, downstream, relations,
+                                                       exclude_generated=exclude_generated))
+
+    def edge_count(self):
+        return len(self.downstream_edges.neighbours)
+
+    def memory_bytes(self):
+        """
+        Returns an estimate of the memory used by the loaded graph, the overlay left out
+        """
+        size = self.downstream_edges.nbytes() + self.upstream_edges.nbytes()
+        for values in (self.codes, self.package_ids):
+            size += sys.getsizeof(values) + sum(sys.getsizeof(value) for value in values)
+        return size + sys.getsizeof(self.ids) + sys.getsizeof(self.package_index)
+
+    def stats(self):
+        return {
+            'codes': len(self.codes),
+            'edges': self.edge_count(),
+            'packages': len(self.package_ids),
+            'overlay_packages': len(self.overlay.packages),
+            'overlay_edges': self.overlay.edge_count(),
+            'memory_bytes': self.memory_bytes(),
+            'load_seconds': self.load_seconds,
+        }
+
+
+class Engine(object):
+    """
+    Loads the graph of the worker and keeps it up to date with the change log
+    """
+
+    def __init__(self, refresh_interval=DEFAULT_REFRESH_INTERVAL, max_overlay=DEFAULT_MAX_OVERLAY,
+                 change_retention=DEFAULT_CHANGE_RETENTION):
+        self.refresh_interval = refresh_interval
+        self.max_overlay = max_overlay
+        self.change_retention = datetime.timedelta(seconds=change_retention)
+        self.graph = None
+        self.due = False
+        self._last_change = 0
+        self._since = None
+        self._polled = 0
+        self._loading = False
+        self._loading_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def get(self):
+        """
+        Returns the graph, read again from the change log when due, or None while it is
+        being loaded
+        """
+        if self.graph is None:
+            self.start_loading()
+            return None
+        if self.due or time.time() - self._polled >= self.refresh_interval:
+            self.refresh()
+        return self.graph
+
+    def start_loading(self):
+        """
+        Loads the graph in a background thread, unless it is being loaded
+        """
+        with self._loading_lock:
+            if self._loading:
+                return
+            self._loading = True
+        thread = threading.Thread(target=self._load_in_background, name='datalineage-memgraph')
+        thread.daemon = True
+        thread.start()
+
+    def _load_in_background(self):
+        try:
+            self.load()
+        except Exception:
+            logger.exception('Could not load the in-memory lineage graph')
+        finally:
+            model.Session.remove()
+            with self._loading_lock:
+                self._loading = False
+
+    def load(self):
+        """
+        Loads the graph from the datalineage_edge table, in the current thread
+
+        Returns the loaded graph
+        """
+        start = time.time()
+        now = datetime.datetime.utcnow()
+        lineage_model.prune_graph_changes(now - self.change_retention)
+        model.Session.commit()
+        # the changes logged while the edges are read are applied by the next refresh
+        last_change = lineage_model.get_last_graph_change()
+        graph = CompactGraph(lineage_model.iter_edges())
+        model.Session.commit()
+        graph.load_seconds = time.time() - start
+        with self._lock:
+            self.graph = graph
+            self._last_change = last_change
+            self._since = now - CHANGE_LAG
+            self._polled = 0
+        stats = graph.stats()
+        logger.info('Loaded the lineage graph: %s codes, %s edges, %.1f MB in %.2f s' % (
+            stats['codes'], stats['edges'], stats['memory_bytes'] / 1048576.0, stats['load_seconds']))
+        metrics.observe('datalineage_memgraph_load_seconds', graph.load_seconds)
+        metrics.gauge('datalineage_memgraph_bytes', stats['memory_bytes'])
+        metrics.gauge('datalineage_memgraph_edges', stats['edges'], part='base')
+        metrics.gauge('datalineage_memgraph_edges', 0, part='overlay')
+        return graph
+
+    def refresh(self):
+        """
+        Applies the changes logged since the last read, in the current session
+        """
+        # a single thread reads the log, the others keep using the graph as it is
+        if not self._lock.acquire(False):
+            return
+        try:
+            graph = self.graph
+            started = datetime.datetime.utcnow()
+            if started - self._since > self.change_retention:
+                # the changes since the last read may be pruned already
+                self.start_loading()
+                return
+            changes = lineage_model.get_graph_changes(self._last_change, self._since)
+            package_ids = set(package_id for _, package_id in changes)
+            if package_ids:
+                graph.apply_changes(lineage_model.get_package_edges(package_ids))
+                metrics.gauge('datalineage_memgraph_edges', graph.overlay.edge_count(),
+                              part='overlay')
+            self._last_change = max([self._last_change] + [change_id for change_id, _ in changes])
+            self._since = started - CHANGE_LAG
+            self._polled = time.time()
+            self.due = False
+        finally:
+            self._lock.release()
+        if len(graph.overlay.packages) > self.max_overlay:
+            self.start_loading()
+
+
+_engine = None
+
+
+def memgraph_enabled():
+    return _engine is not None
+
+
+def configure(ckan_config):
+    """
+    Sets up the in-memory graph from the CKAN config, the graph itself is loaded on first use
+
+    @param ckan_config: CKAN config
+    """
+    global _engine
+    if not asbool(ckan_config.get('ckanext.datalineage.memgraph.enabled', False)):
+        _engine = None
+        return
+    _engine = Engine(
+        int(ckan_config.get('ckanext.datalineage.memgraph.refresh_interval',
+                            DEFAULT_REFRESH_INTERVAL)),
+        int(ckan_config.get('ckanext.datalineage.memgraph.max_overlay', DEFAULT_MAX_OVERLAY)),
+        int(ckan_config.get('ckanext.datalineage.memgraph.change_retention',
+                            DEFAULT_CHANGE_RETENTION)))
+    if not event.contains(model.Session, 'after_commit', _refresh_pending):
+        event.listen(model.Session, 'after_commit', _refresh_pending)
+        event.listen(model.Session, 'after_soft_rollback', _drop_pending)
+
+
+def get_graph():
+    """
+    Returns the in-memory graph of the worker, or None if it is disabled or not loaded yet
+    """
+    return _engine.get() if _engine is not None else None
+
+
+def get_engine():
+    return _engine
+
+
+def record_change(package_id):
+    """
+    Logs a change of the edges of a package for the graphs of all the workers, the graph of
+    this worker reads it right after the commit
+
+    @param package_id: Id of the package
+    """
+    if _engine is None:
+        return
+    lineage_model.record_graph_change(package_id)
+    model.Session.info[PENDING_KEY] = True
+
+
+def _refresh_pending(session):
+    if session.info.pop(PENDING_KEY, None) and _engine is not None:
+        _engine.due = True
+
+
+def _drop_pending(session, previous_transaction):
+    session.info.pop(PENDING_KEY, None)
@@ -0,0 +1,54 @@
+// Dojo build profile of the lineage page, limited to the modules MetaViz requires
+//
+// Run it from the root of a dojo 1.9 source release:
+//
+//     util/buildscripts/build.sh --profile /path/to/metaviz.profile.js
+//
+// then copy release/dojo/dojo.js over ckanext/datalineage/fanstatic/js/dojo/dojo.js and
+// run `paster datalineage build-assets` to get a new bundle version.
+var profile = {
+    basePath: ".",
+    releaseDir: "release",
+    action: "release",
+    optimize: "closure",
+    layerOptimize: "closure",
+    cssOptimize: "comments",
+    mini: true,
+    stripConsole: "warn",
+    selectorEngine: "lite",
+
+    packages: [
+        {name: "dojo", location: "dojo"},
+        {name: "dijit", location: "dijit"},
+        {name: "dojox", location: "dojox"}
+    ],
+
+    layers: {
+        "dojo/dojo": {
+            boot: true,
+            include: [
+                // MetaViz/required_dojo_scripts.js
+                "dojo/data/ItemFileReadStore",
+                "dojo/data/ItemFileWriteStore",
+                "dojox/fx",
+                "dojox/gfx/_base",
+                "dojox/gfx3d/object",
+                "dojox/gfx/shape",
+                "dijit/Tooltip",
+                "dojox/grid/EnhancedGrid",
+                "dojox/grid/DataGrid",
+                // modules used by the MetaViz scripts without requiring them
+                "dojo/fx",
+                "dojo/window",
+                "dojo/html",
+                "dojo/dom",
+                "dojo/dom-style",
+                "dojo/Deferred",
+                "dojo/domReady",
+                "dojox/gfx",
+                "dojox/gfx/svg",
+                "dojox/gfx/matrix"
+            ]
+        }
+    }
+};
@@ -0,0 +1,809 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+MetaViz module
+Collects the lineage information of a package and converts it to the payload expected by
+the MetaViz frontend UI
+"""
+
+import functools
+import logging
+
+from ckanext.datalineage import history
+from ckanext.datalineage import layout
+from ckanext.datalineage import metrics
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import traversal
+from ckanext.datalineage.concurrency import run_concurrently
+from ckanext.datalineage.model import split_codes
+from ckanext.datalineage.resolver import resolve_codes
+
+
+logger = logging.getLogger(__name__)
+
+
+EXAMPLE_DATA = {
+    "model_data": {
+        "model_1": {
+            "dateTime": "2014-01-01T00:00:00",
+            "output_datasets": [
+                "glues:ilr:metadata:dataset:capri"
+            ],
+            "description": "The CAPRI model is a comparative static global partial equilibrium model for the agricultural sector. It endogenously determins market balances&#44; area use and yields and many other variables for agricu ...",
+            "organisation": "Institute for Food and Resource Economics&#44; Bonn University",
+            "paramName": "model_1",
+            "title": "CAPRI",
+            "type": "usage",
+            "info": "",
+            "input_datasets": [
+                "6479e718-3a61-45cb-b36a-015254f56d7a",
+                "596c710f-1830-4582-a0ec-13627f370b2f",
+                "1f057e8b-16f0-43ad-a788-860250a31625",
+                "glues:lmu:metadata:dataset:promet"
+            ]
+        },
+        "paramName": "models",  
+        "model_0": {
+            "dateTime": "2014-01-01T00:00:00",
+            "output_datasets": [
+                "glues:kei:metadata:dataset:dart"
+            ],
+            "description": "The DART model is a multi&#45;region&#44; multi&#45;sector&#44; recursive dynamic CGE model of the world economy and was developed at the Kiel Institute for the World Economy to analyse international climate policies ...",
+            "organisation": "Kiel institute for the World Economy",
+            "paramName": "model_0",
+            "title": "DART",
+            "type": "usage",
+            "info": "",
+            "input_datasets": [
+                "glues:lmu:metadata:dataset:promet"
+            ]
+        },
+        "model_2": {
+            "dateTime": "2012-01-01T00:00:00",
+            "output_datasets": [
+                "glues:lmu:metadata:dataset:promet"
+            ],
+            "description": "Potential Yield Unit&#58; Potential Yield &#91;t/ha&#93;.",
+            "organisation": "Department of Geography&#44; LMU Munich",
+            "paramName": "model_2",
+            "title": "PROMET",
+            "type": "lineage",
+            "info": "",
+            "input_datasets": [
+                "c9844990-9a92-4be1-a04f-6cb12a048e05",
+                "cc92dd0e-47d3-4cce-b358-d134fd607539",
+                "f9b95aec-bada-4326-aa60-144032cc0240",
+                "476cb529-a1c0-47e1-84e7-1494acee7eaa",
+                "f3b06df1-4e00-4a29-8442-7104aef2601f",
+                "f0b8bcb5-cdea-46da-a51b-972d81e10def"
+            ]
+        }
+    },
+    "usage": {
+        "models": {
+            "usage_model_ids": [
+                "usage_model_0",
+                "usage_model_1"
+            ],
+            "paramName": "usage_models"
+        },
+        "mod_ds_relations": {
+            "usage_model_0": "model_0",
+            "usage_model_1": "model_1",
+            "paramName": "mod_ds_relations"
+        },
+        "paramName": "usage"
+    },
+    "dataset_data": {
+        "596c710f-1830-4582-a0ec-13627f370b2f": {
+            "extent": "-180,-90;180,-90;180,90;-180,90",
+            "keywords": "Agriculture&#44;Statistical units",
+            "save": "",
+            "description": "The annual Agricultural Outlook is a report prepared jointly by the Organisation for Economic Co&#45;operation and Development &#40;OECD&#41; and the Food and Agriculture Organisation &#40;FAO&#41; of the United Nations. ...",
+            "organisation": "OECD&#45;FAO",
+            "paramName": "596c710f-1830-4582-a0ec-13627f370b2f",
+            "title": "OECD&#45;FAO Agricultural Outlook 2009&#45;2018",
+            "type": "usage_input",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=596c710f-1830-4582-a0ec-13627f370b2f",
+            "relations_csw": "",
+            "vector": "false",
+            "time": "",
+            "linked_2_modelInput": 0,
+            "info": "null"
+        },
+        "cc92dd0e-47d3-4cce-b358-d134fd607539": {
+            "extent": "-180,-60;180,-60;180,90;-180,90",
+            "keywords": "Bodenkunde&#44;Boden&#44;Bodenressourcen&#44;Bodenart&#44;Bodentextur&#44;Bodenkarte&#44;Bodenoekologie&#44;Bodenkarte",
+            "save": "http://www.iiasa.ac.at/Research/LUC/External-World-soil-database/HTML/",
+            "description": "The HWSD &#40;Harmonized World Soil Database&#41; is a 30 arc&#45;second raster database with over 16000 different soil mapping units that combines existing regional and national updates of soil information world ...",
+            "organisation": "International Institute for Applied Systems Analysis &#40;IIASA&#41;",
+            "paramName": "cc92dd0e-47d3-4cce-b358-d134fd607539",
+            "title": "HWSD &#45; Harmonized World Soil Database",
+            "type": "lineage",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=cc92dd0e-47d3-4cce-b358-d134fd607539",
+            "relations_csw": " ",
+            "vector": "false",
+            "time": "",
+            "info": ""
+        },
+        "f0b8bcb5-cdea-46da-a51b-972d81e10def": {
+            "extent": "-180,-90;180,-90;180,90;-180,90",
+            "keywords": "global input&#45;output tables",
+            "save": "",
+            "description": "The Global Trade Analysis Project\u0092s GTAP 7 Data Base is a fully documented&#44; publicly available global data base for 113 regions and 57 GTAP commodities for a single year &#40;2004&#41;. It combines detailed b ...",
+            "organisation": "Center for Global Trade Analysis&#44; Purdue University.",
+            "paramName": "f0b8bcb5-cdea-46da-a51b-972d81e10def",
+            "title": "GTAP 7 Data Base",
+            "type": "lineage",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=f0b8bcb5-cdea-46da-a51b-972d81e10def",
+            "relations_csw": " ",
+            "vector": "false",
+            "time": "2004-01-01-2004-12-31",
+            "info": ""
+        },
+        "f9b95aec-bada-4326-aa60-144032cc0240": {
+            "extent": "-180,-58;180,-58;180,60;-180,60",
+            "keywords": "Digitales Gelaendemodell&#44;Relief",
+            "save": "http://www.dgadv.com/srtm30/",
+            "description": "SRTM30 is a near&#45;global digital elevation model &#40;DEM&#41; comprising a combination of data from the Shuttle Radar Topography Mission&#44; flown in February&#44; 2000 and the U.S. Geological Survey&lsquo;s GTOPO30 data ...",
+            "organisation": "NASA",
+            "paramName": "f9b95aec-bada-4326-aa60-144032cc0240",
+            "title": "USGS SRTM30",
+            "type": "lineage",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=f9b95aec-bada-4326-aa60-144032cc0240",
+            "relations_csw": " ",
+            "vector": "false",
+            "time": "2011-08-01-",
+            "info": ""
+        },
+        "476cb529-a1c0-47e1-84e7-1494acee7eaa": {
+            "extent": "-180,-90;180,-90;180,90;-180,90",
+            "keywords": "Land&#44;Landbedeckung&#44;Landwirtschaftliche Nutzung",
+            "save": "http://ionia1.esrin.esa.int/",
+            "description": "The GlobCover Land Cover product is the highest resolution &#40;300 meters&#41; Global Land Cover product ever produced and independently validated&#44; derived from an automatic and regionally&#45;tuned classificati ...",
+            "organisation": "ESA",
+            "paramName": "476cb529-a1c0-47e1-84e7-1494acee7eaa",
+            "title": "Globcover 2009",
+            "type": "lineage",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=476cb529-a1c0-47e1-84e7-1494acee7eaa",
+            "relations_csw": " ",
+            "vector": "false",
+            "time": "",
+            "info": ""
+        },
+        "f3b06df1-4e00-4a29-8442-7104aef2601f": {
+            "extent": "-180,-90;180,-90;180,90;-180,90",
+            "keywords": "Statistische Einheiten",
+            "save": "",
+            "description": "Regions for sector modelling at a global scale",
+            "organisation": "TU Dresden",
+            "paramName": "f3b06df1-4e00-4a29-8442-7104aef2601f",
+            "title": "GLUES Regions",
+            "type": "lineage",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=f3b06df1-4e00-4a29-8442-7104aef2601f",
+            "relations_csw": " ",
+            "vector": "false",
+            "time": "2000-01-01-2060-12-31",
+            "info": ""
+        },
+        "glues:ilr:metadata:dataset:capri": {
+            "extent": "180,-90;-180,-90;-180,90;180,90",
+            "keywords": "CAPRI&#44;Institute for Food and Resource Economics&#44;Bonn University&#44;agricultural product&#44;agricultural economics&#44;agricultural land",
+            "save": "",
+            "description": "The CAPRI model is a comparative static global partial equilibrium model for the agricultural sector. It endogenously determins market balances&#44; area use and yields and many other variables for agricu ...",
+            "organisation": "Institute for Food and Resource Economics&#44; Bonn University",
+            "paramName": "glues:ilr:metadata:dataset:capri",
+            "title": "CAPRI",
+            "type": "usage",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=glues:ilr:metadata:dataset:capri",
+            "relations_csw": "",
+            "vector": "false",
+            "time": "2010-01-01-2030-12-31",
+            "linked_2_modelInput": 0,
+            "info": ""
+        },
+        "c9844990-9a92-4be1-a04f-6cb12a048e05": {
+            "extent": "-180,-90;180,-90;180,90;-180,90",
+            "keywords": "ECHAM5 SRES&#45;A1B",
+            "save": "",
+            "description": "ECHAM5 &#40;A1B&#41; modeloutput with a spatial resolution of 0.5625°. &#40;Parameters&#58; Temperatur 2m&#44; Precipitation&#44; Snowfall&#44; Incoming Shortwave Radiation&#44; Incoming Longwave Radiation&#44; Dewpoint Temperature&#44; Su ...",
+            "organisation": "Ocean Circulation &#38; Climate Dynamics Marine Meteorology Helmholtz&#45;Zentrum fuer Ozeanforschung Kiel &#40;GEOMAR&#41;",
+            "paramName": "c9844990-9a92-4be1-a04f-6cb12a048e05",
+            "title": "ECHAM5 A1B Scenario 1961&#45;2040; 2071&#45;2100",
+            "type": "lineage",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=c9844990-9a92-4be1-a04f-6cb12a048e05",
+            "relations_csw": " ",
+            "vector": "false",
+            "time": "1971-01-01-1990-12-31",
+            "info": ""
+        },
+        "glues:kei:metadata:dataset:dart": {
+            "extent": "180,-90;-180,-90;-180,90;180,90",
+            "keywords": "DART&#44;Kiel institute for the World Economy",
+            "save": "",
+            "description": "The DART model is a multi&#45;region&#44; multi&#45;sector&#44; recursive dynamic CGE model of the world economy and was developed at the Kiel Institute for the World Economy to analyse international climate policies ...",
+            "organisation": "Kiel institute for the World Economy",
+            "paramName": "glues:kei:metadata:dataset:dart",
+            "title": "DART",
+            "type": "usage",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=glues:kei:metadata:dataset:dart",
+            "relations_csw": "",
+            "vector": "false",
+            "time": "2007-01-01-2030-12-31",
+            "linked_2_modelInput": 0,
+            "info": ""
+        },
+        "paramName": "datasets",
+        "6479e718-3a61-45cb-b36a-015254f56d7a": {
+            "extent": "-180,-90;180,-90;180,90;-180,90",
+            "keywords": "Statistical units",
+            "save": "",
+            "description": "Food and Agriculture Organization of the United Nations Statistical database provides time&#45;series and cross sectional data from over 200 countries&#44; covering statistics on agriculture&#44; nutrition&#44; food ...",
+            "organisation": "FOOD AND AGRICULTURE ORGANIZATION OF THE UNITED NATIONS",
+            "paramName": "6479e718-3a61-45cb-b36a-015254f56d7a",
+            "title": "FAOSTAT Database domains",
+            "type": "usage_input",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=6479e718-3a61-45cb-b36a-015254f56d7a",
+            "relations_csw": "",
+            "vector": "false",
+            "time": "1961-01-01-2010-12-31",
+            "linked_2_modelInput": 0,
+            "info": "null"
+        },
+        "1f057e8b-16f0-43ad-a788-860250a31625": {
+            "extent": "180,-90;-180,-90;-180,90;180,90",
+            "keywords": "EUROSTAT dataset",
+            "save": "",
+            "description": "Summary&#58; EUROSTAT Statistical database provides time&#45;series data from European Union. Data cover 27 Member States of the European Union&#44; while some of the indicators are provided for other countries&#44; ...",
+            "organisation": "EUROSTAT",
+            "paramName": "1f057e8b-16f0-43ad-a788-860250a31625",
+            "title": "EUROSTAT",
+            "type": "usage_input",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=1f057e8b-16f0-43ad-a788-860250a31625",
+            "relations_csw": "",
+            "vector": "false",
+            "time": "1965-01-01-2012-01-01",
+            "linked_2_modelInput": 0,
+            "info": "null"
+        }
+    },
+    "paramName": "metaViz_data",
+    
+    "mapping_ids_uuids": {
+        "usage_dataset_1": "glues:ilr:metadata:dataset:capri",
+        "usage_dataset_0": "glues:kei:metadata:dataset:dart",
+        "detail_0": "glues:lmu:metadata:dataset:promet",
+        "usage_model_0": "model_0",
+        "usage_model_1": "model_1",
+        "paramName": "mapping_ids_uuids",
+        "6479e718-3a61-45cb-b36a-015254f56d7a": "6479e718-3a61-45cb-b36a-015254f56d7a",
+        "lineage_dataset_5": "f0b8bcb5-cdea-46da-a51b-972d81e10def",
+        "lineage_dataset_3": "476cb529-a1c0-47e1-84e7-1494acee7eaa",
+        "lineage_dataset_4": "f3b06df1-4e00-4a29-8442-7104aef2601f",
+        "596c710f-1830-4582-a0ec-13627f370b2f": "596c710f-1830-4582-a0ec-13627f370b2f",
+        "lineage_model_0": "model_2",
+        "lineage_dataset_1": "cc92dd0e-47d3-4cce-b358-d134fd607539",
+        "lineage_dataset_2": "f9b95aec-bada-4326-aa60-144032cc0240",
+        "1f057e8b-16f0-43ad-a788-860250a31625": "1f057e8b-16f0-43ad-a788-860250a31625",
+        "lineage_dataset_0": "c9844990-9a92-4be1-a04f-6cb12a048e05"
+    },
+    "detail_data": {
+        "paramName": "detail",
+        "glues:lmu:metadata:dataset:promet": {
+            "extent": "-180,-90;-180,90;180,90;180,-90",
+            "keywords": "LMU&#44;potential yield&#44;Sorghum&#44;Sugarcane&#44;Potatoe&#44;Cassava&#44;Sunflower&#44;Soy&#44;Rapeseed&#44;Oilpalm&#44;Groundnut&#44;Wheat&#44;Rye&#44;Rice&#44;Millet&#44;Maize&#44;Barley&#44;Crops&#44;Department fuer Geographie&#44; LMU Muenchen&#44;PROMET",
+            "save": "",
+            "description": "Potential Yield Unit&#58; Potential Yield &#91;t/ha&#93;.",
+            "organisation": "Department fuer Geographie&#44; LMU Muenchen",
+            "paramName": "glues:lmu:metadata:dataset:promet",
+            "title": "PROMET",
+            "type": "",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=glues:lmu:metadata:dataset:promet",
+            "relations_csw": "",
+            "vector": "false",
+            "time": "",
+            "linked_2_modelInput": 0,
+            "info": ""
+        }
+    }
+}
+
+def new_metaviz_results():
+    """
+    Returns an empty MetaViz payload
+    """
+    return {
+        'model_data': {"paramName": "models"},
+        'usage': {"paramName": "usage"},
+        'dataset_data': {"paramName": "datasets"},
+        'paramName': 'metaViz_data',
+        'mapping_ids_uuids': {"paramName": "mapping_ids_uuids"},
+        'detail_data': {"paramName": "detail"}
+    }
+
+
+def get_usage_models(context, ds_info, models=None, model_codes=None):
+    """
+    Get the models that are used by the current dataset
+
+    @param models: Already resolved consumers of the dataset, they are resolved here if not given
+    @param model_codes: Codes of the consumers to get, all the consumers of the dataset if not given
+    """
+    models_info = []
+    if model_codes is None:
+        model_codes = split_codes(ds_info.get('consumers', ''))
+    if models is None:
+        models = resolve_codes(context, model_codes)
+    for model_code in model_codes:
+        if model_code not in models:
+            logger.debug('No result found for consumers [%s] of package [%s]' % (model_code, ds_info['code']) )
+        else:
+            models_info.append(dict(models[model_code]))
+    return models_info
+
+
+def get_models_producer_codes(models_info, ds_info, limit=None):
+    """
+    Get the codes of the datasets used by some models besides the current dataset
+
+    @param limit: Maximum number of producers taken from each model
+    """
+    producer_codes = set()
+    for model_info in models_info:
+        producer_codes.update(split_codes(model_info.get('producers', ''))[:limit])
+    # a model generating no dataset has no current DS
+    producer_codes.discard(ds_info.get('code'))
+    return producer_codes
+
+
+def set_models_input_datasets(models_info, ds_info, producers, limit=None):
+    """
+    Link the models to their resolved producers DSs
+
+    @param limit: Maximum number of producers linked to each model
+    """
+    for model_info in models_info:
+        # get the producers DSs
+        model_producers = split_codes(model_info.get('producers', ''))[:limit]
+        if model_producers:
+            producers_info = [ds_info]
+            for ds_code in model_producers:
+                if ds_code == ds_info['code']:
+                    continue
+                if ds_code not in producers:
+                    logger.debug('No result found for producer [%s] of package [%s]' % (ds_code, model_info['code']) )
+                else:
+                    producers_info.append(producers[ds_code])
+            model_info['input_datasets'] = producers_info
+
+
+def get_usage_datasets(context, models, as_of=None):
+    """
+    Get the datasets generated by some models, the first generated dataset found for each
+    model
+
+    @param as_of: Optional datetime, the datasets generated at that date are returned
+    """
+    generated = lineage_model.get_generated_codes([model['code'] for model in models],
+                                                  traversal.get_edge_source(as_of))
+    # all the codes are resolved, so a code without a package falls back to the next one
+    datasets = resolve_codes(context, [code for codes in generated.values() for code in codes])
+    result = {}
+    for model in models:
+        found = [code for code in generated.get(model['code'], []) if code in datasets]
+        if not found:
+            logger.debug('No dataset produced by model [%s] found' % (model['code']))
+        else:
+            result[model['code']] = datasets[found[0]]
+    return result
+
+
+
+
+def create_metavis_ds_info(dataset_info, ds_type='usage_input', linked_2_model=False):
+    """
+    Convert the dataset structure that comes from ckan to the expected dataset structrue
+    of metaviz frontend UI
+
+    metaviz expects:
+
+    "extent": "180,-90;-180,-90;-180,90;180,90",
+            "keywords": "EUROSTAT dataset",
+            "save": "",
+            "description": "Summary&#58; EUROSTAT Statistical database provides time&#45;series data from European Union. Data cover 27 Member States of the European Union&#44; while some of the indicators are provided for other countries&#44; ...",
+            "organisation": "EUROSTAT",
+            "paramName": "1f057e8b-16f0-43ad-a788-860250a31625",
+            "title": "EUROSTAT",
+            "type": "usage_input",
+            "view": "http://catalog-glues.ufz.de/terraCatalog/Query/ShowCSWInfo.do?fileIdentifier=1f057e8b-16f0-43ad-a788-860250a31625",
+            "relations_csw": "",
+            "vector": "false",
+            "time": "1965-01-01-2012-01-01",
+            "linked_2_modelInput": 0,
+            "info": "null"
+    """
+    result = {
+        'extent': '',
+        'keywords': ','.join(tag['name'] if isinstance(tag, dict) else tag
+                             for tag in dataset_info.get('tags') or []),
+        'save': '',
+        'description': dataset_info.get('notes', ''),
+        'organisation': (dataset_info.get('organization') or {}).get('name', ''),
+        'paramName': dataset_info.get('code', ''),
+        'title': dataset_info.get('title', ''),
+        'type': ds_type,
+        'view': dataset_info.get('url', ''),
+        'relations_csw': '',
+        'vector': 'false',
+        'time': dataset_info.get('metadata_created', ''),
+        'info': 'null',
+        'name': dataset_info.get('name' ''),
+    }
+    if linked_2_model:
+        result['linked_2_modelInput'] = 0
+    # if not ds_type or "usage" in ds_type:
+    #     result['linked_2_modelInput'] = 0
+    return result
+
+
+
+def convert_model_data_to_metaviz(results, usage_models, usage_datasets, extra_vars):
+    """
+    Convert model data to the format needed by the metaviz UI frontend and add it to the results payload
+
+    "model_1": {
+            "dateTime": "2014-01-01T00:00:00",
+            "output_datasets": [
+                "glues:ilr:metadata:dataset:capri"
+            ],
+            "description": "The CAPRI model is a comparative static global partial equilibrium model for the agricultural sector. It endogenously determins market balances&#44; area use and yields and many other variables for agricu ...",
+            "organisation": "Institute for Food and Resource Economics&#44; Bonn University",
+            "paramName": "model_1",
+            "title": "CAPRI",
+            "type": "usage",
+            "info": "",
+            "input_datasets": [
+                "6479e718-3a61-45cb-b36a-015254f56d7a",
+                "596c710f-1830-4582-a0ec-13627f370b2f",
+                "1f057e8b-16f0-43ad-a788-860250a31625",
+                "glues:lmu:metadata:dataset:promet"
+            ]
+        }
+    """
+    index = -1
+    for index, model_info in enumerate(usage_models):
+        results['model_data']['model_{}'.format(index)] = {
+            'paramName': 'model_{}'.format(index),
+            'dateTime': model_info.get('metadata_created', ''),
+            'description': model_info.get('notes', ''),
+            'organisation': (model_info.get('organization') or {}).get('name', ''),
+            'title': model_info.get('title', ''),
+            'type': 'usage',
+            'info': '',
+            'name': model_info.get('name', ''),
+            'output_datasets':[
+                usage_datasets.get(model_info['code'], {}).get('code', '')
+            ],
+            'input_datasets':[
+                producer_info['code'] for producer_info in model_info.get('input_datasets', [])
+            ]
+        }
+    
+    model_info = extra_vars['current_model']
+    results['model_data']['model_{}'.format(index+1)] = {
+            'paramName': 'model_{}'.format(index+1),
+            'dateTime': model_info.get('metadata_created', ''),
+            'description': model_info.get('notes', ''),
+            'organisation': (model_info.get('organization') or {}).get('name', ''),
+            'title': model_info.get('title', ''),
+            'type': 'lineage',
+            'info': '',
+            'name': model_info.get('name', ''),
+            'output_datasets':[
+                extra_vars['detail_data']['code']
+            ],
+            'input_datasets':[
+                producer_info['code'] for producer_info in extra_vars['datalineage_producers']
+            ]
+    }
+
+@metrics.timed('convert')
+def convert_extra_vars_to_metaviz(extra_vars):
+    """
+    Convert collected data from the current ckan dataset structure to the format the metaviz frontend UI expect
+
+    Returns a new MetaViz payload, nothing is shared between calls
+    """
+    results = new_metaviz_results()
+    detail_data = create_metavis_ds_info(extra_vars['detail_data'],
+                                         ds_type="",
+                                         linked_2_model=True if extra_vars['usage_models'] else False)
+    results['detail_data'] = {'paramName': 'detail',
+                              extra_vars['detail_data']['code']: detail_data}
+    usage_models = extra_vars['usage_models']
+    usage_datasets = extra_vars['usage_datasets'] 
+    for model_info in usage_models:
+        for producer_info in model_info.get('input_datasets', []):
+            if producer_info['code'] != extra_vars['detail_data']['code']:
+                results['dataset_data'][producer_info['code']] = create_metavis_ds_info(producer_info,
+                                                                                        ds_type='usage_input',
+                                                                                        linked_2_model=True)
+    for _, usage_ds in usage_datasets.items():
+        results['dataset_data'][usage_ds['code']] = create_metavis_ds_info(usage_ds, 
+                                                                            ds_type='usage',
+                                                                            linked_2_model=False)
+    for producer_info in extra_vars['datalineage_producers']:
+        results['dataset_data'][producer_info['code']] = create_metavis_ds_info(producer_info, 
+                                                                                ds_type='lineage',
+                                                                                linked_2_model=False)
+                                                                        
+
+    convert_model_data_to_metaviz(results, usage_models, usage_datasets, extra_vars)
+
+    # now its time to update the usage and mapping attributes which I have no idea why they exist
+    # "usage": {
+    #     "models": {
+    #         "usage_model_ids": [
+    #             "usage_model_0",
+    #             "usage_model_1"
+    #         ],
+    #         "paramName": "usage_models"
+    #     },
+    #     "mod_ds_relations": {
+    #         "usage_model_0": "model_0",
+    #         "usage_model_1": "model_1",
+    #         "paramName": "mod_ds_relations"
+    #     },
+    #     "paramName": "usage"
+    # },
+    # "mapping_ids_uuids": {
+    #     "usage_dataset_1": "glues:ilr:metadata:dataset:capri",
+    #     "usage_dataset_0": "glues:kei:metadata:dataset:dart",
+    #     "detail_0": "glues:lmu:metadata:dataset:promet",
+    #     "usage_model_0": "model_0",
+    #     "usage_model_1": "model_1",
+    #     "paramName": "mapping_ids_uuids",
+    #     "6479e718-3a61-45cb-b36a-015254f56d7a": "6479e718-3a61-45cb-b36a-015254f56d7a",
+    #     "lineage_dataset_5": "f0b8bcb5-cdea-46da-a51b-972d81e10def",
+    #     "lineage_dataset_3": "476cb529-a1c0-47e1-84e7-1494acee7eaa",
+    #     "lineage_dataset_4": "f3b06df1-4e00-4a29-8442-7104aef2601f",
+    #     "596c710f-1830-4582-a0ec-13627f370b2f": "596c710f-1830-4582-a0ec-13627f370b2f",
+    #     "lineage_model_0": "model_2",
+    #     "lineage_dataset_1": "cc92dd0e-47d3-4cce-b358-d134fd607539",
+    #     "lineage_dataset_2": "f9b95aec-bada-4326-aa60-144032cc0240",
+    #     "1f057e8b-16f0-43ad-a788-860250a31625": "1f057e8b-16f0-43ad-a788-860250a31625",
+    #     "lineage_dataset_0": "c9844990-9a92-4be1-a04f-6cb12a048e05"
+    # },
+
+    results['usage']['models'] = {
+        "paramName": "usage_models",
+        "usage_model_ids": [
+            "usage_model_{}".format(index) for index in xrange(len(usage_models))
+        ]
+    }
+    results['usage']['mod_ds_relations'] = {
+        "paramName": "mod_ds_relations"
+    }
+    for index in xrange(len(usage_models)):
+        results['usage']['mod_ds_relations']['usage_model_{}'.format(index)] = 'model_{}'.format(index)
+    
+    results['mapping_ids_uuids']['lineage_model_0'] = 'model_{}'.format(len(usage_models))
+    results['mapping_ids_uuids']['detail_0'] = extra_vars['detail_data']['code']
+    for index in xrange(len(usage_models)):
+        results['mapping_ids_uuids']['usage_model_{}'.format(index)] = 'model_{}'.format(index)
+    
+    for index, producer_info in enumerate(extra_vars['datalineage_producers']):
+        results['mapping_ids_uuids']['lineage_dataset_{}'.format(index)] = producer_info['code']
+
+    for index in xrange(len(usage_models)):
+        value = results['model_data']['model_{}'.format(index)]['output_datasets'][0] if results['model_data']['model_{}'.format(index)]['output_datasets'] else ''
+        if value:
+            results['mapping_ids_uuids']['usage_dataset_{}'.format(index)] = value
+
+    results['layout'] = metaviz_layout(results['mapping_ids_uuids'])
+
+    # the pages of neighbours left out, loaded on demand by the page
+    paging = extra_vars.get('paging', {})
+    results['paging'] = {'paramName': 'paging'}
+    for key, page in paging.items():
+        results['paging'][key] = dict(page, paramName='paging_{}'.format(key),
+                                      next_cursor=page['next_cursor'] or '')
+
+    return results
+
+
+# card heights of the MetaViz page, see card_position.js
+CARD_HEIGHTS = {'dataset': 90, 'model': 85, 'detail': 90}
+MINI_CARD_HEIGHTS = {'dataset': 50, 'model': 45, 'detail': 90}
+CARD_GAP = 10
+# columns of the MetaViz page, from left to right
+CARD_LAYERS = ('lineage_dataset', 'lineage_model', 'detail', 'usage_model', 'usage_dataset')
+
+
+def _card_graph(mapping):
+    """
+    Returns the cards of a MetaViz payload, by id, and the lines between them
+    """
+    cards = sorted((key for key in mapping if key != 'paramName' and
+                    key.rsplit('_', 1)[0] in CARD_LAYERS),
+                   key=lambda card: (card.rsplit('_', 1)[0], int(card.rsplit('_', 1)[1])))
+    lines = []
+    for card in cards:
+        kind, index = card.rsplit('_', 1)
+        if kind == 'lineage_dataset':
+            lines.append((card, 'lineage_model_0'))
+        elif kind == 'usage_model':
+            lines.append(('detail_0', card))
+            lines.append((card, 'usage_dataset_%s' % index))
+    lines.append(('lineage_model_0', 'detail_0'))
+    return cards, lines
+
+
+def _card_layout(cards, lines, heights):
+    layers = dict((card, CARD_LAYERS.index(card.rsplit('_', 1)[0])) for card in cards)
+    sizes = dict((card, heights[card.rsplit('_', 1)[0].split('_')[-1]]) for card in cards)
+    positions = layout.layered_layout(cards, lines, layers=layers, sizes=sizes, gap=CARD_GAP)
+    return dict((card, top) for card, (_, top) in positions.items())
+
+
+def _mini_id(card):
+    kind, index = card.rsplit('_', 1)
+    return card if kind == 'detail' else '%s_mini_%s' % (kind, index)
+
+
+@metrics.timed('layout')
+def compute_metaviz_layout(cards, lines):
+    """
+    Returns the top of every card of the MetaViz page, for the normal and the mini cards,
+    both centered on the detail card
+    """
+    tops = _card_layout(cards, lines, CARD_HEIGHTS)
+    mini_tops = _card_layout(cards, lines, MINI_CARD_HEIGHTS)
+    shift = tops.get('detail_0', 0) - mini_tops.get('detail_0', 0)
+    for card, top in mini_tops.items():
+        if card != 'detail_0':
+            tops[_mini_id(card)] = top + shift
+    # keep every card below the top of the page
+    offset = min(tops.values() or [0])
+    return dict((card, top - offset) for card, top in tops.items())
+
+
+def metaviz_layout(mapping):
+    """
+    Returns the layout section of a MetaViz payload, the top of every card by card id
+
+    Layouts only depend on the shape of the page, they are cached and shared by the
+    packages having the same number of cards of every kind
+
+    @param mapping: mapping_ids_uuids section of the payload, giving the cards of the page
+    """
+    cards, lines = _card_graph(mapping)
+    digest = layout.graph_digest('metaviz', cards, lines, CARD_HEIGHTS, MINI_CARD_HEIGHTS)
+    tops = layout.cached_layout(digest, lambda: compute_metaviz_layout(cards, lines))
+    return dict(tops, paramName='layout')
+
+
+def _neighbour_page(code, direction, limit, as_of=None, exclude_generated=False):
+    """
+    Returns the first page of the datasets or models linked to a code by a usage edge
+    """
+    if not code:
+        return {'codes': [], 'total': 0, 'next_cursor': None}
+    return traversal.neighbour_page(code, direction, lineage_model.USAGE_RELATIONS, limit=limit,
+                                    as_of=as_of, exclude_generated=exclude_generated)
+
+
+def _paging(code, direction, page, as_of=None, exclude_generated=False):
+    return {'code': code, 'direction': direction, 'total': page['total'],
+            'limit': len(page['codes']), 'next_cursor': page['next_cursor'],
+            'as_of': history.format_as_of(as_of), 'exclude_generated': exclude_generated}
+
+
+@metrics.timed('collect')
+def collect_lineage(context, pkg_dict, as_of=None):
+    """
+    Collects the lineage information of a package: the model that generated it or the
+    dataset it generates, its producers and the models and datasets using it
+
+    Only the first page of the models using the dataset and of the producers is collected,
+    so the cost stays bounded whatever the number of neighbours, the other pages are read
+    through the datalineage_neighbours action
+
+    The lookups of each graph level are independent of each other and run concurrently
+    when enabled
+
+    @param as_of: Optional datetime, the lineage is collected as it was at that date, see
+                  the history module
+    """
+    limit = traversal.get_page_size()
+    extra_vars = {}
+    if as_of is not None:
+        pkg_dict = history.with_fields_as_of([pkg_dict], as_of)[0]
+    if pkg_dict.get('parent'):
+        # this is a DS
+        results = resolve_codes(context, [pkg_dict['parent']]).get(pkg_dict['parent'], {})
+        extra_vars['datalineage_wasgeneratedby'] = results
+    else:
+        # this is a process/activity/model
+        results = get_usage_datasets(context, [pkg_dict], as_of).get(pkg_dict.get('code'), {})
+        extra_vars['datalineage_generates'] = results
+    if as_of is not None:
+        results = history.with_fields_as_of([results], as_of)[0]
+    # a package without parent generating no dataset is a raw DS, its page shows the
+    # models using it
+    is_dataset = bool(pkg_dict.get('parent') or not results)
+    ds_info = pkg_dict if is_dataset else results
+
+    # the models using the DS and the producers DSs of the current model
+    producers_owner = pkg_dict if pkg_dict.get('producers') else results
+    # a dataset declaring the DS as producer is downstream of it but is no model using it
+    usage_page = _neighbour_page(ds_info.get('code'), traversal.DOWNSTREAM, limit, as_of,
+                                 exclude_generated=True)
+    producers_page = _neighbour_page(producers_owner.get('code'), traversal.UPSTREAM, limit,
+                                     as_of)
+    producer_codes = producers_page['codes']
+    models, producers = run_concurrently(context, [
+        (resolve_codes, usage_page['codes']),
+        (resolve_codes, producer_codes),
+    ])
+    usage_models = get_usage_models(context, ds_info, models, usage_page['codes'])
+    if as_of is not None:
+        usage_models = history.with_fields_as_of(usage_models, as_of)
+
+    # the producers DSs of the models and the DSs they generate
+    models_producer_codes = get_models_producer_codes(usage_models, ds_info, limit)
+    models_producers, usage_datasets = run_concurrently(context, [
+        (resolve_codes, models_producer_codes),
+        (functools.partial(get_usage_datasets, as_of=as_of), usage_models),
+    ])
+    set_models_input_datasets(usage_models, ds_info, models_producers, limit)
+
+    extra_vars['usage_models'] = usage_models
+    extra_vars['usage_datasets'] = usage_datasets
+    extra_vars['detail_data'] = ds_info
+    extra_vars['current_model'] = results if is_dataset else pkg_dict
+    extra_vars['paging'] = {
+        'usage_models': _paging(ds_info.get('code'), traversal.DOWNSTREAM, usage_page, as_of,
+                                exclude_generated=True),
+        'producers': _paging(producers_owner.get('code'), traversal.UPSTREAM, producers_page,
+                             as_of),
+    }
+
+    producers_info = []
+    for ds_code in producer_codes:
+        if ds_code not in producers:
+            logger.debug('No result found for producer [%s] of package [%s]' % (ds_code, pkg_dict['code']) )
+        else:
+            producers_info.append(producers[ds_code])
+    extra_vars['datalineage_producers'] = producers_info
+    # every code looked up, resolved or not, a package getting one of them changes the page
+    extra_vars['referenced_codes'] = set(
+        code for code in [pkg_dict.get('code'), pkg_dict.get('parent')] + usage_page['codes']
+        + producer_codes + list(models_producer_codes) if code)
+    metrics.observe('datalineage_graph_nodes', len(lineage_codes(extra_vars)), graph='page')
+    return extra_vars
+
+
+def build_metaviz_payload(context, pkg_dict, as_of=None):
+    """
+    Builds the MetaViz payload of a package
+
+    The payload is a new object on every call so concurrent requests never share state
+
+    @param as_of: Optional datetime, the payload shows the lineage at that date
+    """
+    return convert_extra_vars_to_metaviz(collect_lineage(context, pkg_dict, as_of))
+
+
+def lineage_codes(extra_vars):
+    """
+    Returns the codes of all the packages taking part in the collected lineage information
+    """
+    packages = [extra_vars['detail_data'], extra_vars['current_model']]
+    packages.extend(extra_vars['datalineage_producers'])
+    packages.extend(extra_vars['usage_datasets'].values())
+    for model_info in extra_vars['usage_models']:
+        packages.append(model_info)
+        packages.extend(model_info.get('input_datasets', []))
+    return set(package['code'] for package in packages if package.get('code'))
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+Metrics module
+Timings, query counts and cache hit ratios of the lineage lookups
+
+The lookup stages are timed with `timer`, the lineage requests are wrapped in
+`request_scope`, which records the number of package_search calls and database queries
+each request made, including the lookups running in the thread pool. Metrics are kept per
+worker process and served in the Prometheus text format at /api/datalineage/metrics, and
+sent to a statsd daemon, which aggregates all the workers, when a statsd host is set:
+
+    ckanext.datalineage.metrics.enabled = false
+    ckanext.datalineage.metrics.public = false    (serve the endpoint to anyone, sysadmins only otherwise)
+    ckanext.datalineage.metrics.statsd_host =      (statsd is not used when empty)
+    ckanext.datalineage.metrics.statsd_port = 8125
+    ckanext.datalineage.metrics.statsd_prefix = datalineage
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import functools
+import logging
+import socket
+import threading
+import time
+
+from ckan.common import config
+from paste.deploy.converters import asbool
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# name -> (type, help, buckets of the histograms)
+METRICS = OrderedDict([
+    ('datalineage_request_seconds',
+     ('histogram', 'Time to serve a lineage request', SECONDS_BUCKETS)),
+    ('datalineage_request_searches',
+     ('histogram', 'package_search calls made by a lineage request', COUNT_BUCKETS)),
+    ('datalineage_request_db_queries',
+     ('histogram', 'Database queries made by a lineage request', COUNT_BUCKETS)),
+    ('datalineage_stage_seconds',
+     ('histogram', 'Time spent in a stage of the lineage lookups', SECONDS_BUCKETS)),
+    ('datalineage_graph_nodes',
+     ('histogram', 'Packages of the lineage graphs built', SIZE_BUCKETS)),
+    ('datalineage_searches_total',
+     ('counter', 'package_search calls of the lineage lookups', None)),
+    ('datalineage_db_queries_total',
+     ('counter', 'Database queries of the lineage requests', None)),
+    ('datalineage_cache_requests_total',
+     ('counter', 'Lookups of the lineage caches by cache and result', None)),
+    ('datalineage_missing_codes_total',
+     ('counter', 'Codes referenced by a package without a package of their own', None)),
+    ('datalineage_skipped_lookups_total',
+     ('counter', 'Lookups skipped because their request ran out of time', None)),
+    ('datalineage_memgraph_load_seconds',
+     ('histogram', 'Time to load the in-memory lineage graph', SECONDS_BUCKETS)),
+    ('datalineage_memgraph_bytes',
+     ('gauge', 'Estimated memory used by the in-memory lineage graph', None)),
+    ('datalineage_memgraph_edges',
+     ('gauge', 'Edges of the in-memory lineage graph, by part (base or overlay)', None)),
+])
+
+DEFAULT_STATSD_PORT = 8125
+DEFAULT_STATSD_PREFIX = 'datalineage'
+
+
+class Registry(object):
+    """
+    In-process store of the counters and histograms of the worker
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = OrderedDict()
+        self._gauges = OrderedDict()
+        self._histograms = OrderedDict()
+
+    def inc(self, name, value, labels):
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, labels):
+        with self._lock:
+            self._gauges[(name, labels)] = value
+
+    def observe(self, name, value, labels):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0, 0]
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text format
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            counters.update(self._gauges)
+            histograms = dict((key, [list(value[0]), value[1], value[2]])
+                              for key, value in self._histograms.items())
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+            if kind in ('counter', 'gauge'):
+                for (metric, labels), value in sorted(counters.items()):
+                    if metric == name:
+                        lines.append('%s%s %s' % (name, _labels(labels), _number(value)))
+                continue
+            for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append('%s_bucket%s %s' % (
+                        name, _labels(labels + (('le', _number(bound)),)), bucket_count))
+                lines.append('%s_bucket%s %s' % (name, _labels(labels + (('le', '+Inf'),)), count))
+                lines.append('%s_sum%s %s' % (name, _labels(labels), _number(total)))
+                lines.append('%s_count%s %s' % (name, _labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, unicode(value).replace('\\', '\\\\')
+                                          .replace('"', '\\"').replace('\n', '\\n'))
+                             for key, value in labels)
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class StatsdClient(object):
+    """
+    Sends the metrics to a statsd daemon over UDP, errors are ignored so a missing daemon
+    never fails a request
+    """
+
+    def __init__(self, host, port=DEFAULT_STATSD_PORT, prefix=DEFAULT_STATSD_PREFIX):
+        self.address = (host, port)
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _name(self, name, labels):
+        # datalineage_stage_seconds{stage="resolve"} -> <prefix>.stage.resolve
+        name = name[len('datalineage_'):] if name.startswith('datalineage_') else name
+        for suffix in ('_total', '_seconds'):
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+        parts = [self.prefix, name] + [unicode(value).replace('.', '_') for _, value in labels]
+        return '.'.join(part for part in parts if part)
+
+    def _send(self, data):
+        try:
+            self._socket.sendto(data.encode('utf-8'), self.address)
+        except (socket.error, UnicodeError) as e:
+            logger.debug('Could not send metric to statsd: %s' % e)
+
+    def inc(self, name, value, labels):
+        self._send('%s:%s|c' % (self._name(name, labels), value))
+
+    def set(self, name, value, labels):
+        self._send('%s:%s|g' % (self._name(name, labels), value))
+
+    def observe(self, name, value, labels):
+        if name.endswith('_seconds'):
+            self._send('%s:%s|ms' % (self._name(name, labels), int(round(value * 1000))))
+        else:
+            self._send('%s:%s|h' % (self._name(name, labels), value))
+
+
+class RequestStats(object):
+    """
+    Queries made by one lineage request, shared with the lookups it runs in the pool
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.db_queries = 0
+
+    def add(self, attribute, value=1):
+        with self._lock:
+            setattr(self, attribute, getattr(self, attribute) + value)
+
+
+_registry = None
+_statsd = None
+_local = threading.local()
+
+
+def metrics_enabled():
+    return _registry is not None
+
+
+def metrics_public():
+    return asbool(config.get('ckanext.datalineage.metrics.public', False))
+
+
+def configure(ckan_config):
+    """
+    Sets up the metrics from the CKAN config
+
+    @param ckan_config: CKAN config
+    """
+    global _registry, _statsd
+    if not asbool(ckan_config.get('ckanext.datalineage.metrics.enabled', False)):
+        _registry = _statsd = None
+        return
+    _registry = Registry()
+    host = ckan_config.get('ckanext.datalineage.metrics.statsd_host')
+    _statsd = StatsdClient(
+        host, int(ckan_config.get('ckanext.datalineage.metrics.statsd_port', DEFAULT_STATSD_PORT)),
+        ckan_config.get('ckanext.datalineage.metrics.statsd_prefix', DEFAULT_STATSD_PREFIX)
+    ) if host else None
+    if not event.contains(Engine, 'before_cursor_execute', _count_db_query):
+        event.listen(Engine, 'before_cursor_execute', _count_db_query)
+
+
+def inc(name, value=1, **labels):
+    """
+    Increments a counter
+
+    @param name: Name of the counter, see METRICS
+    @param labels: Labels of the counter
+    """
+    if _registry is None:
+        return
+    labels = tuple(sorted(labels.items()))
+    _registry.inc(name, value, labels)
+    if _statsd is not None:
+        _statsd.inc(name, value, labels)
+
+
+def gauge(name, value, **labels):
+    """
+    Sets the value of a gauge
+
+    @param name: Name of the gauge, see METRICS
+    @param labels: Labels of the gauge
+    """
+    if _registry is None:
+        return
+    labels = tuple(sorted(labels.items()))
+    _registry.set(name, value, labels)
+    if _statsd is not None:
+        _statsd.set(name, value, labels)
+
+
+def observe(name, value, **labels):
+    """
+    Records a value in a histogram
+
+    @param name: Name of the histogram, see METRICS
+    @param labels: Labels of the histogram
+    """
+    if _registry is None:
+        return
+    labels = tuple(sorted(labels.items()))
+    _registry.observe(name, value, labels)
+    if _statsd is not None:
+        _statsd.observe(name, value, labels)
+
+
+def count_cache(cache, hits, misses):
+    """
+    Records the hits and misses of a lookup in one of the lineage caches (code, layout, snapshot)
+    """
+    if hits:
+        inc('datalineage_cache_requests_total', hits, cache=cache, result='hit')
+    if misses:
+        inc('datalineage_cache_requests_total', misses, cache=cache, result='miss')
+
+
+def count_search():
+    """
+    Records a package_search call of the lineage lookups
+    """
+    if _registry is None:
+        return
+    inc('datalineage_searches_total')
+    stats = current_stats()
+    if stats is not None:
+        stats.add('searches')
+
+
+def _count_db_query(conn, cursor, statement, parameters, context, executemany):
+    # only the queries of the lineage requests are counted
+    stats = current_stats()
+    if stats is not None and _registry is not None:
+        stats.add('db_queries')
+        inc('datalineage_db_queries_total')
+
+
+def current_stats():
+    """
+    Returns the RequestStats of the lineage request running in this thread, None outside
+    of a lineage request
+    """
+    return getattr(_local, 'stats', None)
+
+
+@contextmanager
+def bound(stats):
+    """
+    Makes the queries of this thread count for a request, used by the lookups running in
+    the pool
+    """
+    previous = current_stats()
+    _local.stats = stats
+    try:
+        yield
+    finally:
+        _local.stats = previous
+
+
+@contextmanager
+def request_scope(name):
+    """
+    Times a lineage request and records the queries it made, nested scopes count for the
+    outer one
+
+    @param name: Name of the request, e.g. show_datalineage
+    """
+    if _registry is None or current_stats() is not None:
+        yield
+        return
+    stats = RequestStats()
+    start = time.time()
+    with bound(stats):
+        try:
+            yield
+        finally:
+            observe('datalineage_request_seconds', time.time() - start, request=name)
+            observe('datalineage_request_searches', stats.searches, request=name)
+            observe('datalineage_request_db_queries', stats.db_queries, request=name)
+
+
+@contextmanager
+def timer(stage):
+    """
+    Times a stage of the lineage lookups
+
+    @param stage: Name of the stage, e.g. resolve
+    """
+    if _registry is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        observe('datalineage_stage_seconds', time.time() - start, stage=stage)
+
+
+def timed(stage):
+    """
+    Decorator timing every call of a function as a stage, see timer
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def scoped(name):
+    """
+    Decorator running every call of a function in a request scope, see request_scope
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with request_scope(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render():
+    """
+    Returns the metrics of the worker in the Prometheus text format
+    """
+    return _registry.render() if _registry is not None else ''
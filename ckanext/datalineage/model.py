@@ -0,0 +1,1123 @@
+# -*- coding: utf-8 -*-
+"""
+Model module
+Materialized lineage edges of the data lineage extension
+
+Every edge goes from the upstream code (source) to the downstream code (target) and
+remembers the field of the package that declared it:
+
+    parent:   the model (source) generated the dataset (target)
+    producer: the dataset (source) is used by the model (target), declared by the model
+    consumer: the dataset (source) is used by the model (target), declared by the dataset
+
+The transitive closure of the edges is kept in the datalineage_closure table, see the
+closure module. The packages whose edges changed are logged in the datalineage_graph_change
+table, which the in-memory graphs of the workers follow, see the memgraph module. The
+codes referenced by a package without a package of their own are recorded in the
+datalineage_dangling table, see the dangling module. Every edge is also kept in the
+datalineage_edge_history table with the period it was declared in, see the history module.
+"""
+
+from collections import OrderedDict
+import datetime
+import logging
+
+from sqlalchemy import (Table, Column, Index, types, select, and_, or_, func, exists, literal,
+                        literal_column, tuple_, union)
+from sqlalchemy.dialects import postgresql
+import ckan.model as model
+from ckan.model.meta import metadata, Session
+from ckan.model.types import make_uuid
+
+logger = logging.getLogger(__name__)
+
+RELATION_PARENT = u'parent'
+RELATION_PRODUCER = u'producer'
+RELATION_CONSUMER = u'consumer'
+# relations meaning that the source dataset is an input of the target model
+USAGE_RELATIONS = (RELATION_PRODUCER, RELATION_CONSUMER)
+
+LINEAGE_FIELDS = ('code', 'parent', 'producers', 'consumers')
+
+# maximum number of values in the IN clause of a single query
+QUERY_BATCH_SIZE = 1000
+
+edge_table = Table('datalineage_edge', metadata,
+    Column('id', types.Integer, primary_key=True),
+    Column('package_id', types.UnicodeText, nullable=False),
+    Column('source', types.UnicodeText, nullable=False),
+    Column('target', types.UnicodeText, nullable=False),
+    Column('relation', types.UnicodeText, nullable=False),
+)
+Index('idx_datalineage_edge_package_id', edge_table.c.package_id)
+Index('idx_datalineage_edge_source', edge_table.c.source, edge_table.c.relation)
+Index('idx_datalineage_edge_target', edge_table.c.target, edge_table.c.relation)
+
+# precomputed MetaViz payloads, the version is bumped every time a snapshot is rebuilt
+snapshot_table = Table('datalineage_snapshot', metadata,
+    Column('package_id', types.UnicodeText, primary_key=True),
+    Column('version', types.Integer, nullable=False, default=0),
+    Column('payload', types.UnicodeText),
+    Column('dirty', types.Boolean, nullable=False, default=False),
+    Column('modified', types.DateTime, default=datetime.datetime.utcnow),
+)
+
+# reverse index from the codes of a graph to the snapshots containing them
+snapshot_code_table = Table('datalineage_snapshot_code', metadata,
+    Column('package_id', types.UnicodeText, nullable=False),
+    Column('code', types.UnicodeText, nullable=False),
+)
+Index('idx_datalineage_snapshot_code_code', snapshot_code_table.c.code)
+Index('idx_datalineage_snapshot_code_package_id', snapshot_code_table.c.package_id)
+
+# packages waiting for their deferred reindex, a package is queued once however many times
+# it changes before the queue is flushed
+reindex_queue_table = Table('datalineage_reindex_queue', metadata,
+    Column('package_id', types.UnicodeText, primary_key=True),
+    Column('queued', types.DateTime, nullable=False),
+)
+Index('idx_datalineage_reindex_queue_queued', reindex_queue_table.c.queued)
+
+# every code reachable from a code through one or more edges, a pair can be written twice
+# by concurrent transactions so it is read with distinct
+closure_table = Table('datalineage_closure', metadata,
+    Column('ancestor', types.UnicodeText, nullable=False),
+    Column('descendant', types.UnicodeText, nullable=False),
+)
+Index('idx_datalineage_closure_ancestor', closure_table.c.ancestor, closure_table.c.descendant)
+Index('idx_datalineage_closure_descendant', closure_table.c.descendant, closure_table.c.ancestor)
+
+# packages whose edges changed, read by the in-memory graphs to catch up with the other
+# workers
+graph_change_table = Table('datalineage_graph_change', metadata,
+    Column('id', types.Integer, primary_key=True),
+    Column('package_id', types.UnicodeText, nullable=False),
+    Column('changed', types.DateTime, nullable=False),
+)
+Index('idx_datalineage_graph_change_changed', graph_change_table.c.changed)
+
+# codes referenced by the lineage field of a package that no active package has
+dangling_table = Table('datalineage_dangling', metadata,
+    Column('package_id', types.UnicodeText, nullable=False),
+    Column('code', types.UnicodeText, nullable=False),
+    Column('field', types.UnicodeText, nullable=False),
+    Column('detected', types.DateTime, nullable=False),
+)
+Index('idx_datalineage_dangling_package_id', dangling_table.c.package_id)
+Index('idx_datalineage_dangling_code', dangling_table.c.code)
+
+# the edges with the period they were declared in, valid_to is null while they still are
+edge_history_table = Table('datalineage_edge_history', metadata,
+    Column('id', types.Integer, primary_key=True),
+    Column('package_id', types.UnicodeText, nullable=False),
+    Column('source', types.UnicodeText, nullable=False),
+    Column('target', types.UnicodeText, nullable=False),
+    Column('relation', types.UnicodeText, nullable=False),
+    Column('valid_from', types.DateTime, nullable=False),
+    Column('valid_to', types.DateTime),
+)
+# the edges of a code valid at a date are one range of these indexes
+Index('idx_datalineage_edge_history_source', edge_history_table.c.source,
+      edge_history_table.c.valid_from, edge_history_table.c.valid_to)
+Index('idx_datalineage_edge_history_target', edge_history_table.c.target,
+      edge_history_table.c.valid_from, edge_history_table.c.valid_to)
+Index('idx_datalineage_edge_history_package_id', edge_history_table.c.package_id,
+      edge_history_table.c.valid_to)
+
+TABLES = [edge_table, snapshot_table, snapshot_code_table, reindex_queue_table, closure_table,
+          graph_change_table, dangling_table, edge_history_table]
+
+
+def setup():
+    """
+    Creates the lineage tables if they do not exist yet
+    """
+    if model.meta.engine is None:
+        return
+    for table in TABLES:
+        if not table.exists(bind=model.meta.engine):
+            table.create(bind=model.meta.engine)
+            logger.debug('Created table %s' % table.name)
+
+
+def split_codes(value):
+    """
+    Splits a comma separated list of codes, dropping empty entries
+
+    @param value: Comma separated string of codes
+    """
+    if not value:
+        return []
+    return [code.strip() for code in value.split(',') if code.strip()]
+
+
+def package_edges(code, parent=None, producers=None, consumers=None):
+    """
+    Returns the (source, target, relation) edges declared by the lineage fields of a package
+
+    @param code: Code of the package
+    @param parent: Code of the model that generated the package
+    @param producers: Comma separated codes of the datasets used by the package
+    @param consumers: Comma separated codes of the models using the package
+    """
+    if not code:
+        return []
+    edges = []
+    if parent:
+        edges.append((parent.strip(), code, RELATION_PARENT))
+    for producer in split_codes(producers):
+        edges.append((producer, code, RELATION_PRODUCER))
+    for consumer in split_codes(consumers):
+        edges.append((code, consumer, RELATION_CONSUMER))
+    # a code listed twice only declares one edge
+    return list(OrderedDict.fromkeys(edges))
+
+
+def declaring_code(edges):
+    """
+    Returns the code of the package declaring some edges, None if there are none
+
+    @param edges: List of (source, target, relation) tuples declared by one package
+    """
+    for source, target, relation in edges:
+        return source if relation == RELATION_CONSUMER else target
+    return None
+
+
+def edge_references(edges):
+    """
+    Returns the (code, field) references of the lineage fields declaring some edges, i.e.
+    the codes of the other end of the edges
+
+    @param edges: List of (source, target, relation) tuples declared by one package
+    """
+    references = []
+    for source, target, relation in edges:
+        if relation == RELATION_PARENT:
+            references.append((source, 'parent'))
+        elif relation == RELATION_PRODUCER:
+            references.append((source, 'producers'))
+        else:
+            references.append((target, 'consumers'))
+    return list(OrderedDict.fromkeys(references))
+
+
+def get_linked_pairs(pairs):
+    """
+    Returns the (source, target) pairs linked by at least one edge, of any package
+
+    @param pairs: Iterable of (source, target) tuples
+    """
+    pairs = list(set(pairs))
+    result = set()
+    for start in xrange(0, len(pairs), QUERY_BATCH_SIZE):
+        query = select([edge_table.c.source, edge_table.c.target],
+                       tuple_(edge_table.c.source, edge_table.c.target)
+                       .in_(pairs[start:start + QUERY_BATCH_SIZE])).distinct()
+        result.update((source, target) for source, target in Session.execute(query))
+    return result
+
+
+def _package_edges(package_id):
+    query = select([edge_table.c.source, edge_table.c.target, edge_table.c.relation],
+                   edge_table.c.package_id == package_id)
+    return set(tuple(row) for row in Session.execute(query))
+
+
+def _record_history(package_id, old_edges, new_edges):
+    """
+    Closes the periods of the edges a package no longer declares and opens the periods of
+    the new ones
+    """
+    now = datetime.datetime.utcnow()
+    closed = list(old_edges - new_edges)
+    for start in xrange(0, len(closed), QUERY_BATCH_SIZE):
+        Session.execute(edge_history_table.update().where(and_(
+            edge_history_table.c.package_id == package_id,
+            edge_history_table.c.valid_to == None,
+            tuple_(edge_history_table.c.source, edge_history_table.c.target,
+                   edge_history_table.c.relation).in_(closed[start:start + QUERY_BATCH_SIZE])
+        )).values(valid_to=now))
+    opened = new_edges - old_edges
+    if opened:
+        Session.execute(edge_history_table.insert(), [
+            {'package_id': package_id, 'source': source, 'target': target,
+             'relation': relation, 'valid_from': now}
+            for source, target, relation in opened
+        ])
+
+
+def sync_package_edges(package_id, edges):
+    """
+    Replaces the edges declared by a package and records the change in the edge history,
+    changes are committed with the current session
+
+    Returns the (source, target) pairs linked by the edges of no other package that were
+    added and removed, see the closure module
+
+    @param package_id: Id of the package declaring the edges
+    @param edges: List of (source, target, relation) tuples
+    """
+    old_edges = _package_edges(package_id)
+    _record_history(package_id, old_edges, set(edges))
+    old_pairs = set((source, target) for source, target, _ in old_edges)
+    new_pairs = set((source, target) for source, target, _ in edges)
+    added = new_pairs - old_pairs
+    added -= get_linked_pairs(added)
+    Session.execute(edge_table.delete().where(edge_table.c.package_id == package_id))
+    if edges:
+        Session.execute(edge_table.insert(), [
+            {'package_id': package_id, 'source': source, 'target': target, 'relation': relation}
+            for source, target, relation in edges
+        ])
+    removed = old_pairs - new_pairs
+    removed -= get_linked_pairs(removed)
+    return added, removed
+
+
+def delete_package_edges(package_id):
+    """
+    Removes all the edges declared by a package
+
+    Returns the (source, target) pairs linked by the edges of no other package that were
+    removed
+
+    @param package_id: Id of the package
+    """
+    return sync_package_edges(package_id, [])[1]
+
+
+def iter_edge_pairs():
+    """
+    Yields the distinct (source, target) pairs of all the edges
+    """
+    query = select([edge_table.c.source, edge_table.c.target]).distinct() \
+        .execution_options(stream_results=True)
+    for source, target in Session.execute(query):
+        yield source, target
+
+
+def iter_edges():
+    """
+    Yields the (package_id, source, target, relation) rows of all the edges
+    """
+    query = select([edge_table.c.package_id, edge_table.c.source, edge_table.c.target,
+                    edge_table.c.relation]).execution_options(stream_results=True)
+    for row in Session.execute(query):
+        yield tuple(row)
+
+
+def get_package_edges(package_ids):
+    """
+    Returns a dict mapping each package id to the (source, target, relation) edges it
+    declares, packages without edges included
+
+    @param package_ids: Iterable of package ids
+    """
+    package_ids = list(set(package_ids))
+    result = dict((package_id, []) for package_id in package_ids)
+    for start in xrange(0, len(package_ids), QUERY_BATCH_SIZE):
+        query = select([edge_table.c.package_id, edge_table.c.source, edge_table.c.target,
+                        edge_table.c.relation],
+                       edge_table.c.package_id.in_(package_ids[start:start + QUERY_BATCH_SIZE]))
+        for package_id, source, target, relation in Session.execute(query):
+            result[package_id].append((source, target, relation))
+    return result
+
+
+def record_graph_change(package_id):
+    """
+    Logs a change of the edges of a package, committed with the current session
+
+    @param package_id: Id of the package
+    """
+    Session.execute(graph_change_table.insert().values(
+        package_id=package_id, changed=datetime.datetime.utcnow()))
+
+
+def get_graph_changes(after_id, since):
+    """
+    Returns the (id, package_id) of the changes logged after a change or since a date,
+    oldest first
+
+    @param after_id: Id of the last change read
+    @param since: Datetime
+    """
+    query = select([graph_change_table.c.id, graph_change_table.c.package_id],
+                   or_(graph_change_table.c.id > after_id,
+                       graph_change_table.c.changed >= since)) \
+        .order_by(graph_change_table.c.id)
+    return Session.execute(query).fetchall()
+
+
+def get_last_graph_change():
+    """
+    Returns the id of the last logged change, 0 if there is none
+    """
+    return Session.execute(select([func.max(graph_change_table.c.id)])).scalar() or 0
+
+
+def prune_graph_changes(before):
+    """
+    Removes the changes logged before a date
+
+    @param before: Datetime
+    """
+    Session.execute(graph_change_table.delete().where(graph_change_table.c.changed < before))
+
+
+def _closure_codes(column, other, codes):
+    codes = list(set(code for code in codes if code))
+    result = {}
+    for start in xrange(0, len(codes), QUERY_BATCH_SIZE):
+        query = select([column, other], column.in_(codes[start:start + QUERY_BATCH_SIZE])).distinct()
+        for code, linked in Session.execute(query):
+            result.setdefault(code, set()).add(linked)
+    return result
+
+
+def get_descendants(codes):
+    """
+    Returns a dict mapping each code to the set of the codes reachable from it, codes
+    reaching nothing are left out
+
+    @param codes: Iterable of codes
+    """
+    return _closure_codes(closure_table.c.ancestor, closure_table.c.descendant, codes)
+
+
+def get_ancestors(codes):
+    """
+    Returns a dict mapping each code to the set of the codes reaching it, codes reached by
+    nothing are left out
+
+    @param codes: Iterable of codes
+    """
+    return _closure_codes(closure_table.c.descendant, closure_table.c.ancestor, codes)
+
+
+def count_descendants(code):
+    """
+    Returns the number of codes reachable from a code
+    """
+    query = select([func.count(closure_table.c.descendant.distinct())],
+                   closure_table.c.ancestor == code)
+    return Session.execute(query).scalar()
+
+
+def get_upstream_depth(code, max_depth):
+    """
+    Returns the number of hops from a code to its furthest ancestor, at most max_depth, with
+    one recursive query whose rows are bounded by the number of ancestors times max_depth,
+    cycles included
+
+    @param code: Code of the package
+    @param max_depth: Maximum number of hops
+    """
+    upstream = select([literal(code, types.UnicodeText).label('code'),
+                       literal(0, types.Integer).label('hops')]).cte('upstream', recursive=True)
+    upstream = upstream.union(
+        select([edge_table.c.source, upstream.c.hops + 1],
+               and_(edge_table.c.target == upstream.c.code, upstream.c.hops < max_depth)))
+    return Session.execute(select([func.max(upstream.c.hops)])).scalar() or 0
+
+
+def add_closure_edge(source, target):
+    """
+    Adds the pairs made reachable by a new edge to the closure: every code reaching the
+    source, and the source, now reaches the target and every code it reaches
+
+    @param source: Source code of the edge
+    @param target: Target code of the edge
+    """
+    ancestors = union(
+        select([closure_table.c.ancestor.label('code')], closure_table.c.descendant == source),
+        select([literal(source, types.UnicodeText).label('code')]),
+    ).alias('ancestors')
+    descendants = union(
+        select([closure_table.c.descendant.label('code')], closure_table.c.ancestor == target),
+        select([literal(target, types.UnicodeText).label('code')]),
+    ).alias('descendants')
+    existing = closure_table.alias('existing')
+    query = select([ancestors.c.code, descendants.c.code], and_(
+        ancestors.c.code != descendants.c.code,
+        ~exists().where(and_(existing.c.ancestor == ancestors.c.code,
+                             existing.c.descendant == descendants.c.code))))
+    Session.execute(closure_table.insert().from_select(['ancestor', 'descendant'], query))
+
+
+def delete_closure_pairs(pairs):
+    """
+    Removes (ancestor, descendant) pairs from the closure
+
+    @param pairs: Iterable of (ancestor, descendant) tuples
+    """
+    pairs = list(pairs)
+    for start in xrange(0, len(pairs), QUERY_BATCH_SIZE):
+        Session.execute(closure_table.delete().where(
+            tuple_(closure_table.c.ancestor, closure_table.c.descendant)
+            .in_(pairs[start:start + QUERY_BATCH_SIZE])))
+
+
+def clear_closure():
+    """
+    Removes all the pairs of the closure
+    """
+    Session.execute(closure_table.delete())
+
+
+def _get_edges(column, codes, relations=None):
+    codes = list(set(code for code in codes if code))
+    if not codes:
+        return []
+    condition = column.in_(codes)
+    if relations:
+        condition = and_(condition, edge_table.c.relation.in_(relations))
+    query = select([edge_table.c.source, edge_table.c.target, edge_table.c.relation],
+                   condition).distinct().order_by(edge_table.c.source, edge_table.c.target)
+    return Session.execute(query).fetchall()
+
+
+def get_downstream_edges(codes, relations=None):
+    """
+    Returns the (source, target, relation) edges going out of the given codes
+
+    @param codes: Iterable of codes
+    @param relations: Optional list of relations to restrict the edges to
+    """
+    return _get_edges(edge_table.c.source, codes, relations)
+
+
+def get_upstream_edges(codes, relations=None):
+    """
+    Returns the (source, target, relation) edges coming into the given codes
+
+    @param codes: Iterable of codes
+    @param relations: Optional list of relations to restrict the edges to
+    """
+    return _get_edges(edge_table.c.target, codes, relations)
+
+
+def _neighbour_columns(downstream):
+    if downstream:
+        return edge_table.c.source, edge_table.c.target
+    return edge_table.c.target, edge_table.c.source
+
+
+def _code_order(neighbour):
+    """
+    Returns the neighbour column compared by code point, as Python compares the codes, so
+    the pages and cursors do not depend on the collation of the database and match the
+    ones of the in-memory graph
+    """
+    # the collation is quoted by hand, older versions of sqlalchemy do not quote it
+    return neighbour.op('COLLATE')(literal_column('"C"'))
+
+
+def _valid_at(as_of, table=edge_history_table):
+    return and_(table.c.valid_from <= as_of, or_(table.c.valid_to == None, table.c.valid_to > as_of))
+
+
+def _not_generated(neighbour, as_of=None):
+    """
+    Condition on the neighbours generated by no model, i.e. the neighbours that are not
+    datasets, at a date when given
+    """
+    parent = edge_table.alias() if as_of is None else edge_history_table.alias()
+    condition = and_(parent.c.target == neighbour, parent.c.relation == RELATION_PARENT)
+    if as_of is not None:
+        condition = and_(condition, _valid_at(as_of, parent))
+    return ~exists().where(condition)
+
+
+def _history_columns(downstream):
+    if downstream:
+        return edge_history_table.c.source, edge_history_table.c.target
+    return edge_history_table.c.target, edge_history_table.c.source
+
+
+def get_edges_as_of(codes, as_of, downstream=True, relations=None):
+    """
+    Returns the (source, target, relation) edges of the given codes declared at a date
+
+    @param codes: Iterable of codes
+    @param as_of: Datetime
+    @param downstream: Edges going out of the codes if True, coming in otherwise
+    @param relations: Optional list of relations to restrict the edges to
+    """
+    codes = list(set(code for code in codes if code))
+    if not codes:
+        return []
+    column, _ = _history_columns(downstream)
+    condition = and_(column.in_(codes), _valid_at(as_of))
+    if relations:
+        condition = and_(condition, edge_history_table.c.relation.in_(relations))
+    query = select([edge_history_table.c.source, edge_history_table.c.target,
+                    edge_history_table.c.relation], condition).distinct() \
+        .order_by(edge_history_table.c.source, edge_history_table.c.target)
+    return Session.execute(query).fetchall()
+
+
+def get_neighbour_page_as_of(code, as_of, downstream=True, relations=None, after=None, limit=50,
+                             exclude_generated=False):
+    """
+    Returns a page of the codes linked to a code at a date, see get_neighbour_page
+    """
+    column, neighbour = _history_columns(downstream)
+    condition = and_(column == code, _valid_at(as_of))
+    if relations:
+        condition = and_(condition, edge_history_table.c.relation.in_(relations))
+    if exclude_generated:
+        condition = and_(condition, _not_generated(neighbour, as_of))
+    if after is not None:
+        condition = and_(condition, _code_order(neighbour) > after)
+    query = select([_code_order(neighbour)], condition).distinct() \
+        .order_by(_code_order(neighbour)).limit(limit + 1)
+    codes = [row[0] for row in Session.execute(query)]
+    return codes[:limit], len(codes) > limit
+
+
+def count_neighbours_as_of(code, as_of, downstream=True, relations=None, exclude_generated=False):
+    """
+    Returns the number of codes linked to a code at a date, see get_neighbour_page
+    """
+    column, neighbour = _history_columns(downstream)
+    condition = and_(column == code, _valid_at(as_of))
+    if relations:
+        condition = and_(condition, edge_history_table.c.relation.in_(relations))
+    if exclude_generated:
+        condition = and_(condition, _not_generated(neighbour, as_of))
+    return Session.execute(select([func.count(neighbour.distinct())], condition)).scalar()
+
+
+def get_lineage_fields_as_of(codes, as_of):
+    """
+    Returns a dict mapping each code to the parent, producers and consumers it declared at a
+    date, as comma separated codes
+
+    @param codes: Iterable of codes
+    @param as_of: Datetime
+    """
+    codes = list(set(code for code in codes if code))
+    result = dict((code, {'parent': None, 'producers': [], 'consumers': []}) for code in codes)
+    for start in xrange(0, len(codes), QUERY_BATCH_SIZE):
+        batch = codes[start:start + QUERY_BATCH_SIZE]
+        query = select([edge_history_table.c.source, edge_history_table.c.target,
+                        edge_history_table.c.relation], and_(_valid_at(as_of), or_(
+                            and_(edge_history_table.c.target.in_(batch),
+                                 edge_history_table.c.relation.in_((RELATION_PARENT, RELATION_PRODUCER))),
+                            and_(edge_history_table.c.source.in_(batch),
+                                 edge_history_table.c.relation == RELATION_CONSUMER)))) \
+            .distinct().order_by(edge_history_table.c.source, edge_history_table.c.target)
+        for source, target, relation in Session.execute(query):
+            if relation == RELATION_PARENT:
+                result[target]['parent'] = source
+            elif relation == RELATION_PRODUCER:
+                result[target]['producers'].append(source)
+            else:
+                result[source]['consumers'].append(target)
+    for fields in result.values():
+        fields['producers'] = u','.join(fields['producers']) or None
+        fields['consumers'] = u','.join(fields['consumers']) or None
+    return result
+
+
+def iter_package_activities(activity_types):
+    """
+    Yields the (package_id, timestamp, activity_type, data) of the activities of all the
+    packages, grouped by package and oldest first
+
+    @param activity_types: Activity types to read, e.g. changed package
+    """
+    query = Session.query(model.Activity.object_id, model.Activity.timestamp,
+                          model.Activity.activity_type, model.Activity.data) \
+        .filter(model.Activity.activity_type.in_(activity_types)) \
+        .order_by(model.Activity.object_id, model.Activity.timestamp) \
+        .execution_options(stream_results=True)
+    for row in query.yield_per(1000):
+        yield tuple(row)
+
+
+def get_package_dates(package_ids):
+    """
+    Returns a dict mapping each package id to its (metadata_created, metadata_modified)
+
+    @param package_ids: Iterable of package ids
+    """
+    package_ids = list(set(package_ids))
+    result = {}
+    for start in xrange(0, len(package_ids), QUERY_BATCH_SIZE):
+        query = Session.query(model.Package.id, model.Package.metadata_created,
+                              model.Package.metadata_modified) \
+            .filter(model.Package.id.in_(package_ids[start:start + QUERY_BATCH_SIZE]))
+        for package_id, created, modified in query:
+            result[package_id] = (created, modified)
+    return result
+
+
+def replace_edge_history(periods):
+    """
+    Replaces the whole edge history
+
+    @param periods: List of (package_id, source, target, relation, valid_from, valid_to)
+    """
+    Session.execute(edge_history_table.delete())
+    keys = ('package_id', 'source', 'target', 'relation', 'valid_from', 'valid_to')
+    for start in xrange(0, len(periods), QUERY_BATCH_SIZE):
+        Session.execute(edge_history_table.insert(),
+                        [dict(zip(keys, period)) for period in periods[start:start + QUERY_BATCH_SIZE]])
+
+
+def get_neighbour_page(code, downstream=True, relations=None, after=None, limit=50,
+                       exclude_generated=False):
+    """
+    Returns a page of the codes linked to a code, ordered by code, and whether more follow
+
+    @param code: Code whose neighbours are listed
+    @param downstream: List the targets of the edges going out of the code if True, the
+                       sources of the edges coming in otherwise
+    @param relations: Optional list of relations to restrict the edges to
+    @param after: Only list the codes coming after this one, i.e. the last code of the
+                  previous page
+    @param limit: Maximum number of codes in the page
+    @param exclude_generated: Leave out the codes generated by a model, i.e. the datasets
+    """
+    column, neighbour = _neighbour_columns(downstream)
+    condition = column == code
+    if relations:
+        condition = and_(condition, edge_table.c.relation.in_(relations))
+    if exclude_generated:
+        condition = and_(condition, _not_generated(neighbour))
+    if after is not None:
+        condition = and_(condition, _code_order(neighbour) > after)
+    query = select([_code_order(neighbour)], condition).distinct() \
+        .order_by(_code_order(neighbour)).limit(limit + 1)
+    codes = [row[0] for row in Session.execute(query)]
+    return codes[:limit], len(codes) > limit
+
+
+def count_neighbours(code, downstream=True, relations=None, exclude_generated=False):
+    """
+    Returns the number of codes linked to a code, see get_neighbour_page
+    """
+    column, neighbour = _neighbour_columns(downstream)
+    condition = column == code
+    if relations:
+        condition = and_(condition, edge_table.c.relation.in_(relations))
+    if exclude_generated:
+        condition = and_(condition, _not_generated(neighbour))
+    query = select([func.count(neighbour.distinct())], condition)
+    return Session.execute(query).scalar()
+
+
+def get_package_codes(package_id):
+    """
+    Returns all the codes linked by the edges a package declared
+
+    @param package_id: Id of the package
+    """
+    query = select([edge_table.c.source, edge_table.c.target],
+                   edge_table.c.package_id == package_id)
+    codes = set()
+    for source, target in Session.execute(query):
+        codes.update((source, target))
+    return codes
+
+
+def get_neighbour_codes(codes):
+    """
+    Returns the codes linked to the given codes by an edge in either direction, including
+    the given codes
+
+    @param codes: Iterable of codes
+    """
+    codes = set(code for code in codes if code)
+    if not codes:
+        return codes
+    query = select([edge_table.c.source, edge_table.c.target],
+                   or_(edge_table.c.source.in_(codes), edge_table.c.target.in_(codes)))
+    result = set(codes)
+    for source, target in Session.execute(query):
+        result.update((source, target))
+    return result
+
+
+def get_package_versions(codes):
+    """
+    Returns the (id, metadata_modified) of the active packages having one of the codes
+
+    @param codes: Iterable of codes
+    """
+    codes = list(set(code for code in codes if code))
+    if not codes:
+        return []
+    query = Session.query(model.Package.id, model.Package.metadata_modified) \
+        .join(model.PackageExtra, model.Package.id == model.PackageExtra.package_id) \
+        .filter(model.Package.state == u'active') \
+        .filter(model.PackageExtra.state == u'active') \
+        .filter(model.PackageExtra.key == u'code') \
+        .filter(model.PackageExtra.value.in_(codes)) \
+        .order_by(model.Package.id)
+    return query.all()
+
+
+def get_generated_codes(model_codes, edge_source=None):
+    """
+    Returns a dict mapping each model code to the codes of the datasets it generated
+
+    @param model_codes: Iterable of model codes
+    @param edge_source: Optional edge source to read the edges from, see the traversal module
+    """
+    result = {}
+    edges = (edge_source.downstream(model_codes, [RELATION_PARENT]) if edge_source is not None
+             else get_downstream_edges(model_codes, [RELATION_PARENT]))
+    for source, target, _ in edges:
+        result.setdefault(source, []).append(target)
+    return result
+
+
+def get_code_packages(codes):
+    """
+    Returns a dict mapping each code to the id of the active package having it, codes
+    without a package are left out
+
+    @param codes: Iterable of codes
+    """
+    codes = list(set(code for code in codes if code))
+    result = {}
+    for start in xrange(0, len(codes), QUERY_BATCH_SIZE):
+        query = Session.query(model.PackageExtra.value, model.PackageExtra.package_id) \
+            .join(model.Package, model.Package.id == model.PackageExtra.package_id) \
+            .filter(model.Package.state == u'active') \
+            .filter(model.PackageExtra.state == u'active') \
+            .filter(model.PackageExtra.key == u'code') \
+            .filter(model.PackageExtra.value.in_(codes[start:start + QUERY_BATCH_SIZE]))
+        result.update(query.all())
+    return result
+
+
+def iter_codes_without_package():
+    """
+    Yields the codes linked by an edge that no active package has, in code order
+    """
+    codes = union(select([edge_table.c.source.label('code')]),
+                  select([edge_table.c.target.label('code')])).alias('codes')
+    extra_table = model.package_extra_table
+    package_table = model.package_table
+    has_package = exists().where(and_(
+        extra_table.c.package_id == package_table.c.id,
+        package_table.c.state == u'active',
+        extra_table.c.state == u'active',
+        extra_table.c.key == u'code',
+        extra_table.c.value == codes.c.code))
+    query = select([codes.c.code], ~has_package).order_by(codes.c.code) \
+        .execution_options(stream_results=True)
+    for row in Session.execute(query):
+        yield row[0]
+
+
+def get_private_code_owners(codes):
+    """
+    Returns a dict mapping each code of an active private package to the id of the
+    organization owning the package
+
+    @param codes: Iterable of codes
+    """
+    codes = list(set(code for code in codes if code))
+    result = {}
+    for start in xrange(0, len(codes), QUERY_BATCH_SIZE):
+        query = Session.query(model.PackageExtra.value, model.Package.owner_org) \
+            .join(model.Package, model.Package.id == model.PackageExtra.package_id) \
+            .filter(model.Package.state == u'active') \
+            .filter(model.Package.private == True) \
+            .filter(model.PackageExtra.state == u'active') \
+            .filter(model.PackageExtra.key == u'code') \
+            .filter(model.PackageExtra.value.in_(codes[start:start + QUERY_BATCH_SIZE]))
+        result.update(query.all())
+    return result
+
+
+def sync_package_dangling(package_id, references):
+    """
+    Replaces the dangling references of a package, detected now
+
+    @param package_id: Id of the package
+    @param references: List of the (code, field) references without a package
+    """
+    Session.execute(dangling_table.delete().where(dangling_table.c.package_id == package_id))
+    if references:
+        now = datetime.datetime.utcnow()
+        Session.execute(dangling_table.insert(), [
+            {'package_id': package_id, 'code': code, 'field': field, 'detected': now}
+            for code, field in references
+        ])
+
+
+def delete_dangling_code(code):
+    """
+    Removes the references to a code, which a package now has
+    """
+    Session.execute(dangling_table.delete().where(dangling_table.c.code == code))
+
+
+def add_dangling_code(code):
+    """
+    Records the references of the other packages to a code whose package went away
+    """
+    query = select([edge_table.c.package_id, edge_table.c.source, edge_table.c.target,
+                    edge_table.c.relation],
+                   or_(edge_table.c.source == code, edge_table.c.target == code))
+    references = OrderedDict()
+    for package_id, source, target, relation in Session.execute(query):
+        for reference in edge_references([(source, target, relation)]):
+            if reference[0] == code:
+                references[(package_id,) + reference] = True
+    delete_dangling_code(code)
+    if references:
+        now = datetime.datetime.utcnow()
+        Session.execute(dangling_table.insert(), [
+            {'package_id': package_id, 'code': code, 'field': field, 'detected': now}
+            for package_id, code, field in references
+        ])
+
+
+def clear_dangling():
+    """
+    Removes all the dangling references
+    """
+    Session.execute(dangling_table.delete())
+
+
+def get_dangling(code=None, limit=None, offset=0):
+    """
+    Returns the (package_id, package name, code, field, detected) dangling references,
+    ordered by code, and their total number
+
+    @param code: Only list the references to this code
+    @param limit: Maximum number of references returned
+    @param offset: Number of references skipped
+    """
+    condition = dangling_table.c.code == code if code else None
+    count = select([func.count()]).select_from(dangling_table)
+    query = select([dangling_table.c.package_id, model.package_table.c.name,
+                    dangling_table.c.code, dangling_table.c.field, dangling_table.c.detected],
+                   from_obj=[dangling_table.outerjoin(
+                       model.package_table, model.package_table.c.id == dangling_table.c.package_id)])
+    if condition is not None:
+        count = count.where(condition)
+        query = query.where(condition)
+    query = query.order_by(dangling_table.c.code, model.package_table.c.name,
+                           dangling_table.c.field).offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return Session.execute(query).fetchall(), Session.execute(count).scalar()
+
+
+def get_lineage_extras(package_ids):
+    """
+    Returns a dict mapping each package id to a dict of its lineage extras rows by key,
+    deleted extras included so they can be brought back
+
+    @param package_ids: Iterable of package ids
+    """
+    extra_table = model.package_extra_table
+    package_ids = list(set(package_ids))
+    result = dict((package_id, {}) for package_id in package_ids)
+    for start in xrange(0, len(package_ids), QUERY_BATCH_SIZE):
+        query = select([extra_table.c.id, extra_table.c.package_id, extra_table.c.key,
+                        extra_table.c.value, extra_table.c.state],
+                       and_(extra_table.c.package_id.in_(package_ids[start:start + QUERY_BATCH_SIZE]),
+                            extra_table.c.key.in_(LINEAGE_FIELDS)))
+        for row in Session.execute(query):
+            result[row.package_id][row.key] = row
+    return result
+
+
+def write_lineage_extras(package_id, extras, values):
+    """
+    Writes lineage extras of a package with plain SQL statements, which unlike changes made
+    through the ORM do not trigger the synchronous reindex of the package on commit
+
+    @param package_id: Id of the package
+    @param extras: Current extras rows of the package by key, see get_lineage_extras
+    @param values: Dict of the lineage fields to write
+    """
+    extra_table = model.package_extra_table
+    for key, value in values.items():
+        extra = extras.get(key)
+        if extra is None:
+            Session.execute(extra_table.insert().values(
+                id=make_uuid(), package_id=package_id, key=key, value=value,
+                state=u'active'))
+        elif extra.value != value or extra.state != u'active':
+            Session.execute(extra_table.update().where(extra_table.c.id == extra.id)
+                            .values(value=value, state=u'active'))
+
+
+def touch_packages(package_ids):
+    """
+    Sets the modification date of packages to now, with plain SQL statements
+
+    @param package_ids: List of package ids
+    """
+    now = datetime.datetime.utcnow()
+    for start in xrange(0, len(package_ids), QUERY_BATCH_SIZE):
+        Session.execute(model.package_table.update()
+                        .where(model.package_table.c.id.in_(package_ids[start:start + QUERY_BATCH_SIZE]))
+                        .values(metadata_modified=now))
+
+
+def iter_package_lineage(after_id=None):
+    """
+    Yields (package, fields) for every active package with lineage extras, ordered by id,
+    where package holds the id, name and title of the package and fields maps the lineage
+    field names to their values
+
+    The extras are read through a server side cursor so memory use does not grow with the
+    number of packages
+
+    @param after_id: Only yield the packages whose id comes after this one
+    """
+    query = Session.query(model.PackageExtra.package_id,
+                          model.Package.name,
+                          model.Package.title,
+                          model.PackageExtra.key,
+                          model.PackageExtra.value) \
+        .join(model.Package, model.Package.id == model.PackageExtra.package_id) \
+        .filter(model.Package.state == u'active') \
+        .filter(model.PackageExtra.state == u'active') \
+        .filter(model.PackageExtra.key.in_(LINEAGE_FIELDS))
+    if after_id is not None:
+        query = query.filter(model.PackageExtra.package_id > after_id)
+    query = query.order_by(model.PackageExtra.package_id) \
+        .execution_options(stream_results=True)
+    package, fields = None, {}
+    for package_id, name, title, key, value in query.yield_per(1000):
+        if package is None or package_id != package['id']:
+            if package is not None:
+                yield package, fields
+            package, fields = {'id': package_id, 'name': name, 'title': title}, {}
+        fields[key] = value
+    if package is not None:
+        yield package, fields
+
+
+def get_snapshot(package_id):
+    """
+    Returns the snapshot row of a package, or None if there is none
+
+    @param package_id: Id of the package
+    """
+    query = select([snapshot_table], snapshot_table.c.package_id == package_id)
+    return Session.execute(query).first()
+
+
+def save_snapshot(package_id, payload, codes):
+    """
+    Stores the payload of a package as a clean snapshot with a new version, changes are
+    committed with the current session
+
+    @param package_id: Id of the package
+    @param payload: Serialized MetaViz payload
+    @param codes: Codes referenced by the graph, with or without a package
+    """
+    # two first builds of a snapshot both insert it, the second insert is skipped and its
+    # update waits for the first transaction, which also serializes the codes below
+    Session.execute(postgresql.insert(snapshot_table)
+                    .values(package_id=package_id, version=0, dirty=True)
+                    .on_conflict_do_nothing(index_elements=['package_id']))
+    version = Session.execute(snapshot_table.update()
+                              .where(snapshot_table.c.package_id == package_id)
+                              .values(version=snapshot_table.c.version + 1, payload=payload,
+                                      dirty=False, modified=datetime.datetime.utcnow())
+                              .returning(snapshot_table.c.version)).scalar()
+    Session.execute(snapshot_code_table.delete()
+                    .where(snapshot_code_table.c.package_id == package_id))
+    if codes:
+        Session.execute(snapshot_code_table.insert(), [
+            {'package_id': package_id, 'code': code} for code in set(codes)
+        ])
+    return version
+
+
+def delete_snapshot(package_id):
+    """
+    Removes the snapshot of a package
+
+    @param package_id: Id of the package
+    """
+    Session.execute(snapshot_table.delete().where(snapshot_table.c.package_id == package_id))
+    Session.execute(snapshot_code_table.delete()
+                    .where(snapshot_code_table.c.package_id == package_id))
+
+
+def mark_snapshots_dirty(codes):
+    """
+    Marks dirty all the snapshots whose graph contains one of the codes
+
+    Returns the ids of the packages whose snapshot was marked
+
+    @param codes: Iterable of codes
+    """
+    codes = list(set(code for code in codes if code))
+    if not codes:
+        return []
+    query = select([snapshot_code_table.c.package_id],
+                   snapshot_code_table.c.code.in_(codes)).distinct()
+    package_ids = [row[0] for row in Session.execute(query)]
+    if package_ids:
+        Session.execute(snapshot_table.update()
+                        .where(snapshot_table.c.package_id.in_(package_ids)),
+                        {'dirty': True})
+    return package_ids
+
+
+def get_dirty_snapshots():
+    """
+    Returns the ids of the packages whose snapshot has to be rebuilt
+    """
+    query = select([snapshot_table.c.package_id], snapshot_table.c.dirty == True)
+    return [row[0] for row in Session.execute(query)]
+
+
+def queue_reindex(package_ids):
+    """
+    Adds packages to the reindex queue, packages already queued get the current time
+
+    The rows are upserted, so concurrent transactions queueing the same package do not
+    conflict, in id order so they lock the rows in the same order
+
+    @param package_ids: List of package ids
+    """
+    now = datetime.datetime.utcnow()
+    package_ids = sorted(set(package_ids))
+    for start in xrange(0, len(package_ids), QUERY_BATCH_SIZE):
+        insert = postgresql.insert(reindex_queue_table).values(
+            [{'package_id': package_id, 'queued': now}
+             for package_id in package_ids[start:start + QUERY_BATCH_SIZE]])
+        Session.execute(insert.on_conflict_do_update(
+            index_elements=['package_id'], set_={'queued': insert.excluded.queued}))
+
+
+def get_reindex_queue(until):
+    """
+    Returns the ids of the packages queued for reindex up to a date, oldest first
+
+    @param until: Datetime
+    """
+    query = select([reindex_queue_table.c.package_id], reindex_queue_table.c.queued <= until) \
+        .order_by(reindex_queue_table.c.queued)
+    return [row[0] for row in Session.execute(query)]
+
+
+def dequeue_reindex(package_ids, until):
+    """
+    Removes packages from the reindex queue, unless they were queued again after a date
+
+    @param package_ids: List of package ids
+    @param until: Datetime
+    """
+    for start in xrange(0, len(package_ids), QUERY_BATCH_SIZE):
+        Session.execute(reindex_queue_table.delete().where(and_(
+            reindex_queue_table.c.package_id.in_(package_ids[start:start + QUERY_BATCH_SIZE]),
+            reindex_queue_table.c.queued <= until)))
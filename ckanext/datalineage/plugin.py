@@ -2,30 +2,82 @@
 import ckan.plugins as plugins
 import ckan.plugins.toolkit as tk
 
-from controllers.utils import get_title_for_code
+from controllers.utils import get_title_for_code, resolve_codes_for_view
+import cache
+import memgraph
+import metrics
+import model as lineage_model
+import reindex
+import resolver
+import snapshot
+import stats
+import sync
+from logic import action, auth
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def get_lineage_value(pkg_dict, key):
+    """
+    Retrieves a lineage field from a package dict, the field is either a top level key
+    or still stored in the extras depending on the schema the dict went through
+
+    @param pkg_dict: Package dict
+    @param key: Name of the lineage field (code, parent, producers, consumers)
+    """
+    if pkg_dict.get(key):
+        return pkg_dict[key]
+    for extra in pkg_dict.get('extras', None) or []:
+        if extra.get('key') == key:
+            return extra.get('value')
+    return None
+
+
 class DatalineagePlugin(plugins.SingletonPlugin, tk.DefaultDatasetForm):
     plugins.implements(plugins.IConfigurer)
     plugins.implements(plugins.IDatasetForm)
     plugins.implements(plugins.IRoutes)
+    plugins.implements(plugins.IConfigurable)
+    plugins.implements(plugins.IPackageController, inherit=True)
+    plugins.implements(plugins.IActions)
+    plugins.implements(plugins.IAuthFunctions)
 
     # Declare that this plugin will implement ITemplateHelpers.
     plugins.implements(plugins.ITemplateHelpers)
 
     # ITemplateHelpers
     def get_helpers(self):
-        '''Register the get_title_for_code() function above as a template
-        helper function.
+        '''Register the get_title_for_code(), resolve_codes_for_view() and
+        stats_enabled() functions as template helper functions.
 
         '''
         # Template helper function names should begin with the name of the
         # extension they belong to, to avoid clashing with functions from
         # other extensions.
-        return {'datalineage_get_title_for_code': get_title_for_code}
+        return {'datalineage_get_title_for_code': get_title_for_code,
+                'datalineage_resolve_codes': resolve_codes_for_view,
+                'datalineage_stats_enabled': stats.stats_enabled}
+
+    # IActions
+    def get_actions(self):
+        return {'datalineage_graph': action.datalineage_graph,
+                'datalineage_neighbours': action.datalineage_neighbours,
+                'datalineage_impact': action.datalineage_impact,
+                'datalineage_bulk_upsert': action.datalineage_bulk_upsert,
+                'datalineage_dangling': action.datalineage_dangling,
+                'datalineage_update': action.datalineage_update}
+
+    # IAuthFunctions
+    def get_auth_functions(self):
+        return {'datalineage_graph': auth.datalineage_graph,
+                'datalineage_neighbours': auth.datalineage_neighbours,
+                'datalineage_impact': auth.datalineage_impact,
+                'datalineage_export': auth.datalineage_export,
+                'datalineage_metrics': auth.datalineage_metrics,
+                'datalineage_bulk_upsert': auth.datalineage_bulk_upsert,
+                'datalineage_dangling': auth.datalineage_dangling,
+                'datalineage_update': auth.datalineage_update}
 
     # IRoutes
     def after_map(self, map):
@@ -35,6 +87,15 @@ class DatalineagePlugin(plugins.SingletonPlugin, tk.DefaultDatasetForm):
         map.connect('dataset_lineage', '/dataset/lineage/{id}',
                   controller='ckanext.datalineage.controllers.datalineage:DataLineageController',
                   action='show_datalineage', ckan_icon='sitemap')
+        map.connect('dataset_lineage_graph', '/api/datalineage/graph/{id}',
+                  controller='ckanext.datalineage.controllers.datalineage:DataLineageController',
+                  action='show_graph')
+        map.connect('dataset_lineage_export', '/api/datalineage/export',
+                  controller='ckanext.datalineage.controllers.datalineage:DataLineageController',
+                  action='export_lineage')
+        map.connect('dataset_lineage_metrics', '/api/datalineage/metrics',
+                  controller='ckanext.datalineage.controllers.datalineage:DataLineageController',
+                  action='show_metrics')
         return map
     
     def before_map(self, map):
@@ -50,8 +111,62 @@ class DatalineagePlugin(plugins.SingletonPlugin, tk.DefaultDatasetForm):
         """
         tk.add_template_directory(config_, 'templates')
         tk.add_public_directory(config_, 'public')
+        # the whole directory is the library, the dojo loader fetches the dijit and dojox
+        # modules MetaViz requires at runtime from the location of dojo.js
         tk.add_resource('fanstatic', 'datalineage')
-    
+
+    # IConfigurable
+
+    def configure(self, config_):
+        """
+        Set up the shared code cache, the metrics, the lineage tables, the in-memory graph,
+        the snapshots and the deferred reindexing
+        """
+        cache.configure(config_)
+        sync.setup()
+        metrics.configure(config_)
+        lineage_model.setup()
+        memgraph.configure(config_)
+        if snapshot.snapshots_enabled():
+            snapshot.setup()
+        # the packages whose statistics changed are reindexed through the deferred queue
+        if reindex.deferred_reindex_enabled() or stats.stats_enabled():
+            reindex.setup()
+
+    # IPackageController
+
+    def before_index(self, pkg_dict):
+        """
+        Index the lineage fields into exact match fields, which the lineage lookups filter on,
+        and the lineage statistics the search sorts on
+        """
+        pkg_dict.update(resolver.lineage_index_fields(pkg_dict))
+        pkg_dict.update(stats.stats_index_fields(pkg_dict))
+        return pkg_dict
+
+    def after_create(self, context, pkg_dict):
+        self._sync_lineage(context, pkg_dict)
+
+    def after_update(self, context, pkg_dict):
+        self._sync_lineage(context, pkg_dict)
+
+    def after_delete(self, context, pkg_dict):
+        package_id = pkg_dict.get('id') or context.get('id')
+        if not package_id:
+            return
+        sync.forget_lineage(package_id, get_lineage_value(pkg_dict, 'code'))
+
+    def _sync_lineage(self, context, pkg_dict):
+        """
+        Keep the materialized edges, the snapshots and the cached lookups in sync with a
+        changed package
+        """
+        package_id = pkg_dict.get('id') or context.get('id')
+        if not package_id:
+            return
+        sync.sync_lineage(package_id, dict((field, get_lineage_value(pkg_dict, field))
+                                           for field in lineage_model.LINEAGE_FIELDS))
+
     # Helpers
     def _modify_package_schema(self, schema):
         # our custom fields
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Reindex module
+Batched and deferred search index updates of the packages whose lineage changed
+
+Lineage edits made through the lineage actions are written with plain SQL, so CKAN does not
+reindex the packages on commit. They are reindexed right after the commit, in batches
+sharing one solr commit, or with deferred reindexing enabled queued and reindexed by a
+background job at most once per flush interval, however many times they changed:
+
+    ckanext.datalineage.reindex.deferred = false
+    ckanext.datalineage.reindex.interval = 60  (seconds between an edit and the flush)
+
+The flush job is scheduled `interval` seconds ahead with rq-scheduler, whose `rqscheduler`
+process moves it to the queue when it is due. Without rq-scheduler the job is queued right
+away, and only the edits made while it waits for a worker are coalesced.
+
+`paster datalineage flush-reindex` flushes the queue on demand.
+"""
+
+import datetime
+import logging
+
+import ckan.model as model
+import ckan.plugins.toolkit as tk
+from ckan.common import config
+from ckan.lib import jobs
+from ckan.lib import search
+from paste.deploy.converters import asbool
+from sqlalchemy import event
+
+from ckanext.datalineage import model as lineage_model
+
+try:
+    from rq_scheduler import Scheduler
+except ImportError:
+    Scheduler = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 60
+# number of packages reindexed between two solr commits
+BATCH_SIZE = 500
+PENDING_KEY = 'datalineage_pending_reindex_flush'
+# redis key set while a flush job waits, it expires in case the job gets lost
+PENDING_JOB_KEY = 'ckanext-datalineage:reindex-flush'
+# seconds a scheduled job can be late, rqscheduler checks the due jobs every minute
+PENDING_JOB_MARGIN = 120
+JOB_TITLE = 'datalineage reindex flush'
+
+
+def deferred_reindex_enabled():
+    return asbool(config.get('ckanext.datalineage.reindex.deferred', False))
+
+
+def flush_interval():
+    return int(config.get('ckanext.datalineage.reindex.interval', DEFAULT_INTERVAL))
+
+
+def reindex_packages(package_ids, batch_size=BATCH_SIZE):
+    """
+    Reindexes packages, committing the search index once per batch
+    """
+    for start in xrange(0, len(package_ids), batch_size):
+        batch = package_ids[start:start + batch_size]
+        search.rebuild(package_ids=batch, defer_commit=True)
+        search.commit()
+        logger.info('Reindexed %s of %s packages' % (start + len(batch), len(package_ids)))
+
+
+def defer_reindex(package_ids):
+    """
+    Queues packages for reindex in the current transaction, a flush job is queued once the
+    transaction is committed if none is pending
+
+    @param package_ids: List of package ids
+    """
+    if package_ids:
+        lineage_model.queue_reindex(package_ids)
+        model.Session.info[PENDING_KEY] = True
+
+
+def flush():
+    """
+    Reindexes the queued packages
+
+    Returns the number of reindexed packages
+    """
+    until = datetime.datetime.utcnow()
+    package_ids = lineage_model.get_reindex_queue(until)
+    if package_ids:
+        reindex_packages(package_ids)
+        lineage_model.dequeue_reindex(package_ids, until)
+        model.Session.commit()
+    return len(package_ids)
+
+
+def flush_job():
+    """
+    Background job flushing the reindex queue, a new job is queued for the packages queued
+    in the meantime
+    """
+    # the edits committed from now on queue the next job
+    jobs.get_queue().connection.delete(PENDING_JOB_KEY)
+    count = flush()
+    logger.info('Flushed the lineage reindex queue, %s packages reindexed' % count)
+    if lineage_model.get_reindex_queue(datetime.datetime.utcnow()):
+        _enqueue_flush_job()
+
+
+def _enqueue_flush_job():
+    """
+    Schedules a flush job `interval` seconds ahead, unless one is pending already
+    """
+    try:
+        connection = jobs.get_queue().connection
+        interval = flush_interval()
+        if not connection.set(PENDING_JOB_KEY, 1, nx=True, ex=interval + PENDING_JOB_MARGIN):
+            return
+    except Exception as e:
+        # the queue is still flushed by the next edit or by paster datalineage flush-reindex
+        logger.warning('Could not queue the lineage reindex flush: %s' % e)
+        return
+    try:
+        if Scheduler is None:
+            tk.enqueue_job(flush_job, title=JOB_TITLE)
+            return
+        scheduler = Scheduler(queue_name=jobs.get_queue().name, connection=connection)
+        job = scheduler.enqueue_in(datetime.timedelta(seconds=interval), flush_job,
+                                   timeout=jobs.DEFAULT_JOB_TIMEOUT)
+        job.meta['title'] = JOB_TITLE
+        job.save()
+    except Exception as e:
+        connection.delete(PENDING_JOB_KEY)
+        logger.warning('Could not queue the lineage reindex flush: %s' % e)
+
+
+def _enqueue_pending(session):
+    if session.info.pop(PENDING_KEY, None):
+        _enqueue_flush_job()
+
+
+def _drop_pending(session, previous_transaction):
+    session.info.pop(PENDING_KEY, None)
+
+
+def setup():
+    """
+    Hooks the queueing of the flush jobs into the session
+    """
+    if not event.contains(model.Session, 'after_commit', _enqueue_pending):
+        event.listen(model.Session, 'after_commit', _enqueue_pending)
+        event.listen(model.Session, 'after_soft_rollback', _drop_pending)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Resolver module
+Resolves lineage codes to their packages in batches
+"""
+
+from ckan.common import OrderedDict, config
+import ckan.logic as logic
+from paste.deploy.converters import asbool
+
+from ckanext.datalineage import metrics
+from ckanext.datalineage.cache import get_code_cache
+from ckanext.datalineage.concurrency import run_concurrently
+from ckanext.datalineage.model import LINEAGE_FIELDS, get_code_packages, split_codes
+
+get_action = logic.get_action
+
+# maximum number of codes OR-ed together in a single package_search call
+SEARCH_BATCH_SIZE = 50
+# CKAN caps the rows returned by package_search at 1000 by default
+SEARCH_MAX_ROWS = 1000
+
+# the lineage fields are also indexed into these exact match fields, vocab_* fields are
+# multivalued strings in the CKAN solr schema
+INDEX_FIELD_PREFIX = 'vocab_datalineage_'
+
+# index fields needed to build the lineage nodes, everything else of the package is left in solr
+NODE_INDEX_FIELDS = ['id', 'name', 'title', 'notes', 'url', 'dataset_type', 'capacity',
+                     'organization', 'tags', 'metadata_created', 'metadata_modified',
+                     'extras_code', 'extras_parent', 'extras_producers', 'extras_consumers']
+
+
+def make_node(doc):
+    """
+    Converts a search index document to a lineage node
+
+    Nodes are plain dicts holding the few package fields the lineage views and actions
+    use, with the same keys as a package dict so both can be handled alike
+
+    @param doc: Search index document with the NODE_INDEX_FIELDS fields
+    """
+    organization = doc.get('organization')
+    return {
+        'id': doc.get('id'),
+        'name': doc.get('name'),
+        'title': doc.get('title'),
+        'notes': doc.get('notes'),
+        'url': doc.get('url'),
+        'type': doc.get('dataset_type'),
+        'private': doc.get('capacity') == 'private',
+        'organization': {'name': organization} if organization else {},
+        'tags': doc.get('tags') or [],
+        'metadata_created': doc.get('metadata_created'),
+        'metadata_modified': doc.get('metadata_modified'),
+        'code': doc.get('extras_code'),
+        'parent': doc.get('extras_parent'),
+        'producers': doc.get('extras_producers'),
+        'consumers': doc.get('extras_consumers'),
+    }
+
+
+def index_field(field):
+    """
+    Returns the name of the exact match index field of a lineage field
+
+    @param field: Name of the lineage field (code, parent, producers, consumers)
+    """
+    return INDEX_FIELD_PREFIX + field
+
+
+def lineage_index_fields(pkg_dict):
+    """
+    Returns the exact match index fields of a package, each one holding the list of codes
+    of a lineage field
+
+    @param pkg_dict: Package dict being indexed, the lineage fields are read from the
+                     extras_* keys or from the top level
+    """
+    fields = {}
+    for field in LINEAGE_FIELDS:
+        codes = split_codes(pkg_dict.get('extras_%s' % field) or pkg_dict.get(field))
+        if codes:
+            fields[index_field(field)] = codes
+    return fields
+
+
+def quote_code(code):
+    """
+    Quotes a code so it can be used as a term in a solr query
+
+    @param code: Code to quote
+    """
+    return '"%s"' % code.replace('\\', '\\\\').replace('"', '\\"')
+
+
+def terms_query(field, codes):
+    """
+    Returns the filter query matching the packages whose lineage field holds one of the codes
+
+    @param field: Name of the lineage field (code, parent, producers, consumers)
+    @param codes: Codes to look for
+    """
+    return '%s:(%s)' % (index_field(field), ' OR '.join(quote_code(code) for code in codes))
+
+
+def _search_batch(context, query):
+    """
+    Runs one package_search call for a lineage query, returning the lineage nodes
+
+    The query is only sent as a filter, which solr does not score and keeps in its filter
+    cache
+
+    @param context: Action context used for package_search
+    @param query: Solr filter query matching the wanted packages
+    """
+    data_dict = {
+        'q': '*:*',
+        'fq': query,
+        'rows': SEARCH_MAX_ROWS,
+        'fl': NODE_INDEX_FIELDS,
+        'extras': {},
+        'include_private': asbool(config.get(
+            'ckan.search.default_include_private', True)),
+    }
+    metrics.count_search()
+    with metrics.timer('search'):
+        result = get_action('package_search')(context, data_dict)
+    return [make_node(doc) for doc in result['results']]
+
+
+def _search_by_field(context, field, codes):
+    """
+    Retrieves the lineage nodes of all the packages whose lineage `field` holds one of the
+    given codes. Codes are OR-ed together so each batch of SEARCH_BATCH_SIZE codes costs one
+    package_search call, which only returns the NODE_INDEX_FIELDS fields. Batches run
+    concurrently when enabled.
+
+    @param context: Action context used for package_search
+    @param field: Name of the lineage field to match (code, parent, producers, consumers)
+    @param codes: Iterable of codes to look for
+    """
+    codes = list(OrderedDict.fromkeys(code for code in codes if code))
+    calls = []
+    for start in xrange(0, len(codes), SEARCH_BATCH_SIZE):
+        batch = codes[start:start + SEARCH_BATCH_SIZE]
+        calls.append((_search_batch, terms_query(field, batch)))
+    results = []
+    for nodes in run_concurrently(context, calls):
+        results.extend(nodes)
+    return results
+
+
+@metrics.timed('resolve')
+def resolve_codes(context, codes):
+    """
+    Resolves a list of codes to their packages with as few package_search calls as possible,
+    packages are read from the shared code cache when possible and searched for otherwise.
+    Codes without a package are remembered by the cache and not searched for again until
+    they expire
+
+    Returns a dict mapping each code to the lineage node of its package (see make_node),
+    codes without a package are left out
+
+    @param context: Action context used for package_search
+    @param codes: Iterable of package codes
+    """
+    wanted = set(code for code in codes if code)
+    code_cache = get_code_cache()
+    result = code_cache.get_many('code', wanted) if code_cache else {}
+    missing = wanted.difference(result)
+    if code_cache:
+        metrics.count_cache('code', len(result), len(missing))
+        known_missing = code_cache.get_missing(missing)
+        metrics.count_cache('missing', len(known_missing), len(missing) - len(known_missing))
+        missing -= known_missing
+    if missing:
+        found = {}
+        for package in _search_by_field(context, 'code', missing):
+            code = package.get('code')
+            if code in missing and code not in found:
+                found[code] = package
+        if code_cache:
+            code_cache.set_many('code', found)
+        result.update(found)
+        if len(found) < len(missing):
+            metrics.inc('datalineage_missing_codes_total', len(missing) - len(found))
+            if code_cache:
+                # codes of packages the user can not see are searched for again
+                not_found = missing.difference(found)
+                code_cache.set_missing(not_found.difference(get_code_packages(not_found)))
+    return result
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot module
+Precomputed MetaViz payloads of the lineage pages
+
+Snapshots are built for anonymous users, so they never contain private packages, and are
+only served to anonymous requests. When a package changes only the snapshots whose graph
+contains one of its codes are marked dirty and rebuilt in a background job. Views never
+write snapshots: a dirty snapshot is served as it is and a missing one is built for the
+request only, until the job rebuilds them.
+
+Snapshots are enabled with the following setting:
+
+    ckanext.datalineage.snapshots.enabled = false
+"""
+
+import json
+import logging
+import time
+
+import ckan.model as model
+import ckan.logic as logic
+import ckan.plugins.toolkit as tk
+from ckan.common import config
+from paste.deploy.converters import asbool
+from sqlalchemy import event
+
+from ckanext.datalineage import metrics
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage.metaviz import (build_metaviz_payload, collect_lineage,
+                                         convert_extra_vars_to_metaviz, lineage_codes)
+
+logger = logging.getLogger(__name__)
+
+# seconds before a worker queues the rebuild of the same snapshot again for its views
+REQUEST_INTERVAL = 60
+_requested = {}
+
+
+def snapshots_enabled():
+    return asbool(config.get('ckanext.datalineage.snapshots.enabled', False))
+
+
+def _anonymous_context():
+    return {'model': model, 'session': model.Session, 'user': '', 'for_view': True}
+
+
+def build_snapshot(context, pkg_dict):
+    """
+    Builds the payload of a package and stores it as its snapshot
+
+    Returns the payload
+    """
+    extra_vars = collect_lineage(context, pkg_dict)
+    payload = convert_extra_vars_to_metaviz(extra_vars)
+    # the codes without a package are kept too, a package created with one of them
+    # changes the graph without adding any edge to it
+    codes = lineage_codes(extra_vars) | extra_vars['referenced_codes']
+    lineage_model.save_snapshot(pkg_dict['id'], json.dumps(payload), codes)
+    model.Session.commit()
+    return payload
+
+
+def _request_rebuild(package_id):
+    """
+    Queues the rebuild of a snapshot found dirty or missing by a view, at most once every
+    REQUEST_INTERVAL seconds per worker
+    """
+    now = time.time()
+    if now - _requested.get(package_id, 0) < REQUEST_INTERVAL:
+        return
+    if len(_requested) > 1000:
+        for key in [key for key, requested in _requested.items()
+                    if now - requested >= REQUEST_INTERVAL]:
+            del _requested[key]
+    _requested[package_id] = now
+    try:
+        tk.enqueue_job(rebuild_snapshots, [[package_id], True],
+                       title='datalineage snapshots rebuild')
+    except Exception as e:
+        logger.warning('Could not queue the rebuild of lineage snapshots: %s' % e)
+
+
+def get_payload(context, pkg_dict):
+    """
+    Returns the MetaViz payload of a package for an anonymous request and whether it is
+    up to date
+
+    The payload is read from the snapshot of the package. A dirty snapshot is served until
+    the queued job rebuilt it and a missing one is built for the request, without writing
+    anything, the job stores it
+
+    @param context: Action context of the anonymous request
+    @param pkg_dict: Requested package
+    """
+    snapshot = lineage_model.get_snapshot(pkg_dict['id'])
+    if snapshot is not None and not snapshot.dirty:
+        metrics.count_cache('snapshot', 1, 0)
+        return json.loads(snapshot.payload), True
+    metrics.count_cache('snapshot', 0, 1)
+    _request_rebuild(pkg_dict['id'])
+    if snapshot is not None:
+        return json.loads(snapshot.payload), False
+    return build_metaviz_payload(context, pkg_dict), True
+
+
+def rebuild_snapshots(package_ids, only_outdated=False):
+    """
+    Background job rebuilding the snapshots of some packages
+
+    @param package_ids: Ids of the packages
+    @param only_outdated: Skip the snapshots that are clean, e.g. rebuilt since a view
+                          queued the job
+    """
+    for package_id in package_ids:
+        if only_outdated:
+            snapshot = lineage_model.get_snapshot(package_id)
+            if snapshot is not None and not snapshot.dirty:
+                continue
+        context = _anonymous_context()
+        try:
+            pkg_dict = logic.get_action('package_show')(context, {'id': package_id})
+        except (logic.NotFound, logic.NotAuthorized):
+            # the package was deleted or made private since
+            lineage_model.delete_snapshot(package_id)
+            model.Session.commit()
+            continue
+        build_snapshot(context, pkg_dict)
+
+
+PENDING_KEY = 'datalineage_pending_snapshots'
+
+
+def invalidate_snapshots(codes):
+    """
+    Marks dirty the snapshots containing one of the codes, their rebuild is queued once the
+    current transaction is committed so the job sees the changes
+
+    @param codes: Codes of the changed package and of the packages it links to
+    """
+    package_ids = lineage_model.mark_snapshots_dirty(codes)
+    if package_ids:
+        model.Session.info.setdefault(PENDING_KEY, set()).update(package_ids)
+    return package_ids
+
+
+def _enqueue_pending(session):
+    package_ids = session.info.pop(PENDING_KEY, None)
+    if not package_ids:
+        return
+    try:
+        tk.enqueue_job(rebuild_snapshots, [sorted(package_ids)],
+                       title='datalineage snapshots rebuild')
+    except Exception as e:
+        # dirty snapshots also queue their rebuild on their next view
+        logger.warning('Could not queue the rebuild of lineage snapshots: %s' % e)
+
+
+def _drop_pending(session, previous_transaction):
+    session.info.pop(PENDING_KEY, None)
+
+
+def setup():
+    """
+    Hooks the queueing of the rebuild jobs into the session
+    """
+    if not event.contains(model.Session, 'after_commit', _enqueue_pending):
+        event.listen(model.Session, 'after_commit', _enqueue_pending)
+        event.listen(model.Session, 'after_soft_rollback', _drop_pending)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Stats module
+Lineage statistics of the packages, indexed so the search can sort and facet on them
+
+Every package with a code gets the following index fields, as zero padded strings so the
+string order of solr is the numeric order:
+
+    datalineage_consumer_count:   models using the package
+    datalineage_producer_count:   datasets the package uses
+    datalineage_downstream_reach: codes reachable from the package, see the closure module
+    datalineage_depth:            hops to the furthest package upstream, up to the
+                                  traversal max_depth
+
+Each statistic costs one aggregate query, so indexing a package does not walk its lineage.
+The queries read the tables rather than the in-memory graph, which only sees the changes
+once committed, as a package is indexed inside the transaction updating it.
+
+When the edges of a package change, the packages whose statistics changed with them are
+queued for reindex, see the reindex module:
+
+    ckanext.datalineage.stats.enabled = false
+"""
+
+import logging
+
+from ckan.common import config
+from paste.deploy.converters import asbool
+
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import reindex
+from ckanext.datalineage import traversal
+from ckanext.datalineage.model import split_codes
+
+logger = logging.getLogger(__name__)
+
+STAT_FIELDS = ('consumer_count', 'producer_count', 'downstream_reach', 'depth')
+FIELD_PREFIX = 'datalineage_'
+# width of the zero padded values
+DIGITS = 8
+
+
+def stats_enabled():
+    return asbool(config.get('ckanext.datalineage.stats.enabled', False))
+
+
+def stat_field(name):
+    """
+    Returns the name of the index field of a statistic
+
+    @param name: Name of the statistic, see STAT_FIELDS
+    """
+    return FIELD_PREFIX + name
+
+
+def lineage_stats(code):
+    """
+    Returns a dict with the lineage statistics of a code, see STAT_FIELDS
+
+    @param code: Code of the package
+    """
+    max_depth, _ = traversal.get_limits()
+    return {
+        'consumer_count': lineage_model.count_neighbours(code, True,
+                                                         lineage_model.USAGE_RELATIONS),
+        'producer_count': lineage_model.count_neighbours(code, False,
+                                                         lineage_model.USAGE_RELATIONS),
+        # read from the closure, zero until it is built
+        'downstream_reach': lineage_model.count_descendants(code),
+        'depth': lineage_model.get_upstream_depth(code, max_depth),
+    }
+
+
+def stats_index_fields(pkg_dict):
+    """
+    Returns the statistics index fields of a package being indexed, none if the statistics
+    are disabled or the package has no code
+
+    @param pkg_dict: Package dict being indexed
+    """
+    if not stats_enabled():
+        return {}
+    codes = split_codes(pkg_dict.get('extras_code') or pkg_dict.get('code'))
+    if not codes:
+        return {}
+    return dict((stat_field(name), '%0*d' % (DIGITS, value))
+                for name, value in lineage_stats(codes[0]).items())
+
+
+def refresh_linked(package_id, edges, reachability_changed):
+    """
+    Queues the reindex of the packages whose statistics changed with the edges of a package,
+    in the current transaction
+
+    The neighbour counts change for the ends of the edges, the reach for the codes reaching
+    their sources and the depth for the codes their targets reach
+
+    @param package_id: Id of the changed package, reindexed on its own
+    @param edges: Old and new (source, target, relation) edges of the package
+    @param reachability_changed: Whether pairs of codes were linked or unlinked, the
+                                 closure must already be up to date
+    """
+    if not stats_enabled() or not edges:
+        return
+    sources = set(source for source, _, _ in edges)
+    targets = set(target for _, target, _ in edges)
+    codes = sources | targets
+    if reachability_changed:
+        for ancestors in lineage_model.get_ancestors(sources).values():
+            codes.update(ancestors)
+        for descendants in lineage_model.get_descendants(targets).values():
+            codes.update(descendants)
+    package_ids = set(lineage_model.get_code_packages(codes).values())
+    package_ids.discard(package_id)
+    if package_ids:
+        logger.debug('Queued the reindex of %s packages linked to [%s]' % (len(package_ids), package_id))
+        reindex.defer_reindex(sorted(package_ids))
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Sync module
+Keeps the materialized edges, the snapshots and the cached lookups in sync with the
+lineage fields of the packages
+"""
+
+import logging
+
+import ckan.model as model
+from sqlalchemy import event
+
+from ckanext.datalineage import cache
+from ckanext.datalineage import closure
+from ckanext.datalineage import dangling
+from ckanext.datalineage import memgraph
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import snapshot
+from ckanext.datalineage import stats
+
+logger = logging.getLogger(__name__)
+
+# session info key of the cache entries to drop once the transaction is committed
+PENDING_KEY = 'datalineage_pending_cache_invalidation'
+
+
+def invalidate_cache(package_id, code=None):
+    """
+    Drops the cached lookups of a changed package, both under its previous and its new code,
+    right after the commit. Entries dropped sooner could be cached again from the search
+    index, which is only updated by the commit
+
+    @param package_id: Id of the package
+    @param code: Current code of the package
+    """
+    if cache.get_code_cache() is None:
+        return
+    pending = model.Session.info.setdefault(PENDING_KEY, {})
+    pending.setdefault(package_id, set()).update(
+        ['code:%s' % code, 'missing:%s' % code] if code else [])
+
+
+def _invalidate_pending(session):
+    pending = session.info.pop(PENDING_KEY, None)
+    code_cache = cache.get_code_cache()
+    if not pending or code_cache is None:
+        return
+    try:
+        for package_id, keys in pending.items():
+            code_cache.invalidate(package_id, keys)
+    except Exception as e:
+        # the change is committed, the stale entries expire with the cache ttl
+        logger.warning('Could not drop the cached lookups of %s packages: %s' % (len(pending), e))
+
+
+def _drop_pending(session, previous_transaction):
+    session.info.pop(PENDING_KEY, None)
+
+
+def setup():
+    """
+    Hooks the invalidation of the cached lookups into the session
+    """
+    if not event.contains(model.Session, 'after_commit', _invalidate_pending):
+        event.listen(model.Session, 'after_commit', _invalidate_pending)
+        event.listen(model.Session, 'after_soft_rollback', _drop_pending)
+
+
+def sync_lineage(package_id, fields):
+    """
+    Replaces the edges of a changed package, updates the closure, records its dangling
+    references and queues the reindex of the packages whose statistics changed, changes are
+    committed with the current session
+
+    @param package_id: Id of the package
+    @param fields: Dict with the code, parent, producers and consumers of the package
+    """
+    edges = lineage_model.package_edges(fields.get('code'), fields.get('parent'),
+                                        fields.get('producers'), fields.get('consumers'))
+    if snapshot.snapshots_enabled():
+        # the graphs linked to the package before and after the change are both affected
+        linked_codes = lineage_model.get_package_codes(package_id)
+        for source, target, relation in edges:
+            linked_codes.update((source, target))
+        linked_codes.add(fields.get('code'))
+        snapshot.invalidate_snapshots(linked_codes)
+    # the package already has its new code, the previous one is read from its edges
+    old_edges = lineage_model.get_package_edges([package_id])[package_id]
+    added, removed = lineage_model.sync_package_edges(package_id, edges)
+    closure.update_closure(added, removed)
+    if set(old_edges) != set(edges):
+        stats.refresh_linked(package_id, old_edges + edges, bool(added or removed))
+    dangling.record_package(package_id, fields.get('code'), edges,
+                            lineage_model.declaring_code(old_edges))
+    memgraph.record_change(package_id)
+    invalidate_cache(package_id, fields.get('code'))
+
+
+def forget_lineage(package_id, code=None):
+    """
+    Removes the edges, their closure and the snapshot of a deleted package, the references
+    of the other packages to its code become dangling and their statistics are refreshed
+
+    @param package_id: Id of the package
+    @param code: Code of the package
+    """
+    linked_codes = lineage_model.get_package_codes(package_id)
+    old_edges = (lineage_model.get_package_edges([package_id])[package_id]
+                 if stats.stats_enabled() else [])
+    removed = lineage_model.delete_package_edges(package_id)
+    closure.update_closure([], removed)
+    stats.refresh_linked(package_id, old_edges, bool(removed))
+    dangling.record_deleted_package(package_id, code)
+    memgraph.record_change(package_id)
+    if snapshot.snapshots_enabled():
+        lineage_model.delete_snapshot(package_id)
+        snapshot.invalidate_snapshots(linked_codes)
+    invalidate_cache(package_id, code)
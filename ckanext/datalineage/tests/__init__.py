@@ -0,0 +1,20 @@
+"""Helpers shared by the tests."""
+import ckan.model as model
+
+
+def create_package(code, private=False, owner_org=None, **fields):
+    """
+    Inserts a package and its lineage extras with plain SQL, so the test does not need a
+    search index, the code is used as id and name
+
+    @param code: Code of the package
+    @param fields: Other lineage fields of the package, e.g. parent='a'
+    """
+    model.Session.execute(model.package_table.insert().values(
+        id=code, name=code, title=code.upper(), private=private, owner_org=owner_org,
+        state=u'active'))
+    fields['code'] = code
+    for key, value in fields.items():
+        model.Session.execute(model.package_extra_table.insert().values(
+            package_id=code, key=key, value=value, state=u'active'))
+    return code
@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark module
+Measures the lineage hot path on synthetic catalogues
+
+Catalogues are layered graphs modelled on the GLUES records of the MetaViz example data:
+raw datasets at the first level, then at every level models using datasets of the level
+before and generating one dataset each. Packages are served by an in-memory stand-in of
+package_search/package_show and of the edge table, which counts the queries each operation
+sends, so the numbers only depend on the lineage code.
+
+Run it from a CKAN virtualenv, e.g.:
+
+    python -m ckanext.datalineage.tests.benchmark --size 5000 --fan-in 4 --fan-out 3 --depth 4
+
+and compare the output before and after a change. Every operation reports the p50/p99
+latency, the package_search and SQL queries it sends and the peak memory growth.
+"""
+
+import argparse
+from collections import OrderedDict
+import datetime
+import json
+import random
+import re
+import resource
+import timeit
+import uuid
+
+import mock
+
+from ckanext.datalineage import cache
+from ckanext.datalineage import httpcache
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import resolver
+from ckanext.datalineage.controllers import utils as view_utils
+from ckanext.datalineage.metaviz import (build_metaviz_payload, collect_lineage,
+                                         convert_extra_vars_to_metaviz)
+
+CODE_FORMATS = ('glues', 'uuid', 'mixed')
+ORGANIZATIONS = ('ilr', 'lmu', 'kei', 'pik', 'ufz')
+
+# matches the lineage queries of the resolver, e.g. vocab_datalineage_code:("a" OR "b")
+QUERY_PATTERN = re.compile(r'^\s*(\w+):\((.*)\)\s*$')
+TERM_PATTERN = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+def make_code(code_format, kind, index, package_id, rand):
+    """
+    Returns the code of a synthetic package
+
+    @param code_format: glues for codes like glues:lmu:metadata:dataset:promet, uuid for
+                        codes reusing the package id, mixed for both
+    @param kind: dataset or model
+    """
+    if code_format == 'mixed':
+        code_format = 'glues' if index % 2 else 'uuid'
+    if code_format == 'uuid':
+        return package_id
+    return u'glues:%s:metadata:%s:%s-%s' % (rand.choice(ORGANIZATIONS), kind, kind, index)
+
+
+def generate_catalogue(size=1000, fan_in=3, fan_out=2, depth=3, code_format='glues', seed=0):
+    """
+    Generates a synthetic catalogue
+
+    Returns a list of package dicts with the lineage fields set as top level keys, as
+    package_show returns them
+
+    @param size: Approximate number of packages
+    @param fan_in: Number of datasets used by every model
+    @param fan_out: Number of models a dataset is used by before the models of the next
+                    level pick other datasets, it is exceeded once all the datasets of a
+                    level reached it
+    @param depth: Number of model levels
+    @param code_format: One of CODE_FORMATS
+    @param seed: Seed of the random generator, the same arguments give the same catalogue
+    """
+    if code_format not in CODE_FORMATS:
+        raise ValueError('Unknown code format %s' % code_format)
+    rand = random.Random(seed)
+    per_level = max(1, size // (2 * depth + 1))
+    modified = datetime.datetime(2014, 1, 1)
+    packages = []
+    counter = [0]
+
+    def new_package(kind, parent=None, producers=()):
+        index = counter[0]
+        counter[0] += 1
+        package_id = unicode(uuid.UUID(int=rand.getrandbits(128)))
+        package = {
+            'id': package_id,
+            'name': u'%s-%s' % (kind, index),
+            'title': u'Synthetic %s %s' % (kind, index),
+            'notes': u'Generated %s' % kind,
+            'url': u'',
+            'type': u'dataset',
+            'private': False,
+            'organization': {'name': rand.choice(ORGANIZATIONS)},
+            'tags': [{'name': kind}],
+            'metadata_created': modified,
+            'metadata_modified': modified + datetime.timedelta(seconds=index),
+            'code': make_code(code_format, kind, index, package_id, rand),
+            'parent': parent or u'',
+            'producers': u','.join(producers),
+            'consumers': u'',
+        }
+        packages.append(package)
+        return package
+
+    level = [new_package('dataset') for _ in xrange(per_level)]
+    for _ in xrange(depth):
+        next_level = []
+        uses = {}
+        for _ in xrange(per_level):
+            # datasets already used by fan_out models are left to the other models
+            candidates = [ds for ds in level if uses.get(ds['id'], 0) < fan_out] or level
+            inputs = rand.sample(candidates, min(fan_in, len(candidates)))
+            model = new_package('model', producers=[ds['code'] for ds in inputs])
+            for ds in inputs:
+                uses[ds['id']] = uses.get(ds['id'], 0) + 1
+                ds['consumers'] = u','.join(filter(None, [ds['consumers'], model['code']]))
+            next_level.append(new_package('dataset', parent=model['code']))
+        level = next_level
+    return packages
+
+
+def _index_document(package):
+    """
+    Returns the search index document of a package, with the field names of the CKAN schema
+    """
+    doc = {
+        'id': package['id'],
+        'name': package['name'],
+        'title': package['title'],
+        'notes': package['notes'],
+        'url': package['url'],
+        'dataset_type': package['type'],
+        'capacity': 'private' if package['private'] else 'public',
+        'organization': package['organization']['name'],
+        'tags': [tag['name'] for tag in package['tags']],
+        'metadata_created': package['metadata_created'].isoformat(),
+        'metadata_modified': package['metadata_modified'].isoformat(),
+    }
+    for field in lineage_model.LINEAGE_FIELDS:
+        doc['extras_%s' % field] = package[field]
+    doc.update(resolver.lineage_index_fields(doc))
+    return doc
+
+
+def _unescape_code(term):
+    return re.sub(r'\\(.)', r'\1', term)
+
+
+class FakeCatalogue(object):
+    """
+    In-memory stand-in of the package actions, the search index and the edge table of a
+    catalogue, counting the queries it answers
+
+    @param packages: Package dicts, see generate_catalogue
+    """
+
+    def __init__(self, packages):
+        self.packages = dict((package['id'], package) for package in packages)
+        self.by_name = dict((package['name'], package) for package in packages)
+        self.documents = {}
+        self.by_field = {}
+        self.edges = []
+        self.edges_by = {'source': {}, 'target': {}}
+        for package in packages:
+            doc = _index_document(package)
+            self.documents[package['id']] = doc
+            for field in lineage_model.LINEAGE_FIELDS:
+                for code in doc.get(resolver.index_field(field), []):
+                    self.by_field.setdefault(resolver.index_field(field), {}) \
+                        .setdefault(code, []).append(doc)
+            for edge in lineage_model.package_edges(package['code'], package['parent'],
+                                                    package['producers'], package['consumers']):
+                self.edges.append(edge)
+                self.edges_by['source'].setdefault(edge[0], []).append(edge)
+                self.edges_by['target'].setdefault(edge[1], []).append(edge)
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.counters = {'search': 0, 'sql': 0}
+
+    # package actions
+
+    def package_show(self, context, data_dict):
+        package = dict(self.packages.get(data_dict['id']) or self.by_name[data_dict['id']])
+        # package_show returns the dates as strings
+        for key in ('metadata_created', 'metadata_modified'):
+            package[key] = package[key].isoformat()
+        return package
+
+    def package_search(self, context, data_dict):
+        self.counters['search'] += 1
+        match = QUERY_PATTERN.match(data_dict['fq'])
+        if not match:
+            raise ValueError('Unsupported query %s' % data_dict['fq'])
+        field = match.group(1)
+        docs = []
+        for term in TERM_PATTERN.findall(match.group(2)):
+            docs.extend(self.by_field.get(field, {}).get(_unescape_code(term), []))
+        fields = data_dict.get('fl')
+        if fields:
+            docs = [dict((key, doc[key]) for key in fields if key in doc) for doc in docs]
+        rows = int(data_dict.get('rows', 10))
+        return {'count': len(docs), 'results': docs[:rows]}
+
+    def get_action(self, name):
+        return getattr(self, name)
+
+    # edge table
+
+    def _get_edges(self, column, codes, relations=None):
+        self.counters['sql'] += 1
+        by = self.edges_by['source' if column is lineage_model.edge_table.c.source else 'target']
+        edges = set()
+        for code in codes:
+            edges.update(edge for edge in by.get(code, [])
+                         if not relations or edge[2] in relations)
+        return sorted(edges)
+
+    def get_neighbour_codes(self, codes):
+        self.counters['sql'] += 1
+        result = set(code for code in codes if code)
+        for code in list(result):
+            for source, target, _ in self.edges_by['source'].get(code, []) + \
+                    self.edges_by['target'].get(code, []):
+                result.update((source, target))
+        return result
+
+    def _neighbours(self, code, downstream, relations, exclude_generated=False):
+        by = self.edges_by['source' if downstream else 'target']
+        neighbours = set(edge[1] if downstream else edge[0] for edge in by.get(code, [])
+                         if not relations or edge[2] in relations)
+        if exclude_generated:
+            neighbours = [neighbour for neighbour in neighbours
+                          if not any(edge[2] == lineage_model.RELATION_PARENT
+                                     for edge in self.edges_by['target'].get(neighbour, []))]
+        return sorted(neighbours)
+
+    def get_neighbour_page(self, code, downstream=True, relations=None, after=None, limit=50,
+                           exclude_generated=False):
+        self.counters['sql'] += 1
+        codes = [neighbour for neighbour
+                 in self._neighbours(code, downstream, relations, exclude_generated)
+                 if after is None or neighbour > after]
+        return codes[:limit], len(codes) > limit
+
+    def count_neighbours(self, code, downstream=True, relations=None, exclude_generated=False):
+        self.counters['sql'] += 1
+        return len(self._neighbours(code, downstream, relations, exclude_generated))
+
+    def get_code_packages(self, codes):
+        self.counters['sql'] += 1
+        result = {}
+        for code in set(codes):
+            for doc in self.by_field.get(resolver.index_field('code'), {}).get(code, []):
+                result[code] = doc['id']
+        return result
+
+    def get_package_versions(self, codes):
+        self.counters['sql'] += 1
+        result = []
+        for code in set(codes):
+            for doc in self.by_field.get(resolver.index_field('code'), {}).get(code, []):
+                package = self.packages[doc['id']]
+                result.append((package['id'], package['metadata_modified']))
+        return sorted(result)
+
+    def patch(self):
+        """
+        Returns the patchers replacing CKAN and the database with the catalogue
+        """
+        return [
+            mock.patch('ckanext.datalineage.resolver.get_action', self.get_action),
+            mock.patch.object(lineage_model, '_get_edges', self._get_edges),
+            mock.patch.object(lineage_model, 'get_neighbour_codes', self.get_neighbour_codes),
+            mock.patch.object(lineage_model, 'get_neighbour_page', self.get_neighbour_page),
+            mock.patch.object(lineage_model, 'count_neighbours', self.count_neighbours),
+            mock.patch.object(lineage_model, 'get_package_versions', self.get_package_versions),
+            mock.patch.object(resolver, 'get_code_packages', self.get_code_packages),
+            mock.patch.object(view_utils, 'c', _TemplateContext()),
+        ]
+
+
+class _TemplateContext(object):
+    """
+    Stand-in of the pylons template context, holding the request cache of the helpers
+    """
+    user = ''
+    userobj = None
+
+
+def _context():
+    return {'user': '', 'for_view': True}
+
+
+def show_datalineage(catalogue, package_id):
+    """
+    Does the work of DataLineageController.show_datalineage, short of rendering the template
+    """
+    context = _context()
+    pkg_dict = catalogue.package_show(context, {'id': package_id})
+    httpcache.compute_validators(pkg_dict, httpcache.page_versions(pkg_dict), '', 'en')
+    return json.dumps(build_metaviz_payload(context, pkg_dict))
+
+
+def titles_for_package(catalogue, package_id):
+    """
+    Does the work of the additional info snippet, resolving the producers and consumers of
+    the package and looking up their titles, with a new request cache
+    """
+    pkg_dict = catalogue.package_show(_context(), {'id': package_id})
+    view_utils.c.datalineage_code_cache = None
+    view_utils.resolve_codes_for_view(pkg_dict['producers'], pkg_dict['consumers'])
+    codes = lineage_model.split_codes(pkg_dict['producers']) + \
+        lineage_model.split_codes(pkg_dict['consumers'])
+    return [view_utils.get_title_for_code(code) for code in codes]
+
+
+def collect(catalogue, package_id):
+    context = _context()
+    return collect_lineage(context, catalogue.package_show(context, {'id': package_id}))
+
+
+def convert(extra_vars):
+    return convert_extra_vars_to_metaviz(extra_vars)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))
+    return values[index]
+
+
+def measure(catalogue, func, args_list):
+    """
+    Calls func once per arguments tuple and returns its statistics
+
+    Returns a dict with the count of calls, the p50 and p99 latency in milliseconds, the
+    mean number of package_search and SQL queries per call and the growth of the peak
+    resident memory in KB
+    """
+    timings = []
+    catalogue.reset_counters()
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    for args in args_list:
+        start = timeit.default_timer()
+        func(*args)
+        timings.append((timeit.default_timer() - start) * 1000)
+    calls = len(args_list) or 1
+    return OrderedDict([
+        ('calls', len(args_list)),
+        ('p50_ms', percentile(timings, 50)),
+        ('p99_ms', percentile(timings, 99)),
+        ('search_per_call', catalogue.counters['search'] / float(calls)),
+        ('sql_per_call', catalogue.counters['sql'] / float(calls)),
+        ('peak_rss_kb', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak),
+    ])
+
+
+def run_benchmark(packages, samples=200, seed=0, cache_backend='none'):
+    """
+    Benchmarks the lineage operations on a catalogue
+
+    Returns an OrderedDict mapping each operation to its statistics, see measure
+
+    @param packages: Package dicts, see generate_catalogue
+    @param samples: Number of packages each operation is run for
+    @param cache_backend: Shared code cache backend, none or memory
+    """
+    catalogue = FakeCatalogue(packages)
+    rand = random.Random(seed)
+    ids = [rand.choice(packages)['id'] for _ in xrange(samples)]
+    patchers = catalogue.patch()
+    previous_cache = cache.get_code_cache()
+    for patcher in patchers:
+        patcher.start()
+    try:
+        cache.configure({'ckanext.datalineage.cache.backend': cache_backend})
+        results = OrderedDict()
+        results['show_datalineage'] = measure(
+            catalogue, show_datalineage, [(catalogue, package_id) for package_id in ids])
+        results['get_title_for_code'] = measure(
+            catalogue, titles_for_package, [(catalogue, package_id) for package_id in ids])
+        results['collect_lineage'] = measure(
+            catalogue, collect, [(catalogue, package_id) for package_id in ids])
+        collected = [(collect(catalogue, package_id),) for package_id in ids]
+        results['convert_extra_vars_to_metaviz'] = measure(catalogue, convert, collected)
+        return results
+    finally:
+        for patcher in reversed(patchers):
+            patcher.stop()
+        cache._code_cache = previous_cache
+
+
+def format_results(results):
+    columns = ['operation'] + list(next(iter(results.values())).keys())
+    lines = ['  '.join('%-30s' % column if i == 0 else '%15s' % column
+                       for i, column in enumerate(columns))]
+    for operation, stats in results.items():
+        cells = ['%-30s' % operation]
+        for value in stats.values():
+            cells.append('%15.2f' % value if isinstance(value, float) else '%15s' % value)
+        lines.append('  '.join(cells))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the lineage views on a synthetic catalogue')
+    parser.add_argument('--size', type=int, default=1000, help='number of packages')
+    parser.add_argument('--fan-in', type=int, default=3, help='datasets used by every model')
+    parser.add_argument('--fan-out', type=int, default=2, help='maximum models using a dataset')
+    parser.add_argument('--depth', type=int, default=3, help='number of model levels')
+    parser.add_argument('--code-format', choices=CODE_FORMATS, default='glues')
+    parser.add_argument('--samples', type=int, default=200, help='packages each operation is run for')
+    parser.add_argument('--cache', choices=('none', 'memory'), default='none',
+                        help='shared code cache backend')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    packages = generate_catalogue(args.size, args.fan_in, args.fan_out, args.depth,
+                                  args.code_format, args.seed)
+    results = run_benchmark(packages, args.samples, args.seed, args.cache)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print('%s packages, fan-in %s, fan-out %s, depth %s, %s codes, cache %s' % (
+            len(packages), args.fan_in, args.fan_out, args.depth, args.code_format, args.cache))
+        print(format_results(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""Tests for logic/action.py."""
+from collections import OrderedDict
+
+import mock
+from nose.tools import assert_equal
+
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage.logic import action
+
+
+def _hidden(private, sysadmin=False, organizations=()):
+    list_for_user = mock.Mock(return_value=[{'id': org} for org in organizations])
+    with mock.patch.object(lineage_model, 'get_private_code_owners', return_value=private), \
+            mock.patch.object(action.authz, 'is_sysadmin', return_value=sysadmin), \
+            mock.patch.object(action.tk, 'get_action', return_value=list_for_user):
+        return action.hidden_codes({'user': 'someone'}, ['a', 'b', 'c'])
+
+
+def test_private_packages_of_other_organizations_are_hidden():
+    assert_equal(_hidden({'b': 'org-1', 'c': 'org-2'}, organizations=['org-1']), set(['c']))
+    assert_equal(_hidden({'b': 'org-1', 'c': 'org-2'}), set(['b', 'c']))
+
+
+def test_sysadmins_see_everything():
+    assert_equal(_hidden({'b': 'org-1'}, sysadmin=True), set())
+
+
+def test_graph_leaves_hidden_packages_out():
+    graph = {
+        'nodes': OrderedDict([('a', 0), ('b', 1), ('c', 2)]),
+        'edges': [('a', 'b', 'consumer'), ('b', 'c', 'parent')],
+        'truncated': False,
+        'capped': [{'code': 'b', 'direction': 'downstream', 'total': 60, 'next_cursor': 'x'}],
+    }
+    packages = {'a': {'name': 'a'}}
+    with mock.patch.object(action, 'hidden_codes', return_value=set(['b'])), \
+            mock.patch.object(action, 'resolve_codes', return_value=packages) as resolve:
+        result = action.graph_payload({}, graph, ['name'])
+    assert_equal([node['code'] for node in result['nodes']], ['a', 'c'])
+    # c has no visible package but is not private, so it is listed as missing
+    assert_equal(result['nodes'][1], {'code': 'c', 'depth': 2, 'missing': True})
+    assert_equal(result['edges'], [])
+    assert_equal(result['capped'], [])
+    assert_equal(resolve.call_args[0][1], ['a', 'c'])
+
+
+def test_impact_leaves_hidden_packages_out():
+    impact = {'downstream': ['b', 'c', 'd'], 'upstream': ['m']}
+    with mock.patch.object(action.tk, 'check_access'), \
+            mock.patch.object(action, 'get_start_code', return_value='a'), \
+            mock.patch.object(action.closure, 'impact', return_value=impact), \
+            mock.patch.object(action, 'hidden_codes', return_value=set(['c', 'm'])):
+        result = action.datalineage_impact({}, {'code': 'a'})
+    assert_equal(result, {'code': 'a', 'downstream': ['b', 'd'], 'downstream_count': 2,
+                          'upstream': [], 'upstream_count': 0})
@@ -0,0 +1,44 @@
+"""Tests for logic/auth.py."""
+import ckan.plugins.toolkit as tk
+import mock
+from nose.tools import assert_equal
+
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage.logic import auth
+
+
+def _check(data_dict, readable):
+    check_access = mock.Mock(side_effect=None if readable else tk.NotAuthorized)
+    with mock.patch.object(auth.tk, 'check_access', check_access), \
+            mock.patch.object(lineage_model, 'get_code_packages',
+                              lambda codes: dict((code, 'pkg-%s' % code) for code in codes
+                                                 if code != 'dangling')):
+        result = auth.datalineage_graph({'user': ''}, data_dict)
+    return result['success'], check_access.call_args
+
+
+def test_package_requested_by_id_must_be_readable():
+    assert_equal(_check({'id': 'a'}, readable=False)[0], False)
+    success, call = _check({'id': 'a'}, readable=True)
+    assert_equal(success, True)
+    assert_equal(call[0][2], {'id': 'a'})
+
+
+def test_package_requested_by_code_must_be_readable():
+    success, call = _check({'code': 'a'}, readable=False)
+    assert_equal(success, False)
+    assert_equal(call[0][2], {'id': 'pkg-a'})
+    assert_equal(_check({'code': 'a'}, readable=True)[0], True)
+
+
+def test_codes_without_a_package_are_readable():
+    success, call = _check({'code': 'dangling'}, readable=False)
+    assert_equal(success, True)
+    assert_equal(call, None)
+
+
+def test_impact_and_neighbours_follow_the_graph_rules():
+    for function in (auth.datalineage_neighbours, auth.datalineage_impact):
+        with mock.patch.object(auth.tk, 'check_access', mock.Mock(side_effect=tk.NotAuthorized)), \
+                mock.patch.object(lineage_model, 'get_code_packages', return_value={'a': 'pkg-a'}):
+            assert_equal(function({'user': ''}, {'code': 'a'})['success'], False)
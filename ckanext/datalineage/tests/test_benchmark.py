@@ -0,0 +1,36 @@
+"""Query count regressions of the lineage hot path, measured by the benchmark harness."""
+from nose.tools import assert_equal, assert_true
+
+from ckanext.datalineage.tests import benchmark
+
+
+def _run(**kwargs):
+    packages = benchmark.generate_catalogue(size=300, seed=1, **kwargs)
+    return benchmark.run_benchmark(packages, samples=20, seed=1)
+
+
+def test_generate_catalogue_is_deterministic():
+    first = benchmark.generate_catalogue(size=100, seed=3)
+    second = benchmark.generate_catalogue(size=100, seed=3)
+    assert_equal([p['code'] for p in first], [p['code'] for p in second])
+
+
+def test_generated_parents_exist():
+    packages = benchmark.generate_catalogue(size=100, code_format='mixed')
+    codes = set(p['code'] for p in packages)
+    for package in packages:
+        assert_true(not package['parent'] or package['parent'] in codes)
+
+
+def test_codes_are_resolved_in_batches():
+    # looking the codes up one by one would cost at least one search per input dataset
+    results = _run(fan_in=20, fan_out=2)
+    for operation in ('show_datalineage', 'get_title_for_code'):
+        assert_true(results[operation]['search_per_call'] < 10, operation)
+
+
+def test_show_datalineage_query_budget():
+    results = _run(fan_in=5, fan_out=3)
+    assert_true(results['show_datalineage']['search_per_call'] <= 5)
+    assert_true(results['get_title_for_code']['search_per_call'] <= 1)
+    assert_equal(results['convert_extra_vars_to_metaviz']['search_per_call'], 0)
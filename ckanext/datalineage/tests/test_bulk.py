@@ -0,0 +1,126 @@
+"""Tests for bulk.py and the bulk upsert action."""
+import ckan.model as model
+import ckan.tests.helpers as helpers
+import mock
+from nose.tools import assert_equal, assert_raises
+
+from ckanext.datalineage import bulk
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage.logic import action
+from ckanext.datalineage.tests import create_package
+
+
+def _fields(package_id):
+    extras = lineage_model.get_lineage_extras([package_id])[package_id]
+    return dict((key, extra.value) for key, extra in extras.items() if key != 'code')
+
+
+def test_plan_groups_the_edges_by_declaring_package():
+    changes, conflicts = bulk.plan_changes([
+        ('m', 'd', 'parent'),
+        ('d', 'm2', 'producer'),
+        ('d', 'm2', 'consumer'),
+        ('d2', 'm2', 'producer'),
+        ('d', 'm2', 'consumer'),
+    ])
+    assert_equal(changes.items(), [
+        ('d', {'parent': ['m'], 'consumers': ['m2']}),
+        ('m2', {'producers': ['d', 'd2']}),
+    ])
+    assert_equal(conflicts, {})
+
+
+def test_plan_reports_conflicting_parents():
+    changes, conflicts = bulk.plan_changes([
+        ('m', 'd', 'parent'),
+        ('m', 'd', 'parent'),
+        ('m2', 'd', 'parent'),
+        ('m', 'd2', 'parent'),
+    ])
+    assert_equal(conflicts, {'d': ['m', 'm2']})
+
+
+class TestApplyChanges(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+        for code in ('m', 'm2', 'd'):
+            create_package(code)
+        create_package('d2', consumers=u'm')
+        self.package_ids = lineage_model.get_code_packages(['m', 'm2', 'd', 'd2'])
+
+    def _apply(self, edges, replace=False):
+        changes, _ = bulk.plan_changes(edges)
+        return bulk.apply_changes(changes, self.package_ids, replace)
+
+    def test_changes_are_added_to_the_fields(self):
+        assert_equal(sorted(self._apply([('m', 'd', 'parent'), ('d2', 'm2', 'consumer')])),
+                     ['d', 'd2'])
+        assert_equal(_fields('d'), {'parent': u'm'})
+        assert_equal(_fields('d2'), {'consumers': u'm,m2'})
+        assert_equal(sorted(lineage_model.get_package_edges(['d2'])['d2']),
+                     [('d2', 'm', 'consumer'), ('d2', 'm2', 'consumer')])
+
+    def test_applying_twice_changes_nothing(self):
+        edges = [('m', 'd', 'parent'), ('d2', 'm', 'consumer'), ('d', 'm2', 'producer')]
+        assert_equal(sorted(self._apply(edges)), ['d', 'm2'])
+        assert_equal(self._apply(edges), [])
+        assert_equal(self._apply(edges, replace=True), [])
+        assert_equal(_fields('d2'), {'consumers': u'm'})
+        assert_equal(_fields('m2'), {'producers': u'd'})
+
+    def test_replace_drops_the_other_values(self):
+        assert_equal(self._apply([('d2', 'm2', 'consumer')], replace=True), ['d2'])
+        assert_equal(_fields('d2'), {'consumers': u'm2'})
+
+
+class TestBulkUpsert(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+        create_package('m')
+        create_package('d')
+        model.Session.commit()
+
+    def _upsert(self, edges):
+        with mock.patch.object(action.tk, 'check_access'), \
+                mock.patch.object(action.reindex, 'reindex_packages') as reindex_packages:
+            result = action.datalineage_bulk_upsert({'model': model}, {'edges': edges})
+        return result, reindex_packages
+
+    def _errors(self, edges):
+        with assert_raises(action.ValidationError) as raised:
+            self._upsert(edges)
+        return raised.exception.error_dict['edges']
+
+    def test_invalid_rows_are_reported_by_index(self):
+        errors = self._errors([
+            {'source': 'm', 'target': 'd', 'relation': 'parent'},
+            {'source': 'm,n', 'target': 'd', 'relation': 'parent'},
+            'm d',
+            {'source': 'm', 'target': 'd', 'relation': 'sibling'},
+        ])
+        assert_equal(sorted(errors[0]), [1, 2, 3])
+        assert_equal(_fields('d'), {})
+
+    def test_conflicting_parents_are_rejected(self):
+        errors = self._errors([{'source': 'm', 'target': 'd', 'relation': 'parent'},
+                               {'source': 'm2', 'target': 'd', 'relation': 'parent'}])
+        assert_equal(errors, ['Packages with more than one parent: d'])
+        assert_equal(_fields('d'), {})
+
+    def test_unknown_codes_are_rejected(self):
+        errors = self._errors([{'source': 'm', 'target': 'd', 'relation': 'parent'},
+                               {'source': 'd', 'target': 'x', 'relation': 'consumer'},
+                               {'source': 'y', 'target': 'x', 'relation': 'producer'}])
+        assert_equal(errors, ['No package with the codes: x'])
+        assert_equal(_fields('d'), {})
+
+    def test_edges_are_recorded_and_reindexed(self):
+        edges = [{'source': 'm', 'target': 'd', 'relation': 'parent'}]
+        result, reindex_packages = self._upsert(edges)
+        assert_equal(result, {'edges': 1, 'packages': 1})
+        reindex_packages.assert_called_once_with(['d'])
+        assert_equal(self._upsert(edges)[0], {'edges': 1, 'packages': 0})
@@ -0,0 +1,184 @@
+"""Tests for cache.py and the cached lookups of resolver.py."""
+import fnmatch
+
+import ckan.model as model
+import mock
+from nose.tools import assert_equal, assert_true
+
+from ckanext.datalineage import cache
+from ckanext.datalineage import resolver
+from ckanext.datalineage import sync
+
+
+class FakeRedis(object):
+    """
+    Stand-in of a redis client with the commands used by the redis backend
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.sets.pop(key, None)
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    def smembers(self, key):
+        return set(self.sets.get(key, ()))
+
+    def expire(self, key, ttl):
+        pass
+
+    def scan_iter(self, pattern):
+        return [key for key in list(self.values) + list(self.sets)
+                if fnmatch.fnmatch(key, pattern)]
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        def command(*args):
+            self.commands.append((name, args))
+        return command
+
+    def execute(self):
+        return [getattr(self.client, name)(*args) for name, args in self.commands]
+
+
+def _package(package_id, code, private=False):
+    return {'id': package_id, 'code': code, 'title': code.upper(), 'private': private}
+
+
+def test_memory_entries_expire():
+    backend = cache.MemoryBackend(ttl=10)
+    with mock.patch.object(cache.time, 'time', return_value=1000):
+        backend.set('code:a', {'id': '1'})
+        backend.set('missing:b', True, ttl=2)
+    with mock.patch.object(cache.time, 'time', return_value=1005):
+        assert_equal(backend.get('code:a'), {'id': '1'})
+        assert_equal(backend.get('missing:b'), None)
+    with mock.patch.object(cache.time, 'time', return_value=1011):
+        assert_equal(backend.get('code:a'), None)
+
+
+def test_memory_evicts_least_recently_used():
+    backend = cache.MemoryBackend(size=2)
+    backend.set('a', 1)
+    backend.set('b', 2)
+    backend.get('a')
+    backend.set('c', 3)
+    assert_equal(backend.get('b'), None)
+    assert_equal(backend.get('a'), 1)
+    assert_equal(backend.get('c'), 3)
+
+
+def test_memory_sets_are_not_evicted():
+    code_cache = cache.CodeCache(cache.MemoryBackend(size=2))
+    code_cache.set_many('code', {'a': _package('1', 'a')})
+    # fills the cache so the LRU drops everything stored before
+    for index in range(5):
+        code_cache.backend.set('other:%s' % index, index)
+    code_cache.set_many('code', {'a': _package('1', 'a')})
+    code_cache.invalidate('1')
+    assert_equal(code_cache.get_many('code', ['a']), {})
+
+
+def test_private_packages_are_not_cached():
+    for backend in (cache.MemoryBackend(), cache.RedisBackend(FakeRedis())):
+        code_cache = cache.CodeCache(backend)
+        code_cache.set_many('code', {'a': _package('1', 'a'), 'b': _package('2', 'b', private=True)})
+        assert_equal(code_cache.get_many('code', ['a', 'b']), {'a': _package('1', 'a')})
+
+
+def test_invalidate_drops_all_the_keys_of_a_package():
+    for backend in (cache.MemoryBackend(), cache.RedisBackend(FakeRedis())):
+        code_cache = cache.CodeCache(backend)
+        code_cache.set_many('code', {'a': _package('1', 'a'), 'b': _package('2', 'b')})
+        code_cache.set_many('parent', {'p': _package('1', 'a')})
+        code_cache.set_missing(['c'])
+        code_cache.invalidate('1', ['code:c', 'missing:c'])
+        assert_equal(code_cache.get_many('code', ['a', 'b']), {'b': _package('2', 'b')})
+        assert_equal(code_cache.get_many('parent', ['p']), {})
+        assert_equal(code_cache.get_missing(['c']), set())
+
+
+def test_index_of_a_package_is_shared_by_the_workers():
+    # two workers caching the same package under different keys through the same redis
+    client = FakeRedis()
+    first = cache.CodeCache(cache.RedisBackend(client))
+    second = cache.CodeCache(cache.RedisBackend(client))
+    first.set_many('code', {'a': _package('1', 'a')})
+    second.set_many('parent', {'p': _package('1', 'a')})
+    first.invalidate('1')
+    assert_equal(second.get_many('code', ['a']), {})
+    assert_equal(second.get_many('parent', ['p']), {})
+
+
+def test_missing_codes_expire():
+    code_cache = cache.CodeCache(cache.MemoryBackend(ttl=300), missing_ttl=60)
+    with mock.patch.object(cache.time, 'time', return_value=1000):
+        code_cache.set_missing(['a'])
+        assert_equal(code_cache.get_missing(['a', 'b']), set(['a']))
+    with mock.patch.object(cache.time, 'time', return_value=1061):
+        assert_equal(code_cache.get_missing(['a']), set())
+
+
+def test_missing_codes_are_not_searched_again():
+    code_cache = cache.CodeCache(cache.MemoryBackend())
+    search = mock.Mock(return_value=[_package('1', 'a')])
+    with mock.patch.object(resolver, 'get_code_cache', return_value=code_cache), \
+            mock.patch.object(resolver, '_search_by_field', search), \
+            mock.patch.object(resolver, 'get_code_packages', return_value={}):
+        assert_equal(resolver.resolve_codes({}, ['a', 'b']), {'a': _package('1', 'a')})
+        assert_equal(resolver.resolve_codes({}, ['a', 'b']), {'a': _package('1', 'a')})
+    assert_equal(search.call_count, 1)
+    assert_equal(set(search.call_args[0][2]), set(['a', 'b']))
+
+
+def test_codes_of_hidden_packages_are_searched_again():
+    # a code whose package the user can not see is not remembered as missing
+    code_cache = cache.CodeCache(cache.MemoryBackend())
+    search = mock.Mock(return_value=[])
+    with mock.patch.object(resolver, 'get_code_cache', return_value=code_cache), \
+            mock.patch.object(resolver, '_search_by_field', search), \
+            mock.patch.object(resolver, 'get_code_packages', return_value={'a': '1'}):
+        resolver.resolve_codes({}, ['a'])
+        resolver.resolve_codes({}, ['a'])
+    assert_equal(search.call_count, 2)
+    assert_true(not code_cache.get_missing(['a']))
+
+
+def test_changed_package_is_dropped_once_committed():
+    code_cache = cache.CodeCache(cache.MemoryBackend())
+    sync.setup()
+    with mock.patch.object(cache, 'get_code_cache', return_value=code_cache):
+        code_cache.set_many('code', {'a': _package('1', 'a')})
+        sync.invalidate_cache('1', 'b')
+        model.Session.rollback()
+        model.Session.commit()
+        assert_equal(code_cache.get_many('code', ['a']), {'a': _package('1', 'a')})
+
+        sync.invalidate_cache('1', 'b')
+        # the search index still has the package as it was until the commit
+        assert_equal(code_cache.get_many('code', ['a']), {'a': _package('1', 'a')})
+        code_cache.set_missing(['b'])
+        model.Session.commit()
+        assert_equal(code_cache.get_many('code', ['a']), {})
+        assert_equal(code_cache.get_missing(['b']), set())
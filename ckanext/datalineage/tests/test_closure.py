@@ -0,0 +1,109 @@
+"""Tests for closure.py, the closure kept up to date must match a rebuilt one."""
+import random
+
+import ckan.model as model
+import ckan.tests.helpers as helpers
+from nose.tools import assert_equal
+from sqlalchemy import select
+
+from ckanext.datalineage import closure
+from ckanext.datalineage import model as lineage_model
+
+
+def _closure():
+    table = lineage_model.closure_table
+    return sorted(tuple(row) for row in model.Session.execute(
+        select([table.c.ancestor, table.c.descendant])))
+
+
+def _paths(edges):
+    """
+    Returns the (ancestor, descendant) pairs of the codes linked by a path of edges
+    """
+    successors = {}
+    for source, target in edges:
+        successors.setdefault(source, set()).add(target)
+    pairs = set()
+    for start in successors:
+        stack = list(successors[start])
+        reached = set()
+        while stack:
+            code = stack.pop()
+            if code not in reached:
+                reached.add(code)
+                stack.extend(successors.get(code, ()))
+        pairs.update((start, code) for code in reached if code != start)
+    return sorted(pairs)
+
+
+class TestClosure(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+        self.edges = {}
+
+    def _declare(self, package_id, *targets):
+        """
+        Replaces the consumers declared by a package, whose code is its id, and checks the
+        closure against a rebuilt one and against the paths of the edges
+        """
+        edges = [(package_id, target, lineage_model.RELATION_CONSUMER) for target in targets]
+        added, removed = lineage_model.sync_package_edges(package_id, edges)
+        closure.update_closure(added, removed)
+        self.edges[package_id] = [(package_id, target) for target in targets]
+        updated = _closure()
+        closure.rebuild_closure()
+        assert_equal(updated, _closure())
+        assert_equal(updated, _paths(edge for edges in self.edges.values() for edge in edges))
+
+    def test_chain(self):
+        self._declare('a', 'b')
+        self._declare('b', 'c')
+        self._declare('c', 'd')
+        self._declare('b')
+        self._declare('b', 'c')
+        self._declare('a')
+
+    def test_diamond(self):
+        self._declare('a', 'b', 'c')
+        self._declare('b', 'd')
+        self._declare('c', 'd')
+        self._declare('d', 'e')
+        # d stays reachable from a through c
+        self._declare('b')
+        self._declare('c')
+        self._declare('b', 'd')
+
+    def test_cycle(self):
+        self._declare('a', 'b')
+        self._declare('b', 'c')
+        self._declare('c', 'a', 'd')
+        # breaking the cycle anywhere keeps the rest of it
+        self._declare('b')
+        self._declare('b', 'c')
+        self._declare('c', 'd')
+        self._declare('c', 'a')
+
+    def test_edge_declared_by_two_packages(self):
+        # the dataset and the model both declare that a uses b
+        self._declare('a', 'b')
+        self._declare('b', 'c')
+        lineage_model.sync_package_edges('m', [('a', 'b', lineage_model.RELATION_PRODUCER)])
+        self.edges['m'] = [('a', 'b')]
+        self._declare('a')
+        self._declare('x', 'y')
+
+    def test_random_changes(self):
+        codes = 'abcdefgh'
+        generator = random.Random(7)
+        for _ in range(40):
+            self._declare(generator.choice(codes),
+                          *generator.sample(codes, generator.randint(0, 3)))
+
+    def test_impact(self):
+        self._declare('a', 'b', 'c')
+        self._declare('b', 'd')
+        self._declare('d', 'b')
+        assert_equal(closure.impact('b'), {'downstream': ['d'], 'upstream': ['a', 'd']})
+        assert_equal(closure.impact('a', 'downstream'), {'downstream': ['b', 'c', 'd']})
@@ -0,0 +1,47 @@
+"""Tests for concurrency.py."""
+from multiprocessing.pool import ThreadPool
+import threading
+
+import mock
+from nose.tools import assert_equal, assert_raises
+
+from ckanext.datalineage import concurrency
+
+
+class TestRunConcurrently(object):
+
+    def setup(self):
+        self.pool = ThreadPool(1)
+        self.patches = [
+            mock.patch.object(concurrency, 'concurrency_enabled', return_value=True),
+            mock.patch.object(concurrency, '_get_pool', return_value=self.pool),
+            mock.patch.object(concurrency, 'config',
+                              {'ckanext.datalineage.concurrency.timeout': '0.2'}),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def teardown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.pool.terminate()
+
+    def test_results_are_returned_in_order(self):
+        lookup = lambda context, arg: (context['user'], arg * 2)
+        assert_equal(concurrency.run_concurrently({'user': 'u'}, [(lookup, 1), (lookup, 2)]),
+                     [('u', 2), ('u', 4)])
+
+    def test_lookups_of_a_timed_out_request_are_skipped(self):
+        release = threading.Event()
+        started = []
+
+        def lookup(context, arg):
+            started.append(arg)
+            release.wait(5)
+
+        assert_raises(concurrency.LookupTimeout, concurrency.run_concurrently, {},
+                      [(lookup, 1), (lookup, 2), (lookup, 3)])
+        release.set()
+        # the pool is free again once the lookup that was running ends
+        assert_equal(self.pool.apply(len, [started]), 1)
+        assert_equal(started, [1])
@@ -0,0 +1,62 @@
+"""Tests for dangling.py, the references to codes without a package."""
+import ckan.model as model
+import ckan.tests.helpers as helpers
+from nose.tools import assert_equal
+
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import sync
+from ckanext.datalineage.tests import create_package
+
+
+def _create(code, **fields):
+    create_package(code, **fields)
+    fields['code'] = code
+    sync.sync_lineage(code, fields)
+
+
+def _rename(package_id, code, **fields):
+    """
+    Changes the code of a package with plain SQL and syncs its lineage as the plugin does
+    """
+    extra_table = model.package_extra_table
+    model.Session.execute(extra_table.update().where(
+        (extra_table.c.package_id == package_id) & (extra_table.c.key == u'code'))
+        .values(value=code))
+    fields['code'] = code
+    sync.sync_lineage(package_id, fields)
+
+
+def _dangling():
+    rows, _ = lineage_model.get_dangling()
+    return [(package_id, code, field) for package_id, _, code, field, _ in rows]
+
+
+class TestDangling(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+        # m -> x -> c
+        _create('m')
+        _create('x', parent='m')
+        _create('c', producers='x')
+
+    def test_references_to_a_renamed_code_are_recorded(self):
+        assert_equal(_dangling(), [])
+        _rename('x', 'y', parent='m')
+        assert_equal(_dangling(), [('c', 'x', 'producers')])
+        # the references follow the code back
+        _rename('x', 'x', parent='m')
+        assert_equal(_dangling(), [])
+
+    def test_code_kept_by_another_package_is_not_dangling(self):
+        _create('x2')
+        _rename('x2', 'x')
+        _rename('x', 'y', parent='m')
+        assert_equal(_dangling(), [])
+
+    def test_references_to_a_deleted_package_are_recorded(self):
+        model.Session.execute(model.package_table.update()
+                              .where(model.package_table.c.id == 'x').values(state=u'deleted'))
+        sync.forget_lineage('x', 'x')
+        assert_equal(_dangling(), [('c', 'x', 'producers')])
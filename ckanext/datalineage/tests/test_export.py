@@ -0,0 +1,45 @@
+"""Tests for export.py."""
+import os
+import shutil
+import tempfile
+from xml.etree import ElementTree
+
+import ckan.model as model
+import ckan.tests.helpers as helpers
+from nose.tools import assert_equal, assert_true
+
+from ckanext.datalineage import export
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage.tests import create_package
+
+GRAPHML = '{http://graphml.graphdrawing.org/xmlns}'
+
+
+class TestExport(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+        self.directory = tempfile.mkdtemp()
+        for code, fields in (('d', {'parent': u'm', 'consumers': u'gone'}),
+                             ('m', {'producers': u'raw'})):
+            create_package(code, **fields)
+            lineage_model.sync_package_edges(code, lineage_model.package_edges(code, **fields))
+        # a package with lineage fields but no code is skipped
+        model.Session.execute(model.package_table.insert().values(id='nocode', name='nocode'))
+        model.Session.execute(model.package_extra_table.insert().values(
+            package_id='nocode', key='parent', value=u'm', state=u'active'))
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_graphml_edges_have_their_nodes(self):
+        path = os.path.join(self.directory, 'lineage.graphml')
+        assert_equal(export.export_to_file('graphml', path), 2)
+        graph = ElementTree.parse(path).getroot().find(GRAPHML + 'graph')
+        nodes = dict((node.get('id'), [data.text for data in node.findall(GRAPHML + 'data')
+                                       if data.get('key') == 'missing'])
+                     for node in graph.findall(GRAPHML + 'node'))
+        assert_equal(nodes, {'d': [], 'm': [], 'gone': ['true'], 'raw': ['true']})
+        for edge in graph.findall(GRAPHML + 'edge'):
+            assert_true(edge.get('source') in nodes and edge.get('target') in nodes)
@@ -0,0 +1,133 @@
+"""Tests for history.py and the edge history of model.py."""
+import datetime
+
+import ckan.model as model
+import ckan.tests.helpers as helpers
+import mock
+from nose.tools import assert_equal
+from sqlalchemy import select
+
+from ckanext.datalineage import history
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage.logic import action
+from ckanext.datalineage.tests import create_package
+
+T1 = datetime.datetime(2020, 1, 1)
+T2 = datetime.datetime(2020, 2, 1)
+T3 = datetime.datetime(2020, 3, 1)
+SECOND = datetime.timedelta(seconds=1)
+
+
+def _sync_at(now, package_id, **fields):
+    clock = mock.Mock(datetime=mock.Mock(utcnow=mock.Mock(return_value=now)))
+    with mock.patch.object(lineage_model, 'datetime', clock):
+        lineage_model.sync_package_edges(package_id,
+                                         lineage_model.package_edges(package_id, **fields))
+
+
+def _periods():
+    table = lineage_model.edge_history_table
+    return sorted(tuple(row) for row in model.Session.execute(select(
+        [table.c.package_id, table.c.source, table.c.target, table.c.relation,
+         table.c.valid_from, table.c.valid_to])))
+
+
+def _edges_as_of(code, as_of):
+    return [tuple(edge) for edge in lineage_model.get_edges_as_of([code], as_of, False)]
+
+
+class TestEdgeHistory(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+
+    def test_periods_are_opened_and_closed(self):
+        _sync_at(T1, 'd', parent='m', producers='a')
+        _sync_at(T2, 'd', parent='m2', producers='a')
+        # a change without any edge change leaves the periods alone
+        _sync_at(T2 + SECOND, 'd', parent='m2', producers='a')
+        _sync_at(T3, 'd')
+        assert_equal(_periods(), [
+            ('d', 'a', 'd', 'producer', T1, T3),
+            ('d', 'm', 'd', 'parent', T1, T2),
+            ('d', 'm2', 'd', 'parent', T2, T3),
+        ])
+
+    def test_edges_are_valid_from_their_start_until_their_end(self):
+        _sync_at(T1, 'd', parent='m')
+        _sync_at(T2, 'd', parent='m2')
+        assert_equal(_edges_as_of('d', T1 - SECOND), [])
+        assert_equal(_edges_as_of('d', T1), [('m', 'd', 'parent')])
+        assert_equal(_edges_as_of('d', T2 - SECOND), [('m', 'd', 'parent')])
+        assert_equal(_edges_as_of('d', T2), [('m2', 'd', 'parent')])
+        # the open period has no end
+        assert_equal(_edges_as_of('d', datetime.datetime(2100, 1, 1)), [('m2', 'd', 'parent')])
+        assert_equal(lineage_model.get_lineage_fields_as_of(['d'], T1)['d']['parent'], 'm')
+        assert_equal(lineage_model.count_neighbours_as_of('m', T2, True), 0)
+
+    def test_deleted_packages_are_missing_nodes(self):
+        create_package('d', parent=u'm')
+        _sync_at(T1, 'd', parent='m')
+        _sync_at(T2, 'm', producers='raw')
+        _sync_at(T3, 'm')
+        packages = {'d': {'name': 'd'}}
+        with mock.patch.object(action.tk, 'check_access'), \
+                mock.patch.object(action, 'hidden_codes', return_value=set()), \
+                mock.patch.object(action, 'resolve_codes', return_value=packages):
+            result = action.datalineage_graph({}, {'code': 'd', 'direction': 'upstream',
+                                                   'as_of': '2020-02-15', 'fields': 'name'})
+        assert_equal(result['nodes'], [
+            {'code': 'd', 'depth': 0, 'name': 'd'},
+            {'code': 'm', 'depth': -1, 'missing': True},
+            {'code': 'raw', 'depth': -2, 'missing': True},
+        ])
+
+
+def test_activities_are_replayed():
+    activities = [
+        (T1, u'new package', {'package': {'extras': [{'key': 'code', 'value': 'd'},
+                                                     {'key': 'parent', 'value': 'm'}]}}),
+        # the lineage fields are top level keys once the schema is applied
+        (T2, u'changed package', {'package': {'code': 'd', 'parent': 'm2'}}),
+        (T3, u'deleted package', {}),
+    ]
+    periods = []
+    history._replay('d', activities, [], T3, periods)
+    assert_equal(sorted(periods), [('d', 'm', 'd', 'parent', T1, T2),
+                                   ('d', 'm2', 'd', 'parent', T2, T3)])
+
+
+def test_edges_written_without_activity_are_dated_by_the_last_change():
+    activities = [(T1, u'new package', {'package': {'code': 'd', 'parent': 'm'}})]
+    periods = []
+    history._replay('d', activities, [('m', 'd', 'parent'), ('d', 'x', 'consumer')], T2, periods)
+    assert_equal(sorted(periods), [('d', 'd', 'x', 'consumer', T2, None),
+                                   ('d', 'm', 'd', 'parent', T1, None)])
+
+
+class TestRebuildHistory(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+
+    def test_history_is_rebuilt_from_the_activities(self):
+        for code, fields in (('d', {'parent': u'm2'}), ('e', {'parent': u'm'})):
+            create_package(code, **fields)
+            lineage_model.sync_package_edges(code, lineage_model.package_edges(code, **fields))
+        model.Session.execute(model.package_table.update().values(
+            metadata_created=T1, metadata_modified=T2))
+        activities = [
+            ('d', T1, u'new package', {'package': {'code': 'd', 'parent': 'm'}}),
+            ('d', T2, u'changed package', {'package': {'code': 'd', 'parent': 'm2'}}),
+        ]
+        with mock.patch.object(lineage_model, 'iter_package_activities',
+                               return_value=iter(activities)):
+            assert_equal(history.rebuild_history(), 3)
+        assert_equal(_periods(), [
+            ('d', 'm', 'd', 'parent', T1, T2),
+            ('d', 'm2', 'd', 'parent', T2, None),
+            # no activity, the edge is declared since the package was created
+            ('e', 'm', 'e', 'parent', T1, None),
+        ])
@@ -0,0 +1,75 @@
+"""Tests for httpcache.py."""
+import datetime
+
+import ckan.tests.helpers as helpers
+import mock
+from nose.tools import assert_equal, assert_not_equal, assert_true, assert_false
+
+from ckanext.datalineage import httpcache
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage.tests import create_package
+
+PACKAGE = {'id': 'pkg', 'metadata_modified': '2020-01-01T00:00:00'}
+OLD = datetime.datetime(2020, 1, 1, 10, 0, 0, 500)
+NEW = datetime.datetime(2020, 1, 2, 10, 0, 0)
+
+
+def _is_not_modified(headers, etag, last_modified):
+    with mock.patch.object(httpcache, 'request', mock.Mock(headers=headers)):
+        return httpcache.is_not_modified(etag, last_modified)
+
+
+def test_validators_follow_the_packages_of_the_page():
+    etag, last_modified = httpcache.compute_validators(PACKAGE, [('a', OLD), ('b', NEW)])
+    assert_equal(last_modified, NEW)
+    assert_equal(httpcache.compute_validators(PACKAGE, [('a', OLD), ('b', NEW)]),
+                 (etag, last_modified))
+    assert_not_equal(httpcache.compute_validators(PACKAGE, [('a', NEW), ('b', NEW)])[0], etag)
+    assert_not_equal(httpcache.compute_validators(PACKAGE, [('a', OLD)])[0], etag)
+    assert_not_equal(httpcache.compute_validators(PACKAGE, [('a', OLD), ('b', NEW)], 'user')[0],
+                     etag)
+
+
+def test_etag_is_matched():
+    etag, _ = httpcache.compute_validators(PACKAGE, [('a', OLD)])
+    assert_true(_is_not_modified({'If-None-Match': '"other", %s' % etag}, etag, OLD))
+    assert_true(_is_not_modified({'If-None-Match': '*'}, etag, OLD))
+    assert_false(_is_not_modified({'If-None-Match': '"other"'}, etag, OLD))
+    # If-None-Match takes precedence over If-Modified-Since
+    assert_false(_is_not_modified({'If-None-Match': '"other"',
+                                   'If-Modified-Since': 'Sat, 01 Jan 2050 00:00:00 GMT'},
+                                  etag, OLD))
+
+
+def test_modification_date_is_compared_to_the_second():
+    assert_true(_is_not_modified({'If-Modified-Since': 'Wed, 01 Jan 2020 10:00:00 GMT'},
+                                 '"x"', OLD))
+    assert_false(_is_not_modified({'If-Modified-Since': 'Wed, 01 Jan 2020 09:59:59 GMT'},
+                                  '"x"', OLD))
+    assert_false(_is_not_modified({'If-Modified-Since': 'not a date'}, '"x"', OLD))
+    assert_false(_is_not_modified({}, '"x"', OLD))
+
+
+class TestPageVersions(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+        # raw -> m -> d -> m2 -> d2, and x -> m2
+        for code, fields in [('raw', {}), ('m', {'producers': 'raw'}),
+                             ('d', {'parent': 'm', 'consumers': 'm2'}),
+                             ('m2', {'producers': 'x'}), ('x', {}), ('d2', {'parent': 'm2'})]:
+            create_package(code, **fields)
+            lineage_model.sync_package_edges(code, lineage_model.package_edges(code, **fields))
+
+    def _codes(self, code, **fields):
+        fields['code'] = code
+        return set(package_id for package_id, _ in httpcache.page_versions(fields))
+
+    def test_model_page_covers_the_models_using_its_dataset(self):
+        # the page of m shows m2 with its producer x and its dataset d2
+        assert_equal(self._codes('m'), set(['raw', 'm', 'd', 'm2', 'x', 'd2']))
+
+    def test_dataset_page_covers_two_edges(self):
+        assert_equal(self._codes('d', parent='m'), set(['raw', 'm', 'd', 'm2', 'x', 'd2']))
+        assert_equal(self._codes('d2', parent='m2'), set(['d', 'm2', 'x', 'd2']))
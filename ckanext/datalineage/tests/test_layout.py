@@ -0,0 +1,67 @@
+"""Tests for layout.py and the layout of the lineage page."""
+import mock
+from nose.tools import assert_equal, assert_true
+
+from ckanext.datalineage import cache
+from ckanext.datalineage import layout
+from ckanext.datalineage import metaviz
+
+
+def _assert_no_overlap(positions, size, gap):
+    ranks = {}
+    for node, (rank, start) in positions.items():
+        ranks.setdefault(rank, []).append(start)
+    for starts in ranks.values():
+        starts.sort()
+        for previous, start in zip(starts, starts[1:]):
+            assert_true(start - previous >= size + gap, starts)
+
+
+def test_layers_follow_the_longest_path():
+    positions = layout.layered_layout(['a', 'b', 'c', 'd'],
+                                      [('a', 'b'), ('b', 'c'), ('a', 'c'), ('a', 'd')])
+    assert_equal(dict((node, rank) for node, (rank, _) in positions.items()),
+                 {'a': 0, 'b': 1, 'c': 2, 'd': 1})
+    _assert_no_overlap(positions, 90, 10)
+
+
+def test_cycles_are_laid_out():
+    positions = layout.layered_layout(['a', 'b', 'c'], [('a', 'b'), ('b', 'c'), ('c', 'a')])
+    assert_equal(sorted(rank for rank, _ in positions.values()), [0, 1, 2])
+
+
+def test_crossings_are_removed():
+    ranks = layout.order_ranks([['a', 'b'], ['c', 'd']], [('a', 'd'), ('b', 'c')])
+    assert_equal(ranks[0].index('a') < ranks[0].index('b'),
+                 ranks[1].index('d') < ranks[1].index('c'))
+
+
+def test_given_layers_and_sizes_are_kept():
+    positions = layout.layered_layout(['a', 'b', 'c'], [('a', 'b'), ('a', 'c')],
+                                      layers={'a': 0, 'b': 2, 'c': 2},
+                                      sizes={'a': 50, 'b': 50, 'c': 50}, gap=5)
+    assert_equal([positions[node][0] for node in 'abc'], [0, 2, 2])
+    _assert_no_overlap(positions, 50, 5)
+    # the parent sits at the middle of its two children, give or take the rounding
+    middle = (positions['b'][1] + positions['c'][1] + 50) / 2.0
+    assert_true(abs(positions['a'][1] + 25 - middle) <= 1)
+
+
+def test_metaviz_layouts_are_cached_by_shape():
+    mapping = {'paramName': 'mapping', 'detail_0': 'x', 'lineage_model_0': 'y',
+               'lineage_dataset_0': 'z', 'lineage_dataset_1': 'z', 'usage_model_0': 'u',
+               'usage_dataset_0': 'v', 'usage_model_1': 'u', 'usage_dataset_1': 'v'}
+    code_cache = cache.CodeCache(cache.MemoryBackend())
+    with mock.patch.object(cache, 'get_code_cache', return_value=code_cache), \
+            mock.patch.object(metaviz, 'compute_metaviz_layout',
+                              wraps=metaviz.compute_metaviz_layout) as compute:
+        first = metaviz.metaviz_layout(mapping)
+        second = metaviz.metaviz_layout(dict(mapping, detail_0='other'))
+    assert_equal(compute.call_count, 1)
+    assert_equal(first, second)
+    assert_equal(first['paramName'], 'layout')
+    assert_equal(min(value for key, value in first.items() if key != 'paramName'), 0)
+    # the cards of a column do not overlap, the normal and the mini ones
+    assert_true(first['usage_model_1'] - first['usage_model_0'] >= 85 + 10)
+    assert_true(first['lineage_dataset_1'] - first['lineage_dataset_0'] >= 90 + 10)
+    assert_true(first['usage_dataset_mini_1'] - first['usage_dataset_mini_0'] >= 50 + 10)
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""Tests for memgraph.py, the in-memory graph must answer as the datalineage_edge table."""
+import ckan.model as model
+import ckan.tests.helpers as helpers
+from nose.tools import assert_equal
+
+from ckanext.datalineage import memgraph
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import traversal
+
+# codes whose order differs between the code points and most collations
+CODES = [u'B', u'a', u'a-b', u'ab', u'a_c', u'Z9', u'\xe9t\xe9', u'e', u'10', u'9']
+
+
+def _rows():
+    rows = [('d', 'd', 'm', 'consumer'), ('d', 'm0', 'd', 'parent')]
+    rows.extend(('p-%s' % index, code, 'm', 'producer') for index, code in enumerate(CODES))
+    rows.extend(('d', 'd', code, 'consumer') for code in CODES)
+    return rows
+
+
+def _pages(edge_source, code, downstream, limit):
+    pages = []
+    after = None
+    while True:
+        codes, more = edge_source.neighbour_page(code, downstream, None, after, limit)
+        pages.append(codes)
+        if not more:
+            return pages
+        after = codes[-1]
+
+
+def test_neighbours_are_stored_in_code_order():
+    graph = memgraph.CompactGraph(_rows())
+    assert_equal(graph.codes, sorted(graph.codes))
+    adjacency = graph.downstream_edges
+    code_id = graph.ids['d']
+    neighbours = adjacency.neighbours[adjacency.offsets[code_id]:adjacency.offsets[code_id + 1]]
+    assert_equal([graph.codes[neighbour] for neighbour in neighbours], sorted(CODES + ['m']))
+    assert_equal(graph.upstream(['d']), [('m0', 'd', 'parent')])
+    assert_equal(graph.downstream(['m0', 'x']), [('m0', 'd', 'parent')])
+    assert_equal(graph.count_neighbours('m', False, ['producer']), len(CODES))
+    assert_equal(graph.edge_count(), 2 + 2 * len(CODES))
+
+
+def test_overlay_replaces_the_edges_of_changed_packages():
+    graph = memgraph.CompactGraph(_rows())
+    before = graph.overlay
+    graph.apply_changes({'d': [('d', u'a', 'consumer'), ('d', u'new', 'consumer')],
+                         'p-new': [('m', u'ab', 'producer')]})
+    assert_equal(graph.neighbour_page('d', True, None, None, 50), ([u'a', u'new'], False))
+    assert_equal(graph.upstream(['d']), [])
+    assert_equal(graph.downstream(['m']), [('m', u'ab', 'producer')])
+    # the overlay the running lookups hold is left as it was
+    assert_equal(before.packages, {})
+    graph.apply_changes({'d': []})
+    assert_equal(graph.count_neighbours('d'), 0)
+    assert_equal(graph.count_neighbours('m', True), 1)
+
+
+class TestAgainstSQL(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+        for package_id, source, target, relation in _rows():
+            model.Session.execute(lineage_model.edge_table.insert().values(
+                package_id=package_id, source=source, target=target, relation=relation))
+        model.Session.commit()
+
+    def test_pages_are_the_same(self):
+        graph = memgraph.CompactGraph(lineage_model.iter_edges())
+        sql = traversal.SQLEdgeSource()
+        for code, downstream in (('d', True), ('m', False), ('m', True), ('x', True)):
+            for limit in (1, 3, 50):
+                assert_equal(_pages(graph, code, downstream, limit),
+                             _pages(sql, code, downstream, limit))
+            assert_equal(graph.count_neighbours(code, downstream),
+                         sql.count_neighbours(code, downstream))
+
+    def test_logged_changes_are_applied_on_refresh(self):
+        engine = memgraph.Engine(refresh_interval=0)
+        engine.load()
+        edges = [('d', u'a', 'consumer'), ('d', u'\xe9', 'consumer')]
+        lineage_model.sync_package_edges('d', edges)
+        lineage_model.record_graph_change('d')
+        model.Session.commit()
+        assert_equal(engine.graph.count_neighbours('d'), len(CODES) + 1)
+        graph = engine.get()
+        assert_equal(graph.neighbour_page('d', True, None, None, 50), ([u'a', u'\xe9'], False))
+        assert_equal(graph.upstream(['d']), [])
+        assert_equal(_pages(graph, 'd', True, 1),
+                     _pages(traversal.SQLEdgeSource(), 'd', True, 1))
+        assert_equal(graph.overlay.packages.keys(), ['d'])
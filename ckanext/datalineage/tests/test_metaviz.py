@@ -0,0 +1,21 @@
+"""Tests for metaviz.py."""
+import mock
+from nose.tools import assert_equal
+
+from ckanext.datalineage import metaviz
+
+
+def test_usage_dataset_is_the_first_generated_dataset_found():
+    generated = {'m1': ['gone', 'd1', 'd2'], 'm2': ['gone'], 'm3': ['d3']}
+    packages = {'d1': {'code': 'd1'}, 'd2': {'code': 'd2'}, 'd3': {'code': 'd3'}}
+
+    def resolve_codes(context, codes):
+        return dict((code, packages[code]) for code in codes if code in packages)
+
+    with mock.patch.object(metaviz.lineage_model, 'get_generated_codes', return_value=generated), \
+            mock.patch.object(metaviz.traversal, 'get_edge_source'), \
+            mock.patch.object(metaviz, 'resolve_codes', side_effect=resolve_codes) as resolve:
+        result = metaviz.get_usage_datasets({}, [{'code': 'm1'}, {'code': 'm2'}, {'code': 'm3'}])
+    assert_equal(result, {'m1': packages['d1'], 'm3': packages['d3']})
+    # the codes of all the models are resolved at once
+    assert_equal(resolve.call_count, 1)
@@ -0,0 +1,121 @@
+"""Tests for reindex.py."""
+import datetime
+import threading
+
+import ckan.model as model
+import ckan.tests.helpers as helpers
+import mock
+from nose.tools import assert_equal
+
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import reindex
+
+
+class FakeConnection(object):
+    """
+    Stand-in of the redis connection of the job queue, keys never expire
+    """
+
+    def __init__(self):
+        self.keys = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = value
+        return True
+
+    def delete(self, key):
+        self.keys.pop(key, None)
+
+
+class TestDeferredReindex(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+        reindex.setup()
+        self.connection = FakeConnection()
+        self.patches = [
+            mock.patch.object(reindex.jobs, 'get_queue',
+                              return_value=mock.Mock(connection=self.connection)),
+            mock.patch.object(reindex, 'Scheduler'),
+            mock.patch.object(reindex, 'reindex_packages'),
+        ]
+        self.scheduler, self.reindex_packages = [patch.start() for patch in self.patches][1:]
+
+    def teardown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _edit(self, package_ids):
+        reindex.defer_reindex(package_ids)
+        model.Session.commit()
+
+    def _scheduled(self):
+        return self.scheduler.return_value.enqueue_in.call_count
+
+    def test_edits_are_coalesced_into_one_job(self):
+        self._edit(['a', 'b'])
+        self._edit(['b'])
+        self._edit(['c'])
+        assert_equal(self._scheduled(), 1)
+        delay, job = self.scheduler.return_value.enqueue_in.call_args[0]
+        assert_equal((delay, job), (datetime.timedelta(seconds=60), reindex.flush_job))
+        assert_equal(sorted(lineage_model.get_reindex_queue(datetime.datetime.utcnow())),
+                     ['a', 'b', 'c'])
+
+        reindex.flush_job()
+        self.reindex_packages.assert_called_once()
+        assert_equal(sorted(self.reindex_packages.call_args[0][0]), ['a', 'b', 'c'])
+        assert_equal(lineage_model.get_reindex_queue(datetime.datetime.utcnow()), [])
+        # nothing left to flush, so no new job
+        assert_equal(self._scheduled(), 1)
+
+    def test_edit_after_the_job_started_queues_a_new_job(self):
+        self._edit(['a'])
+        reindex.flush_job()
+        self._edit(['a'])
+        assert_equal(self._scheduled(), 2)
+
+    def test_lost_job_is_queued_again_by_the_next_edit(self):
+        self._edit(['a'])
+        # the job never ran and its pending key expired
+        self.connection.delete(reindex.PENDING_JOB_KEY)
+        self._edit(['b'])
+        assert_equal(self._scheduled(), 2)
+
+    def test_rolled_back_edits_queue_no_job(self):
+        reindex.defer_reindex(['a'])
+        model.Session.rollback()
+        model.Session.commit()
+        assert_equal(self._scheduled(), 0)
+
+    def test_failed_scheduling_is_retried_by_the_next_edit(self):
+        self.scheduler.return_value.enqueue_in.side_effect = [Exception('down'), mock.Mock()]
+        self._edit(['a'])
+        self._edit(['b'])
+        assert_equal(self._scheduled(), 2)
+
+    def test_concurrent_edits_queue_the_same_package(self):
+        lineage_model.queue_reindex(['a', 'a'])
+        errors = []
+
+        def other_request():
+            # the scoped session gives the thread its own transaction, it waits for ours
+            try:
+                lineage_model.queue_reindex(['b', 'a'])
+                model.Session.commit()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                model.Session.remove()
+
+        thread = threading.Thread(target=other_request)
+        thread.start()
+        thread.join(0.5)
+        model.Session.commit()
+        thread.join()
+        assert_equal(errors, [])
+        assert_equal(sorted(lineage_model.get_reindex_queue(datetime.datetime.utcnow())),
+                     ['a', 'b'])
@@ -0,0 +1,75 @@
+"""Tests for snapshot.py and the snapshot tables of model.py."""
+import json
+
+import ckan.model as model
+import ckan.tests.helpers as helpers
+import mock
+from nose.tools import assert_equal
+
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import snapshot
+
+
+class TestSaveSnapshot(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+
+    def test_versions_are_bumped(self):
+        assert_equal(lineage_model.save_snapshot('pkg', '{}', ['a']), 1)
+        assert_equal(lineage_model.save_snapshot('pkg', '{"b": 1}', ['b']), 2)
+        model.Session.commit()
+        row = lineage_model.get_snapshot('pkg')
+        assert_equal((row.version, row.payload, row.dirty), (2, '{"b": 1}', False))
+
+    def test_existing_row_is_not_inserted_again(self):
+        # a snapshot inserted by a concurrent build between the read and the write
+        model.Session.execute(lineage_model.snapshot_table.insert().values(
+            package_id='pkg', version=3, payload='{}', dirty=True))
+        assert_equal(lineage_model.save_snapshot('pkg', '{}', []), 4)
+        assert_equal(lineage_model.get_snapshot('pkg').dirty, False)
+
+    def test_codes_without_a_package_mark_the_snapshot_dirty(self):
+        extra_vars = {'detail_data': {'code': 'a'}, 'current_model': {}, 'usage_models': [],
+                      'usage_datasets': {}, 'datalineage_producers': [],
+                      'referenced_codes': set(['a', 'dangling'])}
+        with mock.patch.object(snapshot, 'collect_lineage', return_value=extra_vars), \
+                mock.patch.object(snapshot, 'convert_extra_vars_to_metaviz', return_value={}):
+            snapshot.build_snapshot({}, {'id': 'pkg'})
+        assert_equal(lineage_model.mark_snapshots_dirty(['dangling']), ['pkg'])
+        assert_equal(lineage_model.get_dirty_snapshots(), ['pkg'])
+
+
+class TestGetPayload(object):
+
+    def setup(self):
+        snapshot._requested.clear()
+
+    def _get_payload(self, row):
+        with mock.patch.object(lineage_model, 'get_snapshot', return_value=row), \
+                mock.patch.object(snapshot.tk, 'enqueue_job') as enqueue_job, \
+                mock.patch.object(snapshot, 'build_metaviz_payload', return_value={'live': 1}), \
+                mock.patch.object(model.Session, 'commit') as commit:
+            results = [snapshot.get_payload({}, {'id': 'pkg'}) for _ in range(3)]
+        assert_equal(commit.call_count, 0)
+        return results, enqueue_job
+
+    def test_clean_snapshot_is_served(self):
+        results, enqueue_job = self._get_payload(
+            mock.Mock(dirty=False, payload=json.dumps({'a': 1})))
+        assert_equal(results[0], ({'a': 1}, True))
+        assert_equal(enqueue_job.call_count, 0)
+
+    def test_dirty_snapshot_is_served_until_rebuilt(self):
+        results, enqueue_job = self._get_payload(
+            mock.Mock(dirty=True, payload=json.dumps({'a': 1})))
+        assert_equal(results, [({'a': 1}, False)] * 3)
+        # the rebuild is queued once for the three views
+        assert_equal(enqueue_job.call_count, 1)
+        assert_equal(enqueue_job.call_args[0][1], [['pkg'], True])
+
+    def test_missing_snapshot_is_built_for_the_request(self):
+        results, enqueue_job = self._get_payload(None)
+        assert_equal(results[0], ({'live': 1}, True))
+        assert_equal(enqueue_job.call_count, 1)
@@ -0,0 +1,59 @@
+"""Tests for stats.py."""
+import ckan.tests.helpers as helpers
+import mock
+from nose.tools import assert_equal
+
+from ckanext.datalineage import closure
+from ckanext.datalineage import memgraph
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import stats
+from ckanext.datalineage import traversal
+
+
+def _sync(package_id, **fields):
+    lineage_model.sync_package_edges(package_id, lineage_model.package_edges(package_id, **fields))
+
+
+class TestLineageStats(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+        # raw -> m -> d -> m2 -> d2, and raw2 -> m
+        _sync('m', producers='raw,raw2')
+        _sync('d', parent='m', consumers='m2')
+        _sync('d2', parent='m2')
+
+    def _stats(self, code, max_depth=10):
+        with mock.patch.object(traversal, 'get_limits', return_value=(max_depth, 1000)), \
+                mock.patch.object(traversal, 'traverse') as traverse:
+            result = stats.lineage_stats(code)
+        # the statistics are aggregated by the database, the lineage is not walked
+        assert_equal(traverse.call_count, 0)
+        return result
+
+    def test_statistics_of_a_dataset(self):
+        closure.rebuild_closure()
+        assert_equal(self._stats('d'), {'consumer_count': 1, 'producer_count': 0,
+                                         'downstream_reach': 2, 'depth': 2})
+        assert_equal(self._stats('raw'), {'consumer_count': 1, 'producer_count': 0,
+                                           'downstream_reach': 4, 'depth': 0})
+        assert_equal(self._stats('d2')['depth'], 4)
+        assert_equal(self._stats('d2', max_depth=3)['depth'], 3)
+
+    def test_reach_is_zero_until_the_closure_is_built(self):
+        assert_equal(self._stats('raw')['downstream_reach'], 0)
+        assert_equal(self._stats('d2')['depth'], 4)
+
+    def test_depth_of_a_cycle_is_bounded(self):
+        _sync('raw', parent='d2')
+        assert_equal(self._stats('d', max_depth=7)['depth'], 7)
+
+    def test_counts_see_the_current_transaction(self):
+        # the in-memory graph only gets the changes once committed, the package being
+        # indexed inside its update must still get its new counts
+        graph = memgraph.CompactGraph(lineage_model.iter_edges())
+        with mock.patch.object(memgraph, 'get_graph', return_value=graph):
+            _sync('m', producers='raw,raw2,raw3')
+            assert_equal(graph.count_neighbours('m', False, lineage_model.USAGE_RELATIONS), 2)
+            assert_equal(self._stats('m')['producer_count'], 3)
@@ -0,0 +1,81 @@
+"""Tests for the neighbour pages of traversal.py."""
+import datetime
+
+import ckan.tests.helpers as helpers
+import mock
+from nose.tools import assert_equal, assert_raises
+
+from ckanext.datalineage import memgraph
+from ckanext.datalineage import metaviz
+from ckanext.datalineage import model as lineage_model
+from ckanext.datalineage import traversal
+
+
+def _sync(package_id, **fields):
+    lineage_model.sync_package_edges(package_id, lineage_model.package_edges(package_id, **fields))
+
+
+def _edge_sources():
+    """
+    Yields every edge source reading the edges synced so far
+    """
+    yield traversal.SQLEdgeSource()
+    yield memgraph.CompactGraph(lineage_model.iter_edges())
+    yield traversal.HistoryEdgeSource(datetime.datetime.utcnow())
+
+
+def _pages(code, direction, limit, edge_source, **kwargs):
+    pages = []
+    cursor = None
+    with mock.patch.object(traversal, 'get_edge_source', return_value=edge_source):
+        while True:
+            page = traversal.neighbour_page(code, direction, cursor=cursor, limit=limit, **kwargs)
+            pages.append(page['codes'])
+            cursor = page['next_cursor']
+            if cursor is None:
+                return pages, page['total']
+
+
+class TestNeighbourPage(object):
+
+    def setup(self):
+        helpers.reset_db()
+        lineage_model.setup()
+
+    def test_pages_follow_the_cursor(self):
+        _sync('d', consumers='m3,m1,m5,m2,m4')
+        for edge_source in _edge_sources():
+            assert_equal(_pages('d', traversal.DOWNSTREAM, 2, edge_source),
+                         ([['m1', 'm2'], ['m3', 'm4'], ['m5']], 5))
+            assert_equal(_pages('d', traversal.DOWNSTREAM, 5, edge_source),
+                         ([['m1', 'm2', 'm3', 'm4', 'm5']], 5))
+            assert_equal(_pages('m1', traversal.UPSTREAM, 5, edge_source), ([['d']], 1))
+
+    def test_neighbours_linked_twice_are_listed_once(self):
+        _sync('d', consumers='m')
+        _sync('m', producers='d,d2')
+        for edge_source in _edge_sources():
+            assert_equal(_pages('m', traversal.UPSTREAM, 1, edge_source), ([['d'], ['d2']], 2))
+
+    def test_invalid_cursor_is_rejected(self):
+        for cursor in ('not base64!', '', traversal.encode_cursor(u'd')[:-1]):
+            with assert_raises(ValueError):
+                traversal.decode_cursor(cursor)
+        assert_equal(traversal.decode_cursor(traversal.encode_cursor(u'gl\xfces:a')), u'gl\xfces:a')
+
+    def test_datasets_declaring_a_producer_are_no_usage_models(self):
+        # d2 is generated by m2 and declares d as producer, m1 and m3 use d
+        _sync('d', consumers='m1')
+        _sync('d2', parent='m2', producers='d')
+        _sync('m3', producers='d')
+        for edge_source in _edge_sources():
+            assert_equal(_pages('d', traversal.DOWNSTREAM, 1, edge_source,
+                                relations=lineage_model.USAGE_RELATIONS),
+                         ([['d2'], ['m1'], ['m3']], 3))
+            assert_equal(_pages('d', traversal.DOWNSTREAM, 1, edge_source,
+                                relations=lineage_model.USAGE_RELATIONS, exclude_generated=True),
+                         ([['m1'], ['m3']], 2))
+            with mock.patch.object(traversal, 'get_edge_source', return_value=edge_source):
+                page = metaviz._neighbour_page('d', traversal.DOWNSTREAM, 10,
+                                               exclude_generated=True)
+            assert_equal((page['codes'], page['total']), (['m1', 'm3'], 2))
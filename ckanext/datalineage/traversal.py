@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Traversal module
+Walks the lineage graph over any number of hops
+
+The graph is walked level by level, every level costs one query per direction whatever
+the number of codes in it, so a graph of thousands of nodes resolves in a few queries. When
+the in-memory graph of the worker is enabled and loaded, the edges are read from it instead,
+see the memgraph module. The graph at a past date is walked the same way over the edge
+history, see the history module.
+
+The limits default to the following settings:
+
+    ckanext.datalineage.traversal.max_depth = 10
+    ckanext.datalineage.traversal.max_nodes = 1000
+
+Nodes with many neighbours are expanded one page at a time, the following pages are read
+with a cursor:
+
+    ckanext.datalineage.neighbours.page_size = 50
+    ckanext.datalineage.neighbours.max_page_size = 500
+"""
+
+import base64
+import binascii
+from collections import OrderedDict
+
+from ckan.common import config
+
+from ckanext.datalineage import memgraph
+from ckanext.datalineage import metrics
+from ckanext.datalineage import model as lineage_model
+
+UPSTREAM = 'upstream'
+DOWNSTREAM = 'downstream'
+BOTH = 'both'
+DIRECTIONS = (UPSTREAM, DOWNSTREAM, BOTH)
+
+DEFAULT_MAX_DEPTH = 10
+DEFAULT_MAX_NODES = 1000
+DEFAULT_PAGE_SIZE = 50
+DEFAULT_MAX_PAGE_SIZE = 500
+
+
+class SQLEdgeSource(object):
+    """
+    Reads the edges from the datalineage_edge table
+    """
+
+    def upstream(self, codes, relations=None):
+        return lineage_model.get_upstream_edges(codes, relations)
+
+    def downstream(self, codes, relations=None):
+        return lineage_model.get_downstream_edges(codes, relations)
+
+    def neighbour_page(self, code, downstream=True, relations=None, after=None, limit=50,
+                       exclude_generated=False):
+        return lineage_model.get_neighbour_page(code, downstream, relations, after, limit,
+                                                exclude_generated)
+
+    def count_neighbours(self, code, downstream=True, relations=None, exclude_generated=False):
+        return lineage_model.count_neighbours(code, downstream, relations, exclude_generated)
+
+
+class HistoryEdgeSource(object):
+    """
+    Reads the edges declared at a date from the datalineage_edge_history table
+    """
+
+    def __init__(self, as_of):
+        self.as_of = as_of
+
+    def upstream(self, codes, relations=None):
+        return lineage_model.get_edges_as_of(codes, self.as_of, False, relations)
+
+    def downstream(self, codes, relations=None):
+        return lineage_model.get_edges_as_of(codes, self.as_of, True, relations)
+
+    def neighbour_page(self, code, downstream=True, relations=None, after=None, limit=50,
+                       exclude_generated=False):
+        return lineage_model.get_neighbour_page_as_of(code, self.as_of, downstream, relations,
+                                                      after, limit, exclude_generated)
+
+    def count_neighbours(self, code, downstream=True, relations=None, exclude_generated=False):
+        return lineage_model.count_neighbours_as_of(code, self.as_of, downstream, relations,
+                                                    exclude_generated)
+
+
+def get_edge_source(as_of=None):
+    """
+    Returns the edges declared at a date when given, otherwise the in-memory graph of the
+    worker when it is loaded or the datalineage_edge table
+
+    @param as_of: Optional datetime
+    """
+    if as_of is not None:
+        return HistoryEdgeSource(as_of)
+    graph = memgraph.get_graph()
+    return graph if graph is not None else SQLEdgeSource()
+
+
+def get_limits(max_depth=None, max_nodes=None):
+    """
+    Returns the (max_depth, max_nodes) limits, the configured values are used as defaults
+    and as upper bounds of the requested ones
+    """
+    config_depth = int(config.get('ckanext.datalineage.traversal.max_depth', DEFAULT_MAX_DEPTH))
+    config_nodes = int(config.get('ckanext.datalineage.traversal.max_nodes', DEFAULT_MAX_NODES))
+    max_depth = config_depth if max_depth is None else min(int(max_depth), config_depth)
+    max_nodes = config_nodes if max_nodes is None else min(int(max_nodes), config_nodes)
+    return max_depth, max_nodes
+
+
+def get_page_size(limit=None):
+    """
+    Returns the number of neighbours in a page, the configured page size is used as default
+    and the configured maximum as upper bound of the requested one
+    """
+    if limit is None:
+        return int(config.get('ckanext.datalineage.neighbours.page_size', DEFAULT_PAGE_SIZE))
+    return min(int(limit), int(config.get('ckanext.datalineage.neighbours.max_page_size',
+                                          DEFAULT_MAX_PAGE_SIZE)))
+
+
+def encode_cursor(code):
+    return base64.urlsafe_b64encode(code.encode('utf-8'))
+
+
+def decode_cursor(cursor):
+    """
+    Returns the code a cursor points after, raises ValueError if the cursor is invalid
+    """
+    try:
+        code = base64.urlsafe_b64decode(str(cursor)).decode('utf-8')
+    except (TypeError, binascii.Error, UnicodeError):
+        raise ValueError('Invalid cursor %s' % cursor)
+    # the decoder skips the characters it does not know
+    if not code or encode_cursor(code) != cursor:
+        raise ValueError('Invalid cursor %s' % cursor)
+    return code
+
+
+@metrics.timed('neighbours')
+def neighbour_page(code, direction, relations=None, cursor=None, limit=None, as_of=None,
+                   exclude_generated=False):
+    """
+    Returns a page of the neighbours of a code as a dict with:
+        codes: the codes of the page, ordered by code
+        total: the number of neighbours of the code
+        next_cursor: cursor of the next page, None on the last page
+
+    @param code: Code whose neighbours are listed
+    @param direction: upstream or downstream
+    @param relations: Optional list of relations to restrict the edges to
+    @param cursor: Cursor returned with the previous page
+    @param limit: Number of neighbours in the page
+    @param as_of: Optional datetime, the neighbours at that date are listed
+    @param exclude_generated: Leave out the neighbours generated by a model, i.e. the datasets
+    """
+    if direction not in (UPSTREAM, DOWNSTREAM):
+        raise ValueError('Unknown direction %s' % direction)
+    downstream = direction == DOWNSTREAM
+    limit = get_page_size(limit)
+    after = decode_cursor(cursor) if cursor else None
+    edge_source = get_edge_source(as_of)
+    codes, more = edge_source.neighbour_page(code, downstream, relations, after, limit,
+                                             exclude_generated)
+    return {
+        'codes': codes,
+        'total': edge_source.count_neighbours(code, downstream, relations, exclude_generated),
+        'next_cursor': encode_cursor(codes[-1]) if more else None,
+    }
+
+
+def _cap_neighbours(edges, sign, max_neighbours, capped):
+    """
+    Keeps the edges to the first max_neighbours neighbours of every node, by code, and
+    records the nodes having more in `capped`
+    """
+    neighbours = OrderedDict()
+    for edge in sorted(edges, key=lambda edge: (edge[1], edge[0]) if sign < 0 else edge[:2]):
+        node, neighbour = (edge[1], edge[0]) if sign < 0 else (edge[0], edge[1])
+        neighbours.setdefault(node, OrderedDict()).setdefault(neighbour, []).append(edge)
+    kept = []
+    for node, node_neighbours in neighbours.items():
+        codes = list(node_neighbours)
+        if len(codes) > max_neighbours:
+            capped.append({'code': node, 'direction': UPSTREAM if sign < 0 else DOWNSTREAM,
+                           'total': len(codes),
+                           'next_cursor': encode_cursor(codes[max_neighbours - 1])})
+            codes = codes[:max_neighbours]
+        for code in codes:
+            kept.extend(node_neighbours[code])
+    return kept
+
+
+def _walk(codes, step, max_depth, nodes, max_nodes, sign, max_neighbours=None, capped=None):
+    """
+    Walks the graph in one direction, adding the reached codes to `nodes`
+
+    Returns the walked edges and whether the walk stopped because of max_nodes
+    """
+    edges = []
+    frontier = list(codes)
+    depth = 0
+    while frontier and depth < max_depth:
+        depth += 1
+        next_frontier = []
+        step_edges = step(frontier)
+        if max_neighbours:
+            step_edges = _cap_neighbours(step_edges, sign, max_neighbours, capped)
+        for edge in step_edges:
+            source, target, relation = edge
+            code = source if sign < 0 else target
+            if code not in nodes:
+                # nodes already visited are not walked again, which also breaks cycles
+                if len(nodes) >= max_nodes:
+                    return edges, True
+                nodes[code] = sign * depth
+                next_frontier.append(code)
+            edges.append((source, target, relation))
+        frontier = next_frontier
+    return edges, False
+
+
+@metrics.timed('traverse')
+def traverse(codes, direction=BOTH, max_depth=None, max_nodes=None, edge_source=None,
+             max_neighbours=None):
+    """
+    Collects the lineage graph around some codes
+
+    Returns a dict with:
+        nodes: OrderedDict mapping each reached code to its distance from the start codes,
+               negative for upstream codes
+        edges: list of (source, target, relation) tuples between the reached codes
+        truncated: True if the walk stopped because max_nodes was reached
+        capped: list of the nodes whose neighbours were cut by max_neighbours, with the
+                direction, the total number of neighbours and the cursor of the next page
+
+    @param codes: Codes to start from
+    @param direction: upstream, downstream or both
+    @param max_depth: Maximum number of hops from the start codes
+    @param max_nodes: Maximum number of nodes in the graph
+    @param edge_source: Object with upstream(codes) and downstream(codes) methods returning
+                        edges, defaults to the in-memory graph or the datalineage_edge
+                        table, see get_edge_source and HistoryEdgeSource
+    @param max_neighbours: Maximum number of neighbours walked from every node in each
+                           direction, all of them if not given
+    """
+    if direction not in DIRECTIONS:
+        raise ValueError('Unknown direction %s' % direction)
+    max_depth, max_nodes = get_limits(max_depth, max_nodes)
+    if max_neighbours is not None:
+        max_neighbours = get_page_size(max_neighbours)
+    edge_source = edge_source or get_edge_source()
+    nodes = OrderedDict((code, 0) for code in codes if code)
+    edges = []
+    capped = []
+    truncated = False
+    if direction in (UPSTREAM, BOTH):
+        walked, truncated = _walk(list(nodes), edge_source.upstream, max_depth, nodes, max_nodes,
+                                  -1, max_neighbours, capped)
+        edges.extend(walked)
+    if direction in (DOWNSTREAM, BOTH) and not truncated:
+        start = [code for code, depth in nodes.items() if depth == 0]
+        walked, truncated = _walk(start, edge_source.downstream, max_depth, nodes, max_nodes,
+                                  1, max_neighbours, capped)
+        edges.extend(walked)
+    edges = [edge for edge in OrderedDict.fromkeys(edges)
+             if edge[0] in nodes and edge[1] in nodes]
+    metrics.observe('datalineage_graph_nodes', len(nodes), graph='traversal')
+    return {'nodes': nodes, 'edges': edges, 'truncated': truncated, 'capped': capped}
@@ -82,6 +82,9 @@ setup(
         [ckan.plugins]
         datalineage=ckanext.datalineage.plugin:DatalineagePlugin
 
+        [paste.paster_command]
+        datalineage=ckanext.datalineage.commands:DatalineageCommand
+
         [babel.extractors]
         ckan = ckan.lib.extract:extract_ckan
     ''',